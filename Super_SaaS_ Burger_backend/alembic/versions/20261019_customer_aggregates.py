@@ -0,0 +1,57 @@
+"""customer aggregates
+
+Revision ID: 20261019_customer_aggregates
+Revises: 20261019_export_jobs
+Create Date: 2026-10-19
+
+Backfill (uma vez): python scripts/rebuild_customer_aggregates.py
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261019_customer_aggregates"
+down_revision = "20261019_export_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = inspect(op.get_bind())
+
+    order_indexes = {index["name"] for index in inspector.get_indexes("orders")}
+    if "ix_orders_tenant_customer" not in order_indexes:
+        op.create_index("ix_orders_tenant_customer", "orders", ["tenant_id", "customer_id"])
+
+    if "customer_aggregates" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "customer_aggregates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("customer_id", sa.Integer(), nullable=False),
+        sa.Column("total_orders", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_spent", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("first_order_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_order_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("is_vip", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.UniqueConstraint("tenant_id", "customer_id", name="ux_customer_aggregates_tenant_customer"),
+    )
+    op.create_index(
+        "ix_customer_aggregates_tenant_last_order",
+        "customer_aggregates",
+        ["tenant_id", "last_order_at", "customer_id"],
+    )
+    op.create_index(
+        "ix_customer_aggregates_tenant_vip_last_order",
+        "customer_aggregates",
+        ["tenant_id", "is_vip", "last_order_at"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_customer_aggregates_tenant_vip_last_order", table_name="customer_aggregates")
+    op.drop_index("ix_customer_aggregates_tenant_last_order", table_name="customer_aggregates")
+    op.drop_table("customer_aggregates")
+    op.drop_index("ix_orders_tenant_customer", table_name="orders")
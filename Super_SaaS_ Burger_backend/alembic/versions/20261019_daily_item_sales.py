@@ -0,0 +1,47 @@
+"""daily item sales
+
+Revision ID: 20261019_daily_item_sales
+Revises: 20261019_daily_sales_rollups
+Create Date: 2026-10-19
+
+Backfill do histórico (uma vez): python scripts/reconcile_sales_rollups.py --days 3650
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261019_daily_item_sales"
+down_revision = "20261019_daily_sales_rollups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = inspect(op.get_bind())
+    if "daily_item_sales" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "daily_item_sales",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("menu_item_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("production_area", sa.String(), nullable=False, server_default="COZINHA"),
+        sa.Column("item_name", sa.String(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("gross_revenue_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("modifier_revenue_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.UniqueConstraint(
+            "tenant_id",
+            "day",
+            "menu_item_id",
+            "production_area",
+            "item_name",
+            name="ux_daily_item_sales_key",
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("daily_item_sales")
@@ -0,0 +1,50 @@
+"""daily sales rollups
+
+Revision ID: 20261019_daily_sales_rollups
+Revises: 20260716_customer_phone_otp
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261019_daily_sales_rollups"
+down_revision = "20260716_customer_phone_otp"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = inspect(op.get_bind())
+    if "daily_sales_rollups" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "daily_sales_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("orders_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("gross_sales_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("open_orders_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("paid_orders_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("avg_ticket_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("payment_gross_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("payment_fees_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("payment_orders_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("payment_methods_json", sa.Text(), nullable=False, server_default="{}"),
+        sa.Column("cash_in_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cash_out_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cash_fees_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cash_fee_movements_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cogs_cents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cogs_movements_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.UniqueConstraint("tenant_id", "day", name="ux_daily_sales_rollups_tenant_day"),
+    )
+    op.create_index("ix_daily_sales_rollups_tenant_id", "daily_sales_rollups", ["tenant_id"])
+
+
+def downgrade():
+    op.drop_index("ix_daily_sales_rollups_tenant_id", table_name="daily_sales_rollups")
+    op.drop_table("daily_sales_rollups")
@@ -0,0 +1,151 @@
+"""delivery_logs monthly partitions and driver_latest_locations
+
+Revision ID: 20261019_delivery_logs_monthly
+Revises: 20261019_orders_status_indexes
+Create Date: 2026-10-19
+
+No Postgres, delivery_logs vira tabela particionada por mês (RANGE created_at, PK (id, created_at))
+com partição default de segurança; demais bancos seguem com a tabela simples.
+Manutenção/retenção: app.services.delivery_log_partitions (lifespan diário ou scripts/maintain_delivery_logs.py).
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261019_delivery_logs_monthly"
+down_revision = "20261019_orders_status_indexes"
+branch_labels = None
+depends_on = None
+
+DELIVERY_LOG_COLUMNS = (
+    "id, tenant_id, order_id, delivery_user_id, event_type, latitude, longitude, metadata, created_at"
+)
+# fixados aqui, sem importar app.services.delivery_log_partitions: a migration não muda quando o app mudar
+PARTITION_PREFIX = "delivery_logs_p"
+DEFAULT_PARTITION = "delivery_logs_default"
+PARTITIONS_AHEAD = 2
+DELIVERY_LOG_INDEXES = (
+    ("idx_delivery_logs_order", ["order_id"]),
+    ("idx_delivery_logs_user", ["delivery_user_id"]),
+    ("idx_delivery_logs_created", ["created_at"]),
+    ("idx_delivery_logs_event", ["event_type"]),
+    ("ix_delivery_logs_tenant_id", ["tenant_id"]),
+)
+
+
+def _month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_month_partition(month: date) -> None:
+    upper = _add_months(month, 1)
+    op.execute(
+        f'CREATE TABLE IF NOT EXISTS "{PARTITION_PREFIX}{month.year:04d}{month.month:02d}" PARTITION OF delivery_logs '
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+    )
+
+
+def _create_delivery_logs_table(sequence: str, partitioned: bool) -> None:
+    op.execute(
+        f"""
+        CREATE TABLE delivery_logs (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            tenant_id INTEGER NOT NULL,
+            order_id INTEGER NOT NULL,
+            delivery_user_id INTEGER NOT NULL,
+            event_type VARCHAR NOT NULL,
+            latitude DOUBLE PRECISION,
+            longitude DOUBLE PRECISION,
+            metadata JSON,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL
+        ){" PARTITION BY RANGE (created_at)" if partitioned else ""}
+        """
+    )
+
+
+def _swap_delivery_logs(partitioned: bool) -> None:
+    bind = op.get_bind()
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('delivery_logs', 'id')")).scalar()
+    if sequence is None:
+        sequence = "delivery_logs_id_seq"
+        op.execute(f"CREATE SEQUENCE IF NOT EXISTS {sequence}")
+        op.execute(f"SELECT setval('{sequence}', COALESCE((SELECT MAX(id) FROM delivery_logs), 0) + 1, false)")
+    # o DROP da tabela antiga levaria junto a sequence "owned"
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    op.execute("ALTER TABLE delivery_logs RENAME TO delivery_logs_legacy")
+    _create_delivery_logs_table(sequence, partitioned)
+
+    if partitioned:
+        today = datetime.now(timezone.utc).date()
+        oldest = bind.execute(sa.text("SELECT MIN(created_at) FROM delivery_logs_legacy")).scalar()
+        month = _month_start(oldest.date() if oldest is not None else today)
+        last = _add_months(_month_start(today), PARTITIONS_AHEAD)
+        while month <= last:
+            _create_month_partition(month)
+            month = _add_months(month, 1)
+        op.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF delivery_logs DEFAULT')
+
+    op.execute(f"INSERT INTO delivery_logs ({DELIVERY_LOG_COLUMNS}) SELECT {DELIVERY_LOG_COLUMNS} FROM delivery_logs_legacy")
+    op.execute("DROP TABLE delivery_logs_legacy")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY delivery_logs.id")
+    op.execute(
+        "ALTER TABLE delivery_logs ADD CONSTRAINT delivery_logs_pkey PRIMARY KEY "
+        + ("(id, created_at)" if partitioned else "(id)")
+    )
+    for name, columns in DELIVERY_LOG_INDEXES:
+        op.create_index(name, "delivery_logs", columns)
+
+
+def _is_partitioned() -> bool:
+    relkind = op.get_bind().execute(
+        sa.text("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass('delivery_logs')")
+    ).scalar()
+    return relkind == "p"
+
+
+def upgrade():
+    inspector = inspect(op.get_bind())
+
+    if "driver_latest_locations" not in inspector.get_table_names():
+        op.create_table(
+            "driver_latest_locations",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("tenant_id", sa.Integer(), nullable=False),
+            sa.Column("delivery_user_id", sa.Integer(), nullable=False),
+            sa.Column("order_id", sa.Integer(), nullable=True),
+            sa.Column("latitude", sa.Float(), nullable=False),
+            sa.Column("longitude", sa.Float(), nullable=False),
+            sa.Column("recorded_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+            sa.UniqueConstraint("tenant_id", "delivery_user_id", name="ux_driver_latest_locations_tenant_user"),
+        )
+        op.execute(
+            """
+            INSERT INTO driver_latest_locations
+                (tenant_id, delivery_user_id, order_id, latitude, longitude, recorded_at, updated_at)
+            SELECT l.tenant_id, l.delivery_user_id, l.order_id, l.latitude, l.longitude, l.created_at, l.created_at
+            FROM delivery_logs l
+            JOIN (
+                SELECT MAX(id) AS id
+                FROM delivery_logs
+                WHERE event_type = 'location_update' AND latitude IS NOT NULL AND longitude IS NOT NULL
+                GROUP BY tenant_id, delivery_user_id
+            ) latest ON latest.id = l.id
+            """
+        )
+
+    if op.get_bind().dialect.name == "postgresql" and not _is_partitioned():
+        _swap_delivery_logs(partitioned=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql" and _is_partitioned():
+        _swap_delivery_logs(partitioned=False)
+    op.drop_table("driver_latest_locations")
@@ -0,0 +1,59 @@
+"""export jobs
+
+Revision ID: 20261019_export_jobs
+Revises: 20261019_daily_item_sales
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261019_export_jobs"
+down_revision = "20261019_daily_item_sales"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = inspect(op.get_bind())
+    if "export_jobs" in inspector.get_table_names():
+        return
+
+    op.create_table(
+        "export_jobs",
+        sa.Column("id", sa.String(length=32), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("requested_by_user_id", sa.Integer(), nullable=True),
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("format", sa.String(length=10), nullable=False, server_default="csv"),
+        sa.Column("gzip", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("params_json", sa.Text(), nullable=False, server_default="{}"),
+        sa.Column("dedupe_key", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default="pending"),
+        sa.Column("storage", sa.String(length=10), nullable=True),
+        sa.Column("location", sa.Text(), nullable=True),
+        sa.Column("filename", sa.String(length=255), nullable=True),
+        sa.Column("rows_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("size_bytes", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_export_jobs_tenant_id", "export_jobs", ["tenant_id"])
+    op.create_index("ix_export_jobs_status_created_at", "export_jobs", ["status", "created_at"])
+    op.create_index(
+        "ux_export_jobs_active_dedupe",
+        "export_jobs",
+        ["dedupe_key"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('pending', 'running')"),
+        sqlite_where=sa.text("status IN ('pending', 'running')"),
+    )
+
+
+def downgrade():
+    op.drop_index("ux_export_jobs_active_dedupe", table_name="export_jobs")
+    op.drop_index("ix_export_jobs_status_created_at", table_name="export_jobs")
+    op.drop_index("ix_export_jobs_tenant_id", table_name="export_jobs")
+    op.drop_table("export_jobs")
@@ -0,0 +1,28 @@
+"""export jobs host
+
+Revision ID: 20261019_export_jobs_host
+Revises: 20261019_daily_paid_item_sales
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20261019_export_jobs_host"
+down_revision = "20261019_daily_paid_item_sales"
+branch_labels = None
+depends_on = None
+
+
+def _columns_by_name(table_name: str) -> set[str]:
+    inspector = sa.inspect(op.get_bind())
+    return {column["name"] for column in inspector.get_columns(table_name)}
+
+
+def upgrade():
+    if "host" not in _columns_by_name("export_jobs"):
+        op.add_column("export_jobs", sa.Column("host", sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    if "host" in _columns_by_name("export_jobs"):
+        op.drop_column("export_jobs", "host")
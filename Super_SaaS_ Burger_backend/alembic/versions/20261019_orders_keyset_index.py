@@ -0,0 +1,29 @@
+"""orders keyset index
+
+Revision ID: 20261019_orders_keyset_index
+Revises: 20261019_customer_aggregates
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261019_orders_keyset_index"
+down_revision = "20261019_customer_aggregates"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = inspect(op.get_bind())
+    indexes = {index["name"] for index in inspector.get_indexes("orders")}
+    if "ix_orders_tenant_created_at_id" not in indexes:
+        op.create_index(
+            "ix_orders_tenant_created_at_id",
+            "orders",
+            ["tenant_id", sa.text("created_at DESC"), "id"],
+        )
+
+
+def downgrade():
+    op.drop_index("ix_orders_tenant_created_at_id", table_name="orders")
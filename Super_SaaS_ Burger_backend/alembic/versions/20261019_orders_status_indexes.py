@@ -0,0 +1,61 @@
+"""orders uppercase status and composite indexes
+
+Revision ID: 20261019_orders_status_indexes
+Revises: 20261019_orders_keyset_index
+Create Date: 2026-10-19
+
+(tenant_id, created_at) já é coberto por ix_orders_tenant_created_at_id, recriado aqui com id DESC
+para o ORDER BY created_at DESC, id DESC da listagem não precisar de sort.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261019_orders_status_indexes"
+down_revision = "20261019_orders_keyset_index"
+branch_labels = None
+depends_on = None
+
+ACTIVE_DELIVERY_PREDICATE = (
+    "status IN ('READY', 'PRONTO', 'READY_FOR_DELIVERY', 'DRIVER_ASSIGNED', "
+    "'OUT_FOR_DELIVERY', 'SAIU', 'SAIU_PARA_ENTREGA')"
+)
+
+
+def upgrade():
+    op.execute("UPDATE orders SET status = UPPER(TRIM(status)) WHERE status <> UPPER(TRIM(status))")
+
+    inspector = inspect(op.get_bind())
+    indexes = {index["name"] for index in inspector.get_indexes("orders")}
+    if "ix_orders_tenant_created_at_id" in indexes:
+        op.drop_index("ix_orders_tenant_created_at_id", table_name="orders")
+    op.create_index(
+        "ix_orders_tenant_created_at_id",
+        "orders",
+        ["tenant_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+    if "ix_orders_tenant_status_created_at" not in indexes:
+        op.create_index(
+            "ix_orders_tenant_status_created_at",
+            "orders",
+            ["tenant_id", "status", "created_at"],
+        )
+    if "ix_orders_tenant_active_delivery_user" not in indexes:
+        op.create_index(
+            "ix_orders_tenant_active_delivery_user",
+            "orders",
+            ["tenant_id", "assigned_delivery_user_id"],
+            postgresql_where=sa.text(ACTIVE_DELIVERY_PREDICATE),
+            sqlite_where=sa.text(ACTIVE_DELIVERY_PREDICATE),
+        )
+
+
+def downgrade():
+    op.drop_index("ix_orders_tenant_active_delivery_user", table_name="orders")
+    op.drop_index("ix_orders_tenant_status_created_at", table_name="orders")
+    op.drop_index("ix_orders_tenant_created_at_id", table_name="orders")
+    op.create_index(
+        "ix_orders_tenant_created_at_id",
+        "orders",
+        ["tenant_id", sa.text("created_at DESC"), "id"],
+    )
@@ -1,9 +1,20 @@
 from __future__ import annotations
 
-from typing import Any, Protocol
+from dataclasses import dataclass
+from typing import Any, Protocol, runtime_checkable
+
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """Parte estável do prompt (system prompt + cardápio), igual entre turnos da mesma versão do menu."""
+
+    key: str
+    text: str
 
 
 class AIProvider(Protocol):
+    name: str
+
     def generate(
         self,
         tenant_id: int,
@@ -12,3 +23,26 @@ class AIProvider(Protocol):
         context: dict[str, Any],
     ) -> dict[str, Any]:
         ...
+
+    async def agenerate(
+        self,
+        tenant_id: int,
+        phone: str,
+        user_message: str,
+        context: dict[str, Any],
+        prefix: PromptPrefix | None = None,
+    ) -> dict[str, Any]:
+        ...
+
+
+@runtime_checkable
+class PrefixCachingProvider(Protocol):
+    def generate_with_prefix(
+        self,
+        tenant_id: int,
+        phone: str,
+        user_message: str,
+        context: dict[str, Any],
+        prefix: PromptPrefix,
+    ) -> dict[str, Any]:
+        ...
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any
 
+from app.ai.base import PromptPrefix
+
 
 class GeminiProvider:
     name = "gemini"
@@ -19,3 +22,28 @@ class GeminiProvider:
             "message_to_user": "O provedor Gemini ainda não está configurado. Posso ajudar com o cardápio ou pedidos.",
             "confidence": 0.3,
         }
+
+    def generate_with_prefix(
+        self,
+        tenant_id: int,
+        phone: str,
+        user_message: str,
+        context: dict[str, Any],
+        prefix: PromptPrefix,
+    ) -> dict[str, Any]:
+        # prefix.key identifica o conteúdo cacheável (cachedContents) enquanto o cardápio não mudar.
+        return self.generate(tenant_id, phone, user_message, context)
+
+    async def agenerate(
+        self,
+        tenant_id: int,
+        phone: str,
+        user_message: str,
+        context: dict[str, Any],
+        prefix: PromptPrefix | None = None,
+    ) -> dict[str, Any]:
+        if prefix is None:
+            return await asyncio.to_thread(self.generate, tenant_id, phone, user_message, context)
+        return await asyncio.to_thread(
+            self.generate_with_prefix, tenant_id, phone, user_message, context, prefix
+        )
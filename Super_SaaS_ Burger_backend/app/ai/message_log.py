@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.ai_message_log import AIMessageLog
+
+logger = logging.getLogger(__name__)
+
+AI_LOG_BATCH_SIZE = int(os.getenv("AI_LOG_BATCH_SIZE", "50"))
+AI_LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("AI_LOG_FLUSH_INTERVAL_SECONDS", "1.0"))
+AI_LOG_MAX_PENDING = int(os.getenv("AI_LOG_MAX_PENDING", "5000"))
+
+
+class AIMessageLogBuffer:
+    """Acumula AIMessageLog em memória e grava em lote fora do caminho da mensagem.
+
+    Sem o writer rodando (scripts, testes), grava na sessão do chamador como antes.
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_size: int = AI_LOG_BATCH_SIZE,
+        flush_interval: float = AI_LOG_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = AI_LOG_MAX_PENDING,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: deque[dict[str, Any]] = deque(maxlen=max_pending)
+        self._lock = Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._wakeup is not None
+
+    def enqueue(self, db: Session, **fields: Any) -> None:
+        fields.setdefault("created_at", datetime.now(timezone.utc))
+        if not self.running:
+            db.add(AIMessageLog(**fields))
+            db.commit()
+            return
+
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(fields)
+            should_wake = len(self._pending) >= self.batch_size
+        if should_wake and self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def drain(self) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = list(self._pending)
+            self._pending.clear()
+        return rows
+
+    def flush(self, session_factory: Callable[[], Session] = SessionLocal) -> int:
+        rows = self.drain()
+        if not rows:
+            return 0
+        db = session_factory()
+        try:
+            db.add_all([AIMessageLog(**row) for row in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Falha ao gravar lote de ai_message_logs size=%s", len(rows))
+            return 0
+        finally:
+            db.close()
+        return len(rows)
+
+    async def run(
+        self,
+        stop_event: asyncio.Event,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        logger.info("AI message log writer started batch_size=%s", self.batch_size)
+        try:
+            while not stop_event.is_set():
+                waiters = {
+                    asyncio.create_task(self._wakeup.wait()),
+                    asyncio.create_task(stop_event.wait()),
+                }
+                try:
+                    await asyncio.wait(waiters, timeout=self.flush_interval, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for waiter in waiters:
+                        waiter.cancel()
+                self._wakeup.clear()
+                await asyncio.to_thread(self.flush, session_factory)
+        finally:
+            self._wakeup = None
+            self._loop = None
+            self.flush(session_factory)
+            logger.info("AI message log writer stopped")
+
+
+ai_message_log_buffer = AIMessageLogBuffer()
+
+
+async def run_ai_message_log_writer(stop_event: asyncio.Event) -> None:
+    await ai_message_log_buffer.run(stop_event)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from typing import Any
 
+from app.ai.base import PromptPrefix
 from app.services.menu_search import normalize
 
 
@@ -172,3 +173,13 @@ class MockProvider:
             "message_to_user": "Desculpe, não entendi. Você pode pedir o cardápio ou informar o item desejado.",
             "confidence": 0.4,
         }
+
+    async def agenerate(
+        self,
+        tenant_id: int,
+        phone: str,
+        user_message: str,
+        context: dict[str, Any],
+        prefix: PromptPrefix | None = None,
+    ) -> dict[str, Any]:
+        return self.generate(tenant_id, phone, user_message, context)
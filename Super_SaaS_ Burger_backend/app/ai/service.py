@@ -1,26 +1,86 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import logging
+import os
+import time
+import weakref
+from dataclasses import dataclass
+from threading import Lock
 from typing import Any
 
 from pydantic import ValidationError
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from app.ai.base import AIProvider
+from app.ai.base import AIProvider, PrefixCachingProvider, PromptPrefix
 from app.ai.gemini_provider import GeminiProvider
+from app.ai.message_log import ai_message_log_buffer
 from app.ai.mock_provider import MockProvider
 from app.ai.schema import AssistantResponse
 from app.ai import tools
 from app.models.ai_config import AIConfig
-from app.models.ai_message_log import AIMessageLog
-from app.models.menu_item import MenuItem
-from app.models.menu_item_modifier_group import MenuItemModifierGroup
-from app.models.modifier import Modifier
-from app.models.modifier_group import ModifierGroup
+from app.realtime.cache_invalidation import broadcast_cache_invalidation, register_cache_invalidation
+from app.services.menu_snapshot import TenantMenuSnapshot, get_menu_snapshot
 
 logger = logging.getLogger(__name__)
 
+_BUSINESS_RULES = {
+    "mandatory_modifier_groups": False,
+    "notes": "Use apenas ferramentas disponíveis do sistema.",
+}
+# rede de segurança: mudanças de config chegam aos outros workers pelo aviso de invalidação (Redis Pub/Sub);
+# só sem Redis, ou com o aviso perdido, um worker usa a config antiga por até este tempo
+AI_CONFIG_TTL_SECONDS = float(os.getenv("AI_CONFIG_TTL_SECONDS", "300"))
+_CACHE_NAME = "ai_config"
+_DIRTY_CONFIGS_KEY = "ai_config_dirty_tenants"
+AI_PROVIDER_TIMEOUT_SECONDS = float(os.getenv("AI_PROVIDER_TIMEOUT_SECONDS", "8"))
+AI_TENANT_CONCURRENCY = int(os.getenv("AI_TENANT_CONCURRENCY", "2"))
+
+_PROVIDERS: dict[str, AIProvider] = {
+    "gemini": GeminiProvider(),
+    "mock": MockProvider(),
+}
+
+
+@dataclass(frozen=True)
+class AIConfigSnapshot:
+    tenant_id: int
+    provider: str
+    enabled: bool
+    model: str | None
+    temperature: float | None
+    system_prompt: str
+
+    @classmethod
+    def from_model(cls, config: AIConfig) -> "AIConfigSnapshot":
+        return cls(
+            tenant_id=config.tenant_id,
+            provider=(config.provider or "mock").strip().lower(),
+            enabled=bool(config.enabled),
+            model=config.model,
+            temperature=config.temperature,
+            system_prompt=(config.system_prompt or "").strip(),
+        )
+
+
+@dataclass(frozen=True)
+class AssistantContext:
+    config: AIConfigSnapshot
+    menu_version: tuple[int, float]
+    context: dict[str, Any]
+    prefix: PromptPrefix
+
+
+_config_cache: dict[int, tuple[float, AIConfigSnapshot | None]] = {}
+_context_cache: dict[int, AssistantContext] = {}
+_cache_lock = Lock()
+_tenant_semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[int, asyncio.Semaphore]] = (
+    weakref.WeakKeyDictionary()
+)
+
 
 def get_ai_config(db: Session, tenant_id: int) -> AIConfig:
     config = db.query(AIConfig).filter(AIConfig.tenant_id == tenant_id).first()
@@ -32,39 +92,61 @@ def get_ai_config(db: Session, tenant_id: int) -> AIConfig:
     return config
 
 
+def get_cached_ai_config(db: Session, tenant_id: int) -> AIConfigSnapshot | None:
+    with _cache_lock:
+        cached = _config_cache.get(tenant_id)
+    if cached is not None and time.monotonic() - cached[0] < AI_CONFIG_TTL_SECONDS:
+        return cached[1]
+
+    config = db.query(AIConfig).filter(AIConfig.tenant_id == tenant_id).first()
+    snapshot = AIConfigSnapshot.from_model(config) if config else None
+    with _cache_lock:
+        _config_cache[tenant_id] = (time.monotonic(), snapshot)
+    return snapshot
+
+
+def invalidate_ai_config(tenant_id: int | None = None) -> None:
+    with _cache_lock:
+        if tenant_id is None:
+            _config_cache.clear()
+            _context_cache.clear()
+            return
+        _config_cache.pop(tenant_id, None)
+        _context_cache.pop(tenant_id, None)
+
+
+register_cache_invalidation(_CACHE_NAME, invalidate_ai_config)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_ai_config_changes(session: Session, _flush_context) -> None:
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, AIConfig) and instance.tenant_id is not None:
+            session.info.setdefault(_DIRTY_CONFIGS_KEY, set()).add(int(instance.tenant_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_ai_config_after_commit(session: Session) -> None:
+    for tenant_id in session.info.pop(_DIRTY_CONFIGS_KEY, ()):
+        invalidate_ai_config(tenant_id)
+        broadcast_cache_invalidation(_CACHE_NAME, tenant_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_ai_config_changes(session: Session) -> None:
+    session.info.pop(_DIRTY_CONFIGS_KEY, None)
+
+
 def get_provider(tenant_id: int, db: Session) -> AIProvider:
-    config = get_ai_config(db, tenant_id)
-    provider = (config.provider or "mock").strip().lower()
-    if provider == "gemini":
-        return GeminiProvider()
-    return MockProvider()
+    return _provider_for(get_assistant_context(tenant_id, db).config)
 
 
-def build_context(tenant_id: int, db: Session) -> dict[str, Any]:
-    menu_items = (
-        db.query(MenuItem)
-        .filter(MenuItem.tenant_id == tenant_id, MenuItem.active.is_(True))
-        .order_by(MenuItem.id.asc())
-        .limit(25)
-        .all()
-    )
-    modifiers = (
-        db.query(Modifier)
-        .filter(Modifier.tenant_id == tenant_id, Modifier.active.is_(True))
-        .order_by(Modifier.id.asc())
-        .all()
-    )
-    modifier_groups = (
-        db.query(ModifierGroup)
-        .filter(ModifierGroup.tenant_id == tenant_id, ModifierGroup.active.is_(True))
-        .order_by(ModifierGroup.id.asc())
-        .all()
-    )
-    item_groups = (
-        db.query(MenuItemModifierGroup)
-        .filter(MenuItemModifierGroup.tenant_id == tenant_id)
-        .all()
-    )
+def _provider_for(config: AIConfigSnapshot) -> AIProvider:
+    return _PROVIDERS.get(config.provider, _PROVIDERS["mock"])
+
+
+def _context_from_snapshot(snapshot: TenantMenuSnapshot) -> dict[str, Any]:
+    menu_items = sorted(snapshot.items, key=lambda item: item.id)[:25]
 
     return {
         "menu_items": [
@@ -84,20 +166,82 @@ def build_context(tenant_id: int, db: Session) -> dict[str, Any]:
                 "price_cents": modifier.price_cents,
                 "group_id": modifier.group_id,
             }
-            for modifier in modifiers
+            for modifier in snapshot.modifiers
         ],
         "modifier_groups": [
-            {"id": group.id, "name": group.name} for group in modifier_groups
+            {"id": group.id, "name": group.name} for group in snapshot.modifier_groups
         ],
         "item_modifier_groups": [
-            {"menu_item_id": entry.menu_item_id, "modifier_group_id": entry.modifier_group_id}
-            for entry in item_groups
+            {"menu_item_id": menu_item_id, "modifier_group_id": modifier_group_id}
+            for menu_item_id, modifier_group_id in snapshot.item_group_links
         ],
-        "business_rules": {
-            "mandatory_modifier_groups": False,
-            "notes": "Use apenas ferramentas disponíveis do sistema.",
+        "business_rules": dict(_BUSINESS_RULES),
+    }
+
+
+def build_context(tenant_id: int, db: Session) -> dict[str, Any]:
+    return _context_from_snapshot(get_menu_snapshot(db, tenant_id))
+
+
+def _build_prompt_prefix(config: AIConfigSnapshot, snapshot: TenantMenuSnapshot) -> PromptPrefix:
+    menu_items = sorted(snapshot.items, key=lambda item: item.id)[:25]
+    payload = {
+        "system_prompt": config.system_prompt,
+        "format": {
+            "menu_items": "[id, nome, preco_centavos, categoria_id, [grupos_adicionais]]",
+            "modifier_groups": "[id, nome, [[adicional_id, nome, preco_centavos]]]",
         },
+        "menu_items": [
+            [
+                item.id,
+                item.name,
+                item.price_cents,
+                item.category_id,
+                snapshot.modifier_group_ids_for_item(item.id),
+            ]
+            for item in menu_items
+        ],
+        "modifier_groups": [
+            [
+                group.id,
+                group.name,
+                [
+                    [modifier.id, modifier.name, modifier.price_cents]
+                    for modifier in snapshot.modifiers_by_group.get(group.id, ())
+                ],
+            ]
+            for group in snapshot.modifier_groups
+        ],
+        "business_rules": _BUSINESS_RULES,
     }
+    text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return PromptPrefix(key=key, text=text)
+
+
+def get_assistant_context(tenant_id: int, db: Session) -> AssistantContext:
+    snapshot = get_menu_snapshot(db, tenant_id)
+    menu_version = (snapshot.version, snapshot.built_at)
+    config = get_cached_ai_config(db, tenant_id)
+    if config is None:
+        config = AIConfigSnapshot.from_model(get_ai_config(db, tenant_id))
+        with _cache_lock:
+            _config_cache[tenant_id] = (time.monotonic(), config)
+
+    with _cache_lock:
+        cached = _context_cache.get(tenant_id)
+    if cached is not None and cached.menu_version == menu_version and cached.config == config:
+        return cached
+
+    assistant_context = AssistantContext(
+        config=config,
+        menu_version=menu_version,
+        context=_context_from_snapshot(snapshot),
+        prefix=_build_prompt_prefix(config, snapshot),
+    )
+    with _cache_lock:
+        _context_cache[tenant_id] = assistant_context
+    return assistant_context
 
 
 def _fallback_rule_parser(message: str, context: dict[str, Any]) -> AssistantResponse:
@@ -118,7 +262,8 @@ def _log_message(
     parsed_json: str | None = None,
     error: str | None = None,
 ) -> None:
-    entry = AIMessageLog(
+    ai_message_log_buffer.enqueue(
+        db,
         tenant_id=tenant_id,
         phone=phone,
         direction=direction,
@@ -128,52 +273,91 @@ def _log_message(
         parsed_json=parsed_json,
         error=error,
     )
-    db.add(entry)
-    db.commit()
 
 
-def run_assistant(
+def _tenant_semaphore(tenant_id: int) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphores = _tenant_semaphores.get(loop)
+    if semaphores is None:
+        semaphores = {}
+        _tenant_semaphores[loop] = semaphores
+    semaphore = semaphores.get(tenant_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(AI_TENANT_CONCURRENCY)
+        semaphores[tenant_id] = semaphore
+    return semaphore
+
+
+def _parse_provider_payload(
+    raw_payload: dict[str, Any],
+    message: str,
+    context: dict[str, Any],
+) -> tuple[AssistantResponse, str | None, str | None]:
+    raw_response = json.dumps(raw_payload, ensure_ascii=False)
+    try:
+        return AssistantResponse.parse_obj(raw_payload), raw_response, None
+    except ValidationError as exc:
+        return _fallback_rule_parser(message, context), raw_response, f"validation_error: {exc}"
+
+
+def _generate(
+    provider: AIProvider,
     tenant_id: int,
     phone: str,
     message: str,
-    db: Session,
-) -> tuple[dict[str, Any], str]:
-    config = get_ai_config(db, tenant_id)
-    provider = get_provider(tenant_id, db)
-    context = build_context(tenant_id, db)
-
-    prompt_payload = {
-        "system_prompt": (config.system_prompt or "").strip(),
-        "user_message": message,
-        "context": context,
-    }
-    prompt_text = json.dumps(prompt_payload, ensure_ascii=False)
+    assistant_context: AssistantContext,
+) -> tuple[AssistantResponse, str | None, str | None]:
+    context = assistant_context.context
+    try:
+        if isinstance(provider, PrefixCachingProvider):
+            raw_payload = provider.generate_with_prefix(
+                tenant_id, phone, message, context, assistant_context.prefix
+            )
+        else:
+            raw_payload = provider.generate(tenant_id, phone, message, context)
+    except Exception as exc:
+        return _fallback_rule_parser(message, context), None, f"provider_error: {exc}"
+    return _parse_provider_payload(raw_payload, message, context)
 
-    _log_message(
-        db,
-        tenant_id=tenant_id,
-        phone=phone,
-        direction="in",
-        provider=provider.name,
-        prompt=message,
-    )
 
-    raw_response = None
-    parsed_response: AssistantResponse | None = None
-    error_message = None
+async def _agenerate(
+    provider: AIProvider,
+    tenant_id: int,
+    phone: str,
+    message: str,
+    assistant_context: AssistantContext,
+) -> tuple[AssistantResponse, str | None, str | None]:
+    context = assistant_context.context
+
+    async def _call() -> dict[str, Any]:
+        async with _tenant_semaphore(tenant_id):
+            return await provider.agenerate(
+                tenant_id, phone, message, context, prefix=assistant_context.prefix
+            )
 
     try:
-        raw_payload = provider.generate(tenant_id, phone, message, context)
-        raw_response = json.dumps(raw_payload, ensure_ascii=False)
-        parsed_response = AssistantResponse.parse_obj(raw_payload)
-    except ValidationError as exc:
-        error_message = f"validation_error: {exc}"
-        parsed_response = _fallback_rule_parser(message, context)
+        # O timeout cobre a espera pelo semáforo do tenant e a chamada ao provider;
+        # ao estourar, wait_for cancela a tarefa e seguimos com o parser por regras.
+        raw_payload = await asyncio.wait_for(_call(), timeout=AI_PROVIDER_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(
+            "AI provider timeout tenant_id=%s provider=%s timeout=%ss",
+            tenant_id,
+            provider.name,
+            AI_PROVIDER_TIMEOUT_SECONDS,
+        )
+        return _fallback_rule_parser(message, context), None, "provider_timeout"
     except Exception as exc:
-        error_message = f"provider_error: {exc}"
-        parsed_response = _fallback_rule_parser(message, context)
+        return _fallback_rule_parser(message, context), None, f"provider_error: {exc}"
+    return _parse_provider_payload(raw_payload, message, context)
 
-    final_message = parsed_response.message_to_user
+
+def _execute_tool_calls(
+    db: Session,
+    tenant_id: int,
+    phone: str,
+    parsed_response: AssistantResponse,
+) -> tuple[list[str], list[str]]:
     tool_errors: list[str] = []
     tool_messages: list[str] = []
 
@@ -214,6 +398,24 @@ def run_assistant(
             logger.exception("Erro executando tool_call %s", name)
             tool_errors.append(f"tool_error:{name}:{exc}")
 
+    return tool_messages, tool_errors
+
+
+def _finish_assistant_turn(
+    db: Session,
+    *,
+    tenant_id: int,
+    phone: str,
+    message: str,
+    provider: AIProvider,
+    assistant_context: AssistantContext,
+    parsed_response: AssistantResponse,
+    raw_response: str | None,
+    error_message: str | None,
+) -> tuple[dict[str, Any], str]:
+    final_message = parsed_response.message_to_user
+    tool_messages, tool_errors = _execute_tool_calls(db, tenant_id, phone, parsed_response)
+
     if tool_messages:
         final_message = tool_messages[-1]
 
@@ -221,7 +423,10 @@ def run_assistant(
         combined = "; ".join(tool_errors)
         error_message = f"{error_message or ''} {combined}".strip()
 
-    parsed_json = json.dumps(parsed_response.dict(), ensure_ascii=False)
+    parsed_payload = parsed_response.dict()
+    prompt_text = (
+        f"{assistant_context.prefix.text}\n{json.dumps({'user_message': message}, ensure_ascii=False)}"
+    )
 
     _log_message(
         db,
@@ -231,8 +436,60 @@ def run_assistant(
         provider=provider.name,
         prompt=prompt_text,
         raw_response=raw_response,
-        parsed_json=parsed_json,
+        parsed_json=json.dumps(parsed_payload, ensure_ascii=False),
         error=error_message,
     )
 
-    return parsed_response.dict(), final_message
+    return parsed_payload, final_message
+
+
+def run_assistant(
+    tenant_id: int,
+    phone: str,
+    message: str,
+    db: Session,
+) -> tuple[dict[str, Any], str]:
+    assistant_context = get_assistant_context(tenant_id, db)
+    provider = _provider_for(assistant_context.config)
+    _log_message(db, tenant_id=tenant_id, phone=phone, direction="in", provider=provider.name, prompt=message)
+
+    parsed_response, raw_response, error_message = _generate(
+        provider, tenant_id, phone, message, assistant_context
+    )
+    return _finish_assistant_turn(
+        db,
+        tenant_id=tenant_id,
+        phone=phone,
+        message=message,
+        provider=provider,
+        assistant_context=assistant_context,
+        parsed_response=parsed_response,
+        raw_response=raw_response,
+        error_message=error_message,
+    )
+
+
+async def arun_assistant(
+    tenant_id: int,
+    phone: str,
+    message: str,
+    db: Session,
+) -> tuple[dict[str, Any], str]:
+    assistant_context = get_assistant_context(tenant_id, db)
+    provider = _provider_for(assistant_context.config)
+    _log_message(db, tenant_id=tenant_id, phone=phone, direction="in", provider=provider.name, prompt=message)
+
+    parsed_response, raw_response, error_message = await _agenerate(
+        provider, tenant_id, phone, message, assistant_context
+    )
+    return _finish_assistant_turn(
+        db,
+        tenant_id=tenant_id,
+        phone=phone,
+        message=message,
+        provider=provider,
+        assistant_context=assistant_context,
+        parsed_response=parsed_response,
+        raw_response=raw_response,
+        error_message=error_message,
+    )
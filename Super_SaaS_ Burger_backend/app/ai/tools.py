@@ -5,10 +5,9 @@ from typing import Any
 
 from sqlalchemy.orm import Session
 
-from app.models.menu_item import MenuItem
-from app.models.modifier import Modifier
 from app.models.order import Order
 from app.services.menu_search import normalize, search_menu_items
+from app.services.menu_snapshot import get_menu_snapshot
 from app.services.orders import create_order_items
 
 
@@ -74,15 +73,10 @@ def _resolve_modifiers(db: Session, tenant_id: int, modifiers: list[dict[str, An
     if not normalized_names:
         return []
 
-    candidates = (
-        db.query(Modifier)
-        .filter(Modifier.tenant_id == tenant_id, Modifier.active.is_(True))
-        .all()
-    )
+    candidates = get_menu_snapshot(db, tenant_id).modifiers
     resolved: list[dict[str, Any]] = []
     for candidate in candidates:
-        normalized = normalize(candidate.name)
-        if normalized in normalized_names:
+        if candidate.normalized_name in normalized_names:
             resolved.append({"name": candidate.name, "price_cents": int(candidate.price_cents or 0)})
     return resolved
 
@@ -134,11 +128,7 @@ def add_item(
 
     menu_item = None
     if item_id:
-        menu_item = (
-            db.query(MenuItem)
-            .filter(MenuItem.tenant_id == tenant_id, MenuItem.id == item_id, MenuItem.active.is_(True))
-            .first()
-        )
+        menu_item = get_menu_snapshot(db, tenant_id).get_item(item_id)
     if not menu_item and item_name:
         matches = search_menu_items(db, tenant_id, item_name, limit=1)
         if matches:
@@ -185,13 +175,7 @@ def add_item(
 
 
 def list_menu(db: Session, tenant_id: int, limit: int = 10) -> dict[str, Any]:
-    items = (
-        db.query(MenuItem)
-        .filter(MenuItem.tenant_id == tenant_id, MenuItem.active.is_(True))
-        .order_by(MenuItem.id.asc())
-        .limit(limit)
-        .all()
-    )
+    items = sorted(get_menu_snapshot(db, tenant_id).items, key=lambda item: item.id)[:limit]
     if not items:
         return {"ok": False, "message": "Ainda não temos itens cadastrados no cardápio."}
 
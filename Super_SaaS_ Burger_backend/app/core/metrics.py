@@ -67,3 +67,54 @@ class InMemoryRequestMetrics:
 
 
 request_metrics = InMemoryRequestMetrics()
+
+
+@dataclass
+class OutboundGauge:
+    connections: int = 0
+    queued_frames: int = 0
+    queued_bytes: int = 0
+    dropped_frames: int = 0
+    slow_consumer_closes: int = 0
+
+
+class RealtimeOutboundMetrics:
+    """Gauges do worker para as filas de saída em tempo real, por transporte (websocket, sse)."""
+
+    def __init__(self) -> None:
+        self._gauges: dict[str, OutboundGauge] = {}
+        self._lock = Lock()
+
+    def connection(self, transport: str, delta: int) -> None:
+        with self._lock:
+            self._gauges.setdefault(transport, OutboundGauge()).connections += delta
+
+    def queued(self, transport: str, frames: int, size: int) -> None:
+        with self._lock:
+            gauge = self._gauges.setdefault(transport, OutboundGauge())
+            gauge.queued_frames += frames
+            gauge.queued_bytes += size
+
+    def dropped(self, transport: str, frames: int = 1) -> None:
+        with self._lock:
+            self._gauges.setdefault(transport, OutboundGauge()).dropped_frames += frames
+
+    def slow_consumer_closed(self, transport: str) -> None:
+        with self._lock:
+            self._gauges.setdefault(transport, OutboundGauge()).slow_consumer_closes += 1
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {
+                transport: {
+                    "connections": gauge.connections,
+                    "queued_frames": gauge.queued_frames,
+                    "queued_bytes": gauge.queued_bytes,
+                    "dropped_frames": gauge.dropped_frames,
+                    "slow_consumer_closes": gauge.slow_consumer_closes,
+                }
+                for transport, gauge in self._gauges.items()
+            }
+
+
+realtime_outbound_metrics = RealtimeOutboundMetrics()
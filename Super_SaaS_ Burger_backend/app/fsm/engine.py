@@ -4,10 +4,6 @@ import logging
 import re
 
 from app.fsm import states
-from app.models.menu_item import MenuItem
-from app.models.menu_item_modifier_group import MenuItemModifierGroup
-from app.models.modifier import Modifier
-from app.models.modifier_group import ModifierGroup
 from app.services.menu_search import (
     extract_modifier_triggers,
     normalize,
@@ -16,6 +12,7 @@ from app.services.menu_search import (
     search_menu_items_in_candidates,
     split_item_and_modifiers,
 )
+from app.services.menu_snapshot import SnapshotMenuItem, SnapshotModifier, get_menu_snapshot
 
 
 def _format_price_cents(price_cents: int) -> str:
@@ -23,16 +20,11 @@ def _format_price_cents(price_cents: int) -> str:
     return f"R$ {price:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
 
-def _load_menu_items(db, tenant_id: int) -> list[MenuItem]:
-    return (
-        db.query(MenuItem)
-        .filter(MenuItem.tenant_id == tenant_id, MenuItem.active.is_(True))
-        .order_by(MenuItem.name.asc())
-        .all()
-    )
+def _load_menu_items(db, tenant_id: int) -> list[SnapshotMenuItem]:
+    return list(get_menu_snapshot(db, tenant_id).items)
 
 
-def _format_menu(items: list[MenuItem]) -> str:
+def _format_menu(items: list[SnapshotMenuItem]) -> str:
     if not items:
         return "Desculpe, o cardápio está indisponível no momento."
     lines = ["🍔 Cardápio:"]
@@ -54,7 +46,7 @@ def _modifiers_key(modifiers: list[dict]) -> tuple:
 
 def _add_item_to_cart(
     dados: dict,
-    item: MenuItem,
+    item: SnapshotMenuItem,
     qty: int,
     modifiers: list[dict] | None = None,
 ) -> None:
@@ -134,7 +126,7 @@ def _build_disambiguation_message(options: list[dict]) -> str:
 
 
 def _is_strong_unique_match(
-    query: str, results: list[tuple[MenuItem, float]], score_threshold: float, min_gap: float
+    query: str, results: list[tuple[SnapshotMenuItem, float]], score_threshold: float, min_gap: float
 ) -> bool:
     if not results:
         return False
@@ -144,7 +136,7 @@ def _is_strong_unique_match(
         return False
 
     exact_matches = [
-        item for item, _score in results if normalize(item.name) == normalized_query
+        item for item, _score in results if item.normalized_name == normalized_query
     ]
     if len(exact_matches) == 1:
         return True
@@ -158,49 +150,16 @@ def _is_strong_unique_match(
     return (top_score - second_score) >= min_gap
 
 
-def _load_modifiers_for_item(db, tenant_id: int, item_id: int) -> list[Modifier]:
-    ids = _load_modifier_group_ids_for_item(db, tenant_id, item_id)
-    if not ids:
-        return []
-    return (
-        db.query(Modifier)
-        .filter(
-            Modifier.tenant_id == tenant_id,
-            Modifier.group_id.in_(ids),
-            Modifier.active.is_(True),
-        )
-        .all()
-    )
+def _load_modifiers_for_item(db, tenant_id: int, item_id: int) -> list[SnapshotModifier]:
+    return get_menu_snapshot(db, tenant_id).modifiers_for_item(item_id)
 
 
 def _load_modifier_group_ids_for_item(db, tenant_id: int, item_id: int) -> list[int]:
-    group_ids = (
-        db.query(MenuItemModifierGroup.modifier_group_id)
-        .join(
-            ModifierGroup,
-            ModifierGroup.id == MenuItemModifierGroup.modifier_group_id,
-        )
-        .filter(
-            MenuItemModifierGroup.tenant_id == tenant_id,
-            MenuItemModifierGroup.menu_item_id == item_id,
-            ModifierGroup.active.is_(True),
-        )
-        .all()
-    )
-    return [gid for (gid,) in group_ids]
+    return get_menu_snapshot(db, tenant_id).modifier_group_ids_for_item(item_id)
 
 
-def _load_modifiers_for_tenant(db, tenant_id: int) -> list[Modifier]:
-    return (
-        db.query(Modifier)
-        .join(ModifierGroup, Modifier.group_id == ModifierGroup.id)
-        .filter(
-            Modifier.tenant_id == tenant_id,
-            Modifier.active.is_(True),
-            ModifierGroup.active.is_(True),
-        )
-        .all()
-    )
+def _load_modifiers_for_tenant(db, tenant_id: int) -> list[SnapshotModifier]:
+    return list(get_menu_snapshot(db, tenant_id).tenant_modifiers)
 
 
 def _score_modifier_match(segment: str, modifier_name: str) -> float:
@@ -235,13 +194,15 @@ def _split_modifier_phrases(modifiers_text: str) -> list[str]:
     return [part.strip() for part in parts if part.strip()]
 
 
-def _match_modifier_segment(segment: str, modifiers: list[Modifier], min_score: float = 0.72) -> list[Modifier]:
+def _match_modifier_segment(
+    segment: str, modifiers: list[SnapshotModifier], min_score: float = 0.72
+) -> list[SnapshotModifier]:
     normalized_segment = normalize(segment)
     if not normalized_segment:
         return []
-    scored: list[tuple[float, Modifier]] = []
+    scored: list[tuple[float, SnapshotModifier]] = []
     for modifier in modifiers:
-        mod_name = normalize(modifier.name)
+        mod_name = modifier.normalized_name
         if not mod_name:
             continue
         score = _score_modifier_match(normalized_segment, mod_name)
@@ -254,15 +215,15 @@ def _match_modifier_segment(segment: str, modifiers: list[Modifier], min_score:
     return [modifier for score, modifier in scored if score >= top_score - 0.05]
 
 
-def _format_modifier_choices(modifiers: list[dict] | list[Modifier]) -> str:
+def _format_modifier_choices(modifiers: list[dict] | list[SnapshotModifier]) -> str:
     formatted: list[str] = []
     for modifier in modifiers:
-        if isinstance(modifier, Modifier):
-            name = modifier.name
-            price_cents = modifier.price_cents
-        else:
+        if isinstance(modifier, dict):
             name = modifier.get("name")
             price_cents = modifier.get("price_cents", 0)
+        else:
+            name = modifier.name
+            price_cents = modifier.price_cents
         if not name:
             continue
         if price_cents and int(price_cents) > 0:
@@ -274,11 +235,11 @@ def _format_modifier_choices(modifiers: list[dict] | list[Modifier]) -> str:
 
 def _collect_modifier_matches(
     modifiers_text: str,
-    allowed_modifiers: list[Modifier],
-    tenant_modifiers: list[Modifier],
-) -> tuple[list[Modifier], list[Modifier], list[str], list[str]]:
-    selected: list[Modifier] = []
-    invalid_modifiers: list[Modifier] = []
+    allowed_modifiers: list[SnapshotModifier],
+    tenant_modifiers: list[SnapshotModifier],
+) -> tuple[list[SnapshotModifier], list[SnapshotModifier], list[str], list[str]]:
+    selected: list[SnapshotModifier] = []
+    invalid_modifiers: list[SnapshotModifier] = []
     invalid_segments: list[str] = []
     segments: list[str] = []
     selected_ids: set[int] = set()
@@ -337,11 +298,7 @@ def processar_mensagem(conversa, texto, db, tenant_id: int):
             qty = int(pending_modifier_confirmation.get("qty", 1) or 1)
             allowed_modifiers = pending_modifier_confirmation.get("allowed_modifiers") or []
             choice = _parse_yes_no_choice(texto)
-            item = (
-                db.query(MenuItem)
-                .filter(MenuItem.tenant_id == tenant_id, MenuItem.id == item_id)
-                .first()
-            )
+            item = get_menu_snapshot(db, tenant_id).get_item(item_id)
             if not item:
                 dados.pop("pending_modifier_confirmation", None)
                 resposta = "Não encontrei o item do seu pedido. Pode me dizer novamente?"
@@ -372,11 +329,7 @@ def processar_mensagem(conversa, texto, db, tenant_id: int):
             item_id = pending_modifier.get("item_id")
             qty = int(pending_modifier.get("qty", 1) or 1)
             allowed_modifiers = pending_modifier.get("allowed_modifiers") or []
-            item = (
-                db.query(MenuItem)
-                .filter(MenuItem.tenant_id == tenant_id, MenuItem.id == item_id)
-                .first()
-            )
+            item = get_menu_snapshot(db, tenant_id).get_item(item_id)
             if not item:
                 dados.pop("pending_modifier", None)
                 resposta = "Não encontrei o item do seu pedido. Pode me dizer novamente?"
@@ -396,12 +349,12 @@ def processar_mensagem(conversa, texto, db, tenant_id: int):
                         tenant_id,
                     )
                     allowed_objs = [
-                        Modifier(
+                        SnapshotModifier(
                             id=mod.get("id"),
-                            tenant_id=tenant_id,
                             group_id=mod.get("group_id"),
                             name=mod.get("name"),
                             price_cents=mod.get("price_cents", 0),
+                            normalized_name=normalize(str(mod.get("name") or "")),
                         )
                         for mod in allowed_modifiers
                     ]
@@ -535,7 +488,7 @@ def processar_mensagem(conversa, texto, db, tenant_id: int):
                             [modifier.name for modifier in allowed_modifiers],
                         )
                         selected_modifiers: list[dict] = []
-                        invalid_modifiers: list[Modifier] = []
+                        invalid_modifiers: list[SnapshotModifier] = []
                         invalid_segments: list[str] = []
                         modifier_segments: list[str] = []
                         if modifiers_text:
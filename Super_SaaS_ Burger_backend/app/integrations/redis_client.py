@@ -1,5 +1,6 @@
 import logging
 import os
+from threading import Lock
 
 import redis
 import redis.asyncio as redis_asyncio
@@ -8,6 +9,9 @@ from redis.asyncio import Redis as AsyncRedis
 
 logger = logging.getLogger(__name__)
 
+_shared_clients: dict[str, Redis] = {}
+_shared_clients_lock = Lock()
+
 
 def _get_redis_url() -> str:
     return os.getenv("REDIS_URL", "").strip()
@@ -20,6 +24,19 @@ def get_redis_client() -> Redis | None:
     return redis.from_url(redis_url)
 
 
+def get_shared_redis_client() -> Redis | None:
+    """Cliente síncrono reaproveitado no processo (pool de conexões próprio); não deve ser fechado."""
+    redis_url = _get_redis_url()
+    if not redis_url:
+        return None
+    with _shared_clients_lock:
+        client = _shared_clients.get(redis_url)
+        if client is None:
+            client = redis.from_url(redis_url)
+            _shared_clients[redis_url] = client
+    return client
+
+
 def get_async_redis_client() -> AsyncRedis | None:
     redis_url = _get_redis_url()
     if not redis_url:
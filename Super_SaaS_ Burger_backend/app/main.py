@@ -12,12 +12,20 @@ from sqlalchemy import inspect
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.core.config import CORS_ALLOW_ORIGIN_REGEX, DATABASE_URL, ENV, FEATURE_LEGACY_ADMIN
+from app.ai.message_log import run_ai_message_log_writer
 from app.core.database import Base, SessionLocal, engine
 from app.core.logging_setup import configure_logging
 from app.core.startup_checks import ensure_migrations_applied, validate_database_environment
 from app.integrations.redis_client import validate_redis_connection
 from app.realtime.subscriber import run_tenant_events_subscriber
 from app.realtime.delivery_subscriber import run_delivery_subscriber
+from app.realtime.cache_invalidation import run_cache_invalidation_subscriber
+from app.realtime.publish_queue import run_realtime_publisher
+from app.services.sales_rollups import run_sales_rollup_reconciler, run_sales_rollup_refresher
+from app.services.customer_aggregates import run_customer_aggregates_reconciler
+from app.services.export_jobs import run_export_worker
+from app.services.delivery_log_partitions import run_delivery_log_maintenance
+from app.services.location_writer import run_location_writer
 from app.middleware.observability import ObservabilityMiddleware
 from app.middleware.admin_session import AdminSessionMiddleware
 from app.middleware.tenant_rate_limit import TenantRateLimitMiddleware
@@ -25,6 +33,8 @@ from app.middleware.tenant_context import TenantContextMiddleware
 from app.middleware.delivery_redirect import DeliveryRedirectMiddleware
 import app.models  # garante que os models são importados antes do create_all
 import app.services.event_handlers  # registra handlers do event bus
+import app.services.customer_aggregates  # mantém customer_aggregates na gravação de pedidos
+import app.services.driver_locations  # mantém driver_latest_locations a cada location_update
 
 from app.models.admin_user import AdminUser
 from app.services.passwords import hash_password
@@ -100,8 +110,17 @@ ALEMBIC_CONFIG_PATH = Path(
 async def lifespan(_: FastAPI):
     _startup_tasks()
     stop_event = asyncio.Event()
+    realtime_publisher_task = asyncio.create_task(run_realtime_publisher(stop_event))
     subscriber_task = asyncio.create_task(run_tenant_events_subscriber(stop_event))
     delivery_subscriber_task = asyncio.create_task(run_delivery_subscriber(stop_event))
+    cache_invalidation_task = asyncio.create_task(run_cache_invalidation_subscriber(stop_event))
+    ai_log_writer_task = asyncio.create_task(run_ai_message_log_writer(stop_event))
+    sales_rollup_task = asyncio.create_task(run_sales_rollup_reconciler(stop_event))
+    sales_rollup_refresher_task = asyncio.create_task(run_sales_rollup_refresher(stop_event))
+    customer_aggregates_task = asyncio.create_task(run_customer_aggregates_reconciler(stop_event))
+    export_worker_task = asyncio.create_task(run_export_worker(stop_event))
+    delivery_log_maintenance_task = asyncio.create_task(run_delivery_log_maintenance(stop_event))
+    location_writer_task = asyncio.create_task(run_location_writer(stop_event))
     for route_path in _registered_route_paths():
         logger.info("registered_route path=%s", route_path)
     try:
@@ -110,6 +129,14 @@ async def lifespan(_: FastAPI):
         stop_event.set()
         subscriber_task.cancel()
         delivery_subscriber_task.cancel()
+        cache_invalidation_task.cancel()
+        ai_log_writer_task.cancel()
+        sales_rollup_task.cancel()
+        sales_rollup_refresher_task.cancel()
+        customer_aggregates_task.cancel()
+        export_worker_task.cancel()
+        delivery_log_maintenance_task.cancel()
+        location_writer_task.cancel()
         try:
             await subscriber_task
         except asyncio.CancelledError:
@@ -118,6 +145,43 @@ async def lifespan(_: FastAPI):
             await delivery_subscriber_task
         except asyncio.CancelledError:
             pass
+        try:
+            await cache_invalidation_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await ai_log_writer_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await sales_rollup_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await sales_rollup_refresher_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await customer_aggregates_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await export_worker_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await delivery_log_maintenance_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await location_writer_task
+        except asyncio.CancelledError:
+            pass
+        # por último: o publisher envia o que as outras tasks ainda enfileiraram no encerramento
+        try:
+            await asyncio.wait_for(realtime_publisher_task, timeout=5)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
 
 
 app = FastAPI(
@@ -162,6 +226,8 @@ app.add_middleware(
         "X-Tenant-ID",
         "X-Tenant-Slug",
     ],
+    # o painel de pedidos lê o cursor da próxima página (GET /api/orders/{tenant_id})
+    expose_headers=["X-Next-Cursor"],
 )
 
 print("CORS CONFIG ACTIVE")
@@ -10,6 +10,7 @@ from app.models.modifier_option import ModifierOption
 from app.models.menu_item_modifier_group import MenuItemModifierGroup
 from app.models.order_item import OrderItem
 from app.models.finance import OrderPayment, CashMovement
+from app.models.sales_rollup import DailyItemSales, DailyPaidItemSales, DailySalesRollup
 from app.models.admin_user import AdminUser
 from app.models.admin_audit_log import AdminAuditLog
 from app.models.admin_login_attempt import AdminLoginAttempt
@@ -20,6 +21,7 @@ from app.models.inventory import (
     ModifierIngredient,
 )
 from app.models.customer_stats import CustomerStats
+from app.models.customer_aggregate import CustomerAggregate
 from app.models.customer import Customer
 from app.models.customer_address import CustomerAddress
 from app.models.whatsapp_outbound_log import WhatsAppOutboundLog
@@ -27,10 +29,12 @@ from app.models.whatsapp_config import WhatsAppConfig
 from app.models.whatsapp_message_log import WhatsAppMessageLog
 from app.models.ai_config import AIConfig
 from app.models.ai_message_log import AIMessageLog
+from app.models.export_job import ExportJob
 from app.models.tenant_public_settings import TenantPublicSettings
 from app.models.coupon import Coupon, CouponRedemption
 from app.models.delivery_log import DeliveryLog
 from app.models.delivery_tracking import DeliveryTracking
+from app.models.driver_latest_location import DriverLatestLocation
 from app.models.customer_benefit import CustomerBenefit
 from app.models.customer_points import CustomerPoints
 from app.models.customer_tag import CustomerTag
@@ -0,0 +1,24 @@
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, UniqueConstraint
+
+from app.core.database import Base
+
+
+class CustomerAggregate(Base):
+    """Totais de pedidos por cliente, mantidos na gravação dos pedidos (lista de clientes do admin)."""
+
+    __tablename__ = "customer_aggregates"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "customer_id", name="ux_customer_aggregates_tenant_customer"),
+        # ordenação padrão da lista e filtros de inatividade/recorrência (faixas de last_order_at)
+        Index("ix_customer_aggregates_tenant_last_order", "tenant_id", "last_order_at", "customer_id"),
+        Index("ix_customer_aggregates_tenant_vip_last_order", "tenant_id", "is_vip", "last_order_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, nullable=False)
+    customer_id = Column(Integer, nullable=False)
+    total_orders = Column(Integer, nullable=False, default=0)
+    total_spent = Column(Integer, nullable=False, default=0)
+    first_order_at = Column(DateTime(timezone=True), nullable=True)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+    is_vip = Column(Boolean, nullable=False, default=False)
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Float, Integer, UniqueConstraint
+
+from app.core.database import Base
+
+
+class DriverLatestLocation(Base):
+    """Última posição de cada entregador, atualizada a cada ping (mapa ao vivo lê daqui, não de delivery_logs)."""
+
+    __tablename__ = "driver_latest_locations"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "delivery_user_id", name="ux_driver_latest_locations_tenant_user"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, nullable=False)
+    delivery_user_id = Column(Integer, nullable=False)
+    order_id = Column(Integer, nullable=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
@@ -0,0 +1,42 @@
+from uuid import uuid4
+
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, Text, func, text
+
+from app.core.database import Base
+
+
+class ExportJob(Base):
+    """Exportação gerada em segundo plano; o arquivo fica em disco local ou no R2."""
+
+    __tablename__ = "export_jobs"
+    __table_args__ = (
+        # no máximo um job ativo por pedido idêntico (dedupe de requisições concorrentes)
+        Index(
+            "ux_export_jobs_active_dedupe",
+            "dedupe_key",
+            unique=True,
+            postgresql_where=text("status IN ('pending', 'running')"),
+            sqlite_where=text("status IN ('pending', 'running')"),
+        ),
+        Index("ix_export_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String(32), primary_key=True, default=lambda: uuid4().hex)
+    tenant_id = Column(Integer, index=True, nullable=False)
+    requested_by_user_id = Column(Integer, nullable=True)
+    kind = Column(String(20), nullable=False)  # customers / orders / financial
+    format = Column(String(10), nullable=False, default="csv")  # csv / ndjson
+    gzip = Column(Boolean, nullable=False, default=False)
+    params_json = Column(Text, nullable=False, default="{}")
+    dedupe_key = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending / running / done / failed / expired
+    storage = Column(String(10), nullable=True)  # local / r2
+    location = Column(Text, nullable=True)  # caminho local ou chave do objeto no R2; None depois de expirar
+    host = Column(String(255), nullable=True)  # instância que gravou o arquivo local
+    filename = Column(String(255), nullable=True)
+    rows_count = Column(Integer, nullable=False, default=0)
+    size_bytes = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
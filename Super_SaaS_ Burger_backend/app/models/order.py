@@ -1,13 +1,43 @@
 import sqlalchemy as sa
 from sqlalchemy import Boolean, Column, ForeignKey, Integer, Numeric, String, Text, DateTime, func
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from app.core.database import Base
 from app.services.public_tracking import default_tracking_expires_at, generate_tracking_token
 
+# pedidos com entregador vinculado ainda em andamento (índice parcial de assigned_delivery_user_id)
+ACTIVE_DELIVERY_STATUSES = (
+    "READY",
+    "PRONTO",
+    "READY_FOR_DELIVERY",
+    "DRIVER_ASSIGNED",
+    "OUT_FOR_DELIVERY",
+    "SAIU",
+    "SAIU_PARA_ENTREGA",
+)
+_ACTIVE_DELIVERY_PREDICATE = "status IN ({})".format(", ".join(f"'{status}'" for status in ACTIVE_DELIVERY_STATUSES))
+
+
+def normalize_order_status(status: str | None) -> str:
+    """Status é sempre gravado em maiúsculas para os filtros usarem os índices sem upper()/lower()."""
+    return (status or "").strip().upper() or "RECEBIDO"
+
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        sa.Index("ix_orders_tenant_customer", "tenant_id", "customer_id"),
+        # listagem do admin paginada por (created_at, id), mais recentes primeiro
+        sa.Index("ix_orders_tenant_created_at_id", "tenant_id", sa.text("created_at DESC"), sa.text("id DESC")),
+        sa.Index("ix_orders_tenant_status_created_at", "tenant_id", "status", "created_at"),
+        sa.Index(
+            "ix_orders_tenant_active_delivery_user",
+            "tenant_id",
+            "assigned_delivery_user_id",
+            postgresql_where=sa.text(_ACTIVE_DELIVERY_PREDICATE),
+            sqlite_where=sa.text(_ACTIVE_DELIVERY_PREDICATE),
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     daily_order_number = Column(Integer, nullable=True)
@@ -79,3 +109,7 @@ class Order(Base):
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     payments = relationship("OrderPayment", back_populates="order", cascade="all, delete-orphan")
     coupon_redemptions = relationship("CouponRedemption", back_populates="order", cascade="all, delete-orphan")
+
+    @validates("status")
+    def _normalize_status(self, _key, value):
+        return normalize_order_status(value)
@@ -0,0 +1,85 @@
+from sqlalchemy import Column, Date, DateTime, Integer, String, Text, UniqueConstraint, func
+
+from app.core.database import Base
+
+
+class DailySalesRollup(Base):
+    """Totais de vendas por tenant e dia (UTC), recalculados a partir de orders/payments/caixa."""
+
+    __tablename__ = "daily_sales_rollups"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "day", name="ux_daily_sales_rollups_tenant_day"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, index=True, nullable=False)
+    day = Column(Date, nullable=False)
+
+    # por data de criação do pedido
+    orders_count = Column(Integer, nullable=False, default=0)
+    gross_sales_cents = Column(Integer, nullable=False, default=0)
+    open_orders_count = Column(Integer, nullable=False, default=0)
+    paid_orders_count = Column(Integer, nullable=False, default=0)
+    avg_ticket_cents = Column(Integer, nullable=False, default=0)
+
+    # por data do pagamento (paid_at ou created_at), apenas status "paid"
+    payment_gross_cents = Column(Integer, nullable=False, default=0)
+    payment_fees_cents = Column(Integer, nullable=False, default=0)
+    payment_orders_count = Column(Integer, nullable=False, default=0)
+    payment_methods_json = Column(Text, nullable=False, default="{}")
+
+    # caixa e estoque
+    cash_in_cents = Column(Integer, nullable=False, default=0)
+    cash_out_cents = Column(Integer, nullable=False, default=0)
+    cash_fees_cents = Column(Integer, nullable=False, default=0)
+    cash_fee_movements_count = Column(Integer, nullable=False, default=0)
+    cogs_cents = Column(Integer, nullable=False, default=0)
+    cogs_movements_count = Column(Integer, nullable=False, default=0)
+
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class DailyItemSales(Base):
+    """Vendas por item do cardápio, área de produção e dia (UTC), alimentada na gravação dos order_items."""
+
+    __tablename__ = "daily_item_sales"
+    __table_args__ = (
+        UniqueConstraint(
+            "tenant_id",
+            "day",
+            "menu_item_id",
+            "production_area",
+            "item_name",
+            name="ux_daily_item_sales_key",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False)
+    menu_item_id = Column(Integer, nullable=False, default=0)  # 0 = item sem vínculo com o cardápio
+    production_area = Column(String, nullable=False, default="COZINHA")
+    item_name = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    gross_revenue_cents = Column(Integer, nullable=False, default=0)
+    modifier_revenue_cents = Column(Integer, nullable=False, default=0)
+
+
+class DailyPaidItemSales(Base):
+    """Itens de pedidos pagos por dia do pagamento (UTC), com a taxa dos pagamentos rateada por item."""
+
+    __tablename__ = "daily_paid_item_sales"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "day", "menu_item_id", "item_name", name="ux_daily_paid_item_sales_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False)
+    menu_item_id = Column(Integer, nullable=False, default=0)  # 0 = item sem vínculo com o cardápio
+    item_name = Column(String, nullable=False)
+    # no dia do primeiro pagamento "paid" do pedido
+    quantity = Column(Integer, nullable=False, default=0)
+    gross_revenue_cents = Column(Integer, nullable=False, default=0)
+    # no dia de cada pagamento
+    fee_cents = Column(Integer, nullable=False, default=0)
@@ -14,6 +14,10 @@ from app.deps import get_current_delivery_user
 from app.integrations.redis_client import get_async_redis_client
 from app.models.admin_user import AdminUser
 from app.models.order import Order
+from app.realtime.coalescer import CoalescingHub
+from app.realtime.delivery_envelope import parse_delivery_envelope
+from app.realtime.event_streams import order_tracking_stream
+from app.realtime.publisher import publish_public_tracking_event
 from app.modules.tracking.service import (
     TrackingStoreError,
     can_accept_location_update,
@@ -26,7 +30,10 @@ logger = logging.getLogger(__name__)
 
 OUT_FOR_DELIVERY_STATUSES = {"OUT_FOR_DELIVERY", "SAIU", "SAIU_PARA_ENTREGA"}
 DELIVERED_STATUSES = {"DELIVERED", "ENTREGUE"}
-POLL_SECONDS = 1.0
+COALESCE_SECONDS = 1.0
+KEEPALIVE_SECONDS = 15.0
+KEEPALIVE_FRAME = b": keep-alive\n\n"
+TRACKING_ENDED_FRAME = f"data: {json.dumps({'type': 'tracking_ended'})}\n\n".encode()
 
 
 def _coerce_float(payload: dict[str, Any], field_name: str) -> float:
@@ -99,6 +106,16 @@ async def post_driver_location(
     finally:
         await redis.aclose()
 
+    publish_public_tracking_event(
+        tenant_id,
+        int(order.id),
+        status=str(order.status or ""),
+        delivery_user_name=None,
+        lat=lat,
+        lng=lng,
+        updated_at=location["updated_at"],
+    )
+
     return {
         "ok": True,
         "throttled": False,
@@ -121,6 +138,43 @@ def _is_delivered(status: str | None) -> bool:
     return (status or "").upper() in DELIVERED_STATUSES
 
 
+def _render_tracking_frame(state: dict) -> bytes:
+    status = state.get("status")
+    if _is_delivered(status):
+        return TRACKING_ENDED_FRAME
+    if not _is_out_for_delivery(status) or state.get("lat") is None:
+        return b""
+    location = {"lat": state["lat"], "lng": state.get("lng"), "updated_at": state.get("updated_at")}
+    return f"data: {json.dumps(location)}\n\n".encode()
+
+
+def _tracking_extractor(tenant_id: int):
+    def _extract(raw_payload: Any) -> tuple[str, dict] | None:
+        envelope = parse_delivery_envelope(raw_payload, expected_tenant_id=tenant_id)
+        if envelope is None:
+            return None
+        payload = envelope["payload"]
+        update: dict[str, Any] = {}
+        if payload.get("status"):
+            update["status"] = str(payload["status"])
+        last_location = payload.get("last_location")
+        if isinstance(last_location, dict) and last_location.get("lat") is not None:
+            update["lat"] = last_location.get("lat")
+            update["lng"] = last_location.get("lng")
+            update["updated_at"] = last_location.get("updated_at") or payload.get("updated_at") or envelope.get("ts")
+        return ("order", update) if update else None
+
+    return _extract
+
+
+tracking_hub = CoalescingHub(
+    window_seconds=COALESCE_SECONDS,
+    render=_render_tracking_frame,
+    stream=True,
+    client_factory=lambda: get_async_redis_client(),
+)
+
+
 @router.get("/sse/order/{order_token}")
 async def stream_order_tracking(order_token: str, request: Request):
     db = SessionLocal()
@@ -129,6 +183,8 @@ async def stream_order_tracking(order_token: str, request: Request):
         if order is None:
             raise HTTPException(status_code=404, detail="Pedido não encontrado")
         order_id = int(order.id)
+        tenant_id = int(order.tenant_id)
+        initial_status = order.status
     finally:
         db.close()
 
@@ -136,40 +192,37 @@ async def stream_order_tracking(order_token: str, request: Request):
     if redis is None:
         raise HTTPException(status_code=503, detail="Redis indisponível")
 
-    async def event_generator() -> AsyncGenerator[str, None]:
+    async def event_generator() -> AsyncGenerator[bytes, None]:
+        # status e posição chegam pelo stream do pedido (status publicado no fluxo de mudança de status);
+        # o banco e o Redis só são lidos uma vez, na conexão
         try:
-            while True:
-                if await request.is_disconnected():
-                    break
-
-                loop_db = SessionLocal()
-                try:
-                    current_status = (
-                        loop_db.query(Order.status)
-                        .filter(Order.id == order_id)
-                        .scalar()
-                    )
-                finally:
-                    loop_db.close()
-
-                if _is_delivered(current_status):
-                    ended_payload = {"type": "tracking_ended"}
-                    yield f"data: {json.dumps(ended_payload)}\n\n"
-                    break
-
-                if _is_out_for_delivery(current_status):
+            if _is_delivered(initial_status):
+                yield TRACKING_ENDED_FRAME
+                return
+
+            channel = order_tracking_stream(tenant_id, order_id).key
+            async with tracking_hub.subscribe(channel, _tracking_extractor(tenant_id)) as mailbox:
+                if _is_out_for_delivery(initial_status):
                     try:
                         location_payload = await get_driver_location(redis, order_id=order_id)
                     except TrackingStoreError:
                         logger.exception("tracking sse load failed order_id=%s", order_id)
-                        yield "event: error\ndata: {\"detail\":\"tracking_unavailable\"}\n\n"
-                        await asyncio.sleep(POLL_SECONDS)
-                        continue
-
+                        yield b"event: error\ndata: {\"detail\":\"tracking_unavailable\"}\n\n"
+                        location_payload = None
                     if location_payload is not None:
-                        yield f"data: {json.dumps(location_payload)}\n\n"
+                        yield f"data: {json.dumps(location_payload)}\n\n".encode()
 
-                await asyncio.sleep(POLL_SECONDS)
+                while not await request.is_disconnected():
+                    if mailbox is None:
+                        yield KEEPALIVE_FRAME
+                        await asyncio.sleep(KEEPALIVE_SECONDS)
+                        continue
+                    if mailbox.lagging():
+                        break
+                    data = b"".join(frame.data for frame in await mailbox.get(KEEPALIVE_SECONDS))
+                    yield data or KEEPALIVE_FRAME
+                    if data.endswith(TRACKING_ENDED_FRAME) or mailbox.closed:
+                        break
         finally:
             await redis.aclose()
 
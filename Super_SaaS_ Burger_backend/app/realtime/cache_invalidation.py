@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from typing import Callable
+
+from app.integrations.redis_client import get_async_redis_client
+from app.realtime.delivery_connections import WORKER_ID
+from app.realtime.publisher import cache_invalidation_channel, publish_cache_invalidation
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_RETRY_MAX_SECONDS = float(os.getenv("CACHE_INVALIDATION_RETRY_MAX_SECONDS", "30"))
+
+InvalidationHandler = Callable[[int | None], None]
+
+_handlers: dict[str, InvalidationHandler] = {}
+
+
+def register_cache_invalidation(cache: str, handler: InvalidationHandler) -> None:
+    """`handler(tenant_id)` descarta o cache local; tenant_id None descarta todos os tenants."""
+    _handlers[cache] = handler
+
+
+def broadcast_cache_invalidation(cache: str, tenant_id: int | None) -> None:
+    """Avisa os outros workers depois do commit; quem chama já invalidou o próprio cache."""
+    publish_cache_invalidation(cache, tenant_id, origin=WORKER_ID)
+
+
+def apply_cache_invalidation(raw: str | bytes | None) -> bool:
+    try:
+        payload = json.loads(raw)
+    except (TypeError, ValueError):
+        return False
+    if not isinstance(payload, dict) or payload.get("origin") == WORKER_ID:
+        return False
+    handler = _handlers.get(payload.get("cache"))
+    if handler is None:
+        return False
+    tenant_id = payload.get("tenant_id")
+    handler(int(tenant_id) if tenant_id is not None else None)
+    return True
+
+
+def _invalidate_all() -> None:
+    for handler in list(_handlers.values()):
+        handler(None)
+
+
+async def run_cache_invalidation_subscriber(stop_event: asyncio.Event) -> None:
+    """Escuta os avisos de invalidação dos outros workers; reconecta com backoff se o Redis cair.
+
+    Ao reconectar descarta todos os caches registrados, porque avisos enviados no intervalo se perderam.
+    Sem Redis, só o TTL de cada cache limita o tempo de dado velho nos outros workers.
+    """
+    client = get_async_redis_client()
+    if client is None:
+        logger.info("REDIS_URL not configured; cache invalidation subscriber disabled")
+        return
+
+    channel = cache_invalidation_channel()
+    delay = 1.0
+    connected_before = False
+    try:
+        while not stop_event.is_set():
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                if connected_before:
+                    _invalidate_all()
+                connected_before = True
+                delay = 1.0
+                logger.info("Cache invalidation subscriber started channel=%s", channel)
+                while not stop_event.is_set():
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        apply_cache_invalidation(message.get("data"))
+            except asyncio.CancelledError:
+                logger.info("Cache invalidation subscriber cancellation requested")
+                raise
+            except Exception:
+                logger.exception("Cache invalidation subscriber failed; retrying in %ss", delay)
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, CACHE_INVALIDATION_RETRY_MAX_SECONDS)
+            finally:
+                await pubsub.aclose()
+    finally:
+        await client.aclose()
+        logger.info("Cache invalidation subscriber stopped")
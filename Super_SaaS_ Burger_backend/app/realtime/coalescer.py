@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, NamedTuple
+
+from redis.asyncio import Redis as AsyncRedis
+
+from app.core.metrics import realtime_outbound_metrics
+from app.integrations.redis_client import get_async_redis_client
+from app.realtime.event_streams import latest_stream_id, read_stream_blocking
+from app.realtime.outbound import REALTIME_OUTBOUND_MAX_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+REALTIME_ADMIN_COALESCE_SECONDS = float(os.getenv("REALTIME_ADMIN_COALESCE_SECONDS", "1.0"))
+REALTIME_PUBLIC_COALESCE_SECONDS = float(os.getenv("REALTIME_PUBLIC_COALESCE_SECONDS", "3.0"))
+STREAM_BLOCK_MS = 5000
+
+Extract = Callable[[Any], "tuple[Hashable, dict] | None"]
+Render = Callable[[dict], bytes]
+
+
+class Frame(NamedTuple):
+    event_id: str | None
+    data: bytes
+
+
+def render_frame(render: Render, payload: dict, event_id: str | None = None) -> Frame:
+    """Frame SSE; com id de Redis Stream ganha a linha `id:` usada no Last-Event-ID da reconexão."""
+    data = render(payload)
+    if event_id is not None and data:
+        data = f"id: {event_id}\n".encode() + data
+    return Frame(event_id, data)
+
+
+class FrameMailbox:
+    """Caixa de um cliente: só o último frame de cada chave.
+
+    Cliente lento não acumula fila: o frame não lido é substituído pelo novo e contado em `dropped`.
+    Como o estado por chave é cumulativo, o status nunca se perde; a substituição só pula posições intermediárias.
+    `closed` indica que a leitura compartilhada caiu: o stream deve ser encerrado para o cliente reconectar.
+    """
+
+    transport = "sse"
+
+    def __init__(self, *, max_lag_seconds: float = REALTIME_OUTBOUND_MAX_LAG_SECONDS) -> None:
+        self._frames: dict[Hashable, Frame] = {}
+        self._ready = asyncio.Event()
+        self._pending_since: float | None = None
+        self.max_lag_seconds = max_lag_seconds
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, key: Hashable, frame: Frame) -> None:
+        # reinsere no fim: os frames saem na ordem em que chegaram (ids do stream crescentes)
+        replaced = self._frames.pop(key, None)
+        if replaced is not None:
+            self.dropped += 1
+            realtime_outbound_metrics.dropped(self.transport)
+            realtime_outbound_metrics.queued(self.transport, -1, -len(replaced.data))
+        elif self._pending_since is None:
+            self._pending_since = time.monotonic()
+        self._frames[key] = frame
+        realtime_outbound_metrics.queued(self.transport, 1, len(frame.data))
+        self._ready.set()
+
+    def lagging(self) -> bool:
+        """Frames esperando há mais de `max_lag_seconds`: o cliente não está lendo e o stream deve ser encerrado.
+        O cliente reconecta e retoma pelo Last-Event-ID."""
+        if self._pending_since is None or time.monotonic() - self._pending_since <= self.max_lag_seconds:
+            return False
+        realtime_outbound_metrics.slow_consumer_closed(self.transport)
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: float) -> list[Frame]:
+        """Frames pendentes (vazio se nada chegou dentro do timeout; na hora, se a caixa foi fechada)."""
+        if not self._frames:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        frames = list(self._frames.values())
+        self.clear()
+        return frames
+
+    def clear(self) -> None:
+        if self._frames:
+            realtime_outbound_metrics.queued(
+                self.transport, -len(self._frames), -sum(len(frame.data) for frame in self._frames.values())
+            )
+        self._frames.clear()
+        if not self.closed:
+            self._ready.clear()
+        self._pending_since = None
+
+
+class CoalescedFeed:
+    """Junta as atualizações de cada chave dentro da janela e entrega o mesmo frame (bytes) a todos.
+
+    O estado por chave é cumulativo, então cada frame é completo e descartar intermediários não perde campos.
+    A primeira atualização depois de uma janela ociosa sai na hora; as seguintes esperam o fim da janela.
+    """
+
+    def __init__(self, *, window_seconds: float, render: Render) -> None:
+        self.window_seconds = window_seconds
+        self._render = render
+        self._state: dict[Hashable, dict] = {}
+        self._event_ids: dict[Hashable, str | None] = {}
+        self._dirty: dict[Hashable, None] = {}
+        self._mailboxes: set[FrameMailbox] = set()
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._last_flush = float("-inf")
+        self.frames = 0
+
+    def __len__(self) -> int:
+        return len(self._mailboxes)
+
+    def subscribe(self) -> FrameMailbox:
+        mailbox = FrameMailbox()
+        self._mailboxes.add(mailbox)
+        realtime_outbound_metrics.connection(FrameMailbox.transport, 1)
+        return mailbox
+
+    def unsubscribe(self, mailbox: FrameMailbox) -> None:
+        if mailbox in self._mailboxes:
+            self._mailboxes.discard(mailbox)
+            mailbox.clear()
+            realtime_outbound_metrics.connection(FrameMailbox.transport, -1)
+
+    def push(self, key: Hashable, payload: dict, event_id: str | None = None) -> None:
+        self._state.setdefault(key, {}).update(payload)
+        self._event_ids[key] = event_id
+        self._dirty.pop(key, None)
+        self._dirty[key] = None
+        if self._flush_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        delay = max(0.0, self._last_flush + self.window_seconds - loop.time())
+        self._flush_handle = loop.call_later(delay, self.flush)
+
+    def flush(self) -> None:
+        self._flush_handle = None
+        self._last_flush = asyncio.get_running_loop().time()
+        dirty, self._dirty = self._dirty, {}
+        for key in dirty:
+            frame = render_frame(self._render, self._state[key], self._event_ids.get(key))
+            self.frames += 1
+            for mailbox in self._mailboxes:
+                mailbox.offer(key, frame)
+
+    def close(self) -> None:
+        """Entrega o que ficou na janela e fecha as caixas ainda assinadas (leitor caiu)."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self.flush()
+        for mailbox in self._mailboxes:
+            mailbox.close()
+
+
+class CoalescingHub:
+    """Uma leitura Redis por origem e processo, compartilhada por todos os clientes SSE dela.
+
+    A origem é um canal Pub/Sub ou, com `stream=True`, a chave de um Redis Stream (frames com `id:`).
+    """
+
+    def __init__(
+        self,
+        *,
+        window_seconds: float,
+        render: Render,
+        stream: bool = False,
+        client_factory: Callable[[], AsyncRedis | None] = get_async_redis_client,
+    ) -> None:
+        self.window_seconds = window_seconds
+        self._render = render
+        self._stream = stream
+        self._client_factory = client_factory
+        self._feeds: dict[str, CoalescedFeed] = {}
+        self._readers: dict[str, asyncio.Task] = {}
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str, extract: Extract) -> AsyncIterator[FrameMailbox | None]:
+        """`extract` transforma a mensagem crua em (chave, payload) ou None; vale o do primeiro assinante.
+        Sem Redis configurado entrega None."""
+        feed = self._feeds.get(channel)
+        if feed is None:
+            client = self._client_factory()
+            if client is None:
+                yield None
+                return
+            feed = CoalescedFeed(window_seconds=self.window_seconds, render=self._render)
+            self._feeds[channel] = feed
+            read = self._read_stream if self._stream else self._read_pubsub
+            self._readers[channel] = asyncio.create_task(self._read(read, client, channel, feed, extract))
+
+        mailbox = feed.subscribe()
+        try:
+            yield mailbox
+        finally:
+            feed.unsubscribe(mailbox)
+            if mailbox.dropped:
+                logger.debug("Coalesced frames dropped for slow client channel=%s dropped=%s", channel, mailbox.dropped)
+            if not feed and self._feeds.get(channel) is feed:
+                self._feeds.pop(channel, None)
+                feed.close()
+                reader = self._readers.pop(channel, None)
+                if reader is not None:
+                    reader.cancel()
+                    await asyncio.wait({reader})
+
+    async def _read(
+        self,
+        read: Callable[[AsyncRedis, str, CoalescedFeed, Extract], Awaitable[None]],
+        client: AsyncRedis,
+        channel: str,
+        feed: CoalescedFeed,
+        extract: Extract,
+    ) -> None:
+        try:
+            await read(client, channel, feed, extract)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Coalescing hub reader crashed channel=%s", channel)
+        finally:
+            # os clientes atuais são encerrados e reconectam (Last-Event-ID); o próximo assinante abre um leitor novo
+            if self._feeds.get(channel) is feed:
+                self._feeds.pop(channel, None)
+                self._readers.pop(channel, None)
+                feed.close()
+            await client.aclose()
+
+    @staticmethod
+    async def _read_pubsub(client: AsyncRedis, channel: str, feed: CoalescedFeed, extract: Extract) -> None:
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                extracted = extract(message.get("data"))
+                if extracted is not None:
+                    feed.push(*extracted)
+        finally:
+            await pubsub.aclose()
+
+    @staticmethod
+    async def _read_stream(client: AsyncRedis, key: str, feed: CoalescedFeed, extract: Extract) -> None:
+        # parte do fim do stream: o que veio antes cada cliente recupera pelo próprio Last-Event-ID
+        last_id = await latest_stream_id(client, key)
+        while True:
+            for entry_id, data in await read_stream_blocking(client, key, last_id, block_ms=STREAM_BLOCK_MS):
+                last_id = entry_id
+                extracted = extract(data)
+                if extracted is not None:
+                    feed.push(*extracted, event_id=entry_id)
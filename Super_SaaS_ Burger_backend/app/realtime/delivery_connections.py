@@ -1,36 +1,117 @@
 from __future__ import annotations
 
-import asyncio
-from typing import Dict, Tuple
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Dict, Tuple
 
 from fastapi import WebSocket
+from redis.asyncio import Redis as AsyncRedis
+
+from app.integrations.redis_client import get_async_redis_client
+from app.realtime.outbound import OutboundWebSocket, is_location_frame
+from app.realtime.publisher import delivery_presence_key
+
+logger = logging.getLogger(__name__)
 
 ConnectionKey = Tuple[int, int]
 
+DELIVERY_PRESENCE_TTL_SECONDS = int(os.getenv("DELIVERY_PRESENCE_TTL_SECONDS", "90"))
+DELIVERY_PRESENCE_REFRESH_SECONDS = DELIVERY_PRESENCE_TTL_SECONDS / 3
+# identifica este processo nas chaves de presença e no canal de roteamento
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
 
 class DeliveryConnectionRegistry:
-    def __init__(self) -> None:
-        self._connections: Dict[ConnectionKey, WebSocket] = {}
-        self._lock = asyncio.Lock()
-
-    async def set(self, tenant_id: int, delivery_user_id: int, websocket: WebSocket) -> None:
-        key = (tenant_id, delivery_user_id)
-        async with self._lock:
-            self._connections[key] = websocket
-
-    async def remove(self, tenant_id: int, delivery_user_id: int, websocket: WebSocket | None = None) -> None:
-        key = (tenant_id, delivery_user_id)
-        async with self._lock:
-            existing = self._connections.get(key)
-            if existing is None:
-                return
-            if websocket is not None and existing is not websocket:
-                return
+    """Sockets de entregador deste processo; um entregador pode ter vários aparelhos conectados.
+
+    Leitura sem lock: cada chave guarda uma tupla trocada inteira a cada mudança (copy-on-write),
+    então `has`/`send` nunca esperam por quem conecta ou desconecta.
+    A presença no Redis (sorted set worker -> expiração) diz ao publisher quais workers têm o entregador.
+    """
+
+    def __init__(
+        self,
+        *,
+        worker_id: str = WORKER_ID,
+        client_factory: Callable[[], AsyncRedis | None] = get_async_redis_client,
+    ) -> None:
+        self.worker_id = worker_id
+        self._client_factory = client_factory
+        self._connections: Dict[ConnectionKey, Tuple[OutboundWebSocket, ...]] = {}
+
+    async def add(self, tenant_id: int, delivery_user_id: int, websocket: WebSocket) -> OutboundWebSocket:
+        key = (int(tenant_id), int(delivery_user_id))
+        connection = OutboundWebSocket(websocket)
+        connection.start(lambda closed: self._discard(key, closed))
+        self._connections[key] = self._connections.get(key, ()) + (connection,)
+        await self._update_presence([key], online=True)
+        return connection
+
+    def discard(self, tenant_id: int, delivery_user_id: int, websocket: WebSocket) -> bool:
+        """Remove o aparelho sem esperar nada (seguro em finally de handler cancelado).
+        True quando o entregador não tem mais aparelhos neste worker."""
+        key = (int(tenant_id), int(delivery_user_id))
+        for connection in self._connections.get(key, ()):
+            if connection.websocket is websocket:
+                self._discard(key, connection)
+                connection.close()
+        return key not in self._connections
+
+    async def clear_presence(self, tenant_id: int, delivery_user_id: int) -> None:
+        key = (int(tenant_id), int(delivery_user_id))
+        if key not in self._connections:
+            await self._update_presence([key], online=False)
+
+    def _discard(self, key: ConnectionKey, connection: OutboundWebSocket) -> None:
+        remaining = tuple(existing for existing in self._connections.get(key, ()) if existing is not connection)
+        if remaining:
+            self._connections[key] = remaining
+        else:
             self._connections.pop(key, None)
 
-    async def get(self, tenant_id: int, delivery_user_id: int) -> WebSocket | None:
-        async with self._lock:
-            return self._connections.get((tenant_id, delivery_user_id))
+    def has(self, tenant_id: int, delivery_user_id: int) -> bool:
+        return (tenant_id, delivery_user_id) in self._connections
+
+    def connections(self, tenant_id: int, delivery_user_id: int) -> Tuple[OutboundWebSocket, ...]:
+        return self._connections.get((tenant_id, delivery_user_id), ())
+
+    def send(self, tenant_id: int, delivery_user_id: int, message: dict) -> int:
+        """Enfileira para todos os aparelhos do entregador (serializa uma vez); retorna quantos aceitaram."""
+        connections = self.connections(tenant_id, delivery_user_id)
+        if not connections:
+            return 0
+        data = json.dumps(message)
+        droppable = is_location_frame(message)
+        return sum(1 for connection in connections if connection.send(data, droppable=droppable))
+
+    async def refresh_presence(self) -> None:
+        await self._update_presence(list(self._connections), online=True)
+
+    async def _update_presence(self, keys: list[ConnectionKey], *, online: bool) -> None:
+        if not keys:
+            return
+        client = self._client_factory()
+        if client is None:
+            return
+        try:
+            pipeline = client.pipeline(transaction=False)
+            expires_at = time.time() + DELIVERY_PRESENCE_TTL_SECONDS
+            for tenant_id, delivery_user_id in keys:
+                presence_key = delivery_presence_key(tenant_id, delivery_user_id)
+                if online:
+                    pipeline.zadd(presence_key, {self.worker_id: expires_at})
+                    pipeline.expire(presence_key, DELIVERY_PRESENCE_TTL_SECONDS)
+                else:
+                    pipeline.zrem(presence_key, self.worker_id)
+            await pipeline.execute()
+        except Exception:
+            logger.warning("Failed to update delivery presence worker_id=%s", self.worker_id, exc_info=True)
+        finally:
+            await client.aclose()
 
 
 delivery_connections = DeliveryConnectionRegistry()
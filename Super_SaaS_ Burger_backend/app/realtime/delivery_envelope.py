@@ -1,8 +1,43 @@
 from __future__ import annotations
 
+import json
+import os
+import struct
 from datetime import datetime, timezone
+from typing import Callable, NamedTuple
 
 DELIVERY_SCHEMA_VERSION = 1
+# formato binário interno (Redis → subscribers) do mesmo envelope v1; navegador continua recebendo JSON
+DELIVERY_BINARY_SCHEMA_VERSION = 2
+REALTIME_ENVELOPE_FORMAT = os.getenv("REALTIME_ENVELOPE_FORMAT", "json").strip().lower()
+
+_BINARY_MAGIC = 0xDE
+# magic, schema_version, type, body, tenant_id, order_id, delivery_user_id, tamanho do ts;
+# o ts ISO segue o cabeçalho como texto (reconvertê-lo custaria mais CPU que os bytes economizados)
+_HEADER = struct.Struct("!BBBBIqqB")
+_LOCATION = struct.Struct("!dd")
+_NONE_ID = -1
+_BODY_JSON = 0
+_BODY_LOCATION = 1
+
+_TYPE_CODES = {
+    "delivery.status": 1,
+    "delivery.location": 2,
+    "driver_location": 3,
+    "delivery.assignment": 4,
+    "delivery.public_tracking": 5,
+}
+_TYPE_NAMES = {code: name for name, code in _TYPE_CODES.items()}
+_ENVELOPE_KEYS = {"type", "schema_version", "tenant_id", "order_id", "delivery_user_id", "payload", "ts"}
+# driver_location repete driver_id/lat/lng no topo; no binário eles são reconstruídos
+_DRIVER_LOCATION_KEYS = _ENVELOPE_KEYS | {"driver_id", "lat", "lng"}
+
+
+class DeliveryEnvelopeHeader(NamedTuple):
+    type: str
+    tenant_id: int
+    order_id: int | None
+    delivery_user_id: int | None
 
 
 def build_delivery_envelope(
@@ -24,12 +59,143 @@ def build_delivery_envelope(
     }
 
 
-def parse_delivery_envelope(raw_payload: str, *, expected_tenant_id: int | None = None) -> dict | None:
-    import json
+def _encode_binary(envelope: dict) -> bytes | None:
+    event_type = envelope.get("type")
+    type_code = _TYPE_CODES.get(event_type)
+    if type_code is None:
+        return None
+    allowed_keys = _DRIVER_LOCATION_KEYS if event_type == "driver_location" else _ENVELOPE_KEYS
+    if not envelope.keys() <= allowed_keys:
+        return None
+
+    payload = envelope["payload"]
+    status = payload.get("status")
+    if (
+        event_type in ("delivery.location", "driver_location")
+        and payload.keys() <= {"lat", "lng", "status"}
+        and isinstance(payload.get("lat"), float)
+        and isinstance(payload.get("lng"), float)
+        and (status is None or (isinstance(status, str) and status))
+    ):
+        body_kind = _BODY_LOCATION
+        body = _LOCATION.pack(payload["lat"], payload["lng"]) + (status or "").encode()
+    elif event_type == "driver_location":
+        return None
+    else:
+        body_kind = _BODY_JSON
+        body = json.dumps(payload, separators=(",", ":")).encode()
+    if event_type == "driver_location" and (
+        envelope.get("driver_id") != envelope.get("delivery_user_id")
+        or envelope.get("lat") != payload["lat"]
+        or envelope.get("lng") != payload["lng"]
+    ):
+        return None
+
+    ts = envelope["ts"].encode()
+    order_id = envelope.get("order_id")
+    delivery_user_id = envelope.get("delivery_user_id")
+    header = _HEADER.pack(
+        _BINARY_MAGIC,
+        DELIVERY_BINARY_SCHEMA_VERSION,
+        type_code,
+        body_kind,
+        envelope["tenant_id"],
+        _NONE_ID if order_id is None else order_id,
+        _NONE_ID if delivery_user_id is None else delivery_user_id,
+        len(ts),
+    )
+    return header + ts + body
+
+
+def encode_delivery_envelope(envelope: dict, *, binary: bool | None = None) -> str | bytes:
+    """Serializa para o Redis: binário quando habilitado (REALTIME_ENVELOPE_FORMAT=binary) e o envelope
+    cabe no formato compacto; senão o JSON de sempre."""
+    if binary is None:
+        binary = REALTIME_ENVELOPE_FORMAT == "binary"
+    if binary:
+        try:
+            encoded = _encode_binary(envelope)
+        except (AttributeError, KeyError, TypeError, ValueError, struct.error):
+            encoded = None
+        if encoded is not None:
+            return encoded
+    return json.dumps(envelope)
+
+
+def _is_binary(raw_payload: str | bytes) -> bool:
+    return isinstance(raw_payload, (bytes, bytearray, memoryview)) and len(raw_payload) >= _HEADER.size and raw_payload[0] == _BINARY_MAGIC
+
+
+def _decode_binary(
+    raw_payload: bytes,
+    *,
+    expected_tenant_id: int | None,
+    accept: Callable[[DeliveryEnvelopeHeader], bool] | None,
+) -> dict | None:
+    _magic, schema_version, type_code, body_kind, tenant_id, order_id, delivery_user_id, ts_size = _HEADER.unpack_from(raw_payload)
+    event_type = _TYPE_NAMES.get(type_code)
+    if schema_version != DELIVERY_BINARY_SCHEMA_VERSION or event_type is None:
+        return None
+    if expected_tenant_id is not None and tenant_id != int(expected_tenant_id):
+        return None
+    header = DeliveryEnvelopeHeader(
+        event_type,
+        tenant_id,
+        None if order_id == _NONE_ID else order_id,
+        None if delivery_user_id == _NONE_ID else delivery_user_id,
+    )
+    if accept is not None and not accept(header):
+        return None
+
+    # só quem passou pelo filtro de cabeçalho paga a decodificação do corpo
+    body_start = _HEADER.size + ts_size
+    ts = raw_payload[_HEADER.size : body_start].decode()
+    if body_kind == _BODY_LOCATION:
+        lat, lng = _LOCATION.unpack_from(raw_payload, body_start)
+        payload: dict = {"lat": lat, "lng": lng}
+        status = raw_payload[body_start + _LOCATION.size :].decode()
+        if status:
+            payload["status"] = status
+    else:
+        try:
+            payload = json.loads(raw_payload[body_start:])
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+        if not isinstance(payload, dict):
+            return None
+
+    envelope = {
+        "type": header.type,
+        "schema_version": DELIVERY_SCHEMA_VERSION,
+        "tenant_id": header.tenant_id,
+        "order_id": header.order_id,
+        "delivery_user_id": header.delivery_user_id,
+        "payload": payload,
+        "ts": ts,
+    }
+    if header.type == "driver_location" and body_kind == _BODY_LOCATION:
+        envelope["driver_id"] = header.delivery_user_id
+        envelope["lat"] = payload["lat"]
+        envelope["lng"] = payload["lng"]
+    return envelope
+
+
+def parse_delivery_envelope(
+    raw_payload: str | bytes,
+    *,
+    expected_tenant_id: int | None = None,
+    accept: Callable[[DeliveryEnvelopeHeader], bool] | None = None,
+) -> dict | None:
+    """Aceita JSON (v1) ou binário (v2). `accept` filtra pelo cabeçalho antes de decodificar o corpo."""
+    if _is_binary(raw_payload):
+        try:
+            return _decode_binary(bytes(raw_payload), expected_tenant_id=expected_tenant_id, accept=accept)
+        except (struct.error, UnicodeDecodeError, OverflowError):
+            return None
 
     try:
         payload = json.loads(raw_payload)
-    except (TypeError, json.JSONDecodeError):
+    except (TypeError, UnicodeDecodeError, json.JSONDecodeError):
         return None
 
     if not isinstance(payload, dict):
@@ -63,4 +229,9 @@ def parse_delivery_envelope(raw_payload: str, *, expected_tenant_id: int | None
     if not isinstance(payload.get("ts"), str):
         return None
 
+    if accept is not None and not accept(
+        DeliveryEnvelopeHeader(payload["type"], tenant_id, payload.get("order_id"), payload.get("delivery_user_id"))
+    ):
+        return None
+
     return payload
@@ -2,17 +2,14 @@ from __future__ import annotations
 
 import asyncio
 import logging
-import re
 
 from app.integrations.redis_client import get_async_redis_client
-from app.realtime.delivery_connections import delivery_connections
+from app.realtime.delivery_connections import DELIVERY_PRESENCE_REFRESH_SECONDS, delivery_connections
 from app.realtime.delivery_envelope import parse_delivery_envelope
+from app.realtime.publisher import delivery_worker_channel
 
 logger = logging.getLogger(__name__)
 
-DELIVERY_CHANNEL_PATTERN = "tenant:*:delivery:assignment"
-_CHANNEL_RE = re.compile(r"^tenant:(?P<tenant_id>\d+):delivery:assignment$")
-
 
 async def run_delivery_subscriber(stop_event: asyncio.Event) -> None:
     client = get_async_redis_client()
@@ -21,48 +18,34 @@ async def run_delivery_subscriber(stop_event: asyncio.Event) -> None:
         return
 
     pubsub = client.pubsub()
+    # só as mensagens de entregadores com socket neste worker chegam aqui (roteadas pela presença)
+    channel = delivery_worker_channel(delivery_connections.worker_id)
+    loop = asyncio.get_running_loop()
+    next_presence_refresh = loop.time() + DELIVERY_PRESENCE_REFRESH_SECONDS
 
     try:
-        await pubsub.psubscribe(DELIVERY_CHANNEL_PATTERN)
-        logger.info("Delivery subscriber started pattern=%s", DELIVERY_CHANNEL_PATTERN)
+        await pubsub.subscribe(channel)
+        logger.info("Delivery subscriber started channel=%s", channel)
 
         while not stop_event.is_set():
+            if loop.time() >= next_presence_refresh:
+                next_presence_refresh = loop.time() + DELIVERY_PRESENCE_REFRESH_SECONDS
+                await delivery_connections.refresh_presence()
+
             message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
             if message is None:
                 continue
 
-            raw_channel = message.get("channel")
-            raw_payload = message.get("data")
-
-            channel = raw_channel.decode() if isinstance(raw_channel, bytes) else str(raw_channel)
-            payload_text = raw_payload.decode() if isinstance(raw_payload, bytes) else str(raw_payload)
-
-            channel_match = _CHANNEL_RE.match(channel)
-            if not channel_match:
-                continue
-
-            tenant_id = int(channel_match.group("tenant_id"))
-            payload_data = parse_delivery_envelope(payload_text, expected_tenant_id=tenant_id)
+            # presença pode estar atrasada: descarta pelo cabeçalho quem já desconectou
+            payload_data = parse_delivery_envelope(
+                message.get("data"),
+                accept=lambda header: header.delivery_user_id is not None
+                and delivery_connections.has(header.tenant_id, header.delivery_user_id),
+            )
             if payload_data is None:
                 continue
 
-            delivery_user_id = payload_data.get("delivery_user_id")
-            if not isinstance(delivery_user_id, int):
-                continue
-
-            websocket = await delivery_connections.get(tenant_id, delivery_user_id)
-            if websocket is None:
-                continue
-
-            try:
-                await websocket.send_json(payload_data)
-            except Exception:
-                logger.debug(
-                    "Failed to deliver websocket message tenant_id=%s delivery_user_id=%s",
-                    tenant_id,
-                    delivery_user_id,
-                )
-                await delivery_connections.remove(tenant_id, delivery_user_id, websocket)
+            delivery_connections.send(payload_data["tenant_id"], payload_data["delivery_user_id"], payload_data)
     except asyncio.CancelledError:
         logger.info("Delivery subscriber cancellation requested")
         raise
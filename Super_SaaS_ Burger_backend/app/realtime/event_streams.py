@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, NamedTuple, Sequence
+
+from redis.asyncio import Redis as AsyncRedis
+
+ORDER_TRACKING_STREAM_MAXLEN = int(os.getenv("REALTIME_TRACKING_STREAM_MAXLEN", "200"))
+ORDER_TRACKING_STREAM_TTL_SECONDS = int(os.getenv("REALTIME_TRACKING_STREAM_TTL_SECONDS", str(6 * 60 * 60)))
+KDS_STREAM_MAXLEN = int(os.getenv("REALTIME_KDS_STREAM_MAXLEN", "2000"))
+KDS_STREAM_TTL_SECONDS = int(os.getenv("REALTIME_KDS_STREAM_TTL_SECONDS", str(24 * 60 * 60)))
+STREAM_REPLAY_MAX_EVENTS = int(os.getenv("REALTIME_STREAM_REPLAY_MAX_EVENTS", "500"))
+STREAM_DATA_FIELD = b"data"
+
+
+class StreamTarget(NamedTuple):
+    """Destino Redis Stream (capado e com TTL) usado no lugar de um canal Pub/Sub."""
+
+    key: str
+    maxlen: int
+    ttl_seconds: int
+
+
+class PresenceTarget(NamedTuple):
+    """Uma cópia da mensagem em `<channel_prefix><worker>` para cada worker vivo no sorted set `key`.
+
+    Quem envia o lote (o publisher de fundo, com o cliente async) lê a presença; o request não espera o Redis.
+    """
+
+    key: str
+    channel_prefix: str
+
+
+def order_tracking_stream(tenant_id: int, order_id: int) -> StreamTarget:
+    return StreamTarget(
+        f"tenant:{int(tenant_id)}:order:{int(order_id)}:tracking:stream",
+        ORDER_TRACKING_STREAM_MAXLEN,
+        ORDER_TRACKING_STREAM_TTL_SECONDS,
+    )
+
+
+def kds_stream(tenant_id: int) -> StreamTarget:
+    return StreamTarget(f"tenant:{int(tenant_id)}:kds:stream", KDS_STREAM_MAXLEN, KDS_STREAM_TTL_SECONDS)
+
+
+def presence_keys(messages: list[tuple[Any, str | bytes]]) -> list[str]:
+    return list(dict.fromkeys(target.key for target, _message in messages if isinstance(target, PresenceTarget)))
+
+
+def queue_presence_lookups(pipeline: Any, keys: list[str]) -> None:
+    """ZRANGEBYSCORE dos workers com presença ainda válida (score = expiração), um por chave."""
+    now = time.time()
+    for key in keys:
+        pipeline.zrangebyscore(key, now, "+inf")
+
+
+def expand_presence(
+    messages: list[tuple[Any, str | bytes]],
+    members_by_key: dict[str, Sequence[str | bytes]],
+) -> list[tuple[str | StreamTarget, str | bytes]]:
+    """Troca cada PresenceTarget por um PUBLISH por worker; chave sem resultado (falha na leitura) não gera nada."""
+    expanded: list[tuple[str | StreamTarget, str | bytes]] = []
+    for target, message in messages:
+        if not isinstance(target, PresenceTarget):
+            expanded.append((target, message))
+            continue
+        for member in members_by_key.get(target.key) or ():
+            worker = member.decode() if isinstance(member, bytes) else str(member)
+            expanded.append((f"{target.channel_prefix}{worker}", message))
+    return expanded
+
+
+def queue_commands(pipeline: Any, messages: list[tuple[str | StreamTarget, str | bytes]]) -> list[int]:
+    """Enfileira PUBLISH/XADD no pipeline (sync ou async); devolve as posições dos resultados de PUBLISH."""
+    publish_positions: list[int] = []
+    position = 0
+    for target, message in messages:
+        if isinstance(target, StreamTarget):
+            pipeline.xadd(target.key, {STREAM_DATA_FIELD: message}, maxlen=target.maxlen, approximate=True)
+            pipeline.expire(target.key, target.ttl_seconds)
+            position += 2
+        else:
+            pipeline.publish(target, message)
+            publish_positions.append(position)
+            position += 1
+    return publish_positions
+
+
+def parse_stream_id(value: str | bytes | None) -> tuple[int, int] | None:
+    if isinstance(value, bytes):
+        value = value.decode()
+    if not value:
+        return None
+    milliseconds, _, sequence = str(value).strip().partition("-")
+    try:
+        return int(milliseconds), int(sequence or 0)
+    except ValueError:
+        return None
+
+
+def format_stream_id(value: tuple[int, int]) -> str:
+    return f"{value[0]}-{value[1]}"
+
+
+def _decode_entries(entries: list) -> list[tuple[str, bytes]]:
+    decoded = []
+    for entry_id, fields in entries:
+        data = fields.get(STREAM_DATA_FIELD)
+        if data is None:
+            data = fields.get(STREAM_DATA_FIELD.decode())
+        if data is None:
+            continue
+        decoded.append((entry_id.decode() if isinstance(entry_id, bytes) else str(entry_id), data))
+    return decoded
+
+
+async def latest_stream_id(client: AsyncRedis, key: str) -> str:
+    """Id da última entrada ("0-0" com o stream vazio): ponto de retomada de quem recebe um snapshot."""
+    entries = await client.xrevrange(key, count=1)
+    if not entries:
+        return "0-0"
+    entry_id = entries[0][0]
+    return entry_id.decode() if isinstance(entry_id, bytes) else str(entry_id)
+
+
+async def read_stream_after(
+    client: AsyncRedis,
+    key: str,
+    last_event_id: str,
+    *,
+    count: int = STREAM_REPLAY_MAX_EVENTS,
+) -> list[tuple[str, bytes]] | None:
+    """Entradas posteriores a `last_event_id`. None quando não dá para retomar (id inválido, stream expirado
+    ou já aparado além do id, ou mais eventos perdidos que `count`): o cliente precisa de um snapshot."""
+    parsed = parse_stream_id(last_event_id)
+    if parsed is None:
+        return None
+    if parsed != (0, 0):
+        first = await client.xrange(key, count=1)
+        if not first or parse_stream_id(first[0][0]) > parsed:
+            return None
+    entries = await client.xrange(key, min=f"({format_stream_id(parsed)}", count=count + 1)
+    if len(entries) > count:
+        return None
+    return _decode_entries(entries)
+
+
+async def read_stream_blocking(
+    client: AsyncRedis,
+    key: str,
+    last_id: str,
+    *,
+    block_ms: int,
+    count: int = 100,
+) -> list[tuple[str, bytes]]:
+    response = await client.xread({key: last_id}, count=count, block=block_ms)
+    if not response:
+        return []
+    _stream, entries = response[0]
+    return _decode_entries(entries)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable
+
+from fastapi import WebSocket
+
+from app.core.metrics import realtime_outbound_metrics
+
+logger = logging.getLogger(__name__)
+
+REALTIME_OUTBOUND_MAX_FRAMES = int(os.getenv("REALTIME_OUTBOUND_MAX_FRAMES", "64"))
+REALTIME_OUTBOUND_MAX_BYTES = int(os.getenv("REALTIME_OUTBOUND_MAX_BYTES", str(256 * 1024)))
+REALTIME_OUTBOUND_MAX_LAG_SECONDS = float(os.getenv("REALTIME_OUTBOUND_MAX_LAG_SECONDS", "30"))
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# frames de posição: só o mais recente importa, podem ser descartados sob pressão
+LOCATION_FRAME_TYPES = frozenset({"delivery.location", "driver_location", "driver_location_update", "location"})
+
+
+def is_location_frame(message: dict) -> bool:
+    return message.get("type") in LOCATION_FRAME_TYPES or message.get("event") in LOCATION_FRAME_TYPES
+
+
+class OutboundBuffer:
+    """Fila de saída limitada (frames e bytes) de uma conexão.
+
+    Ao estourar o limite descarta o frame de posição mais antigo; frames de status nunca são descartados:
+    se não houver posição para descartar a fila fica `overflowed` e a conexão deve ser fechada.
+    """
+
+    def __init__(
+        self,
+        transport: str,
+        *,
+        max_frames: int = REALTIME_OUTBOUND_MAX_FRAMES,
+        max_bytes: int = REALTIME_OUTBOUND_MAX_BYTES,
+        max_lag_seconds: float = REALTIME_OUTBOUND_MAX_LAG_SECONDS,
+    ) -> None:
+        self.transport = transport
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.max_lag_seconds = max_lag_seconds
+        self._frames: deque[tuple[str, int, bool, float]] = deque()
+        self._bytes = 0
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.overflowed = False
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def queued_bytes(self) -> int:
+        return self._bytes
+
+    def put(self, data: str, *, droppable: bool) -> bool:
+        if self.overflowed:
+            return False
+        size = len(data)
+        self._frames.append((data, size, droppable, time.monotonic()))
+        self._bytes += size
+        realtime_outbound_metrics.queued(self.transport, 1, size)
+        while len(self._frames) > self.max_frames or self._bytes > self.max_bytes:
+            if not self._drop_oldest_location():
+                self.overflowed = True
+                break
+        self._ready.set()
+        return not self.overflowed
+
+    def _drop_oldest_location(self) -> bool:
+        for index, (_data, size, droppable, _queued_at) in enumerate(self._frames):
+            if droppable:
+                del self._frames[index]
+                self._bytes -= size
+                self.dropped += 1
+                realtime_outbound_metrics.queued(self.transport, -1, -size)
+                realtime_outbound_metrics.dropped(self.transport)
+                return True
+        return False
+
+    def lagging(self) -> bool:
+        """Fila estourada com status ou frame mais antigo esperando além do limite."""
+        if self.overflowed:
+            return True
+        return bool(self._frames) and time.monotonic() - self._frames[0][3] > self.max_lag_seconds
+
+    async def get(self) -> str:
+        while not self._frames:
+            self._ready.clear()
+            await self._ready.wait()
+        data, size, _droppable, _queued_at = self._frames.popleft()
+        self._bytes -= size
+        realtime_outbound_metrics.queued(self.transport, -1, -size)
+        return data
+
+    def clear(self) -> None:
+        if self._frames:
+            realtime_outbound_metrics.queued(self.transport, -len(self._frames), -self._bytes)
+        self._frames.clear()
+        self._bytes = 0
+
+
+class OutboundWebSocket:
+    """WebSocket com buffer de saída e writer próprio: quem publica só enfileira.
+
+    Fecha a conexão (1013) quando o cliente fica para trás por mais de `max_lag_seconds`,
+    seja com a fila parada ou com um send travado.
+    """
+
+    transport = "websocket"
+
+    def __init__(self, websocket: WebSocket, **buffer_options) -> None:
+        self.websocket = websocket
+        self.buffer = OutboundBuffer(self.transport, **buffer_options)
+        self._writer: asyncio.Task | None = None
+        self.closed = False
+
+    @property
+    def dropped(self) -> int:
+        return self.buffer.dropped
+
+    def start(self, on_close: Callable[["OutboundWebSocket"], None] | None = None) -> None:
+        realtime_outbound_metrics.connection(self.transport, 1)
+        self._writer = asyncio.create_task(self._write(on_close))
+
+    def send(self, message: dict | str, *, droppable: bool | None = None) -> bool:
+        if self.closed:
+            return False
+        if isinstance(message, dict):
+            if droppable is None:
+                droppable = is_location_frame(message)
+            message = json.dumps(message)
+        # com status sem espaço o buffer fica overflowed e o writer fecha a conexão na próxima volta
+        return self.buffer.put(message, droppable=bool(droppable))
+
+    async def _write(self, on_close: Callable[["OutboundWebSocket"], None] | None) -> None:
+        slow_consumer = False
+        while True:
+            data = await self.buffer.get()
+            if self.buffer.lagging():
+                slow_consumer = True
+                break
+            try:
+                async with asyncio.timeout(self.buffer.max_lag_seconds):
+                    await self.websocket.send_text(data)
+            except TimeoutError:
+                slow_consumer = True
+                break
+            except Exception:
+                logger.debug("Failed to deliver realtime frame; dropping connection")
+                break
+
+        self._shutdown()
+        if on_close is not None:
+            on_close(self)
+        if slow_consumer:
+            realtime_outbound_metrics.slow_consumer_closed(self.transport)
+            logger.info("Closing slow realtime consumer dropped=%s", self.buffer.dropped)
+            try:
+                await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+            except Exception:
+                pass
+
+    def _shutdown(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.buffer.clear()
+        realtime_outbound_metrics.connection(self.transport, -1)
+
+    def close(self) -> None:
+        writer, self._writer = self._writer, None
+        self._shutdown()
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import deque
+from threading import Lock
+from typing import Callable
+
+from redis.asyncio import Redis as AsyncRedis
+
+from app.integrations.redis_client import get_async_redis_client
+from app.realtime.event_streams import (
+    PresenceTarget,
+    StreamTarget,
+    expand_presence,
+    presence_keys,
+    queue_commands,
+    queue_presence_lookups,
+)
+
+logger = logging.getLogger(__name__)
+
+REALTIME_PUBLISH_BATCH_SIZE = int(os.getenv("REALTIME_PUBLISH_BATCH_SIZE", "200"))
+REALTIME_PUBLISH_MAX_PENDING = int(os.getenv("REALTIME_PUBLISH_MAX_PENDING", "20000"))
+
+
+class RealtimePublisher:
+    """Fila de publicações Pub/Sub enviada por uma task de fundo com um cliente redis.asyncio (pool).
+
+    `enqueue` é thread-safe: rotas async chamam direto no loop, rotas síncronas chamam do threadpool;
+    nenhum dos dois espera o round-trip do Redis. Sem a task rodando, `enqueue` devolve False
+    e o chamador publica de forma síncrona como antes.
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_size: int = REALTIME_PUBLISH_BATCH_SIZE,
+        max_pending: int = REALTIME_PUBLISH_MAX_PENDING,
+        client_factory: Callable[[], AsyncRedis | None] = get_async_redis_client,
+    ) -> None:
+        self.batch_size = batch_size
+        self._client_factory = client_factory
+        self._pending: deque[tuple[str | StreamTarget | PresenceTarget, str | bytes]] = deque(maxlen=max_pending)
+        self._lock = Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._wakeup is not None
+
+    def enqueue(self, channel: str | StreamTarget | PresenceTarget, message: str | bytes) -> bool:
+        return self.enqueue_many([(channel, message)])
+
+    def enqueue_many(self, messages: list[tuple[str | StreamTarget | PresenceTarget, str | bytes]]) -> bool:
+        """Enfileira as mensagens juntas (um lock, um wakeup), para saírem no mesmo pipeline."""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None:
+            return False
+        with self._lock:
+            overflow = len(self._pending) + len(messages) - self._pending.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            was_empty = not self._pending
+            self._pending.extend(messages)
+        if was_empty:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # loop já encerrado; o flush final do run() cuida do que ficou na fila
+                pass
+        return True
+
+    def _drain(self) -> list[tuple[str | StreamTarget | PresenceTarget, str | bytes]]:
+        with self._lock:
+            count = min(len(self._pending), self.batch_size)
+            return [self._pending.popleft() for _ in range(count)]
+
+    async def _resolve_presence(
+        self, client: AsyncRedis, batch: list[tuple[str | StreamTarget | PresenceTarget, str | bytes]]
+    ) -> list[tuple[str | StreamTarget, str | bytes]]:
+        keys = presence_keys(batch)
+        if not keys:
+            return batch
+        pipeline = client.pipeline(transaction=False)
+        queue_presence_lookups(pipeline, keys)
+        try:
+            members = await pipeline.execute()
+        except Exception:
+            logger.exception("Failed to load realtime presence keys=%s", len(keys))
+            members = []
+        return expand_presence(batch, dict(zip(keys, members)))
+
+    async def _send(self, client: AsyncRedis, batch: list[tuple[str | StreamTarget | PresenceTarget, str | bytes]]) -> None:
+        batch = await self._resolve_presence(client, batch)
+        pipeline = client.pipeline(transaction=False)
+        queue_commands(pipeline, batch)
+        try:
+            await pipeline.execute()
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to publish realtime batch size=%s", len(batch))
+
+    async def _flush(self, client: AsyncRedis) -> None:
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            await self._send(client, batch)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        client = self._client_factory()
+        if client is None:
+            logger.info("REDIS_URL not configured; realtime publisher disabled")
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        logger.info("Realtime publisher started batch_size=%s", self.batch_size)
+        try:
+            while not stop_event.is_set():
+                waiters = {
+                    asyncio.create_task(self._wakeup.wait()),
+                    asyncio.create_task(stop_event.wait()),
+                }
+                try:
+                    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for waiter in waiters:
+                        waiter.cancel()
+                self._wakeup.clear()
+                await self._flush(client)
+        finally:
+            self._wakeup = None
+            self._loop = None
+            try:
+                await self._flush(client)
+            finally:
+                await client.aclose()
+            logger.info("Realtime publisher stopped dropped=%s failed=%s", self.dropped, self.failed)
+
+
+realtime_publisher = RealtimePublisher()
+
+
+async def run_realtime_publisher(stop_event: asyncio.Event) -> None:
+    await realtime_publisher.run(stop_event)
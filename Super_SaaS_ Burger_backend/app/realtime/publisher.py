@@ -1,8 +1,21 @@
 import json
 import logging
-
-from app.integrations.redis_client import get_redis_client
-from app.realtime.delivery_envelope import build_delivery_envelope
+from contextvars import ContextVar
+from typing import Callable
+
+from app.integrations.redis_client import get_shared_redis_client
+from app.realtime.delivery_envelope import build_delivery_envelope, encode_delivery_envelope
+from app.realtime.event_streams import (
+    PresenceTarget,
+    StreamTarget,
+    expand_presence,
+    kds_stream,
+    order_tracking_stream,
+    presence_keys,
+    queue_commands,
+    queue_presence_lookups,
+)
+from app.realtime.publish_queue import realtime_publisher
 
 logger = logging.getLogger(__name__)
 
@@ -27,35 +40,167 @@ def delivery_assignment_channel(tenant_id: int) -> str:
     return f"tenant:{int(tenant_id)}:delivery:assignment"
 
 
+def delivery_presence_key(tenant_id: int, delivery_user_id: int) -> str:
+    return f"tenant:{int(tenant_id)}:delivery:{int(delivery_user_id)}:presence"
+
+
+DELIVERY_WORKER_CHANNEL_PREFIX = "delivery:worker:"
+
+
+def delivery_worker_channel(worker_id: str) -> str:
+    return f"{DELIVERY_WORKER_CHANNEL_PREFIX}{worker_id}"
+
+
 def order_tracking_channel(tenant_id: int, order_id: int) -> str:
     return f"tenant:{int(tenant_id)}:order:{int(order_id)}:tracking"
 
 
+def export_job_channel(job_id: str) -> str:
+    return f"export_job:{job_id}:events"
+
+
 def delivery_order_channel(order_id: int) -> str:
     return f"delivery:{int(order_id)}"
 
 
-def _publish(channel: str, payload: dict) -> int:
-    client = get_redis_client()
-    if client is None:
-        logger.debug("Redis unavailable: skipped publish channel=%s", channel)
+def cache_invalidation_channel() -> str:
+    return "cache:invalidate"
+
+
+class PublishBatch:
+    """Publicações acumuladas para sair num único pipeline do Redis.
+
+    O mesmo dict publicado em vários canais é serializado uma vez só; não altere o payload depois de adicioná-lo.
+    Usado como context manager, os publish_* do bloco entram no lote, enviado na saída sem exceção.
+    """
+
+    def __init__(self) -> None:
+        self._messages: list[tuple[str | StreamTarget | PresenceTarget, str | bytes]] = []
+        self._encoded: dict[int, tuple[dict, Callable, str | bytes]] = {}
+        self._depth = 0
+        self._token = None
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __enter__(self) -> "PublishBatch":
+        if self._depth == 0:
+            self._token = _current_batch.set(self)
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._depth -= 1
+        if self._depth:
+            return
+        _current_batch.reset(self._token)
+        self._token = None
+        if exc_type is None:
+            self.send()
+
+    def add(self, channel: str | StreamTarget | PresenceTarget, payload: dict, encode: Callable[[dict], str | bytes] | None = None) -> None:
+        encode = encode or json.dumps
+        cached = self._encoded.get(id(payload))
+        if cached is None or cached[0] is not payload or cached[1] is not encode:
+            cached = (payload, encode, encode(payload))
+            self._encoded[id(payload)] = cached
+        self._messages.append((channel, cached[2]))
+
+    def send(self) -> int:
+        messages, self._messages = self._messages, []
+        self._encoded.clear()
+        return _send_messages(messages)
+
+
+_current_batch: ContextVar[PublishBatch | None] = ContextVar("realtime_publish_batch", default=None)
+
+
+def publish_batch() -> PublishBatch:
+    """Lote para `with`: blocos aninhados reaproveitam o lote mais externo."""
+    current = _current_batch.get()
+    return current if current is not None else PublishBatch()
+
+
+def _send_messages(messages: list[tuple[str | StreamTarget | PresenceTarget, str | bytes]]) -> int:
+    """Fire-and-forget quando o publisher de fundo está rodando (retorna quantas foram enfileiradas);
+    fora do app (scripts, testes) publica na hora e retorna o número de receptores."""
+    if not messages:
         return 0
+    if realtime_publisher.enqueue_many(messages):
+        return len(messages)
 
-    message = json.dumps(payload)
+    client = get_shared_redis_client()
+    if client is None:
+        logger.debug("Redis unavailable: skipped publish channels=%s", [channel for channel, _ in messages])
+        return 0
 
     try:
-        return int(client.publish(channel, message))
+        messages = _resolve_presence(client, messages)
+        if not messages:
+            return 0
+        if len(messages) == 1 and not isinstance(messages[0][0], StreamTarget):
+            return int(client.publish(*messages[0]))
+        pipeline = client.pipeline(transaction=False)
+        publish_positions = queue_commands(pipeline, messages)
+        results = pipeline.execute()
+        return sum(int(results[position]) for position in publish_positions)
     except Exception:
-        logger.exception("Failed to publish event channel=%s", channel)
+        logger.exception("Failed to publish events channels=%s", [channel for channel, _ in messages])
         return 0
 
 
+def _resolve_presence(
+    client, messages: list[tuple[str | StreamTarget | PresenceTarget, str | bytes]]
+) -> list[tuple[str | StreamTarget, str | bytes]]:
+    """Fallback síncrono (publisher de fundo parado) da leitura de presença feita em RealtimePublisher._send."""
+    keys = presence_keys(messages)
+    if not keys:
+        return messages
+    pipeline = client.pipeline(transaction=False)
+    queue_presence_lookups(pipeline, keys)
+    try:
+        members = pipeline.execute()
+    except Exception:
+        logger.exception("Failed to load delivery presence keys=%s", keys)
+        members = []
+    return expand_presence(messages, dict(zip(keys, members)))
+
+
+def _publish(channel: str | StreamTarget | PresenceTarget, payload: dict, encode: Callable[[dict], str | bytes] | None = None) -> int:
+    batch = _current_batch.get()
+    if batch is not None:
+        batch.add(channel, payload, encode)
+        return 1
+    return _send_messages([(channel, (encode or json.dumps)(payload))])
+
+
+def _publish_envelope(channel: str, envelope: dict, stream: StreamTarget | None = None) -> int:
+    """Com `stream`, grava também no Redis Stream de replay, reaproveitando a mesma serialização."""
+    if stream is None:
+        return _publish(channel, envelope, encode_delivery_envelope)
+    with publish_batch():
+        _publish(stream, envelope, encode_delivery_envelope)
+        return _publish(channel, envelope, encode_delivery_envelope)
+
+
 def publish_event(tenant_id: int, payload: dict) -> int:
     """Publish a tenant event to Redis Pub/Sub."""
     channel = f"tenant:{tenant_id}:events"
     return _publish(channel, payload)
 
 
+def publish_export_job_event(tenant_id: int, job_id: str, payload: dict) -> int:
+    """Evento do tenant e, no canal do job, o aviso que acorda o SSE de conclusão em qualquer processo."""
+    with publish_batch():
+        _publish(export_job_channel(job_id), payload)
+        return publish_event(tenant_id, payload)
+
+
+def publish_cache_invalidation(cache: str, tenant_id: int | None, *, origin: str) -> int:
+    """Aviso para os outros workers descartarem o cache local `cache` (`tenant_id` None = todos os tenants)."""
+    return _publish(cache_invalidation_channel(), {"cache": cache, "tenant_id": tenant_id, "origin": origin})
+
+
 def publish_delivery_event(tenant_id: int, delivery_user_id: int, payload: dict) -> int:
     """Backward-compatible alias for assignment events."""
     return publish_delivery_assignment_event(
@@ -77,7 +222,7 @@ def publish_standard_delivery_status_event(tenant_id: int, delivery_user_id: int
         delivery_user_id=delivery_user_id,
         payload={"status": str(status)},
     )
-    return _publish(channel, envelope)
+    return _publish_envelope(channel, envelope)
 
 def publish_delivery_status_event(tenant_id: int, delivery_user_id: int, status: str) -> int:
     """Publish delivery presence updates to tenant-scoped Redis channel."""
@@ -89,7 +234,7 @@ def publish_delivery_status_event(tenant_id: int, delivery_user_id: int, status:
         delivery_user_id=delivery_user_id,
         payload={"status": str(status)},
     )
-    return _publish(channel, envelope)
+    return _publish_envelope(channel, envelope)
 
 
 def publish_delivery_location_event(
@@ -114,20 +259,21 @@ def publish_delivery_location_event(
         delivery_user_id=delivery_user_id,
         payload=payload,
     )
-    receivers = _publish(channel, envelope)
-
-    if order_id is not None:
-        order_payload = {
-            "type": "delivery.location",
-            "tenant_id": int(tenant_id),
-            "order_id": int(order_id),
-            "delivery_user_id": int(delivery_user_id),
-            "lat": float(lat),
-            "lng": float(lng),
-        }
-        if status is not None:
-            order_payload["status"] = str(status)
-        receivers += _publish(delivery_order_channel(order_id), order_payload)
+    with publish_batch():
+        receivers = _publish_envelope(channel, envelope)
+
+        if order_id is not None:
+            order_payload = {
+                "type": "delivery.location",
+                "tenant_id": int(tenant_id),
+                "order_id": int(order_id),
+                "delivery_user_id": int(delivery_user_id),
+                "lat": float(lat),
+                "lng": float(lng),
+            }
+            if status is not None:
+                order_payload["status"] = str(status)
+            receivers += _publish(delivery_order_channel(order_id), order_payload)
 
     return receivers
 
@@ -150,7 +296,7 @@ def publish_delivery_driver_location_event(
     envelope["driver_id"] = int(driver_id)
     envelope["lat"] = float(lat)
     envelope["lng"] = float(lng)
-    return _publish(channel, envelope)
+    return _publish_envelope(channel, envelope)
 
 
 def publish_delivery_assignment_event(
@@ -167,7 +313,17 @@ def publish_delivery_assignment_event(
         delivery_user_id=delivery_user_id,
         payload=payload,
     )
-    return _publish(channel, envelope)
+    if delivery_user_id is None:
+        return _publish_envelope(channel, envelope)
+    # cópia direta para os workers que têm o socket do entregador; a presença é lida por quem envia o lote
+    with publish_batch():
+        receivers = _publish_envelope(channel, envelope)
+        _publish(
+            PresenceTarget(delivery_presence_key(tenant_id, delivery_user_id), DELIVERY_WORKER_CHANNEL_PREFIX),
+            envelope,
+            encode_delivery_envelope,
+        )
+    return receivers
 
 
 def publish_public_tracking_event(
@@ -209,8 +365,23 @@ def publish_public_tracking_event(
         delivery_user_id=None,
         payload=payload,
     )
-    return _publish(channel, envelope)
+    return _publish_envelope(channel, envelope, order_tracking_stream(tenant_id, order_id))
+
+
+def publish_order_status_event(tenant_id: int, order_id: int, *, status: str, previous_status: str | None = None) -> int:
+    """Mudança de status no canal e no stream do pedido: acorda os SSE de rastreio sem polling no banco."""
+    envelope = build_delivery_envelope(
+        event_type="delivery.status",
+        tenant_id=tenant_id,
+        order_id=order_id,
+        payload={"status": str(status), "previous_status": previous_status},
+    )
+    return _publish_envelope(order_tracking_channel(tenant_id, order_id), envelope, order_tracking_stream(tenant_id, order_id))
+
 
+def publish_kds_event(tenant_id: int, event_type: str, payload: dict) -> int:
+    """Evento do KDS no stream do tenant (sem Pub/Sub): lido pelo SSE do KDS com replay por Last-Event-ID."""
+    return _publish(kds_stream(tenant_id), {"type": str(event_type), "tenant_id": int(tenant_id), **payload})
 
 
 def publish_order_tracking_eta_event(
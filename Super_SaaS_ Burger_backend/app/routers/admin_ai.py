@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
+import app.ai.service  # noqa: F401 - registra o hook que invalida o cache de config após o commit
 from app.core.database import get_db
 from app.deps import require_role
 from app.models.admin_user import AdminUser
@@ -101,6 +102,7 @@ def update_ai_config(
         meta={"provider": config.provider, "enabled": config.enabled},
     )
 
+    # o commit invalida o cache deste e dos outros workers (hook em app.ai.service)
     db.commit()
     db.refresh(config)
     return _serialize_config(config)
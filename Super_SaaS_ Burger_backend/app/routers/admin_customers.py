@@ -1,15 +1,12 @@
 from __future__ import annotations
 
-import csv
-import io
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import func, or_
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
@@ -17,7 +14,12 @@ from app.deps import require_role
 from app.models.admin_user import AdminUser
 from app.models.customer import Customer
 from app.models.customer_address import CustomerAddress
+from app.models.customer_aggregate import CustomerAggregate
 from app.models.order import Order
+from app.services.customer_aggregates import is_vip, recurrence_segment
+from app.services.export_jobs import CUSTOMER_EXPORT_FIELDS, customer_export_rows
+from app.services.exports import csv_streaming_response
+from app.services.keyset import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/api/admin/customers", tags=["admin-customers"])
 
@@ -38,8 +40,9 @@ class AdminCustomerListItem(BaseModel):
 
 class AdminCustomerListResponse(BaseModel):
     items: list[AdminCustomerListItem]
-    total: int
+    total: int | None = None  # só na primeira página; páginas por cursor não refazem o COUNT
     page: int
+    next_cursor: str | None = None
 
 
 class AdminCustomerOrderRead(BaseModel):
@@ -71,6 +74,7 @@ def list_admin_customers(
     tenant_id: Optional[int] = None,
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = Query(default=None),
     search: str | None = Query(default=None),
     vip_only: bool = Query(default=False),
     inactive_days: int | None = Query(default=None, ge=1),
@@ -86,28 +90,22 @@ def list_admin_customers(
         search_like = f"%{clean_search}%"
         filters.append(or_(Customer.name.ilike(search_like), Customer.phone.ilike(search_like)))
 
-    aggregates = (
-        db.query(
-            Order.customer_id.label("customer_id"),
-            func.count(Order.id).label("total_orders"),
-            func.coalesce(func.sum(func.coalesce(Order.total_cents, Order.valor_total)), 0).label("total_spent"),
-            func.min(Order.created_at).label("first_order_date"),
-            func.max(Order.created_at).label("last_order_date"),
-        )
-        .filter(Order.tenant_id == resolved_tenant_id)
-        .group_by(Order.customer_id)
-        .subquery()
-    )
-
+    last_order_at = CustomerAggregate.last_order_at
     query = db.query(
         Customer.id,
         Customer.name,
         Customer.phone,
-        func.coalesce(aggregates.c.total_orders, 0).label("total_orders"),
-        func.coalesce(aggregates.c.total_spent, 0).label("total_spent"),
-        aggregates.c.first_order_date.label("first_order_date"),
-        aggregates.c.last_order_date.label("last_order_date"),
-    ).outerjoin(aggregates, aggregates.c.customer_id == Customer.id)
+        func.coalesce(CustomerAggregate.total_orders, 0).label("total_orders"),
+        func.coalesce(CustomerAggregate.total_spent, 0).label("total_spent"),
+        CustomerAggregate.first_order_at.label("first_order_date"),
+        last_order_at.label("last_order_date"),
+    ).outerjoin(
+        CustomerAggregate,
+        and_(
+            CustomerAggregate.tenant_id == resolved_tenant_id,
+            CustomerAggregate.customer_id == Customer.id,
+        ),
+    )
 
     now = datetime.utcnow()
     days_15 = now - timedelta(days=15)
@@ -115,45 +113,49 @@ def list_admin_customers(
     days_90 = now - timedelta(days=90)
 
     if vip_only:
-        query = query.filter(
-            or_(
-                func.coalesce(aggregates.c.total_spent, 0) >= 500,
-                func.coalesce(aggregates.c.total_orders, 0) >= 10,
-            )
-        )
+        query = query.filter(CustomerAggregate.is_vip.is_(True))
 
     if inactive_days is not None:
         threshold = now - timedelta(days=inactive_days)
-        query = query.filter(aggregates.c.last_order_date.isnot(None), aggregates.c.last_order_date <= threshold)
+        query = query.filter(last_order_at.isnot(None), last_order_at <= threshold)
 
     if recurrence == "frequent":
-        query = query.filter(aggregates.c.last_order_date.isnot(None), aggregates.c.last_order_date > days_15)
+        query = query.filter(last_order_at.isnot(None), last_order_at > days_15)
     elif recurrence == "regular":
-        query = query.filter(aggregates.c.last_order_date <= days_15, aggregates.c.last_order_date > days_45)
+        query = query.filter(last_order_at <= days_15, last_order_at > days_45)
     elif recurrence == "occasional":
-        query = query.filter(aggregates.c.last_order_date <= days_45, aggregates.c.last_order_date > days_90)
+        query = query.filter(last_order_at <= days_45, last_order_at > days_90)
     elif recurrence == "inactive":
-        query = query.filter(
-            or_(aggregates.c.last_order_date.is_(None), aggregates.c.last_order_date <= days_90)
-        )
+        query = query.filter(or_(last_order_at.is_(None), last_order_at <= days_90))
 
     query = query.filter(*filters)
 
-    total = query.with_entities(func.count(Customer.id)).scalar() or 0
-    offset = (page - 1) * limit
+    total = None if cursor else int(query.with_entities(func.count(Customer.id)).scalar() or 0)
 
-    rows = (
-        query.order_by(aggregates.c.last_order_date.desc().nullslast(), Customer.id.desc())
-        .limit(limit)
-        .offset(offset)
-        .all()
-    )
+    ordered = query.order_by(last_order_at.desc().nullslast(), Customer.id.desc())
+    if cursor:
+        # keyset em (last_order_at DESC NULLS LAST, id DESC): não percorre as páginas anteriores
+        cursor_last_order_at, cursor_id = decode_cursor(cursor, datetime, int)
+        if cursor_last_order_at is None:
+            ordered = ordered.filter(last_order_at.is_(None), Customer.id < cursor_id)
+        else:
+            ordered = ordered.filter(
+                or_(
+                    last_order_at < cursor_last_order_at,
+                    and_(last_order_at == cursor_last_order_at, Customer.id < cursor_id),
+                    last_order_at.is_(None),
+                )
+            )
+    else:
+        ordered = ordered.offset((page - 1) * limit)
+
+    rows = ordered.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
     items = []
     for row in rows:
-        total_spent = row.total_spent if row.total_spent is not None else 0
-        if isinstance(total_spent, Decimal):
-            total_spent = int(total_spent)
+        total_spent = int(row.total_spent or 0)
         total_orders = int(row.total_orders or 0)
         average_ticket = float(total_spent / total_orders) if total_orders > 0 else 0.0
         last_order_date = row.last_order_date
@@ -161,35 +163,31 @@ def list_admin_customers(
         if last_order_date is not None:
             days_since_last_order = max((now - last_order_date.replace(tzinfo=None)).days, 0)
 
-        if days_since_last_order is None or days_since_last_order >= 90:
-            recurrence_segment = "inactive"
-        elif days_since_last_order < 15:
-            recurrence_segment = "frequent"
-        elif days_since_last_order < 45:
-            recurrence_segment = "regular"
-        else:
-            recurrence_segment = "occasional"
-
         items.append(
             {
                 "id": row.id,
                 "name": row.name,
                 "phone": row.phone,
                 "total_orders": total_orders,
-                "total_spent": int(total_spent),
+                "total_spent": total_spent,
                 "average_ticket": average_ticket,
                 "first_order_date": row.first_order_date,
                 "last_order_date": last_order_date,
                 "days_since_last_order": days_since_last_order,
-                "recurrence_segment": recurrence_segment,
-                "is_vip": bool(total_spent >= 500 or total_orders >= 10),
+                "recurrence_segment": recurrence_segment(days_since_last_order),
+                "is_vip": is_vip(total_spent, total_orders),
             }
         )
 
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1].last_order_date, rows[-1].id)
+
     return {
         "items": items,
-        "total": int(total),
+        "total": total,
         "page": page,
+        "next_cursor": next_cursor,
     }
 
 
@@ -198,86 +196,18 @@ def export_admin_customers_csv(
     tenant_id: Optional[int] = None,
     vip_only: bool = Query(default=False),
     inactive_days: int | None = Query(default=None, ge=1),
+    gzip: bool = Query(default=False),
     user: AdminUser = Depends(require_role(["admin"])),
     db: Session = Depends(get_db),
 ):
     resolved_tenant_id = _resolve_tenant(user, tenant_id)
+    rows = customer_export_rows(db, resolved_tenant_id, vip_only=vip_only, inactive_days=inactive_days)
 
-    aggregates = (
-        db.query(
-            Order.customer_id.label("customer_id"),
-            func.count(Order.id).label("total_orders"),
-            func.coalesce(func.sum(func.coalesce(Order.total_cents, Order.valor_total)), 0).label("total_spent"),
-            func.max(Order.created_at).label("last_order_date"),
-        )
-        .filter(Order.tenant_id == resolved_tenant_id)
-        .group_by(Order.customer_id)
-        .subquery()
-    )
-
-    query = db.query(
-        Customer.name,
-        Customer.phone,
-        func.coalesce(aggregates.c.total_spent, 0).label("total_spent"),
-        func.coalesce(aggregates.c.total_orders, 0).label("total_orders"),
-        aggregates.c.last_order_date.label("last_order_date"),
-    ).outerjoin(aggregates, aggregates.c.customer_id == Customer.id)
-
-    query = query.filter(Customer.tenant_id == resolved_tenant_id)
-
-    now = datetime.utcnow()
-    if vip_only:
-        query = query.filter(
-            or_(
-                func.coalesce(aggregates.c.total_spent, 0) >= 500,
-                func.coalesce(aggregates.c.total_orders, 0) >= 10,
-            )
-        )
-
-    if inactive_days is not None:
-        threshold = now - timedelta(days=inactive_days)
-        query = query.filter(aggregates.c.last_order_date.isnot(None), aggregates.c.last_order_date <= threshold)
-
-    rows = query.order_by(aggregates.c.last_order_date.desc().nullslast(), Customer.id.desc())
-
-    def _iter_csv():
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow(["name", "phone", "total_spent", "total_orders", "last_order_date", "days_since_last_order"])
-        yield buffer.getvalue()
-        buffer.seek(0)
-        buffer.truncate(0)
-
-        for row in rows.yield_per(500):
-            total_spent = row.total_spent if row.total_spent is not None else 0
-            if isinstance(total_spent, Decimal):
-                total_spent = int(total_spent)
-            total_orders = int(row.total_orders or 0)
-            last_order_date = row.last_order_date
-
-            days_since_last_order = ""
-            if last_order_date is not None:
-                days_since_last_order = max((now - last_order_date.replace(tzinfo=None)).days, 0)
-
-            writer.writerow(
-                [
-                    row.name,
-                    row.phone,
-                    int(total_spent),
-                    total_orders,
-                    last_order_date.isoformat() if last_order_date else "",
-                    days_since_last_order,
-                ]
-            )
-            yield buffer.getvalue()
-            buffer.seek(0)
-            buffer.truncate(0)
-
-    filename = f"customers_export_tenant_{resolved_tenant_id}.csv"
-    return StreamingResponse(
-        _iter_csv(),
-        media_type="text/csv; charset=utf-8",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    return csv_streaming_response(
+        CUSTOMER_EXPORT_FIELDS,
+        rows,
+        f"customers_export_tenant_{resolved_tenant_id}.csv",
+        gzip=gzip,
     )
 
 
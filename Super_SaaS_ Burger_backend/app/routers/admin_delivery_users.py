@@ -12,6 +12,7 @@ from app.deps import require_role
 from app.models.admin_user import AdminUser
 from app.models.delivery_log import DeliveryLog
 from app.services.admin_audit import log_admin_action
+from app.services.driver_locations import list_driver_latest_locations
 from app.services.passwords import hash_password
 
 router = APIRouter(prefix="/api/admin", tags=["admin-users"])
@@ -155,40 +156,14 @@ def list_delivery_user_latest_locations(
     if int(user.tenant_id) != int(tenant_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Tenant não autorizado")
 
-    latest_location_per_user = (
-        db.query(
-            DeliveryLog.delivery_user_id.label("delivery_user_id"),
-            func.max(DeliveryLog.id).label("latest_log_id"),
-        )
-        .filter(
-            DeliveryLog.tenant_id == tenant_id,
-            DeliveryLog.event_type == "location_update",
-        )
-        .group_by(DeliveryLog.delivery_user_id)
-        .subquery()
-    )
-
-    rows = (
-        db.query(
-            DeliveryLog.delivery_user_id,
-            DeliveryLog.latitude,
-            DeliveryLog.longitude,
-            DeliveryLog.created_at,
-        )
-        .join(latest_location_per_user, DeliveryLog.id == latest_location_per_user.c.latest_log_id)
-        .order_by(DeliveryLog.delivery_user_id.asc())
-        .all()
-    )
-
     return [
         {
             "delivery_user_id": int(row.delivery_user_id),
             "lat": float(row.latitude),
             "lng": float(row.longitude),
-            "updated_at": row.created_at,
+            "updated_at": row.recorded_at,
         }
-        for row in rows
-        if row.latitude is not None and row.longitude is not None
+        for row in list_driver_latest_locations(db, tenant_id)
     ]
 
 
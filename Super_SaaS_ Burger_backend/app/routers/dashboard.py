@@ -5,17 +5,15 @@ from typing import Any, Dict, List
 from zoneinfo import ZoneInfo
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.deps import get_request_tenant_id, require_role
 from app.models.admin_user import AdminUser
-from app.models.finance import CashMovement, OrderPayment
-from app.models.inventory import InventoryItem, InventoryMovement
+from app.models.finance import OrderPayment
 from app.models.order import Order
-from app.models.order_item import OrderItem
 from app.services.inventory import count_low_stock
+from app.services.sales_rollups import sales_by_day, sales_totals, top_item_sales
 
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
@@ -102,10 +100,6 @@ def _last_days_range(days: int) -> tuple[datetime, datetime]:
     return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
 
 
-def _order_total_expression() -> Any:
-    return func.coalesce(Order.total_cents, Order.valor_total, 0)
-
-
 @router.get("/overview")
 def dashboard_overview(
     tenant_id: int = Depends(get_request_tenant_id),
@@ -119,131 +113,22 @@ def dashboard_overview(
     default_start, default_end = _today_range()
     start, end = _resolve_range(start_date, end_date, de, para, default_start, default_end)
 
-    gross_sales_cents = (
-        db.query(func.coalesce(func.sum(_order_total_expression()), 0))
-        .filter(
-            Order.tenant_id == tenant_id,
-            Order.created_at >= start,
-            Order.created_at < end,
-        )
-        .scalar()
-        or 0
-    )
-
-    orders_count = (
-        db.query(func.count(Order.id))
-        .filter(
-            Order.tenant_id == tenant_id,
-            Order.created_at >= start,
-            Order.created_at < end,
-        )
-        .scalar()
-        or 0
-    )
-
-    paid_orders_count = (
-        db.query(func.count(func.distinct(OrderPayment.order_id)))
-        .join(Order, Order.id == OrderPayment.order_id)
-        .filter(
-            Order.tenant_id == tenant_id,
-            Order.created_at >= start,
-            Order.created_at < end,
-            OrderPayment.status == "paid",
-        )
-        .scalar()
-        or 0
-    )
-
-    open_orders_count = (
-        db.query(func.count(Order.id))
-        .filter(
-            Order.tenant_id == tenant_id,
-            Order.created_at >= start,
-            Order.created_at < end,
-            Order.status != "ENTREGUE",
-        )
-        .scalar()
-        or 0
-    )
-
-    net_cash_cents = (
-        db.query(
-            func.coalesce(
-                func.sum(
-                    case(
-                        (CashMovement.type == "in", CashMovement.amount_cents),
-                        else_=-CashMovement.amount_cents,
-                    )
-                ),
-                0,
-            )
-        )
-        .filter(
-            CashMovement.tenant_id == tenant_id,
-            CashMovement.occurred_at >= start,
-            CashMovement.occurred_at < end,
-        )
-        .scalar()
-        or 0
-    )
-
-    cogs_movements = (
-        db.query(InventoryMovement, InventoryItem)
-        .join(InventoryItem, InventoryItem.id == InventoryMovement.inventory_item_id)
-        .filter(
-            InventoryMovement.tenant_id == tenant_id,
-            InventoryMovement.type == "OUT",
-            InventoryMovement.reason == "sale",
-            InventoryMovement.created_at >= start,
-            InventoryMovement.created_at < end,
-        )
-        .all()
-    )
-    cogs_cents = 0
-    for movement, item in cogs_movements:
-        cost_cents = int(item.cost_cents or 0)
-        quantity = float(movement.quantity or 0)
-        cogs_cents += int(round(quantity * cost_cents))
-
+    totals = sales_totals(db, tenant_id, start, end)
+    gross_sales_cents = totals.gross_sales_cents
+    orders_count = totals.orders_count
+    cogs_cents = totals.cogs_cents
     gross_profit_cents = int(gross_sales_cents) - int(cogs_cents)
     low_stock_count = count_low_stock(db, tenant_id)
-
-    payment_time = func.coalesce(OrderPayment.paid_at, OrderPayment.created_at)
-    payment_breakdown = (
-        db.query(
-            OrderPayment.method.label("method"),
-            func.coalesce(func.sum(OrderPayment.amount_cents), 0).label("total_cents"),
-            func.count(OrderPayment.id).label("count"),
-        )
-        .filter(
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            payment_time >= start,
-            payment_time < end,
-        )
-        .group_by(OrderPayment.method)
-        .order_by(func.sum(OrderPayment.amount_cents).desc())
-        .all()
-    )
-
-    payment_method_breakdown = [
-        {
-            "method": row.method,
-            "total_cents": int(row.total_cents or 0),
-            "count": int(row.count or 0),
-        }
-        for row in payment_breakdown
-    ]
-
-    avg_ticket_cents = int(gross_sales_cents / orders_count) if orders_count else 0
+    payment_method_breakdown = totals.payment_method_breakdown()
+    avg_ticket_cents = totals.avg_ticket_cents
     last_updated = datetime.utcnow()
 
     return {
         "gross_sales_cents": int(gross_sales_cents),
-        "net_cash_cents": int(net_cash_cents),
+        "net_cash_cents": int(totals.net_cash_cents),
         "orders_count": int(orders_count),
-        "paid_orders_count": int(paid_orders_count),
-        "open_orders_count": int(open_orders_count),
+        "paid_orders_count": int(totals.paid_orders_count),
+        "open_orders_count": int(totals.open_orders_count),
         "avg_ticket_cents": avg_ticket_cents,
         "cogs_cents": int(cogs_cents),
         "gross_profit_cents": int(gross_profit_cents),
@@ -271,59 +156,19 @@ def dashboard_timeseries(
     default_start, default_end = _last_days_range(7)
     start, end = _resolve_range(start_date, end_date, de, para, default_start, default_end)
 
-    order_rows = (
-        db.query(
-            func.date(Order.created_at).label("day"),
-            func.coalesce(func.sum(_order_total_expression()), 0).label("gross_sales_cents"),
-            func.count(Order.id).label("orders_count"),
-        )
-        .filter(
-            Order.tenant_id == tenant_id,
-            Order.created_at >= start,
-            Order.created_at < end,
-        )
-        .group_by(func.date(Order.created_at))
-        .all()
-    )
-
-    cash_rows = (
-        db.query(
-            func.date(CashMovement.occurred_at).label("day"),
-            func.coalesce(
-                func.sum(
-                    case(
-                        (CashMovement.type == "in", CashMovement.amount_cents),
-                        else_=-CashMovement.amount_cents,
-                    )
-                ),
-                0,
-            ).label("net_cash_cents"),
-        )
-        .filter(
-            CashMovement.tenant_id == tenant_id,
-            CashMovement.occurred_at >= start,
-            CashMovement.occurred_at < end,
-        )
-        .group_by(func.date(CashMovement.occurred_at))
-        .all()
-    )
-
-    orders_map = {str(row.day): row for row in order_rows}
-    cash_map = {str(row.day): row for row in cash_rows}
+    by_day = sales_by_day(db, tenant_id, start, end)
 
     points: List[Dict[str, Any]] = []
     current = start.astimezone(BRAZIL_TZ).date()
     end_date = (end.astimezone(BRAZIL_TZ) - timedelta(days=1)).date()
     while current <= end_date:
-        key = current.isoformat()
-        order_row = orders_map.get(key)
-        cash_row = cash_map.get(key)
+        day_totals = by_day.get(current)
         points.append(
             {
-                "date": key,
-                "gross_sales_cents": int(order_row.gross_sales_cents) if order_row else 0,
-                "orders_count": int(order_row.orders_count) if order_row else 0,
-                "net_cash_cents": int(cash_row.net_cash_cents) if cash_row else 0,
+                "date": current.isoformat(),
+                "gross_sales_cents": day_totals.gross_sales_cents if day_totals else 0,
+                "orders_count": day_totals.orders_count if day_totals else 0,
+                "net_cash_cents": day_totals.net_cash_cents if day_totals else 0,
             }
         )
         current += timedelta(days=1)
@@ -331,50 +176,6 @@ def dashboard_timeseries(
     return {"points": points}
 
 
-def _fallback_top_items(
-    tenant_id: int,
-    start: datetime,
-    end: datetime,
-    limit: int,
-    db: Session,
-) -> List[Dict[str, Any]]:
-    import json
-
-    orders = (
-        db.query(Order)
-        .filter(
-            Order.tenant_id == tenant_id,
-            Order.created_at >= start,
-            Order.created_at < end,
-        )
-        .all()
-    )
-    totals: Dict[str, Dict[str, int]] = {}
-    for order in orders:
-        try:
-            items = json.loads(order.items_json or "[]")
-        except Exception:
-            items = []
-        if not isinstance(items, list):
-            continue
-        for item in items:
-            name = str(item.get("name", "") or "").strip()
-            if not name:
-                continue
-            qty = int(item.get("quantity", 0) or 0)
-            total_cents = int(item.get("subtotal_cents", 0) or 0)
-            if name not in totals:
-                totals[name] = {"qty": 0, "total_cents": 0}
-            totals[name]["qty"] += qty
-            totals[name]["total_cents"] += total_cents
-
-    sorted_items = sorted(totals.items(), key=lambda item: item[1]["total_cents"], reverse=True)
-    return [
-        {"name": name, "qty": values["qty"], "total_cents": values["total_cents"]}
-        for name, values in sorted_items[:limit]
-    ]
-
-
 @router.get("/top-items")
 def dashboard_top_items(
     tenant_id: int = Depends(get_request_tenant_id),
@@ -389,32 +190,11 @@ def dashboard_top_items(
     default_start, default_end = _today_range()
     start, end = _resolve_range(start_date, end_date, de, para, default_start, default_end)
 
-    rows = (
-        db.query(
-            OrderItem.name.label("name"),
-            func.coalesce(func.sum(OrderItem.quantity), 0).label("qty"),
-            func.coalesce(func.sum(OrderItem.subtotal_cents), 0).label("total_cents"),
-        )
-        .filter(
-            OrderItem.tenant_id == tenant_id,
-            OrderItem.created_at >= start,
-            OrderItem.created_at < end,
-        )
-        .group_by(OrderItem.name)
-        .order_by(func.sum(OrderItem.subtotal_cents).desc())
-        .limit(limit)
-        .all()
-    )
-
     items = [
-        {"name": row.name, "qty": int(row.qty or 0), "total_cents": int(row.total_cents or 0)}
-        for row in rows
-        if row.name
+        {"name": item.item_name, "qty": item.quantity, "total_cents": item.gross_revenue_cents}
+        for item in top_item_sales(db, tenant_id, start, end, limit)
     ]
 
-    if not items:
-        items = _fallback_top_items(tenant_id=tenant_id, start=start, end=end, limit=limit, db=db)
-
     return {"items": items}
 
 
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta, timezone
 import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
@@ -19,8 +19,11 @@ from app.models.delivery_log import DeliveryLog
 from app.models.delivery_tracking import DeliveryTracking
 from app.models.order import Order
 from app.integrations.redis_client import get_async_redis_client
+from app.realtime.coalescer import REALTIME_ADMIN_COALESCE_SECONDS, CoalescingHub
+from app.realtime.delivery_envelope import parse_delivery_envelope
 from app.realtime.publisher import (
     delivery_driver_location_channel,
+    publish_batch,
     publish_delivery_location_event,
     publish_order_tracking_location_event,
     publish_order_tracking_eta_event,
@@ -43,6 +46,7 @@ from app.services.gps_service import calculate_distance_km
 from app.services.passwords import verify_password
 from app.websockets.delivery_tracking_ws import manager
 
+from app.services.location_writer import location_write_buffer
 from app.services.loyalty import award_points_for_completed_order
 router = APIRouter(prefix="/api/delivery", tags=["delivery-api"])
 logger = logging.getLogger(__name__)
@@ -62,53 +66,55 @@ class DeliveryLocationUpdate(BaseModel):
     lat: float = Field(..., validation_alias=AliasChoices("lat", "latitude"))
     lng: float = Field(..., validation_alias=AliasChoices("lng", "longitude"))
 
+def _render_live_map_frame(payload: dict) -> bytes:
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def _live_map_extractor(tenant_id: int) -> Callable[[Any], tuple[tuple[str, int], dict] | None]:
+    def _extract(raw_payload: Any) -> tuple[tuple[str, int], dict] | None:
+        payload = parse_delivery_envelope(
+            raw_payload,
+            expected_tenant_id=tenant_id,
+            accept=lambda header: header.type == "driver_location",
+        )
+        if payload is None:
+            return None
+        # um marcador por pedido; sem pedido, um por entregador
+        if payload.get("order_id") is not None:
+            return ("order", payload["order_id"]), payload
+        if payload.get("delivery_user_id") is not None:
+            return ("driver", payload["delivery_user_id"]), payload
+        return None
+
+    return _extract
+
+
+live_map_hub = CoalescingHub(
+    window_seconds=REALTIME_ADMIN_COALESCE_SECONDS,
+    render=_render_live_map_frame,
+    client_factory=lambda: get_async_redis_client(),
+)
+
+
 @router.get("/live-map/stream")
 async def delivery_live_map_stream(
     request: Request,
     tenant_id: int = Depends(get_request_tenant_id),
 ):
-    client = get_async_redis_client()
-
     async def event_generator():
-        if client is None:
-            while not await request.is_disconnected():
-                yield ": heartbeat\n\n"
-                await asyncio.sleep(10)
-            return
-
         channel = delivery_driver_location_channel(tenant_id)
-        pubsub = client.pubsub()
-        await pubsub.subscribe(channel)
-
-        try:
-            while True:
-                if await request.is_disconnected():
-                    break
-
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                if message is None:
+        async with live_map_hub.subscribe(channel, _live_map_extractor(tenant_id)) as mailbox:
+            while not await request.is_disconnected():
+                if mailbox is None:
                     yield ": heartbeat\n\n"
+                    await asyncio.sleep(10)
                     continue
-
-                raw_payload = message.get("data")
-                payload_text = raw_payload.decode() if isinstance(raw_payload, bytes) else str(raw_payload)
-
-                try:
-                    payload = json.loads(payload_text)
-                except (TypeError, json.JSONDecodeError):
-                    continue
-
-                if not isinstance(payload, dict):
-                    continue
-
-                if payload.get("type") != "driver_location":
-                    continue
-
-                yield f"data: {json.dumps(payload)}\n\n"
-        finally:
-            await pubsub.unsubscribe(channel)
-            await pubsub.aclose()
-            await client.aclose()
+                if mailbox.lagging():
+                    break
+                frames = await mailbox.get(10.0)
+                yield b"".join(frame.data for frame in frames) if frames else b": heartbeat\n\n"
+                if mailbox.closed:
+                    break
 
     return StreamingResponse(
         event_generator(),
@@ -359,7 +365,7 @@ def get_driver_active_delivery(
         .filter(
             Order.tenant_id == int(current_user.tenant_id),
             Order.assigned_delivery_user_id == int(current_user.id),
-            func.upper(Order.status) == "OUT_FOR_DELIVERY",
+            Order.status == "OUT_FOR_DELIVERY",
         )
         .order_by(desc(Order.created_at), desc(Order.id))
         .first()
@@ -388,7 +394,7 @@ def get_driver_state(
         .filter(
             Order.tenant_id == int(current_user.tenant_id),
             Order.assigned_delivery_user_id == int(current_user.id),
-            func.upper(Order.status) == "OUT_FOR_DELIVERY",
+            Order.status == "OUT_FOR_DELIVERY",
         )
         .order_by(desc(Order.created_at), desc(Order.id))
         .first()
@@ -425,7 +431,7 @@ def get_driver_delivery_snapshot(
         .filter(
             Order.tenant_id == tenant_id,
             Order.assigned_delivery_user_id == delivery_user_id,
-            func.upper(Order.status).in_(OUT_FOR_DELIVERY_STATUSES),
+            Order.status.in_(OUT_FOR_DELIVERY_STATUSES),
         )
         .order_by(desc(Order.created_at), desc(Order.id))
         .all()
@@ -496,7 +502,7 @@ def list_delivery_orders(
         Order.assigned_delivery_user_id == int(current_user.id),
     )
     if normalized_statuses:
-        query = query.filter(func.upper(Order.status).in_(normalized_statuses))
+        query = query.filter(Order.status.in_(normalized_statuses))
 
     orders = query.order_by(desc(Order.created_at)).all()
     return [_order_to_delivery_dict(order) for order in orders]
@@ -679,16 +685,6 @@ async def create_delivery_location_log(
     if not order.assigned_delivery_user_id or int(order.assigned_delivery_user_id) != int(current_user.id):
         raise HTTPException(status_code=409, detail="Pedido atribuído para outro entregador")
 
-    _create_delivery_log(
-        db,
-        tenant_id=tenant_id,
-        order_id=order.id,
-        delivery_user_id=int(current_user.id),
-        event_type="location_update",
-        latitude=payload.lat,
-        longitude=payload.lng,
-    )
-
     tracking = db.query(DeliveryTracking).filter(
         DeliveryTracking.order_id == payload.order_id,
         DeliveryTracking.delivery_user_id == current_user.id,
@@ -737,7 +733,26 @@ async def create_delivery_location_log(
         tracking.route_geometry = geometry
     tracking.expected_delivery_at = datetime.utcnow() + timedelta(seconds=duration)
 
-    db.commit()
+    deferred = location_write_buffer.defer(
+        db,
+        order=order,
+        tracking=tracking,
+        delivery_user_id=int(current_user.id),
+        latitude=payload.lat,
+        longitude=payload.lng,
+        log=True,
+    )
+    if not deferred:
+        _create_delivery_log(
+            db,
+            tenant_id=tenant_id,
+            order_id=order.id,
+            delivery_user_id=int(current_user.id),
+            event_type="location_update",
+            latitude=payload.lat,
+            longitude=payload.lng,
+        )
+        db.commit()
 
     await manager.broadcast(int(order.id), {
         "order_id": int(order.id),
@@ -747,44 +762,44 @@ async def create_delivery_location_log(
         "route_duration_seconds": tracking.route_duration_seconds,
         "expected_delivery_at": tracking.expected_delivery_at.isoformat() if tracking.expected_delivery_at else None,
         "route_geometry": tracking.route_geometry,
-    })
-
-    publish_delivery_location_event(
-        tenant_id=tenant_id,
-        delivery_user_id=int(current_user.id),
-        lat=payload.lat,
-        lng=payload.lng,
-        order_id=int(order.id),
-    )
+    }, droppable=True)
 
     current_status = (order.status or "").upper()
     status = _eta_status_from_remaining_seconds(eta_seconds)
-    if current_status in OUT_FOR_DELIVERY_STATUSES:
-        publish_public_tracking_event(
-            tenant_id=tenant_id,
-            order_id=int(order.id),
-            status=order.status,
-            delivery_user_name=getattr(current_user, "name", None),
-            lat=payload.lat,
-            lng=payload.lng,
-        )
-        publish_order_tracking_location_event(
+    with publish_batch():
+        publish_delivery_location_event(
             tenant_id=tenant_id,
-            order_id=int(order.id),
+            delivery_user_id=int(current_user.id),
             lat=payload.lat,
             lng=payload.lng,
-            remaining_seconds=eta_seconds,
-            distance_meters=distance_meters,
-        )
-        publish_order_tracking_eta_event(
-            tenant_id=tenant_id,
             order_id=int(order.id),
-            lat=payload.lat,
-            lng=payload.lng,
-            remaining_seconds=eta_seconds,
-            status=status,
-            schema_version=1,
         )
+        if current_status in OUT_FOR_DELIVERY_STATUSES:
+            publish_public_tracking_event(
+                tenant_id=tenant_id,
+                order_id=int(order.id),
+                status=order.status,
+                delivery_user_name=getattr(current_user, "name", None),
+                lat=payload.lat,
+                lng=payload.lng,
+            )
+            publish_order_tracking_location_event(
+                tenant_id=tenant_id,
+                order_id=int(order.id),
+                lat=payload.lat,
+                lng=payload.lng,
+                remaining_seconds=eta_seconds,
+                distance_meters=distance_meters,
+            )
+            publish_order_tracking_eta_event(
+                tenant_id=tenant_id,
+                order_id=int(order.id),
+                lat=payload.lat,
+                lng=payload.lng,
+                remaining_seconds=eta_seconds,
+                status=status,
+                schema_version=1,
+            )
 
     return {
         "ok": True,
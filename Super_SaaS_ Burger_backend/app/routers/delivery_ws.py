@@ -22,7 +22,11 @@ from app.services.auth import decode_access_token
 from app.services.tenant_resolver import TenantResolver
 from app.core.database import SessionLocal
 from app.models.admin_user import AdminUser
-from app.routers.driver_api import DriverLocationRejected, process_driver_location_update
+from app.routers.driver_api import (
+    DriverLocationRejected,
+    process_driver_location_batch,
+    process_driver_location_update,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["delivery-realtime"])
@@ -98,11 +102,16 @@ async def driver_location_updates_ws(websocket: WebSocket):
                 continue
 
             delivery_id = payload.get("delivery_id") if isinstance(payload, dict) else None
-            if not isinstance(payload, dict) or payload.get("type") != "driver_location_update":
+            frame_type = payload.get("type") if isinstance(payload, dict) else None
+            if frame_type not in {"driver_location_update", "driver_location_batch"}:
                 await websocket.send_json(_driver_rejection(delivery_id, "unknown_payload"))
                 continue
 
-            allowed = {"type", "delivery_id", "latitude", "longitude", "accuracy", "speed", "heading", "recorded_at"}
+            allowed = (
+                {"type", "delivery_id", "fixes"}
+                if frame_type == "driver_location_batch"
+                else {"type", "delivery_id", "latitude", "longitude", "accuracy", "speed", "heading", "recorded_at"}
+            )
             if any(key not in allowed for key in payload.keys()):
                 await websocket.send_json(_driver_rejection(delivery_id, "unknown_payload"))
                 continue
@@ -117,6 +126,25 @@ async def driver_location_updates_ws(websocket: WebSocket):
                     await websocket.send_json(_driver_rejection(delivery_id, "driver_not_found"))
                     continue
 
+                if frame_type == "driver_location_batch":
+                    if not isinstance(payload.get("fixes"), list):
+                        raise ValueError("fixes ausente")
+                    result = await process_driver_location_batch(
+                        authenticated_driver=driver,
+                        db=db,
+                        delivery_id=int(payload["delivery_id"]),
+                        fixes=payload["fixes"],
+                    )
+                    await websocket.send_json({
+                        "type": "driver_location_batch_ack",
+                        "delivery_id": result["delivery_id"],
+                        "accepted": result["accepted"],
+                        "duplicates": result["duplicates"],
+                        "rejected": result["rejected"],
+                        "server_time": datetime.now(timezone.utc).isoformat(),
+                    })
+                    continue
+
                 result = await process_driver_location_update(
                     authenticated_driver=driver,
                     db=db,
@@ -165,8 +193,11 @@ async def delivery_ws(websocket: WebSocket):
         return
 
     await websocket.accept()
-    await delivery_connections.set(tenant_id, delivery_user_id, websocket)
-    publish_delivery_status_event(tenant_id=tenant_id, delivery_user_id=delivery_user_id, status="online")
+    # vários aparelhos por entregador: online no primeiro, offline quando o último sai
+    first_device = not delivery_connections.has(tenant_id, delivery_user_id)
+    await delivery_connections.add(tenant_id, delivery_user_id, websocket)
+    if first_device:
+        publish_delivery_status_event(tenant_id=tenant_id, delivery_user_id=delivery_user_id, status="online")
 
     try:
         while True:
@@ -178,8 +209,9 @@ async def delivery_ws(websocket: WebSocket):
             delivery_user_id,
         )
     finally:
-        await delivery_connections.remove(tenant_id, delivery_user_id, websocket)
-        publish_delivery_status_event(tenant_id=tenant_id, delivery_user_id=delivery_user_id, status="offline")
+        if delivery_connections.discard(tenant_id, delivery_user_id, websocket):
+            publish_delivery_status_event(tenant_id=tenant_id, delivery_user_id=delivery_user_id, status="offline")
+            await delivery_connections.clear_presence(tenant_id, delivery_user_id)
 
 
 @router.websocket("/ws/delivery/location")
@@ -355,10 +387,7 @@ async def admin_delivery_status_ws(websocket: WebSocket):
             if message is None:
                 continue
 
-            raw_payload = message.get("data")
-            payload_text = raw_payload.decode() if isinstance(raw_payload, bytes) else str(raw_payload)
-
-            payload_data = parse_delivery_envelope(payload_text, expected_tenant_id=tenant_id)
+            payload_data = parse_delivery_envelope(message.get("data"), expected_tenant_id=tenant_id)
             if payload_data is None:
                 continue
 
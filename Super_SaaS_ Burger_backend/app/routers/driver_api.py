@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import os
 import traceback
 from datetime import datetime, timezone, timedelta
 from typing import Any
@@ -19,10 +20,16 @@ from app.models.delivery_tracking import DeliveryTracking
 from app.models.order import Order
 from app.services.geocoding_service import geocode_address
 from app.services.auth import create_access_token
-from app.realtime.publisher import publish_delivery_driver_location_event, publish_public_tracking_event
+from app.realtime.publisher import (
+    publish_batch,
+    publish_delivery_driver_location_event,
+    publish_public_tracking_event,
+)
 from app.integrations.redis_client import get_async_redis_client
 from app.services.order_events import emit_order_status_changed
 from app.services.directions_service import get_route_metrics_with_fallback
+from app.services.driver_locations import record_driver_location
+from app.services.location_writer import insert_location_track, location_write_buffer
 from app.modules.tracking.service import save_delivery_location, save_delivery_total_distance
 from app.services.passwords import verify_password
 
@@ -34,6 +41,11 @@ DRIVER_ASSIGNED_STATUSES = {"DRIVER_ASSIGNED"}
 OUT_FOR_DELIVERY_STATUSES = {"OUT_FOR_DELIVERY", "SAIU", "SAIU_PARA_ENTREGA"}
 DELIVERED_STATUSES = {"DELIVERED", "ENTREGUE"}
 
+DRIVER_LOCATION_BATCH_MAX = int(os.getenv("DRIVER_LOCATION_BATCH_MAX", "500"))
+# fixes guardados offline podem ser antigos; só o mais recente (até 1h) vai para o tempo real
+DRIVER_LOCATION_BATCH_MAX_AGE_HOURS = int(os.getenv("DRIVER_LOCATION_BATCH_MAX_AGE_HOURS", "12"))
+REALTIME_MAX_AGE = timedelta(hours=1)
+
 
 class DriverLoginPayload(BaseModel):
     email: EmailStr
@@ -46,6 +58,11 @@ class DriverLocationPayload(BaseModel):
     lng: float = Field(validation_alias=AliasChoices("lng", "longitude"))
 
 
+class DriverLocationBatchPayload(BaseModel):
+    delivery_id: int | None = Field(default=None, validation_alias=AliasChoices("delivery_id", "order_id"))
+    fixes: list[dict[str, Any]] = Field(..., min_length=1, max_length=DRIVER_LOCATION_BATCH_MAX)
+
+
 class DriverLocationRejected(Exception):
     def __init__(self, reason: str, status_code: int = 422):
         super().__init__(reason)
@@ -237,6 +254,33 @@ async def _store_total_delivery_distance(order: Order, driver_lat: float | None,
     return total_distance_km
 
 
+def _ensure_driver_role(driver: AdminUser) -> None:
+    role = str(getattr(driver, "role", "")).upper()
+    if role not in {"DELIVERY", "DRIVER"}:
+        raise DriverLocationRejected("unauthorized_role", status_code=403)
+
+
+def _parse_recorded_at(value: Any) -> datetime | None:
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _get_trackable_order(db: Session, *, tenant_id: int, driver_id: int, delivery_id: int) -> Order:
+    order = db.query(Order).filter(Order.id == int(delivery_id), Order.tenant_id == tenant_id).first()
+    if order is None:
+        raise DriverLocationRejected("delivery_not_found", status_code=404)
+    if int(order.assigned_delivery_user_id or 0) != driver_id:
+        raise DriverLocationRejected("delivery_not_assigned", status_code=409)
+    if (order.status or "").upper() not in (DRIVER_ASSIGNED_STATUSES | OUT_FOR_DELIVERY_STATUSES):
+        raise DriverLocationRejected("delivery_not_trackable", status_code=409)
+    return order
+
+
 async def process_driver_location_update(
     *,
     authenticated_driver: AdminUser,
@@ -252,9 +296,7 @@ async def process_driver_location_update(
 ) -> dict[str, Any]:
     tenant_id = int(authenticated_driver.tenant_id)
     driver_id = int(authenticated_driver.id)
-    role = str(getattr(authenticated_driver, "role", "")).upper()
-    if role not in {"DELIVERY", "DRIVER"}:
-        raise DriverLocationRejected("unauthorized_role", status_code=403)
+    _ensure_driver_role(authenticated_driver)
     if not _coordinates_are_valid(latitude, longitude):
         raise DriverLocationRejected("invalid_coordinates")
     if accuracy is not None and (accuracy < 0 or accuracy > 10000):
@@ -262,23 +304,12 @@ async def process_driver_location_update(
 
     parsed_recorded_at = None
     if recorded_at:
-        try:
-            parsed_recorded_at = datetime.fromisoformat(str(recorded_at).replace("Z", "+00:00"))
-        except ValueError as exc:
-            raise DriverLocationRejected("invalid_timestamp") from exc
+        parsed_recorded_at = _parse_recorded_at(recorded_at)
         now = datetime.now(timezone.utc)
-        if parsed_recorded_at.tzinfo is None:
-            parsed_recorded_at = parsed_recorded_at.replace(tzinfo=timezone.utc)
-        if parsed_recorded_at < now - timedelta(hours=1) or parsed_recorded_at > now + timedelta(minutes=5):
+        if parsed_recorded_at is None or not now - REALTIME_MAX_AGE <= parsed_recorded_at <= now + timedelta(minutes=5):
             raise DriverLocationRejected("invalid_timestamp")
 
-    order = db.query(Order).filter(Order.id == int(delivery_id), Order.tenant_id == tenant_id).first()
-    if order is None:
-        raise DriverLocationRejected("delivery_not_found", status_code=404)
-    if int(order.assigned_delivery_user_id or 0) != driver_id:
-        raise DriverLocationRejected("delivery_not_assigned", status_code=409)
-    if (order.status or "").upper() not in (DRIVER_ASSIGNED_STATUSES | OUT_FOR_DELIVERY_STATUSES):
-        raise DriverLocationRejected("delivery_not_trackable", status_code=409)
+    order = _get_trackable_order(db, tenant_id=tenant_id, driver_id=driver_id, delivery_id=delivery_id)
 
     redis = get_async_redis_client()
     try:
@@ -310,7 +341,27 @@ async def process_driver_location_update(
         progress = 0.0
         if (order.status or "").upper() in OUT_FOR_DELIVERY_STATUSES:
             distance_meters, duration_seconds, progress = await _recalculate_tracking_metrics(order, tracking)
-        db.commit()
+        deferred = location_write_buffer.defer(
+            db,
+            order=order,
+            tracking=tracking,
+            delivery_user_id=driver_id,
+            latitude=float(latitude),
+            longitude=float(longitude),
+            recorded_at=parsed_recorded_at,
+            update_order=True,
+        )
+        if not deferred:
+            record_driver_location(
+                db,
+                tenant_id=tenant_id,
+                delivery_user_id=driver_id,
+                order_id=int(order.id),
+                latitude=float(latitude),
+                longitude=float(longitude),
+                recorded_at=parsed_recorded_at,
+            )
+            db.commit()
 
         location_payload = await save_delivery_location(
             redis,
@@ -328,21 +379,22 @@ async def process_driver_location_update(
         if redis is not None:
             await redis.aclose()
 
-    publish_delivery_driver_location_event(tenant_id=tenant_id, driver_id=driver_id, order_id=int(order.id), lat=latitude, lng=longitude)
-    if (order.status or "").upper() in OUT_FOR_DELIVERY_STATUSES:
-        publish_public_tracking_event(
-            tenant_id=tenant_id,
-            order_id=int(order.id),
-            status=order.status,
-            delivery_user_name=getattr(authenticated_driver, "name", None),
-            lat=latitude,
-            lng=longitude,
-            distance_meters=distance_meters,
-            duration_seconds=duration_seconds,
-            initial_distance_meters=getattr(tracking, "initial_distance_meters", None),
-            progress=progress,
-            updated_at=location_payload.get("updated_at") if isinstance(location_payload, dict) else None,
-        )
+    with publish_batch():
+        publish_delivery_driver_location_event(tenant_id=tenant_id, driver_id=driver_id, order_id=int(order.id), lat=latitude, lng=longitude)
+        if (order.status or "").upper() in OUT_FOR_DELIVERY_STATUSES:
+            publish_public_tracking_event(
+                tenant_id=tenant_id,
+                order_id=int(order.id),
+                status=order.status,
+                delivery_user_name=getattr(authenticated_driver, "name", None),
+                lat=latitude,
+                lng=longitude,
+                distance_meters=distance_meters,
+                duration_seconds=duration_seconds,
+                initial_distance_meters=getattr(tracking, "initial_distance_meters", None),
+                progress=progress,
+                updated_at=location_payload.get("updated_at") if isinstance(location_payload, dict) else None,
+            )
 
     return {
         "ok": True,
@@ -357,6 +409,130 @@ async def process_driver_location_update(
     }
 
 
+def _validate_location_fixes(
+    fixes: list[dict[str, Any]],
+    now: datetime,
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]], int]:
+    """Valida o lote numa passada só: devolve os fixes aceitos (ordenados, sem recorded_at repetido),
+    as rejeições por índice e quantos duplicados foram descartados."""
+    oldest_allowed = now - timedelta(hours=DRIVER_LOCATION_BATCH_MAX_AGE_HOURS)
+    newest_allowed = now + timedelta(minutes=5)
+    accepted: dict[datetime, dict[str, Any]] = {}
+    rejected: list[dict[str, Any]] = []
+    duplicates = 0
+    for index, fix in enumerate(fixes):
+        try:
+            lat = float(fix["latitude"] if fix.get("latitude") is not None else fix["lat"])
+            lng = float(fix["longitude"] if fix.get("longitude") is not None else fix["lng"])
+            accuracy = float(fix["accuracy"]) if fix.get("accuracy") is not None else None
+            speed = float(fix["speed"]) if fix.get("speed") is not None else None
+            heading = float(fix["heading"]) if fix.get("heading") is not None else None
+        except (KeyError, TypeError, ValueError):
+            rejected.append({"index": index, "reason": "invalid_payload"})
+            continue
+        if not _coordinates_are_valid(lat, lng):
+            rejected.append({"index": index, "reason": "invalid_coordinates"})
+            continue
+        if accuracy is not None and (accuracy < 0 or accuracy > 10000):
+            rejected.append({"index": index, "reason": "invalid_accuracy"})
+            continue
+        recorded_at = _parse_recorded_at(fix["recorded_at"]) if fix.get("recorded_at") else None
+        if recorded_at is None or not oldest_allowed <= recorded_at <= newest_allowed:
+            rejected.append({"index": index, "reason": "invalid_timestamp"})
+            continue
+        if recorded_at in accepted:
+            duplicates += 1
+            continue
+        accepted[recorded_at] = {
+            "lat": lat,
+            "lng": lng,
+            "accuracy": accuracy,
+            "speed": speed,
+            "heading": heading,
+            "recorded_at": recorded_at,
+        }
+    return [accepted[key] for key in sorted(accepted)], rejected, duplicates
+
+
+async def process_driver_location_batch(
+    *,
+    authenticated_driver: AdminUser,
+    db: Session,
+    delivery_id: int,
+    fixes: list[dict[str, Any]],
+) -> dict[str, Any]:
+    """Ingere uma fila de fixes offline: trilha inteira num INSERT em lote e só o último fix no tempo real."""
+    tenant_id = int(authenticated_driver.tenant_id)
+    driver_id = int(authenticated_driver.id)
+    _ensure_driver_role(authenticated_driver)
+    if len(fixes) > DRIVER_LOCATION_BATCH_MAX:
+        raise DriverLocationRejected("batch_too_large", status_code=413)
+
+    order = _get_trackable_order(db, tenant_id=tenant_id, driver_id=driver_id, delivery_id=delivery_id)
+
+    # o lote conta como um ping na janela do throttle; o último fix sai sem checar de novo
+    redis = get_async_redis_client()
+    if redis is not None:
+        try:
+            from app.modules.tracking.service import can_accept_location_update
+            if not await can_accept_location_update(redis, int(order.id), driver_id):
+                raise DriverLocationRejected("rate_limited", status_code=429)
+        finally:
+            await redis.aclose()
+
+    now = datetime.now(timezone.utc)
+    accepted, rejected, duplicates = _validate_location_fixes(fixes, now)
+
+    stored = 0
+    if accepted:
+        stored = insert_location_track(
+            db.connection(),
+            [
+                {
+                    "tenant_id": tenant_id,
+                    "order_id": int(order.id),
+                    "delivery_user_id": driver_id,
+                    "lat": fix["lat"],
+                    "lng": fix["lng"],
+                    "recorded_at": fix["recorded_at"],
+                }
+                for fix in accepted
+            ],
+        )
+        db.commit()
+
+    latest_result = None
+    latest = accepted[-1] if accepted else None
+    if latest is not None and latest["recorded_at"] >= now - REALTIME_MAX_AGE:
+        try:
+            latest_result = await process_driver_location_update(
+                authenticated_driver=authenticated_driver,
+                db=db,
+                delivery_id=int(order.id),
+                latitude=latest["lat"],
+                longitude=latest["lng"],
+                accuracy=latest["accuracy"],
+                speed=latest["speed"],
+                heading=latest["heading"],
+                recorded_at=latest["recorded_at"].isoformat(),
+                enforce_rate_limit=False,
+            )
+        except DriverLocationRejected as exc:
+            logger.info("driver location batch latest fix not published delivery_id=%s reason=%s", order.id, exc.reason)
+
+    return {
+        "ok": True,
+        "success": True,
+        "delivery_id": int(order.id),
+        "received": len(fixes),
+        "accepted": len(accepted),
+        "duplicates": duplicates,
+        "stored": stored,
+        "rejected": rejected,
+        "latest": latest_result,
+    }
+
+
 def _build_order_address(order: Order) -> str:
     delivery_address = getattr(order, "delivery_address_json", None)
     delivery_address = delivery_address if isinstance(delivery_address, dict) else {}
@@ -447,7 +623,7 @@ def get_driver_state(
         .filter(
             Order.tenant_id == tenant_id,
             Order.assigned_delivery_user_id == driver_id,
-            func.upper(Order.status).in_(DRIVER_ASSIGNED_STATUSES | OUT_FOR_DELIVERY_STATUSES),
+            Order.status.in_(DRIVER_ASSIGNED_STATUSES | OUT_FOR_DELIVERY_STATUSES),
         )
         .order_by(desc(Order.created_at), desc(Order.id))
         .first()
@@ -463,7 +639,7 @@ def get_driver_state(
         .filter(
             Order.tenant_id == tenant_id,
             Order.assigned_delivery_user_id == driver_id,
-            ~func.upper(Order.status).in_(DELIVERED_STATUSES | {"CANCELLED"}),
+            ~Order.status.in_(DELIVERED_STATUSES | {"CANCELLED"}),
         )
         .order_by(desc(Order.created_at), desc(Order.id))
         .all()
@@ -475,7 +651,7 @@ def get_driver_state(
         .filter(
             Order.tenant_id == tenant_id,
             Order.assigned_delivery_user_id == driver_id,
-            func.upper(Order.status).in_(DELIVERED_STATUSES),
+            Order.status.in_(DELIVERED_STATUSES),
             Order.created_at >= today_start,
         )
         .scalar()
@@ -486,7 +662,7 @@ def get_driver_state(
         db.query(Order)
         .filter(
             Order.tenant_id == tenant_id,
-            func.upper(Order.status).in_(READY_FOR_DELIVERY_STATUSES),
+            Order.status.in_(READY_FOR_DELIVERY_STATUSES),
             Order.assigned_delivery_user_id.is_(None),
         )
         .order_by(desc(Order.created_at), desc(Order.id))
@@ -544,7 +720,7 @@ def accept_order(
             Order.id == int(order_id),
             Order.tenant_id == tenant_id,
             Order.assigned_delivery_user_id.is_(None),
-            func.upper(Order.status).in_(READY_FOR_DELIVERY_STATUSES),
+            Order.status.in_(READY_FOR_DELIVERY_STATUSES),
         )
         .values(assigned_delivery_user_id=driver_id, status="DRIVER_ASSIGNED")
     )
@@ -744,6 +920,28 @@ async def update_driver_location(
         )
 
 
+@router.post("/location/batch")
+@router.post("/deliveries/{path_delivery_id}/locations")
+async def upload_driver_location_batch(
+    payload: DriverLocationBatchPayload,
+    path_delivery_id: int | None = None,
+    db: Session = Depends(get_db),
+    current_driver: AdminUser = Depends(get_current_delivery_user),
+):
+    delivery_id = path_delivery_id or payload.delivery_id
+    if not delivery_id:
+        raise HTTPException(status_code=400, detail="Missing location data")
+    try:
+        return await process_driver_location_batch(
+            authenticated_driver=current_driver,
+            db=db,
+            delivery_id=int(delivery_id),
+            fixes=payload.fixes,
+        )
+    except DriverLocationRejected as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.reason) from exc
+
+
 @router.get("/live-map/{order_id}")
 def get_live_map(
     order_id: int,
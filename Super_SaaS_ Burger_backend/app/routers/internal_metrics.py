@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Depends
 
-from app.core.metrics import request_metrics
+from app.core.metrics import realtime_outbound_metrics, request_metrics
 from app.deps import require_role
 from app.models.admin_user import AdminUser
 
@@ -12,3 +12,9 @@ router = APIRouter(prefix="/internal/metrics", tags=["internal-metrics"])
 @router.get("/tenants")
 def tenant_metrics(_user: AdminUser = Depends(require_role(["admin"]))):
     return {"tenants": request_metrics.snapshot_per_tenant()}
+
+
+@router.get("/realtime")
+def realtime_metrics(_user: AdminUser = Depends(require_role(["admin"]))):
+    # por worker: cada processo responde com as próprias filas
+    return {"transports": realtime_outbound_metrics.snapshot()}
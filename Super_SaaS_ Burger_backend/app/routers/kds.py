@@ -1,29 +1,33 @@
 from __future__ import annotations
 
+import asyncio
 import json
 from datetime import datetime, timezone
 from typing import Any, Dict, List
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from fastapi.responses import HTMLResponse
-from sqlalchemy import desc, func
+from fastapi.responses import HTMLResponse, StreamingResponse
+from sqlalchemy import desc
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.core.production import normalize_production_area
 from app.deps import get_request_tenant_id, get_current_admin_user_ui, require_admin_tenant_access, require_admin_user
+from app.integrations.redis_client import get_async_redis_client
 from app.models.admin_user import AdminUser
 from app.models.menu_item import MenuItem
 from app.models.modifier_group import ModifierGroup
 from app.models.modifier_option import ModifierOption
 from app.models.order import Order
 from app.models.order_item import OrderItem
+from app.realtime.event_streams import kds_stream, latest_stream_id, parse_stream_id, read_stream_after, read_stream_blocking
 from app.services.admin_audit import log_admin_action
 from app.services.order_events import emit_order_status_changed
 
 router = APIRouter(tags=["kds"])
 
-ACTIVE_STATUSES = {"pending", "preparing"}
+ACTIVE_STATUSES = {"PENDING", "PREPARING"}
+KDS_STREAM_KEEPALIVE_SECONDS = 15.0
 
 def _normalize_area(area: str) -> str:
     try:
@@ -137,7 +141,7 @@ def list_kds_orders(
         .filter(
             Order.tenant_id == tenant_id,
             OrderItem.production_area == area,
-            func.lower(Order.status).in_(ACTIVE_STATUSES),
+            Order.status.in_(ACTIVE_STATUSES),
         )
         .order_by(desc(Order.created_at))
         .distinct()
@@ -267,6 +271,75 @@ def list_kds_orders(
     return response
 
 
+def _kds_stream_frame(event_id: str, data: bytes) -> str:
+    try:
+        payload = json.loads(data)
+    except (TypeError, UnicodeDecodeError, json.JSONDecodeError):
+        payload = None
+    event_type = payload.get("type") if isinstance(payload, dict) else None
+    body = data.decode() if isinstance(data, bytes) else str(data)
+    return f"id: {event_id}\nevent: {event_type or 'message'}\ndata: {body}\n\n"
+
+
+@router.get("/api/kds/stream")
+async def stream_kds_events(
+    request: Request,
+    tenant_id: int = Depends(get_request_tenant_id),
+    user: AdminUser = Depends(require_admin_user),
+):
+    require_admin_tenant_access(request=request, tenant_id=tenant_id, user=user)
+    stream_key = kds_stream(tenant_id).key
+    last_event_id = request.headers.get("last-event-id")
+
+    async def event_generator():
+        redis = get_async_redis_client()
+        if redis is None:
+            while not await request.is_disconnected():
+                yield ": keep-alive\n\n"
+                await asyncio.sleep(KDS_STREAM_KEEPALIVE_SECONDS)
+            return
+
+        try:
+            missed = None
+            if parse_stream_id(last_event_id) is not None:
+                missed = await read_stream_after(redis, stream_key, last_event_id)
+            if missed is None:
+                # primeira conexão ou histórico já aparado: o KDS recarrega /api/kds/orders e segue daqui
+                cursor = await latest_stream_id(redis, stream_key)
+                event_type = "kds.resync" if last_event_id else "kds.ready"
+                yield f"id: {cursor}\nevent: {event_type}\ndata: {{}}\n\n"
+            else:
+                cursor = last_event_id
+                if missed:
+                    cursor = missed[-1][0]
+                    yield "".join(_kds_stream_frame(entry_id, data) for entry_id, data in missed)
+
+            while not await request.is_disconnected():
+                entries = await read_stream_blocking(
+                    redis,
+                    stream_key,
+                    cursor,
+                    block_ms=int(KDS_STREAM_KEEPALIVE_SECONDS * 1000),
+                )
+                if not entries:
+                    yield ": keep-alive\n\n"
+                    continue
+                cursor = entries[-1][0]
+                yield "".join(_kds_stream_frame(entry_id, data) for entry_id, data in entries)
+        finally:
+            await redis.aclose()
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.post("/api/kds/orders/{order_id}/start")
 def start_kds_order(
     request: Request,
@@ -678,6 +751,11 @@ async function readyOrder(orderId) {{
 
 loadOrders();
 setInterval(loadOrders, 5000);
+
+if (window.EventSource) {{
+  const events = new EventSource(`/api/kds/stream?tenant_id=${{TENANT_ID}}`);
+  ['order.created', 'order.status.changed', 'kds.resync'].forEach(type => events.addEventListener(type, loadOrders));
+}}
 </script>
 </body>
 </html>
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request, Response
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from datetime import datetime, timezone
+from sqlalchemy import and_, desc, or_
+from datetime import date, datetime, time, timedelta, timezone
 import uuid
 import asyncio
 import json
@@ -19,6 +19,7 @@ from app.services.delivery_service import sync_driver_status_by_active_orders
 from app.services.loyalty import award_points_for_completed_order
 from app.services.geocoding_service import geocode_address
 from app.services.public_tracking import ensure_order_tracking_token
+from app.services.keyset import decode_cursor, encode_cursor
 from app.deps import get_request_tenant_id, require_admin_tenant_access, require_admin_user
 from app.models.admin_user import AdminUser
 
@@ -27,6 +28,7 @@ router = APIRouter(prefix="/api", tags=["orders"])
 READY_STATUSES = {"READY", "PRONTO"}
 OUT_FOR_DELIVERY_STATUSES = {"OUT_FOR_DELIVERY", "SAIU", "SAIU_PARA_ENTREGA"}
 DELIVERED_STATUSES = {"DELIVERED", "ENTREGUE"}
+ORDER_LIST_DEFAULT_LIMIT = 100
 
 
 def _resolve_order_type(order_type: Optional[str], tipo_entrega: Optional[str]) -> str:
@@ -127,21 +129,117 @@ def _order_item_to_dict(item: OrderItem) -> Dict[str, Any]:
     }
 
 
+def _order_summary_to_dict(row: Any) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "daily_order_number": row.daily_order_number,
+        "tenant_id": row.tenant_id,
+        "customer_name": row.customer_name or row.cliente_nome,
+        "customer_phone": row.customer_phone or row.cliente_telefone,
+        "status": row.status,
+        "order_type": row.order_type,
+        "channel": row.channel,
+        "forma_pagamento": row.forma_pagamento,
+        "table_number": row.table_number,
+        "valor_total": row.valor_total,
+        "total_cents": row.total_cents,
+        "ready_at": row.ready_at.isoformat() if row.ready_at else None,
+        "start_delivery_at": row.start_delivery_at.isoformat() if row.start_delivery_at else None,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+# projeção da view=summary: sem itens, endereço e observações (colunas de texto grandes)
+ORDER_SUMMARY_COLUMNS = (
+    Order.id,
+    Order.daily_order_number,
+    Order.tenant_id,
+    Order.customer_name,
+    Order.cliente_nome,
+    Order.customer_phone,
+    Order.cliente_telefone,
+    Order.status,
+    Order.order_type,
+    Order.channel,
+    Order.forma_pagamento,
+    Order.table_number,
+    Order.valor_total,
+    Order.total_cents,
+    Order.ready_at,
+    Order.start_delivery_at,
+    Order.created_at,
+)
+
+
+def _parse_list_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Data inválida") from exc
+
+
 @router.get("/orders/{tenant_id}")
 def list_orders(
     request: Request,
+    response: Response,
     tenant_id: int,
+    status: Optional[str] = None,
+    channel: Optional[str] = None,
+    order_type: Optional[str] = Query(default=None, pattern="^(delivery|pickup|table)$"),
+    from_date: Optional[str] = Query(default=None, alias="from"),
+    to_date: Optional[str] = Query(default=None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=500),
+    view: str = Query(default="full", pattern="^(full|summary)$"),
     db: Session = Depends(get_db),
     user: AdminUser = Depends(require_admin_user),
 ):
+    """Pedidos do tenant, mais recentes primeiro, paginados por (created_at, id).
+
+    Com `cursor` ou `limit` a resposta é paginada (limite padrão 100) e a próxima página vem no
+    header X-Next-Cursor, ausente na última. Sem eles devolve a lista inteira, como antes.
+    """
     require_admin_tenant_access(request=request, tenant_id=tenant_id, user=user)
-    orders = (
-        db.query(Order)
-        .filter(Order.tenant_id == tenant_id)
-        .order_by(desc(Order.created_at))
-        .all()
-    )
-    return [_order_to_dict(o) for o in orders]
+
+    query = db.query(*ORDER_SUMMARY_COLUMNS) if view == "summary" else db.query(Order)
+    query = query.filter(Order.tenant_id == tenant_id)
+
+    if status:
+        statuses = [s.strip().upper() for s in status.split(",") if s.strip()]
+        if statuses:
+            query = query.filter(Order.status.in_(statuses))
+    if channel:
+        query = query.filter(Order.channel == channel.strip())
+    if order_type:
+        query = query.filter(Order.order_type == order_type)
+    if from_date:
+        query = query.filter(Order.created_at >= datetime.combine(_parse_list_date(from_date), time.min))
+    if to_date:
+        next_day = _parse_list_date(to_date) + timedelta(days=1)
+        query = query.filter(Order.created_at < datetime.combine(next_day, time.min))
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor, datetime, int)
+        query = query.filter(
+            or_(
+                Order.created_at < cursor_created_at,
+                and_(Order.created_at == cursor_created_at, Order.id < cursor_id),
+            )
+        )
+
+    query = query.order_by(desc(Order.created_at), desc(Order.id))
+    if cursor is None and limit is None:
+        rows = query.all()
+    else:
+        page_size = limit or ORDER_LIST_DEFAULT_LIMIT
+        rows = query.limit(page_size + 1).all()
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    if view == "summary":
+        return [_order_summary_to_dict(row) for row in rows]
+    return [_order_to_dict(o) for o in rows]
 
 
 class OrderItem(BaseModel):
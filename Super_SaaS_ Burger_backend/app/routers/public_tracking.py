@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 import asyncio
 import json
 import logging
+from typing import Any, Callable
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
@@ -16,8 +17,9 @@ from app.models.order_item import OrderItem
 from app.models.order import Order
 from app.models.tenant import Tenant
 from app.models.tenant_public_settings import TenantPublicSettings
+from app.realtime.coalescer import REALTIME_PUBLIC_COALESCE_SECONDS, CoalescingHub, render_frame
 from app.realtime.delivery_envelope import parse_delivery_envelope
-from app.realtime.publisher import order_tracking_channel
+from app.realtime.event_streams import latest_stream_id, order_tracking_stream, parse_stream_id, read_stream_after
 from app.services.directions_service import (
     get_route_data,
     get_route_metrics_with_fallback,
@@ -29,6 +31,9 @@ from app.modules.tracking.service import get_delivery_location
 router = APIRouter(tags=["public-tracking"])
 logger = logging.getLogger(__name__)
 
+PUBLIC_TRACKING_KEEPALIVE_SECONDS = 15.0
+KEEPALIVE_FRAME = b": keep-alive\n\n"
+
 NO_CACHE_HEADERS = {
     "Cache-Control": "no-cache, no-store, must-revalidate",
     "Pragma": "no-cache",
@@ -39,18 +44,22 @@ STATUS_NORMALIZE = {
     "RECEBIDO": "pending",
     "recebido": "pending",
     "pending": "pending",
+    "PENDING": "pending",
     "EM_PREPARO": "preparing",
     "em_preparo": "preparing",
     "preparing": "preparing",
+    "PREPARING": "preparing",
     "PRONTO": "ready",
     "pronto": "ready",
     "ready": "ready",
+    "READY": "ready",
     "SAIU": "delivering",
     "OUT_FOR_DELIVERY": "delivering",
     "out_for_delivery": "delivering",
     "SAIU_PARA_ENTREGA": "delivering",
     "saiu_para_entrega": "delivering",
     "delivering": "delivering",
+    "DELIVERING": "delivering",
     "DELIVERED": "delivered",
     "delivered": "delivered",
     "ENTREGUE": "delivered",
@@ -561,153 +570,150 @@ def get_public_order_tracking(tracking_token: str, request: Request, db: Session
 
 
 
+def _render_public_tracking_frame(payload: dict) -> bytes:
+    data = json.dumps(payload)
+    if payload.get("driver_lat") is None or payload.get("driver_lng") is None:
+        return f"event: tracking_update\ndata: {data}\n\n".encode()
+    return f"event: tracking_update\ndata: {data}\n\nevent: driver_update\ndata: {data}\n\n".encode()
+
+
+def _public_tracking_extractor(tenant_id: int, order_id: int) -> Callable[[Any], tuple[int, dict] | None]:
+    def _extract(raw_payload: Any) -> tuple[int, dict] | None:
+        payload_data = parse_delivery_envelope(raw_payload, expected_tenant_id=tenant_id)
+        if payload_data is None:
+            return None
+        normalized_payload = _build_public_tracking_event(payload_data)
+        if normalized_payload is None:
+            return None
+        # mudança de status (order status path) também acorda o cliente, mesmo sem posição do entregador
+        has_location = normalized_payload.get("driver_lat") is not None and normalized_payload.get("driver_lng") is not None
+        if not has_location and "status" not in normalized_payload:
+            return None
+        normalized_payload.setdefault("event", "tracking_update")
+        return order_id, normalized_payload
+
+    return _extract
+
+
+public_tracking_hub = CoalescingHub(
+    window_seconds=REALTIME_PUBLIC_COALESCE_SECONDS,
+    render=_render_public_tracking_frame,
+    stream=True,
+    client_factory=lambda: get_async_redis_client(),
+)
+
+
+async def _latest_tracking_event_id(redis, stream_key: str) -> str | None:
+    if redis is None:
+        return None
+    try:
+        return await latest_stream_id(redis, stream_key)
+    except Exception:
+        logger.warning("Failed to read tracking stream cursor key=%s", stream_key, exc_info=True)
+        return None
+
+
+def _fold_tracking_replay(entries: list[tuple[str, bytes]], tenant_id: int, order_id: int) -> dict:
+    """Junta os eventos perdidos num único estado (os eventos de rastreio são cumulativos)."""
+    extract = _public_tracking_extractor(tenant_id, order_id)
+    state: dict = {}
+    for _entry_id, data in entries:
+        extracted = extract(data)
+        if extracted is not None:
+            state.update(extracted[1])
+    return state
+
+
+async def _load_public_tracking_snapshot(order_id: int) -> dict | None:
+    db = SessionLocal()
+    try:
+        order = db.get(Order, order_id)
+        if order is None:
+            return None
+        return await _build_public_tracking_snapshot_async(db, order)
+    finally:
+        db.close()
+
+
 @router.get("/public/tracking/{tracking_token}", include_in_schema=False)
 @router.get("/api/public/tracking/{tracking_token}")
 @router.get("/public/sse/{tracking_token}", include_in_schema=False)
 @router.get("/api/public/sse/{tracking_token}")
 async def sse_public_tracking(tracking_token: str, request: Request):
+    # reconexão com Last-Event-ID: só os eventos perdidos saem do Redis Stream, sem snapshot (DB + Directions)
+    last_event_id = request.headers.get("last-event-id")
+    redis = get_async_redis_client()
+    initial_payload = None
     db = SessionLocal()
     try:
         order = _resolve_public_tracking_order(db, tracking_token, request)
         tenant_id = int(order.tenant_id)
         order_id = int(order.id)
-        initial_payload = await _build_public_tracking_snapshot_async(db, order)
+        stream_key = order_tracking_stream(tenant_id, order_id).key
+        if redis is None or parse_stream_id(last_event_id) is None:
+            # cursor lido antes do snapshot: o que chegar durante a montagem vem no catch-up
+            last_event_id = await _latest_tracking_event_id(redis, stream_key)
+            initial_payload = await _build_public_tracking_snapshot_async(db, order)
     except TrackingNotFound as exc:
+        if redis is not None:
+            await redis.aclose()
         raise HTTPException(status_code=404, detail="Rastreamento não encontrado") from exc
     finally:
         db.close()
 
+    def _tracking_frame(payload: dict, event_id: str | None, *, require_location: bool = True) -> bytes | None:
+        payload.setdefault("event", "tracking_update")
+        if require_location and (payload.get("driver_lat") is None or payload.get("driver_lng") is None):
+            return None
+        return render_frame(_render_public_tracking_frame, payload, event_id).data
+
     async def event_generator():
-        initial_payload.setdefault("event", "tracking_update")
-        if initial_payload.get("driver_lat") is not None and initial_payload.get("driver_lng") is not None:
-            logger.info(
-                "public_tracking_update %s",
-                {
-                    "driver_lat": initial_payload.get("driver_lat"),
-                    "driver_lng": initial_payload.get("driver_lng"),
-                    "distance_meters": initial_payload.get("distance_meters"),
-                    "duration_seconds": initial_payload.get("duration_seconds"),
-                    "progress": initial_payload.get("progress"),
-                },
-            )
-            yield f"event: tracking_update\ndata: {json.dumps(initial_payload)}\n\n"
-            yield f"event: driver_update\ndata: {json.dumps(initial_payload)}\n\n"
-
-        redis = get_async_redis_client()
-        pubsub = redis.pubsub() if redis is not None else None
-        last_progress_payload = {
-            "progress": initial_payload.get("progress"),
-            "distance_meters": initial_payload.get("distance_meters"),
-            "duration_seconds": initial_payload.get("duration_seconds"),
-            "driver_lat": initial_payload.get("driver_lat"),
-            "driver_lng": initial_payload.get("driver_lng"),
-            "destination_lat": initial_payload.get("destination_lat"),
-            "destination_lng": initial_payload.get("destination_lng"),
-            "initial_distance_meters": initial_payload.get("initial_distance_meters"),
-            "last_location": initial_payload.get("last_location"),
-        }
+        resume_id = last_event_id
         try:
-            if pubsub is not None:
-                await pubsub.subscribe(order_tracking_channel(tenant_id, order_id))
-            while True:
-                if await request.is_disconnected():
-                    break
-
-                if redis is not None:
-                    live_location = await get_delivery_location(redis, order_id)
-                    if isinstance(live_location, dict) and live_location.get("lat") is not None and live_location.get("lng") is not None:
-                        live_lat = float(live_location["lat"])
-                        live_lng = float(live_location["lng"])
-                        distance_meters = last_progress_payload.get("distance_meters")
-                        duration_seconds = last_progress_payload.get("duration_seconds")
-                        current_progress_payload = {
-                            "event": "tracking_update",
-                            "status": "OUT_FOR_DELIVERY",
-                            "progress": last_progress_payload.get("progress"),
-                            "distance_meters": distance_meters,
-                            "duration_seconds": duration_seconds,
-                            "driver_lat": live_lat,
-                            "driver_lng": live_lng,
-                            "destination_lat": last_progress_payload.get("destination_lat"),
-                            "destination_lng": last_progress_payload.get("destination_lng"),
-                            "initial_distance_meters": last_progress_payload.get("initial_distance_meters"),
-                            "updated_at": live_location.get("updated_at"),
-                            "last_location": {
-                                "lat": live_lat,
-                                "lng": live_lng,
-                                "updated_at": live_location.get("updated_at"),
-                            },
-                        }
-                        if current_progress_payload.get("initial_distance_meters") is None and distance_meters is not None:
-                            current_progress_payload["initial_distance_meters"] = distance_meters
-                            last_progress_payload["initial_distance_meters"] = distance_meters
-                        baseline_distance = current_progress_payload.get("initial_distance_meters")
-                        if baseline_distance is not None and distance_meters is not None:
-                            current_progress_payload["progress"] = _clamp_progress(1 - (distance_meters / max(int(baseline_distance), 1)))
-                        if current_progress_payload != last_progress_payload:
-                            logger.info(
-                                "public_tracking_update %s",
-                                {
-                                    "driver_lat": current_progress_payload.get("driver_lat"),
-                                    "driver_lng": current_progress_payload.get("driver_lng"),
-                                    "distance_meters": current_progress_payload.get("distance_meters"),
-                                    "duration_seconds": current_progress_payload.get("duration_seconds"),
-                                    "progress": current_progress_payload.get("progress"),
-                                },
-                            )
-                            last_progress_payload = current_progress_payload.copy()
-                            yield f"event: tracking_update\ndata: {json.dumps(current_progress_payload)}\n\n"
-                            yield f"event: driver_update\ndata: {json.dumps(current_progress_payload)}\n\n"
-
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0) if pubsub is not None else None
-                if message is not None:
-                    raw_payload = message.get("data")
-                    payload_text = raw_payload.decode() if isinstance(raw_payload, bytes) else str(raw_payload)
-                    payload_data = parse_delivery_envelope(payload_text, expected_tenant_id=tenant_id)
-                    if payload_data is not None:
-                        normalized_payload = _build_public_tracking_event(payload_data)
-                        if normalized_payload is not None:
-                            normalized_payload.setdefault("event", "tracking_update")
-                            for field_name in last_progress_payload:
-                                if normalized_payload.get(field_name) is not None:
-                                    last_progress_payload[field_name] = normalized_payload[field_name]
-                            if normalized_payload.get("driver_lat") is not None and normalized_payload.get("driver_lng") is not None:
-                                logger.info(
-                                    "public_tracking_update %s",
-                                    {
-                                        "driver_lat": normalized_payload.get("driver_lat"),
-                                        "driver_lng": normalized_payload.get("driver_lng"),
-                                        "distance_meters": normalized_payload.get("distance_meters"),
-                                        "duration_seconds": normalized_payload.get("duration_seconds"),
-                                        "progress": normalized_payload.get("progress", last_progress_payload.get("progress")),
-                                    },
-                                )
-                                yield f"event: tracking_update\ndata: {json.dumps(normalized_payload)}\n\n"
-                                yield f"event: driver_update\ndata: {json.dumps(normalized_payload)}\n\n"
-                            continue
-
-                heartbeat_payload = {
-                    "event": "tracking_update",
-                    "driver_lat": last_progress_payload.get("driver_lat"),
-                    "driver_lng": last_progress_payload.get("driver_lng"),
-                    "distance_meters": last_progress_payload.get("distance_meters"),
-                    "duration_seconds": last_progress_payload.get("duration_seconds"),
-                    "initial_distance_meters": last_progress_payload.get("initial_distance_meters"),
-                    "progress": last_progress_payload.get("progress"),
-                    "updated_at": (last_progress_payload.get("last_location") or {}).get("updated_at")
-                    if isinstance(last_progress_payload.get("last_location"), dict)
-                    else None,
-                }
-                if heartbeat_payload.get("driver_lat") is not None and heartbeat_payload.get("driver_lng") is not None:
-                    logger.info("public_tracking_update %s", heartbeat_payload)
-                    yield f"event: tracking_update\ndata: {json.dumps(heartbeat_payload)}\n\n"
-                    yield f"event: driver_update\ndata: {json.dumps(heartbeat_payload)}\n\n"
-                else:
-                    yield ": keep-alive\n\n"
-                await asyncio.sleep(2)
+            if initial_payload is not None:
+                frame = _tracking_frame(initial_payload, resume_id)
+                if frame is not None:
+                    yield frame
+
+            channel = order_tracking_stream(tenant_id, order_id).key
+            async with public_tracking_hub.subscribe(channel, _public_tracking_extractor(tenant_id, order_id)) as mailbox:
+                if redis is not None and resume_id is not None:
+                    try:
+                        missed = await read_stream_after(redis, channel, resume_id)
+                    except Exception:
+                        logger.warning("Failed to replay tracking stream key=%s", channel, exc_info=True)
+                        missed = None
+                    if missed is None:
+                        # id expirado/aparado: volta ao snapshot completo
+                        resume_id = await _latest_tracking_event_id(redis, channel)
+                        payload = await _load_public_tracking_snapshot(order_id)
+                    elif missed:
+                        resume_id = missed[-1][0]
+                        payload = _fold_tracking_replay(missed, tenant_id, order_id)
+                    else:
+                        payload = None
+                    frame = _tracking_frame(payload, resume_id, require_location=missed is None) if payload else None
+                    if frame is not None:
+                        yield frame
+
+                resume_after = parse_stream_id(resume_id)
+                while not await request.is_disconnected():
+                    if mailbox is None:
+                        yield KEEPALIVE_FRAME
+                        await asyncio.sleep(2)
+                        continue
+                    # cliente parado além do limite: encerra, ele reconecta pelo Last-Event-ID
+                    if mailbox.lagging():
+                        break
+                    # frames já vêm coalescidos e codificados, compartilhados com os outros clientes do pedido
+                    frames = await mailbox.get(PUBLIC_TRACKING_KEEPALIVE_SECONDS)
+                    if resume_after is not None:
+                        frames = [frame for frame in frames if (parse_stream_id(frame.event_id) or (0, 0)) > resume_after]
+                    yield b"".join(frame.data for frame in frames) if frames else KEEPALIVE_FRAME
+                    # leitura compartilhada caiu: encerra, o cliente reconecta pelo Last-Event-ID
+                    if mailbox.closed:
+                        break
         finally:
-            if pubsub is not None:
-                await pubsub.aclose()
             if redis is not None:
                 await redis.aclose()
 
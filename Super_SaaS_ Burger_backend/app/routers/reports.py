@@ -1,25 +1,53 @@
 from __future__ import annotations
 
-import csv
-import io
+import asyncio
+import json
 from datetime import date, datetime, time, timedelta
-from typing import Any, Dict, List
+from pathlib import Path
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from pydantic import AliasChoices, BaseModel, Field
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.deps import get_request_tenant_id, require_role
 from app.models.admin_user import AdminUser
-from app.models.finance import CashMovement, OrderPayment
-from app.models.inventory import InventoryItem, InventoryMovement, MenuItemIngredient
-from app.models.order import Order
-from app.models.order_item import OrderItem
+from app.models.export_job import ExportJob
+from app.models.inventory import InventoryItem, MenuItemIngredient
+from app.services import r2_storage
+from app.services.authorization_service import AuthorizationService
+from app.services.export_jobs import (
+    EXPORT_JOBS_DOWNLOAD_TTL_SECONDS,
+    EXPORT_JOBS_HOST,
+    FINANCIAL_EXPORT_FIELDS,
+    FINISHED_STATUSES,
+    export_content_type,
+    export_job_finished_signal,
+    export_job_payload,
+    export_job_snapshot,
+    financial_export_rows,
+    request_export_job,
+)
+from app.services.exports import csv_streaming_response
+from app.services.sales_rollups import DailySales, paid_item_sales_by_name, sales_by_day
 
 router = APIRouter(prefix="/api/reports", tags=["reports"])
 
+# keep-alive do SSE de exportação; também relê o status, caso o aviso de conclusão se perca
+EXPORT_EVENTS_KEEPALIVE_SECONDS = 15.0
+
+
+class ExportJobCreate(BaseModel):
+    kind: Literal["customers", "orders", "financial"]
+    format: Literal["csv", "ndjson"] = "csv"
+    gzip: bool = False
+    from_date: str | None = Field(default=None, validation_alias=AliasChoices("from", "from_date"))
+    to_date: str | None = Field(default=None, validation_alias=AliasChoices("to", "to_date"))
+    vip_only: bool = False
+    inactive_days: int | None = Field(default=None, ge=1)
+
 
 def _parse_date(value: str) -> date:
     try:
@@ -42,126 +70,9 @@ def _date_range(from_str: str, to_str: str) -> tuple[datetime, datetime]:
     return start, end
 
 
-def _payment_time_expression() -> Any:
-    return func.coalesce(OrderPayment.paid_at, OrderPayment.created_at)
-
-
-def _fee_categories_filter():
-    categories = ["fee", "taxa", "taxas"]
-    return func.lower(CashMovement.category).in_(categories)
-
-
-def _sum_fees_cents(db: Session, tenant_id: int, start: datetime, end: datetime) -> int:
-    fee_count = (
-        db.query(func.count(CashMovement.id))
-        .filter(
-            CashMovement.tenant_id == tenant_id,
-            _fee_categories_filter(),
-            CashMovement.occurred_at >= start,
-            CashMovement.occurred_at <= end,
-        )
-        .scalar()
-        or 0
-    )
-    if fee_count:
-        fee_sum = (
-            db.query(func.coalesce(func.sum(CashMovement.amount_cents), 0))
-            .filter(
-                CashMovement.tenant_id == tenant_id,
-                _fee_categories_filter(),
-                CashMovement.occurred_at >= start,
-                CashMovement.occurred_at <= end,
-            )
-            .scalar()
-            or 0
-        )
-        return int(fee_sum)
-
-    payment_time = _payment_time_expression()
-    fee_sum = (
-        db.query(func.coalesce(func.sum(OrderPayment.fee_cents), 0))
-        .filter(
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            payment_time >= start,
-            payment_time <= end,
-        )
-        .scalar()
-        or 0
-    )
-    return int(fee_sum)
-
-
-def _fee_map_by_day(db: Session, tenant_id: int, start: datetime, end: datetime) -> dict[str, int]:
-    fee_count = (
-        db.query(func.count(CashMovement.id))
-        .filter(
-            CashMovement.tenant_id == tenant_id,
-            _fee_categories_filter(),
-            CashMovement.occurred_at >= start,
-            CashMovement.occurred_at <= end,
-        )
-        .scalar()
-        or 0
-    )
-    if fee_count:
-        rows = (
-            db.query(
-                func.strftime("%Y-%m-%d", CashMovement.occurred_at).label("bucket"),
-                func.coalesce(func.sum(CashMovement.amount_cents), 0).label("fees_cents"),
-            )
-            .filter(
-                CashMovement.tenant_id == tenant_id,
-                _fee_categories_filter(),
-                CashMovement.occurred_at >= start,
-                CashMovement.occurred_at <= end,
-            )
-            .group_by("bucket")
-            .all()
-        )
-        return {row.bucket: int(row.fees_cents or 0) for row in rows if row.bucket}
-
-    payment_time = _payment_time_expression()
-    rows = (
-        db.query(
-            func.strftime("%Y-%m-%d", payment_time).label("bucket"),
-            func.coalesce(func.sum(OrderPayment.fee_cents), 0).label("fees_cents"),
-        )
-        .filter(
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            payment_time >= start,
-            payment_time <= end,
-        )
-        .group_by("bucket")
-        .all()
-    )
-    return {row.bucket: int(row.fees_cents or 0) for row in rows if row.bucket}
-
-
-def _cogs_total(db: Session, tenant_id: int, start: datetime, end: datetime) -> tuple[int, bool]:
-    movements = (
-        db.query(InventoryMovement, InventoryItem)
-        .join(InventoryItem, InventoryItem.id == InventoryMovement.inventory_item_id)
-        .filter(
-            InventoryMovement.tenant_id == tenant_id,
-            InventoryMovement.type == "OUT",
-            InventoryMovement.reason == "sale",
-            InventoryMovement.created_at >= start,
-            InventoryMovement.created_at <= end,
-        )
-        .all()
-    )
-    if not movements:
-        return 0, False
-
-    total_cents = 0
-    for movement, item in movements:
-        cost_cents = int(item.cost_cents or 0)
-        quantity = float(movement.quantity or 0)
-        total_cents += int(round(quantity * cost_cents))
-
-    return total_cents, True
+def _daily_sales(db: Session, tenant_id: int, start: datetime, end: datetime) -> dict[date, DailySales]:
+    exclusive_end = datetime.combine(end.date() + timedelta(days=1), time.min)
+    return sales_by_day(db, tenant_id, start, exclusive_end)
 
 
 def _granularity_format(granularity: str) -> str:
@@ -174,6 +85,19 @@ def _granularity_format(granularity: str) -> str:
     raise HTTPException(status_code=400, detail="Granularidade inválida")
 
 
+def _timeseries_point(bucket: str, totals: DailySales) -> dict:
+    gross = totals.payment_gross_cents
+    net = gross - totals.payment_fees_cents
+    return {
+        "date": bucket,
+        "gross_revenue_cents": gross,
+        "net_revenue_cents": net,
+        "orders_count": totals.payment_orders_count,
+        "cogs_cents": totals.cogs_cents,
+        "gross_profit_cents": net - totals.cogs_cents,
+    }
+
+
 def _build_timeseries(
     db: Session,
     tenant_id: int,
@@ -182,153 +106,29 @@ def _build_timeseries(
     granularity: str,
 ) -> tuple[list[dict], bool]:
     fmt = _granularity_format(granularity)
-    payment_time = _payment_time_expression()
-
-    payment_rows = (
-        db.query(
-            func.strftime(fmt, payment_time).label("bucket"),
-            func.coalesce(func.sum(OrderPayment.amount_cents), 0).label("gross_revenue_cents"),
-            func.coalesce(func.sum(OrderPayment.fee_cents), 0).label("fees_cents"),
-            func.count(func.distinct(OrderPayment.order_id)).label("orders_count"),
-        )
-        .filter(
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            payment_time >= start,
-            payment_time <= end,
-        )
-        .group_by("bucket")
-        .all()
-    )
-
-    cogs_rows = (
-        db.query(
-            func.strftime(fmt, InventoryMovement.created_at).label("bucket"),
-            func.coalesce(
-                func.sum(InventoryMovement.quantity * InventoryItem.cost_cents),
-                0,
-            ).label("cogs_cents"),
-        )
-        .join(InventoryItem, InventoryItem.id == InventoryMovement.inventory_item_id)
-        .filter(
-            InventoryMovement.tenant_id == tenant_id,
-            InventoryMovement.type == "OUT",
-            InventoryMovement.reason == "sale",
-            InventoryMovement.created_at >= start,
-            InventoryMovement.created_at <= end,
-        )
-        .group_by("bucket")
-        .all()
-    )
-
-    payment_map = {
-        row.bucket: {
-            "gross_revenue_cents": int(row.gross_revenue_cents or 0),
-            "fees_cents": int(row.fees_cents or 0),
-            "orders_count": int(row.orders_count or 0),
-        }
-        for row in payment_rows
-        if row.bucket
-    }
-    cogs_map = {row.bucket: int(row.cogs_cents or 0) for row in cogs_rows if row.bucket}
-    cogs_available = bool(cogs_rows)
+    by_day = _daily_sales(db, tenant_id, start, end)
+    cogs_available = any(totals.cogs_movements_count for totals in by_day.values())
 
     points: list[dict] = []
     if granularity == "day":
         current = start.date()
         end_date = end.date()
         while current <= end_date:
-            bucket = current.isoformat()
-            payments = payment_map.get(bucket, {})
-            gross = int(payments.get("gross_revenue_cents", 0))
-            fees = int(payments.get("fees_cents", 0))
-            net = gross - fees
-            cogs = int(cogs_map.get(bucket, 0))
-            points.append(
-                {
-                    "date": bucket,
-                    "gross_revenue_cents": gross,
-                    "net_revenue_cents": net,
-                    "orders_count": int(payments.get("orders_count", 0)),
-                    "cogs_cents": cogs,
-                    "gross_profit_cents": net - cogs,
-                }
-            )
+            points.append(_timeseries_point(current.isoformat(), by_day.get(current) or DailySales()))
             current += timedelta(days=1)
         return points, cogs_available
 
-    buckets = sorted(set(payment_map.keys()) | set(cogs_map.keys()))
-    for bucket in buckets:
-        payments = payment_map.get(bucket, {})
-        gross = int(payments.get("gross_revenue_cents", 0))
-        fees = int(payments.get("fees_cents", 0))
-        net = gross - fees
-        cogs = int(cogs_map.get(bucket, 0))
-        points.append(
-            {
-                "date": bucket,
-                "gross_revenue_cents": gross,
-                "net_revenue_cents": net,
-                "orders_count": int(payments.get("orders_count", 0)),
-                "cogs_cents": cogs,
-                "gross_profit_cents": net - cogs,
-            }
-        )
+    buckets: dict[str, DailySales] = {}
+    for day in sorted(by_day):
+        totals = by_day[day]
+        if totals.has_payments_or_cogs:
+            buckets.setdefault(day.strftime(fmt), DailySales()).merge(totals)
+    for bucket in sorted(buckets):
+        points.append(_timeseries_point(bucket, buckets[bucket]))
 
     return points, cogs_available
 
 
-def _paid_orders_subquery(
-    db: Session,
-    tenant_id: int,
-    start: datetime,
-    end: datetime,
-):
-    payment_time = _payment_time_expression()
-    return (
-        db.query(OrderPayment.order_id)
-        .filter(
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            payment_time >= start,
-            payment_time <= end,
-        )
-        .distinct()
-        .subquery()
-    )
-
-
-def _order_payment_totals(
-    db: Session,
-    tenant_id: int,
-    start: datetime,
-    end: datetime,
-) -> dict[int, dict[str, int]]:
-    payment_time = _payment_time_expression()
-    rows = (
-        db.query(
-            OrderPayment.order_id.label("order_id"),
-            func.coalesce(func.sum(OrderPayment.amount_cents), 0).label("gross_cents"),
-            func.coalesce(func.sum(OrderPayment.fee_cents), 0).label("fee_cents"),
-        )
-        .filter(
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            payment_time >= start,
-            payment_time <= end,
-        )
-        .group_by(OrderPayment.order_id)
-        .all()
-    )
-    return {
-        int(row.order_id): {
-            "gross_cents": int(row.gross_cents or 0),
-            "fee_cents": int(row.fee_cents or 0),
-        }
-        for row in rows
-    }
-
-
 def _menu_item_cost_map(db: Session, tenant_id: int, menu_item_ids: list[int]) -> dict[int, int]:
     if not menu_item_ids:
         return {}
@@ -354,95 +154,37 @@ def _menu_item_cost_map(db: Session, tenant_id: int, menu_item_ids: list[int]) -
     return cost_map
 
 
-def _allocate_fees(order_fee_cents: int, order_items_total: int) -> float:
-    if order_items_total <= 0:
-        return 0.0
-    return float(order_fee_cents) / float(order_items_total)
+def _paid_top_items(db: Session, tenant_id: int, start: datetime, end: datetime, limit: int) -> list[dict[str, int | str]]:
+    """Itens de pedidos pagos no período (pela data do pagamento), com a taxa rateada entre os itens.
 
+    Relatório financeiro: não usa daily_item_sales, que conta todo pedido (inclusive não pago ou
+    cancelado) pelo dia de criação; lê daily_paid_item_sales.
+    """
+    top_items = sorted(
+        paid_item_sales_by_name(db, tenant_id, start, end).values(),
+        key=lambda item: item.gross_revenue_cents,
+        reverse=True,
+    )[:limit]
+    menu_item_ids = sorted({menu_item_id for item in top_items for menu_item_id in item.quantity_by_menu_item})
+    cost_map = _menu_item_cost_map(db, tenant_id, menu_item_ids)
 
-def _fallback_top_items(
-    tenant_id: int,
-    start: datetime,
-    end: datetime,
-    limit: int,
-    db: Session,
-) -> List[Dict[str, Any]]:
-    import json
-
-    paid_orders = (
-        db.query(Order)
-        .join(OrderPayment, OrderPayment.order_id == Order.id)
-        .filter(
-            Order.tenant_id == tenant_id,
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            _payment_time_expression() >= start,
-            _payment_time_expression() <= end,
+    results: list[dict[str, int | str]] = []
+    for item in top_items:
+        net = item.gross_revenue_cents - item.fee_cents
+        cogs = sum(
+            quantity * cost_map.get(menu_item_id, 0) for menu_item_id, quantity in item.quantity_by_menu_item.items()
         )
-        .distinct()
-        .all()
-    )
-    if not paid_orders:
-        return []
-
-    payment_totals = _order_payment_totals(db, tenant_id, start, end)
-    order_totals: dict[int, int] = {}
-    order_items: dict[int, list[dict]] = {}
-
-    for order in paid_orders:
-        try:
-            items = json.loads(order.items_json or "[]")
-        except Exception:
-            items = []
-        if not isinstance(items, list):
-            items = []
-        order_items[order.id] = items
-        order_totals[order.id] = 0
-        for item in items:
-            order_totals[order.id] += int(item.get("subtotal_cents", 0) or 0)
-
-    totals: Dict[str, Dict[str, int]] = {}
-
-    for order in paid_orders:
-        items = order_items.get(order.id, [])
-        fee_ratio = _allocate_fees(payment_totals.get(order.id, {}).get("fee_cents", 0), order_totals.get(order.id, 0))
-        for item in items:
-            name = str(item.get("name", "") or "").strip()
-            if not name:
-                continue
-            qty = int(item.get("quantity", 0) or 0)
-            gross_cents = int(item.get("subtotal_cents", 0) or 0)
-            fee_share = int(round(gross_cents * fee_ratio)) if fee_ratio else 0
-            net_cents = gross_cents - fee_share
-            if name not in totals:
-                totals[name] = {
-                    "qty": 0,
-                    "gross_revenue_cents": 0,
-                    "net_revenue_cents": 0,
-                }
-            totals[name]["qty"] += qty
-            totals[name]["gross_revenue_cents"] += gross_cents
-            totals[name]["net_revenue_cents"] += net_cents
-
-    sorted_items = sorted(
-        totals.items(),
-        key=lambda item: item[1]["gross_revenue_cents"],
-        reverse=True,
-    )
-    result = []
-    for name, values in sorted_items[:limit]:
-        net = values["net_revenue_cents"]
-        result.append(
+        results.append(
             {
-                "item_name": name,
-                "qty": values["qty"],
-                "gross_revenue_cents": values["gross_revenue_cents"],
+                "item_name": item.item_name,
+                "qty": item.quantity,
+                "gross_revenue_cents": item.gross_revenue_cents,
                 "net_revenue_cents": net,
-                "cogs_cents": 0,
-                "gross_profit_cents": net,
+                "cogs_cents": cogs,
+                "gross_profit_cents": net - cogs,
             }
         )
-    return result
+    return results
 
 
 @router.get("/financial/summary")
@@ -454,60 +196,19 @@ def financial_summary(
     _user: AdminUser = Depends(require_role(["admin", "operator", "cashier"])),
 ):
     start, end = _date_range(from_date, to_date)
-    payment_time = _payment_time_expression()
-
-    gross_revenue_cents = (
-        db.query(func.coalesce(func.sum(OrderPayment.amount_cents), 0))
-        .filter(
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            payment_time >= start,
-            payment_time <= end,
-        )
-        .scalar()
-        or 0
-    )
+    totals = DailySales()
+    for day_totals in _daily_sales(db, tenant_id, start, end).values():
+        totals.merge(day_totals)
 
-    orders_count = (
-        db.query(func.count(func.distinct(OrderPayment.order_id)))
-        .filter(
-            OrderPayment.tenant_id == tenant_id,
-            OrderPayment.status == "paid",
-            payment_time >= start,
-            payment_time <= end,
-        )
-        .scalar()
-        or 0
-    )
-
-    fees_cents = _sum_fees_cents(db, tenant_id, start, end)
+    gross_revenue_cents = totals.payment_gross_cents
+    orders_count = totals.payment_orders_count
+    fees_cents = totals.fees_cents
     net_revenue_cents = int(gross_revenue_cents) - int(fees_cents)
-
-    cash_in_cents = (
-        db.query(func.coalesce(func.sum(CashMovement.amount_cents), 0))
-        .filter(
-            CashMovement.tenant_id == tenant_id,
-            CashMovement.type == "in",
-            CashMovement.occurred_at >= start,
-            CashMovement.occurred_at <= end,
-        )
-        .scalar()
-        or 0
-    )
-    cash_out_cents = (
-        db.query(func.coalesce(func.sum(CashMovement.amount_cents), 0))
-        .filter(
-            CashMovement.tenant_id == tenant_id,
-            CashMovement.type == "out",
-            CashMovement.occurred_at >= start,
-            CashMovement.occurred_at <= end,
-        )
-        .scalar()
-        or 0
-    )
+    cash_in_cents = totals.cash_in_cents
+    cash_out_cents = totals.cash_out_cents
     cash_balance_cents = int(cash_in_cents) - int(cash_out_cents)
-
-    cogs_cents, cogs_available = _cogs_total(db, tenant_id, start, end)
+    cogs_cents = totals.cogs_cents
+    cogs_available = totals.cogs_movements_count > 0
     gross_profit_cents = net_revenue_cents - int(cogs_cents)
     avg_ticket_cents = int(net_revenue_cents / orders_count) if orders_count else 0
 
@@ -550,74 +251,7 @@ def sales_top_items(
     _user: AdminUser = Depends(require_role(["admin", "operator", "cashier"])),
 ):
     start, end = _date_range(from_date, to_date)
-    paid_orders = _paid_orders_subquery(db, tenant_id, start, end)
-
-    order_items = (
-        db.query(OrderItem)
-        .filter(OrderItem.tenant_id == tenant_id, OrderItem.order_id.in_(paid_orders))
-        .all()
-    )
-
-    if not order_items:
-        items = _fallback_top_items(tenant_id=tenant_id, start=start, end=end, limit=limit, db=db)
-        return {"items": items}
-
-    payment_totals = _order_payment_totals(db, tenant_id, start, end)
-    order_totals: dict[int, int] = {}
-    for item in order_items:
-        order_totals[item.order_id] = order_totals.get(item.order_id, 0) + int(item.subtotal_cents or 0)
-
-    menu_item_ids = list({item.menu_item_id for item in order_items if item.menu_item_id})
-    cost_map = _menu_item_cost_map(db, tenant_id, menu_item_ids)
-
-    totals: dict[str, dict[str, int]] = {}
-    for item in order_items:
-        name = str(item.name or "").strip()
-        if not name:
-            continue
-        gross_cents = int(item.subtotal_cents or 0)
-        fee_ratio = _allocate_fees(
-            payment_totals.get(item.order_id, {}).get("fee_cents", 0),
-            order_totals.get(item.order_id, 0),
-        )
-        fee_share = int(round(gross_cents * fee_ratio)) if fee_ratio else 0
-        net_cents = gross_cents - fee_share
-        qty = int(item.quantity or 0)
-        cost_per_unit = cost_map.get(int(item.menu_item_id)) if item.menu_item_id else 0
-        cogs_cents = int(qty * (cost_per_unit or 0))
-        if name not in totals:
-            totals[name] = {
-                "qty": 0,
-                "gross_revenue_cents": 0,
-                "net_revenue_cents": 0,
-                "cogs_cents": 0,
-            }
-        totals[name]["qty"] += qty
-        totals[name]["gross_revenue_cents"] += gross_cents
-        totals[name]["net_revenue_cents"] += net_cents
-        totals[name]["cogs_cents"] += cogs_cents
-
-    sorted_items = sorted(
-        totals.items(),
-        key=lambda item: item[1]["gross_revenue_cents"],
-        reverse=True,
-    )
-    results: list[dict[str, int | str]] = []
-    for name, values in sorted_items[:limit]:
-        net = values["net_revenue_cents"]
-        cogs = values["cogs_cents"]
-        results.append(
-            {
-                "item_name": name,
-                "qty": values["qty"],
-                "gross_revenue_cents": values["gross_revenue_cents"],
-                "net_revenue_cents": net,
-                "cogs_cents": cogs,
-                "gross_profit_cents": net - cogs,
-            }
-        )
-
-    return {"items": results}
+    return {"items": _paid_top_items(db, tenant_id, start, end, limit)}
 
 
 @router.get("/inventory/low-stock")
@@ -656,49 +290,18 @@ def export_financial_csv(
     tenant_id: int = Depends(get_request_tenant_id),
     from_date: str = Query(..., alias="from"),
     to_date: str = Query(..., alias="to"),
+    gzip: bool = Query(False),
     db: Session = Depends(get_db),
     _user: AdminUser = Depends(require_role(["admin", "operator", "cashier"])),
 ):
     start, end = _date_range(from_date, to_date)
-    points, _ = _build_timeseries(db, tenant_id, start, end, "day")
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(
-        [
-            "date",
-            "gross_revenue_cents",
-            "fees_cents",
-            "net_revenue_cents",
-            "cogs_cents",
-            "gross_profit_cents",
-            "orders_count",
-        ]
+    return csv_streaming_response(
+        FINANCIAL_EXPORT_FIELDS,
+        financial_export_rows(db, tenant_id, start, end),
+        "financial.csv",
+        gzip=gzip,
     )
 
-    fees_map = _fee_map_by_day(db, tenant_id, start, end)
-
-    for point in points:
-        date_key = point["date"]
-        fees_cents = fees_map.get(date_key, 0)
-        net_revenue_cents = int(point["gross_revenue_cents"]) - int(fees_cents)
-        gross_profit_cents = net_revenue_cents - int(point["cogs_cents"])
-        writer.writerow(
-            [
-                date_key,
-                point["gross_revenue_cents"],
-                fees_cents,
-                net_revenue_cents,
-                point["cogs_cents"],
-                gross_profit_cents,
-                point["orders_count"],
-            ]
-        )
-
-    output.seek(0)
-    headers = {"Content-Disposition": "attachment; filename=financial.csv"}
-    return StreamingResponse(iter([output.getvalue()]), media_type="text/csv", headers=headers)
-
 
 @router.get("/export/top-items.csv")
 def export_top_items_csv(
@@ -706,10 +309,10 @@ def export_top_items_csv(
     from_date: str = Query(..., alias="from"),
     to_date: str = Query(..., alias="to"),
     limit: int = Query(50, ge=1, le=200),
+    gzip: bool = Query(False),
     db: Session = Depends(get_db),
     _user: AdminUser = Depends(require_role(["admin", "operator", "cashier"])),
 ):
-    start, end = _date_range(from_date, to_date)
     response = sales_top_items(
         tenant_id=tenant_id,
         from_date=from_date,
@@ -717,11 +320,18 @@ def export_top_items_csv(
         limit=limit,
         db=db,
     )
-    items = response.get("items", [])
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(
+    rows = (
+        [
+            item.get("item_name"),
+            item.get("qty"),
+            item.get("gross_revenue_cents"),
+            item.get("net_revenue_cents"),
+            item.get("cogs_cents"),
+            item.get("gross_profit_cents"),
+        ]
+        for item in response.get("items", [])
+    )
+    return csv_streaming_response(
         [
             "item_name",
             "qty",
@@ -729,20 +339,126 @@ def export_top_items_csv(
             "net_revenue_cents",
             "cogs_cents",
             "gross_profit_cents",
-        ]
+        ],
+        rows,
+        "top-items.csv",
+        gzip=gzip,
     )
-    for item in items:
-        writer.writerow(
-            [
-                item.get("item_name"),
-                item.get("qty"),
-                item.get("gross_revenue_cents"),
-                item.get("net_revenue_cents"),
-                item.get("cogs_cents"),
-                item.get("gross_profit_cents"),
-            ]
-        )
 
-    output.seek(0)
-    headers = {"Content-Disposition": "attachment; filename=top-items.csv"}
-    return StreamingResponse(iter([output.getvalue()]), media_type="text/csv", headers=headers)
+
+def _get_export_job(db: Session, tenant_id: int, job_id: str) -> ExportJob:
+    job = db.query(ExportJob).filter(ExportJob.id == job_id, ExportJob.tenant_id == tenant_id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada")
+    return job
+
+
+@router.post("/exports", status_code=status.HTTP_202_ACCEPTED)
+def create_export_job(
+    payload: ExportJobCreate,
+    tenant_id: int = Depends(get_request_tenant_id),
+    db: Session = Depends(get_db),
+    user: AdminUser = Depends(require_role(["admin", "operator", "cashier"])),
+):
+    if payload.kind == "customers":
+        # mesma regra do /api/admin/customers/export: dados de clientes só para admin
+        if AuthorizationService.normalize_role(user.role) not in {"admin", "owner"}:
+            raise HTTPException(status_code=403, detail="Permissão insuficiente")
+        params = {"vip_only": payload.vip_only, "inactive_days": payload.inactive_days}
+    else:
+        if not payload.from_date or not payload.to_date:
+            raise HTTPException(status_code=400, detail="Informe from e to")
+        start, end = _date_range(payload.from_date, payload.to_date)
+        params = {"from": start.date().isoformat(), "to": end.date().isoformat()}
+
+    job, created = request_export_job(
+        db,
+        tenant_id=tenant_id,
+        kind=payload.kind,
+        fmt=payload.format,
+        gzip=payload.gzip,
+        params=params,
+        user_id=user.id,
+    )
+    return {**export_job_payload(job), "deduplicated": not created}
+
+
+@router.get("/exports/{job_id}")
+def get_export_job(
+    job_id: str,
+    tenant_id: int = Depends(get_request_tenant_id),
+    db: Session = Depends(get_db),
+    _user: AdminUser = Depends(require_role(["admin", "operator", "cashier"])),
+):
+    return export_job_payload(_get_export_job(db, tenant_id, job_id))
+
+
+@router.get("/exports/{job_id}/download")
+def download_export_job(
+    job_id: str,
+    tenant_id: int = Depends(get_request_tenant_id),
+    db: Session = Depends(get_db),
+    _user: AdminUser = Depends(require_role(["admin", "operator", "cashier"])),
+):
+    job = _get_export_job(db, tenant_id, job_id)
+    if job.status == "expired":
+        raise HTTPException(status_code=410, detail="Arquivo de exportação expirado")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail="Exportação ainda não concluída")
+    if job.storage == "r2":
+        url = r2_storage.presigned_download_url(job.location, job.filename, EXPORT_JOBS_DOWNLOAD_TTL_SECONDS)
+        return RedirectResponse(url, status_code=307)
+    path = Path(job.location or "")
+    if not path.is_file():
+        if job.host and job.host != EXPORT_JOBS_HOST:
+            # storage local com várias instâncias: o arquivo está no disco de outra (use EXPORT_JOBS_STORAGE=r2)
+            raise HTTPException(status_code=503, detail="Arquivo de exportação gravado em outra instância")
+        raise HTTPException(status_code=410, detail="Arquivo de exportação indisponível")
+    return FileResponse(path, media_type=export_content_type(job), filename=job.filename)
+
+
+def _export_finished_event(snapshot: dict) -> str:
+    event = "export.completed" if snapshot["status"] == "done" else "export.failed"
+    return f"event: {event}\ndata: {json.dumps(snapshot)}\n\n"
+
+
+@router.get("/exports/{job_id}/events")
+async def export_job_events(
+    job_id: str,
+    request: Request,
+    tenant_id: int = Depends(get_request_tenant_id),
+    _user: AdminUser = Depends(require_role(["admin", "operator", "cashier"])),
+):
+    initial = await asyncio.to_thread(export_job_snapshot, job_id, tenant_id)
+    if initial is None:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada")
+
+    async def event_generator():
+        if initial["status"] in FINISHED_STATUSES:
+            yield _export_finished_event(initial)
+            return
+        # acordado pelo worker na conclusão; sem polling do banco enquanto o job roda
+        async with export_job_finished_signal(job_id) as finished:
+            snapshot = await asyncio.to_thread(export_job_snapshot, job_id, tenant_id)
+            while snapshot is not None:
+                if snapshot["status"] in FINISHED_STATUSES:
+                    yield _export_finished_event(snapshot)
+                    break
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                try:
+                    await asyncio.wait_for(finished.wait(), timeout=EXPORT_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                snapshot = await asyncio.to_thread(export_job_snapshot, job_id, tenant_id)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache, no-transform",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -7,8 +7,7 @@ from sqlalchemy.orm import Session
 
 from app.core.config import IS_DEV, META_WA_VERIFY_TOKEN
 from app.core.database import get_db
-from app.ai.service import run_assistant
-from app.models.ai_config import AIConfig
+from app.ai.service import arun_assistant, get_cached_ai_config
 from app.models.conversation import Conversation
 from app.models.processed_message import ProcessedMessage
 from app.models.whatsapp_config import WhatsAppConfig
@@ -264,9 +263,9 @@ async def _handle_inbound_message(
         provider_message_id=message_id,
     )
 
-    ai_config = db.query(AIConfig).filter(AIConfig.tenant_id == tenant_id).first()
+    ai_config = get_cached_ai_config(db, tenant_id)
     if ai_config and ai_config.enabled:
-        assistant_json, final_text = run_assistant(tenant_id, from_number, text, db)
+        assistant_json, final_text = await arun_assistant(tenant_id, from_number, text, db)
         try:
             service.send_text(db, tenant_id=tenant_id, to_phone=from_number, text=final_text)
         except Exception as e:
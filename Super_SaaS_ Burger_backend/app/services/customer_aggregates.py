@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.customer_aggregate import CustomerAggregate
+from app.models.order import Order
+
+logger = logging.getLogger(__name__)
+
+VIP_MIN_SPENT = 500
+VIP_MIN_ORDERS = 10
+# dias desde o último pedido: < 15 frequent, < 45 regular, < 90 occasional, senão inactive
+RECURRENCE_DAYS = (("frequent", 15), ("regular", 45), ("occasional", 90))
+
+_AGGREGATE_COLUMNS = ("total_orders", "total_spent", "first_order_at", "last_order_at", "is_vip")
+_ORDER_TRACKED_ATTRS = ("tenant_id", "customer_id", "total_cents", "valor_total", "created_at")
+_REBUILD_BATCH_SIZE = 500
+
+CUSTOMER_AGGREGATES_RECONCILE_HOUR_UTC = int(os.getenv("CUSTOMER_AGGREGATES_RECONCILE_HOUR_UTC", "7"))
+
+
+def is_vip(total_spent: int, total_orders: int) -> bool:
+    return total_spent >= VIP_MIN_SPENT or total_orders >= VIP_MIN_ORDERS
+
+
+def recurrence_segment(days_since_last_order: int | None) -> str:
+    if days_since_last_order is None:
+        return "inactive"
+    for segment, max_days in RECURRENCE_DAYS:
+        if days_since_last_order < max_days:
+            return segment
+    return "inactive"
+
+
+def _aggregate_rows(connection: Connection, tenant_id: int, customer_ids: list[int]) -> list[dict[str, Any]]:
+    orders = Order.__table__
+    statement = (
+        select(
+            orders.c.customer_id,
+            func.count(orders.c.id).label("total_orders"),
+            func.coalesce(func.sum(func.coalesce(orders.c.total_cents, orders.c.valor_total)), 0).label("total_spent"),
+            func.min(orders.c.created_at).label("first_order_at"),
+            func.max(orders.c.created_at).label("last_order_at"),
+        )
+        .where(orders.c.tenant_id == tenant_id, orders.c.customer_id.in_(customer_ids))
+        .group_by(orders.c.customer_id)
+    )
+    found = {row.customer_id: row for row in connection.execute(statement)}
+
+    rows: list[dict[str, Any]] = []
+    for customer_id in customer_ids:
+        row = found.get(customer_id)
+        total_orders = int(row.total_orders) if row is not None else 0
+        total_spent = int(row.total_spent or 0) if row is not None else 0
+        rows.append(
+            {
+                "tenant_id": tenant_id,
+                "customer_id": customer_id,
+                "total_orders": total_orders,
+                "total_spent": total_spent,
+                "first_order_at": row.first_order_at if row is not None else None,
+                "last_order_at": row.last_order_at if row is not None else None,
+                "is_vip": is_vip(total_spent, total_orders),
+            }
+        )
+    return rows
+
+
+def _upsert_customer_aggregates(connection: Connection, rows: list[dict[str, Any]]) -> None:
+    table = CustomerAggregate.__table__
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["tenant_id", "customer_id"],
+            set_={column: statement.excluded[column] for column in _AGGREGATE_COLUMNS},
+        )
+        connection.execute(statement, rows)
+        return
+
+    for row in rows:
+        updated = connection.execute(
+            table.update()
+            .where(table.c.tenant_id == row["tenant_id"], table.c.customer_id == row["customer_id"])
+            .values({column: row[column] for column in _AGGREGATE_COLUMNS})
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(**row))
+
+
+def _lock_customer_aggregates(connection: Connection, tenant_id: int, customer_ids: list[int]) -> None:
+    """Cria as linhas que faltam e trava todas (FOR UPDATE) antes da recontagem.
+
+    Sem a trava, duas transações do mesmo cliente contam só o próprio pedido novo e o último
+    commit sobrescreve o outro (READ COMMITTED). Travadas, a segunda espera a primeira e a sua
+    contagem, um statement novo, já enxerga o pedido commitado. Ordem por customer_id: sem deadlock.
+    No SQLite a escrita do pedido já segura o banco inteiro até o commit, então não há o que travar.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    table = CustomerAggregate.__table__
+    connection.execute(
+        postgresql_insert(table).on_conflict_do_nothing(index_elements=["tenant_id", "customer_id"]),
+        [
+            {"tenant_id": tenant_id, "customer_id": customer_id, "total_orders": 0, "total_spent": 0, "is_vip": False}
+            for customer_id in customer_ids
+        ],
+    )
+    connection.execute(
+        select(table.c.id)
+        .where(table.c.tenant_id == tenant_id, table.c.customer_id.in_(customer_ids))
+        .order_by(table.c.customer_id)
+        .with_for_update()
+    ).all()
+
+
+def refresh_customer_aggregates(connection: Connection, tenant_id: int, customer_ids: Iterable[int]) -> int:
+    """Recalcula os agregados dos clientes informados a partir dos pedidos (consulta por índice)."""
+    ids = sorted({int(customer_id) for customer_id in customer_ids})
+    if not ids:
+        return 0
+    _lock_customer_aggregates(connection, int(tenant_id), ids)
+    _upsert_customer_aggregates(connection, _aggregate_rows(connection, int(tenant_id), ids))
+    return len(ids)
+
+
+def rebuild_customer_aggregates(db: Session, tenant_id: int | None = None) -> int:
+    """Regrava customer_aggregates de um tenant (ou de todos): backfill e reconciliação."""
+    query = db.query(Order.tenant_id, Order.customer_id).filter(Order.customer_id.isnot(None)).distinct()
+    if tenant_id is not None:
+        query = query.filter(Order.tenant_id == tenant_id)
+
+    by_tenant: dict[int, list[int]] = {}
+    for row_tenant_id, customer_id in query.all():
+        by_tenant.setdefault(int(row_tenant_id), []).append(int(customer_id))
+
+    refreshed = 0
+    for row_tenant_id, customer_ids in by_tenant.items():
+        for start in range(0, len(customer_ids), _REBUILD_BATCH_SIZE):
+            refreshed += refresh_customer_aggregates(
+                db.connection(), row_tenant_id, customer_ids[start : start + _REBUILD_BATCH_SIZE]
+            )
+            # commit por lote: as travas dos agregados não seguram os pedidos do tenant inteiro
+            db.commit()
+    return refreshed
+
+
+def _rebuild_with_new_session() -> int:
+    db = SessionLocal()
+    try:
+        return rebuild_customer_aggregates(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _seconds_until_next_reconcile(now: datetime) -> float:
+    next_run = now.replace(hour=CUSTOMER_AGGREGATES_RECONCILE_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_customer_aggregates_reconciler(stop_event: asyncio.Event) -> None:
+    """Recalcula customer_aggregates toda noite, corrigindo desvios de escrita fora do ORM."""
+    logger.info("Customer aggregates reconciler started hour_utc=%s", CUSTOMER_AGGREGATES_RECONCILE_HOUR_UTC)
+    while not stop_event.is_set():
+        delay = _seconds_until_next_reconcile(datetime.now(timezone.utc))
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            break
+        except asyncio.TimeoutError:
+            pass
+        try:
+            refreshed = await asyncio.to_thread(_rebuild_with_new_session)
+            logger.info("Customer aggregates reconciled customers=%s", refreshed)
+        except Exception:
+            logger.exception("Customer aggregates reconcile failed")
+
+
+def _order_customer_keys(instance: Order) -> set[tuple[int, int]]:
+    state = inspect(instance)
+    values: dict[str, list[Any]] = {}
+    for attr in ("tenant_id", "customer_id"):
+        history = state.attrs[attr].history
+        values[attr] = [instance.__dict__.get(attr), *history.deleted]
+    return {
+        (int(tenant_id), int(customer_id))
+        for tenant_id in values["tenant_id"]
+        if tenant_id is not None
+        for customer_id in values["customer_id"]
+        if customer_id is not None
+    }
+
+
+@event.listens_for(Order.customer_id, "set", active_history=True)
+def _load_previous_customer(_target, _value, _oldvalue, _initiator) -> None:
+    # active_history carrega o cliente anterior (pedido expirado), que também precisa ser recalculado
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_order_customers(session: Session, _flush_context) -> None:
+    affected: dict[int, set[int]] = {}
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(instance, Order):
+            continue
+        if instance in session.dirty:
+            state = inspect(instance)
+            if not any(state.attrs[attr].history.has_changes() for attr in _ORDER_TRACKED_ATTRS):
+                continue
+        for tenant_id, customer_id in _order_customer_keys(instance):
+            affected.setdefault(tenant_id, set()).add(customer_id)
+
+    if not affected:
+        return
+    connection = session.connection()
+    for tenant_id, customer_ids in affected.items():
+        refresh_customer_aggregates(connection, tenant_id, customer_ids)
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.database import SessionLocal
+from app.models.delivery_log import DeliveryLog
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_LOGS_RETENTION_MONTHS = int(os.getenv("DELIVERY_LOGS_RETENTION_MONTHS", "6"))
+DELIVERY_LOGS_PARTITIONS_AHEAD = int(os.getenv("DELIVERY_LOGS_PARTITIONS_AHEAD", "2"))
+DELIVERY_LOGS_MAINTENANCE_HOUR_UTC = int(os.getenv("DELIVERY_LOGS_MAINTENANCE_HOUR_UTC", "4"))
+
+PARTITION_PREFIX = "delivery_logs_p"
+DEFAULT_PARTITION = "delivery_logs_default"
+_PARTITION_NAME = re.compile(rf"^{PARTITION_PREFIX}(\d{{4}})(\d{{2}})$")
+_RETENTION_DELETE_BATCH = 5000
+
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name: str) -> date | None:
+    match = _PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def retention_cutoff(today: date, retention_months: int = DELIVERY_LOGS_RETENTION_MONTHS) -> date:
+    """Primeiro dia mantido: o mês corrente mais os `retention_months` anteriores completos."""
+    return add_months(month_start(today), -max(0, int(retention_months)))
+
+
+def is_partitioned(connection: Connection) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+    relkind = connection.execute(
+        text("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass('delivery_logs')")
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(connection: Connection) -> List[str]:
+    rows = connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass('delivery_logs') "
+            "ORDER BY child.relname"
+        )
+    )
+    return [row[0] for row in rows]
+
+
+def _month_bounds(month: date) -> tuple[str, str]:
+    return f"{month.isoformat()} 00:00:00+00", f"{add_months(month, 1).isoformat()} 00:00:00+00"
+
+
+def create_month_partition(connection: Connection, month: date) -> str:
+    name = partition_name(month)
+    lower, upper = _month_bounds(month)
+    connection.execute(
+        text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF delivery_logs '
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+    )
+    return name
+
+
+def _create_partition_from_default(connection: Connection, month: date) -> str:
+    """Cria a partição do mês levando junto as linhas que já caíram na default.
+
+    Com linhas do mês na default o CREATE ... PARTITION OF falha; então a default sai da tabela,
+    a partição nova é criada, as linhas mudam de tabela e a default volta.
+    """
+    name = partition_name(month)
+    lower, upper = _month_bounds(month)
+    in_month = {"lower": lower, "upper": upper}
+    has_rows = connection.execute(
+        text(f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE created_at >= :lower AND created_at < :upper LIMIT 1'),
+        in_month,
+    ).first()
+    if has_rows is None:
+        return create_month_partition(connection, month)
+
+    connection.execute(text(f'ALTER TABLE delivery_logs DETACH PARTITION "{DEFAULT_PARTITION}"'))
+    create_month_partition(connection, month)
+    moved = connection.execute(
+        text(
+            f'INSERT INTO "{name}" SELECT * FROM "{DEFAULT_PARTITION}" '
+            "WHERE created_at >= :lower AND created_at < :upper"
+        ),
+        in_month,
+    ).rowcount
+    connection.execute(
+        text(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= :lower AND created_at < :upper'),
+        in_month,
+    )
+    connection.execute(text(f'ALTER TABLE delivery_logs ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT'))
+    logger.info("Delivery logs moved from default partition=%s rows=%s", name, moved)
+    return name
+
+
+def ensure_delivery_log_partitions(
+    connection: Connection,
+    today: date,
+    months_ahead: int = DELIVERY_LOGS_PARTITIONS_AHEAD,
+) -> List[str]:
+    """Cria as partições do mês corrente e dos próximos meses (no-op fora do Postgres particionado).
+
+    Cada mês roda num savepoint: se um falhar, os demais e a retenção seguem.
+    """
+    if not is_partitioned(connection):
+        return []
+    existing = set(list_partitions(connection))
+    has_default = DEFAULT_PARTITION in existing
+    created = []
+    current = month_start(today)
+    for offset in range(0, max(0, int(months_ahead)) + 1):
+        month = add_months(current, offset)
+        if partition_name(month) in existing:
+            continue
+        try:
+            with connection.begin_nested():
+                if has_default:
+                    created.append(_create_partition_from_default(connection, month))
+                else:
+                    created.append(create_month_partition(connection, month))
+        except Exception:
+            logger.exception("Falha ao criar partição de delivery_logs month=%s", month.isoformat())
+    return created
+
+
+def apply_delivery_log_retention(
+    connection: Connection,
+    today: date,
+    retention_months: int = DELIVERY_LOGS_RETENTION_MONTHS,
+) -> int:
+    """Descarta logs anteriores ao corte: DROP das partições mensais no Postgres, DELETE em lotes nos demais."""
+    cutoff = retention_cutoff(today, retention_months)
+    cutoff_at = datetime(cutoff.year, cutoff.month, cutoff.day, tzinfo=timezone.utc)
+
+    if is_partitioned(connection):
+        dropped = 0
+        for name in list_partitions(connection):
+            month = partition_month(name)
+            if month is not None and add_months(month, 1) <= cutoff:
+                connection.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                dropped += 1
+        if DEFAULT_PARTITION in list_partitions(connection):
+            connection.execute(
+                text(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at < :cutoff'),
+                {"cutoff": cutoff_at},
+            )
+        return dropped
+
+    table = DeliveryLog.__table__
+    deleted = 0
+    while True:
+        ids = [
+            row[0]
+            for row in connection.execute(
+                table.select()
+                .with_only_columns(table.c.id)
+                .where(table.c.created_at < cutoff_at)
+                .limit(_RETENTION_DELETE_BATCH)
+            )
+        ]
+        if not ids:
+            return deleted
+        deleted += connection.execute(table.delete().where(table.c.id.in_(ids))).rowcount or 0
+
+
+def maintain_delivery_logs(today: date | None = None) -> dict:
+    today = today or datetime.now(timezone.utc).date()
+    db = SessionLocal()
+    try:
+        connection = db.connection()
+        created = ensure_delivery_log_partitions(connection, today)
+        removed = apply_delivery_log_retention(connection, today)
+        db.commit()
+        return {"created_partitions": created, "removed": removed}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _seconds_until_next_maintenance(now: datetime) -> float:
+    next_run = now.replace(hour=DELIVERY_LOGS_MAINTENANCE_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_delivery_log_maintenance(stop_event: asyncio.Event) -> None:
+    logger.info(
+        "Delivery log maintenance started hour_utc=%s retention_months=%s",
+        DELIVERY_LOGS_MAINTENANCE_HOUR_UTC,
+        DELIVERY_LOGS_RETENTION_MONTHS,
+    )
+    while not stop_event.is_set():
+        delay = _seconds_until_next_maintenance(datetime.now(timezone.utc))
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            break
+        except asyncio.TimeoutError:
+            pass
+        try:
+            result = await asyncio.to_thread(maintain_delivery_logs)
+            logger.info("Delivery logs maintained result=%s", result)
+        except Exception:
+            logger.exception("Falha na manutenção de delivery_logs")
@@ -14,7 +14,12 @@ from app.models.admin_user import AdminUser
 from app.models.delivery_log import DeliveryLog
 from app.models.delivery_tracking import DeliveryTracking
 from app.models.order import Order
-from app.realtime.publisher import publish_public_tracking_event, publish_standard_delivery_status_event
+from app.realtime.publisher import (
+    publish_batch,
+    publish_public_tracking_event,
+    publish_standard_delivery_status_event,
+)
+from app.services.driver_locations import list_driver_latest_locations
 from app.services.order_events import emit_order_status_changed
 
 OFFLINE = "OFFLINE"
@@ -29,40 +34,14 @@ DELIVERED_STATUSES = {"DELIVERED", "ENTREGUE"}
 def _fetch_delivery_locations(tenant_id: int) -> List[Dict[str, Any]]:
     db = SessionLocal()
     try:
-        latest_location_per_user = (
-            db.query(
-                DeliveryLog.delivery_user_id.label("delivery_user_id"),
-                func.max(DeliveryLog.id).label("latest_log_id"),
-            )
-            .filter(
-                DeliveryLog.tenant_id == int(tenant_id),
-                DeliveryLog.event_type == "location_update",
-            )
-            .group_by(DeliveryLog.delivery_user_id)
-            .subquery()
-        )
-
-        rows = (
-            db.query(
-                DeliveryLog.delivery_user_id,
-                DeliveryLog.latitude,
-                DeliveryLog.longitude,
-                DeliveryLog.created_at,
-            )
-            .join(latest_location_per_user, DeliveryLog.id == latest_location_per_user.c.latest_log_id)
-            .order_by(DeliveryLog.delivery_user_id.asc())
-            .all()
-        )
-
         return [
             {
                 "delivery_user_id": int(row.delivery_user_id),
                 "lat": float(row.latitude),
                 "lng": float(row.longitude),
-                "updated_at": row.created_at.isoformat() if row.created_at is not None else None,
+                "updated_at": row.recorded_at.isoformat() if row.recorded_at is not None else None,
             }
-            for row in rows
-            if row.latitude is not None and row.longitude is not None
+            for row in list_driver_latest_locations(db, tenant_id)
         ]
     finally:
         db.close()
@@ -102,7 +81,7 @@ def _active_order_exists(db: Session, *, tenant_id: int, delivery_user_id: int)
         .filter(
             Order.tenant_id == int(tenant_id),
             Order.assigned_delivery_user_id == int(delivery_user_id),
-            func.upper(Order.status).in_(OUT_FOR_DELIVERY_STATUSES),
+            Order.status.in_(OUT_FOR_DELIVERY_STATUSES),
         )
         .exists()
     )
@@ -115,7 +94,7 @@ def _get_active_order(db: Session, *, tenant_id: int, delivery_user_id: int) ->
         .filter(
             Order.tenant_id == int(tenant_id),
             Order.assigned_delivery_user_id == int(delivery_user_id),
-            func.upper(Order.status).in_(OUT_FOR_DELIVERY_STATUSES),
+            Order.status.in_(OUT_FOR_DELIVERY_STATUSES),
         )
         .order_by(desc(Order.start_delivery_at), desc(Order.created_at), desc(Order.id))
         .first()
@@ -184,7 +163,7 @@ def list_available_orders(db: Session, *, current_user: AdminUser) -> List[Order
         db.query(Order)
         .filter(
             Order.tenant_id == int(current_user.tenant_id),
-            func.upper(Order.status).in_(READY_STATUSES),
+            Order.status.in_(READY_STATUSES),
             Order.assigned_delivery_user_id.is_(None),
         )
         .order_by(desc(Order.created_at))
@@ -233,7 +212,7 @@ def accept_order(db: Session, *, current_user: AdminUser, order_id: int) -> Dict
         .where(
             Order.id == int(order_id),
             Order.tenant_id == tenant_id,
-            func.upper(Order.status).in_(READY_STATUSES),
+            Order.status.in_(READY_STATUSES),
             Order.assigned_delivery_user_id.is_(None),
         )
         .values(
@@ -339,17 +318,18 @@ def complete_delivery(db: Session, *, current_user: AdminUser, order_id: int) ->
 
     db.commit()
     emit_order_status_changed(order, previous_status)
-    publish_standard_delivery_status_event(
-        tenant_id=tenant_id,
-        delivery_user_id=delivery_user_id,
-        status=driver_status,
-    )
-    publish_public_tracking_event(
-        tenant_id=tenant_id,
-        order_id=int(order.id),
-        status=order.status,
-        delivery_user_name=getattr(current_user, "name", None),
-        lat=0.0,
-        lng=0.0,
-    )
+    with publish_batch():
+        publish_standard_delivery_status_event(
+            tenant_id=tenant_id,
+            delivery_user_id=delivery_user_id,
+            status=driver_status,
+        )
+        publish_public_tracking_event(
+            tenant_id=tenant_id,
+            order_id=int(order.id),
+            status=order.status,
+            delivery_user_name=getattr(current_user, "name", None),
+            lat=0.0,
+            lng=0.0,
+        )
     return {"ok": True, "status": order.status, "assigned_delivery_user_id": order.assigned_delivery_user_id}
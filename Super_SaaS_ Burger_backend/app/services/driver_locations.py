@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.delivery_log import DeliveryLog
+from app.models.driver_latest_location import DriverLatestLocation
+
+LOCATION_EVENT_TYPE = "location_update"
+
+_PROJECTION_COLUMNS = ("order_id", "latitude", "longitude", "recorded_at", "updated_at")
+
+
+def _as_utc(value: datetime | None) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def upsert_driver_latest_locations(connection: Connection, rows: Iterable[Dict[str, Any]]) -> int:
+    """Grava a última posição por (tenant, entregador); pings fora de ordem não sobrescrevem um mais novo."""
+    table = DriverLatestLocation.__table__
+    now = datetime.now(timezone.utc)
+    payload = [
+        {
+            "tenant_id": int(row["tenant_id"]),
+            "delivery_user_id": int(row["delivery_user_id"]),
+            "order_id": int(row["order_id"]) if row.get("order_id") is not None else None,
+            "latitude": float(row["latitude"]),
+            "longitude": float(row["longitude"]),
+            "recorded_at": _as_utc(row.get("recorded_at")),
+            "updated_at": now,
+        }
+        for row in rows
+    ]
+    if not payload:
+        return 0
+
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["tenant_id", "delivery_user_id"],
+            set_={column: statement.excluded[column] for column in _PROJECTION_COLUMNS},
+            where=table.c.recorded_at <= statement.excluded.recorded_at,
+        )
+        connection.execute(statement, payload)
+        return len(payload)
+
+    for row in payload:
+        key = (table.c.tenant_id == row["tenant_id"]) & (table.c.delivery_user_id == row["delivery_user_id"])
+        updated = connection.execute(
+            table.update()
+            .where(key, table.c.recorded_at <= row["recorded_at"])
+            .values({column: row[column] for column in _PROJECTION_COLUMNS})
+        ).rowcount
+        if not updated and connection.execute(table.select().where(key)).first() is None:
+            connection.execute(table.insert().values(**row))
+    return len(payload)
+
+
+def record_driver_location(
+    db: Session,
+    *,
+    tenant_id: int,
+    delivery_user_id: int,
+    latitude: float,
+    longitude: float,
+    order_id: int | None = None,
+    recorded_at: datetime | None = None,
+) -> None:
+    """Atualiza a projeção na transação do chamador (confirmada junto com o commit dele)."""
+    upsert_driver_latest_locations(
+        db.connection(),
+        [
+            {
+                "tenant_id": tenant_id,
+                "delivery_user_id": delivery_user_id,
+                "order_id": order_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "recorded_at": recorded_at,
+            }
+        ],
+    )
+
+
+def list_driver_latest_locations(db: Session, tenant_id: int) -> List[DriverLatestLocation]:
+    return (
+        db.query(DriverLatestLocation)
+        .filter(DriverLatestLocation.tenant_id == int(tenant_id))
+        .order_by(DriverLatestLocation.delivery_user_id.asc())
+        .all()
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _project_location_logs(session: Session, _flush_context) -> None:
+    latest: dict[tuple[int, int], DeliveryLog] = {}
+    for instance in session.new:
+        if not isinstance(instance, DeliveryLog) or instance.event_type != LOCATION_EVENT_TYPE:
+            continue
+        if instance.latitude is None or instance.longitude is None:
+            continue
+        key = (int(instance.tenant_id), int(instance.delivery_user_id))
+        current = latest.get(key)
+        if current is None or (_as_utc(current.created_at), current.id) <= (_as_utc(instance.created_at), instance.id):
+            latest[key] = instance
+
+    if not latest:
+        return
+    upsert_driver_latest_locations(
+        session.connection(),
+        [
+            {
+                "tenant_id": log.tenant_id,
+                "delivery_user_id": log.delivery_user_id,
+                "order_id": log.order_id,
+                "latitude": log.latitude,
+                "longitude": log.longitude,
+                "recorded_at": log.created_at,
+            }
+            for log in latest.values()
+        ],
+    )
@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from app.core.database import SessionLocal
 from app.models.order import Order
 from app.services.customer_stats import update_customer_stats_for_order
-from app.realtime.publisher import publish_delivery_assignment_event
+from app.realtime.publisher import publish_delivery_assignment_event, publish_kds_event, publish_order_status_event
 from app.services.event_bus import event_bus
 from app.services.whatsapp_outbound import send_whatsapp_message
 
@@ -100,7 +100,52 @@ def handle_order_status_changed_delivery_stream(payload: dict) -> None:
         payload=payload,
     )
 
+
+def handle_order_status_changed_tracking_stream(payload: dict) -> None:
+    tenant_id = payload.get("tenant_id")
+    order_id = payload.get("order_id")
+    if tenant_id is None or order_id is None or not payload.get("status"):
+        return
+
+    publish_order_status_event(
+        int(tenant_id),
+        int(order_id),
+        status=payload["status"],
+        previous_status=payload.get("previous_status"),
+    )
+
+
+def _publish_kds_order_event(event_type: str, payload: dict) -> None:
+    tenant_id = payload.get("tenant_id")
+    if tenant_id is None:
+        return
+
+    publish_kds_event(
+        int(tenant_id),
+        event_type,
+        {
+            "order_id": payload.get("order_id"),
+            "order_number": payload.get("order_number"),
+            "daily_order_number": payload.get("daily_order_number"),
+            "status": payload.get("status"),
+            "previous_status": payload.get("previous_status"),
+            "delivery_type": payload.get("delivery_type"),
+        },
+    )
+
+
+def handle_order_created_kds_stream(payload: dict) -> None:
+    _publish_kds_order_event("order.created", payload)
+
+
+def handle_order_status_changed_kds_stream(payload: dict) -> None:
+    _publish_kds_order_event("order.status.changed", payload)
+
+
 event_bus.subscribe("order.created", handle_order_created)
 event_bus.subscribe("order.status.changed", handle_order_status_changed)
 event_bus.subscribe("order.delivered", handle_order_delivered)
 event_bus.subscribe("order.status.changed", handle_order_status_changed_delivery_stream)
+event_bus.subscribe("order.created", handle_order_created_kds_stream)
+event_bus.subscribe("order.status.changed", handle_order_status_changed_kds_stream)
+event_bus.subscribe("order.status.changed", handle_order_status_changed_tracking_stream)
@@ -0,0 +1,631 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.integrations.redis_client import get_async_redis_client
+from app.models.customer import Customer
+from app.models.customer_aggregate import CustomerAggregate
+from app.models.export_job import ExportJob
+from app.models.order import Order
+from app.realtime.publisher import export_job_channel, publish_export_job_event
+from app.services import r2_storage
+from app.services.exports import gzip_chunks, iter_csv, iter_ndjson, stream_query
+from app.services.sales_rollups import DailySales, sales_by_day
+
+logger = logging.getLogger(__name__)
+
+EXPORT_JOBS_DIR = Path(os.getenv("EXPORT_JOBS_DIR", "exports"))
+EXPORT_JOBS_STORAGE = os.getenv("EXPORT_JOBS_STORAGE", "local").strip().lower()  # local / r2
+# storage local só serve com uma instância (ou disco compartilhado): o arquivo fica no disco de quem gerou
+EXPORT_JOBS_HOST = os.getenv("EXPORT_JOBS_HOST", "").strip() or socket.gethostname()
+EXPORT_JOBS_POLL_SECONDS = float(os.getenv("EXPORT_JOBS_POLL_SECONDS", "5"))
+EXPORT_JOBS_STALE_SECONDS = int(os.getenv("EXPORT_JOBS_STALE_SECONDS", "3600"))
+EXPORT_JOBS_DOWNLOAD_TTL_SECONDS = int(os.getenv("EXPORT_JOBS_DOWNLOAD_TTL_SECONDS", "3600"))
+EXPORT_JOBS_RETENTION_HOURS = int(os.getenv("EXPORT_JOBS_RETENTION_HOURS", "72"))
+EXPORT_JOBS_CLEANUP_INTERVAL_SECONDS = float(os.getenv("EXPORT_JOBS_CLEANUP_INTERVAL_SECONDS", "3600"))
+
+EXPORT_KINDS = ("customers", "orders", "financial")
+EXPORT_FORMATS = ("csv", "ndjson")
+ACTIVE_STATUSES = ("pending", "running")
+FINISHED_STATUSES = ("done", "failed", "expired")
+
+CUSTOMER_EXPORT_FIELDS = ["name", "phone", "total_spent", "total_orders", "last_order_date", "days_since_last_order"]
+ORDER_EXPORT_FIELDS = [
+    "id",
+    "daily_order_number",
+    "created_at",
+    "status",
+    "order_type",
+    "channel",
+    "customer_name",
+    "customer_phone",
+    "payment_method",
+    "subtotal",
+    "delivery_fee",
+    "total_cents",
+]
+FINANCIAL_EXPORT_FIELDS = [
+    "date",
+    "gross_revenue_cents",
+    "fees_cents",
+    "net_revenue_cents",
+    "cogs_cents",
+    "gross_profit_cents",
+    "orders_count",
+]
+
+_CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+_worker_loop: asyncio.AbstractEventLoop | None = None
+_worker_wakeup: asyncio.Event | None = None
+# SSEs deste processo esperando a conclusão de cada job: job_id -> {(loop, event)}
+_finished_waiters: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+_finished_waiters_lock = Lock()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def customer_export_rows(
+    db: Session,
+    tenant_id: int,
+    *,
+    vip_only: bool = False,
+    inactive_days: int | None = None,
+) -> Iterator[list[Any]]:
+    last_order_at = CustomerAggregate.last_order_at
+    query = db.query(
+        Customer.name,
+        Customer.phone,
+        func.coalesce(CustomerAggregate.total_spent, 0).label("total_spent"),
+        func.coalesce(CustomerAggregate.total_orders, 0).label("total_orders"),
+        last_order_at.label("last_order_date"),
+    ).outerjoin(
+        CustomerAggregate,
+        and_(CustomerAggregate.tenant_id == tenant_id, CustomerAggregate.customer_id == Customer.id),
+    )
+
+    query = query.filter(Customer.tenant_id == tenant_id)
+
+    now = datetime.utcnow()
+    if vip_only:
+        query = query.filter(CustomerAggregate.is_vip.is_(True))
+
+    if inactive_days is not None:
+        threshold = now - timedelta(days=inactive_days)
+        query = query.filter(last_order_at.isnot(None), last_order_at <= threshold)
+
+    query = query.order_by(last_order_at.desc().nullslast(), Customer.id.desc())
+
+    for row in stream_query(query):
+        last_order_date = row.last_order_date
+
+        days_since_last_order = ""
+        if last_order_date is not None:
+            days_since_last_order = max((now - last_order_date.replace(tzinfo=None)).days, 0)
+
+        yield [
+            row.name,
+            row.phone,
+            int(row.total_spent or 0),
+            int(row.total_orders or 0),
+            last_order_date.isoformat() if last_order_date else "",
+            days_since_last_order,
+        ]
+
+
+def order_export_rows(db: Session, tenant_id: int, start: datetime, end: datetime) -> Iterator[list[Any]]:
+    query = (
+        db.query(
+            Order.id,
+            Order.daily_order_number,
+            Order.created_at,
+            Order.status,
+            Order.order_type,
+            Order.channel,
+            func.coalesce(Order.customer_name, Order.cliente_nome).label("customer_name"),
+            func.coalesce(Order.customer_phone, Order.cliente_telefone).label("customer_phone"),
+            func.coalesce(Order.payment_method, Order.forma_pagamento).label("payment_method"),
+            Order.subtotal,
+            Order.delivery_fee,
+            func.coalesce(Order.total_cents, Order.valor_total).label("total_cents"),
+        )
+        .filter(Order.tenant_id == tenant_id, Order.created_at >= start, Order.created_at <= end)
+        .order_by(Order.created_at, Order.id)
+    )
+    for row in stream_query(query):
+        yield [
+            row.id,
+            row.daily_order_number,
+            row.created_at.isoformat() if row.created_at else "",
+            row.status,
+            row.order_type,
+            row.channel or "",
+            row.customer_name or "",
+            row.customer_phone or "",
+            row.payment_method or "",
+            str(row.subtotal or 0),
+            str(row.delivery_fee or 0),
+            int(row.total_cents or 0),
+        ]
+
+
+def financial_export_rows(db: Session, tenant_id: int, start: datetime, end: datetime) -> Iterator[list[Any]]:
+    exclusive_end = datetime.combine(end.date() + timedelta(days=1), time.min)
+    by_day = sales_by_day(db, tenant_id, start, exclusive_end)
+    # mesma regra do resumo: taxas do caixa, se houver alguma no período, senão fee_cents dos pagamentos
+    use_cash_fees = any(totals.cash_fee_movements_count for totals in by_day.values())
+
+    current = start.date()
+    while current <= end.date():
+        totals = by_day.get(current) or DailySales()
+        fees_cents = totals.cash_fees_cents if use_cash_fees else totals.payment_fees_cents
+        net_revenue_cents = totals.payment_gross_cents - fees_cents
+        yield [
+            current.isoformat(),
+            totals.payment_gross_cents,
+            fees_cents,
+            net_revenue_cents,
+            totals.cogs_cents,
+            net_revenue_cents - totals.cogs_cents,
+            totals.payment_orders_count,
+        ]
+        current += timedelta(days=1)
+
+
+def export_dataset(db: Session, job: ExportJob) -> tuple[list[str], Iterator[list[Any]]]:
+    params = json.loads(job.params_json or "{}")
+    tenant_id = int(job.tenant_id)
+    if job.kind == "customers":
+        rows = customer_export_rows(
+            db,
+            tenant_id,
+            vip_only=bool(params.get("vip_only")),
+            inactive_days=params.get("inactive_days"),
+        )
+        return CUSTOMER_EXPORT_FIELDS, rows
+
+    start = datetime.combine(date.fromisoformat(params["from"]), time.min)
+    end = datetime.combine(date.fromisoformat(params["to"]), time.max)
+    if job.kind == "orders":
+        return ORDER_EXPORT_FIELDS, order_export_rows(db, tenant_id, start, end)
+    if job.kind == "financial":
+        return FINANCIAL_EXPORT_FIELDS, financial_export_rows(db, tenant_id, start, end)
+    raise ValueError(f"Tipo de exportação inválido: {job.kind}")
+
+
+def export_dedupe_key(tenant_id: int, kind: str, fmt: str, gzip: bool, params: dict[str, Any]) -> str:
+    raw = json.dumps([int(tenant_id), kind, fmt, bool(gzip), params], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def export_filename(job: ExportJob) -> str:
+    filename = f"{job.kind}_tenant_{job.tenant_id}_{job.id}.{job.format}"
+    return f"{filename}.gz" if job.gzip else filename
+
+
+def export_content_type(job: ExportJob) -> str:
+    if job.gzip:
+        return "application/gzip"
+    return _CONTENT_TYPES.get(job.format, "application/octet-stream")
+
+
+def export_job_payload(job: ExportJob) -> dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "format": job.format,
+        "gzip": bool(job.gzip),
+        "status": job.status,
+        "rows_count": int(job.rows_count or 0),
+        "size_bytes": int(job.size_bytes or 0),
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "download_url": f"/api/reports/exports/{job.id}/download" if job.status == "done" else None,
+    }
+
+
+def _active_job(db: Session, dedupe_key: str) -> ExportJob | None:
+    return (
+        db.query(ExportJob)
+        .filter(ExportJob.dedupe_key == dedupe_key, ExportJob.status.in_(ACTIVE_STATUSES))
+        .first()
+    )
+
+
+def request_export_job(
+    db: Session,
+    *,
+    tenant_id: int,
+    kind: str,
+    fmt: str = "csv",
+    gzip: bool = False,
+    params: dict[str, Any] | None = None,
+    user_id: int | None = None,
+) -> tuple[ExportJob, bool]:
+    """Enfileira a exportação; um pedido idêntico já em andamento é reaproveitado (retorna created=False)."""
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Tipo de exportação inválido: {kind}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação inválido: {fmt}")
+
+    params = params or {}
+    dedupe_key = export_dedupe_key(tenant_id, kind, fmt, gzip, params)
+    existing = _active_job(db, dedupe_key)
+    if existing is not None:
+        return existing, False
+
+    job = ExportJob(
+        tenant_id=int(tenant_id),
+        requested_by_user_id=user_id,
+        kind=kind,
+        format=fmt,
+        gzip=bool(gzip),
+        params_json=json.dumps(params, sort_keys=True),
+        dedupe_key=dedupe_key,
+        status="pending",
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # outra requisição idêntica criou o job entre a leitura e o insert
+        db.rollback()
+        existing = _active_job(db, dedupe_key)
+        if existing is None:
+            raise
+        return existing, False
+    db.refresh(job)
+    notify_export_worker()
+    return job, True
+
+
+def _write_chunks(path: Path, chunks: Iterable[bytes]) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.part")
+    size = 0
+    try:
+        with partial.open("wb") as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+                size += len(chunk)
+        partial.replace(path)
+    finally:
+        partial.unlink(missing_ok=True)
+    return size
+
+
+def _produce_artifact(db: Session, job: ExportJob) -> None:
+    header, rows = export_dataset(db, job)
+    rows_count = 0
+
+    def _counted() -> Iterator[list[Any]]:
+        nonlocal rows_count
+        for row in rows:
+            rows_count += 1
+            yield row
+
+    chunks = iter_csv(header, _counted()) if job.format == "csv" else iter_ndjson(header, _counted())
+    if job.gzip:
+        chunks = gzip_chunks(chunks)
+
+    filename = export_filename(job)
+    path = EXPORT_JOBS_DIR / str(job.tenant_id) / filename
+    job.size_bytes = _write_chunks(path, chunks)
+    job.rows_count = rows_count
+    job.filename = filename
+
+    if EXPORT_JOBS_STORAGE == "r2":
+        job.location = r2_storage.upload_export_file(path, job.tenant_id, filename, export_content_type(job))
+        job.storage = "r2"
+        path.unlink(missing_ok=True)
+    else:
+        job.location = str(path)
+        job.storage = "local"
+        job.host = EXPORT_JOBS_HOST
+
+
+def _publish_job_event(job: ExportJob) -> None:
+    event_type = "export.completed" if job.status == "done" else "export.failed"
+    _notify_finished_waiters(job.id)
+    publish_export_job_event(job.tenant_id, job.id, {"type": event_type, **export_job_payload(job)})
+
+
+def _notify_finished_waiters(job_id: str) -> None:
+    with _finished_waiters_lock:
+        waiters = _finished_waiters.pop(job_id, set())
+    for loop, finished in waiters:
+        try:
+            loop.call_soon_threadsafe(finished.set)
+        except RuntimeError:
+            pass
+
+
+async def _set_on_job_message(pubsub, finished: asyncio.Event) -> None:
+    async for message in pubsub.listen():
+        if message.get("type") == "message":
+            finished.set()
+            return
+
+
+@asynccontextmanager
+async def export_job_finished_signal(job_id: str) -> AsyncIterator[asyncio.Event]:
+    """Event setado quando o job termina: pelo worker deste processo ou, via Redis, pelo de outro.
+
+    Entre no contexto antes de ler o status do job, para não perder uma conclusão no meio.
+    """
+    finished = asyncio.Event()
+    waiter = (asyncio.get_running_loop(), finished)
+    with _finished_waiters_lock:
+        _finished_waiters.setdefault(job_id, set()).add(waiter)
+
+    client = get_async_redis_client()
+    pubsub = None
+    listener: asyncio.Task | None = None
+    try:
+        if client is not None:
+            try:
+                pubsub = client.pubsub()
+                await pubsub.subscribe(export_job_channel(job_id))
+                listener = asyncio.create_task(_set_on_job_message(pubsub, finished))
+            except Exception:
+                logger.warning("Export job subscribe failed job_id=%s; falling back to periodic checks", job_id)
+        yield finished
+    finally:
+        with _finished_waiters_lock:
+            waiters = _finished_waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    _finished_waiters.pop(job_id, None)
+        if listener is not None:
+            listener.cancel()
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+        if client is not None:
+            await client.aclose()
+
+
+def run_export_job(job_id: str, session_factory: Callable[[], Session] = SessionLocal) -> str | None:
+    """Executa um job pendente; retorna o status final ou None se outro worker já o assumiu."""
+    db = session_factory()
+    try:
+        claimed = (
+            db.query(ExportJob)
+            .filter(ExportJob.id == job_id, ExportJob.status == "pending")
+            .update({"status": "running", "started_at": _utcnow()}, synchronize_session=False)
+        )
+        db.commit()
+        if not claimed:
+            return None
+
+        job = db.get(ExportJob, job_id)
+        try:
+            _produce_artifact(db, job)
+            job.status = "done"
+        except Exception as exc:
+            logger.exception("Export job failed job_id=%s kind=%s", job_id, job.kind)
+            db.rollback()
+            job = db.get(ExportJob, job_id)
+            job.status = "failed"
+            job.error = str(exc)[:500]
+        job.finished_at = _utcnow()
+        db.commit()
+        logger.info(
+            "Export job finished job_id=%s tenant_id=%s status=%s rows=%s bytes=%s",
+            job.id,
+            job.tenant_id,
+            job.status,
+            job.rows_count,
+            job.size_bytes,
+        )
+        _publish_job_event(job)
+        return job.status
+    finally:
+        db.close()
+
+
+def requeue_stale_export_jobs(db: Session, *, now: datetime | None = None) -> int:
+    """Devolve à fila jobs "running" de um worker que morreu no meio da exportação."""
+    threshold = (now or _utcnow()) - timedelta(seconds=EXPORT_JOBS_STALE_SECONDS)
+    requeued = (
+        db.query(ExportJob)
+        .filter(ExportJob.status == "running", ExportJob.started_at < threshold)
+        .update({"status": "pending", "started_at": None}, synchronize_session=False)
+    )
+    db.commit()
+    return int(requeued or 0)
+
+
+def _delete_artifact(job: ExportJob) -> None:
+    if not job.location:
+        return
+    if job.storage == "r2":
+        r2_storage.delete_export_file(job.location)
+    else:
+        Path(job.location).unlink(missing_ok=True)
+
+
+def expire_export_artifacts(db: Session, *, now: datetime | None = None) -> int:
+    """Apaga os arquivos (disco ou R2) de jobs concluídos há mais de EXPORT_JOBS_RETENTION_HOURS."""
+    threshold = (now or _utcnow()) - timedelta(hours=EXPORT_JOBS_RETENTION_HOURS)
+    jobs = (
+        db.query(ExportJob)
+        .filter(
+            ExportJob.status == "done",
+            ExportJob.finished_at < threshold,
+            # arquivo local de outra instância: quem apaga é a limpeza de lá
+            or_(ExportJob.storage != "local", ExportJob.host.is_(None), ExportJob.host == EXPORT_JOBS_HOST),
+        )
+        .order_by(ExportJob.finished_at)
+        .limit(500)
+        .all()
+    )
+    expired = 0
+    for job in jobs:
+        try:
+            _delete_artifact(job)
+        except Exception:
+            # fica "done" e é tentado de novo na próxima limpeza
+            logger.exception("Failed to delete export artifact job_id=%s storage=%s", job.id, job.storage)
+            continue
+        job.status = "expired"
+        job.location = None
+        expired += 1
+    db.commit()
+    return expired
+
+
+def export_job_snapshot(
+    job_id: str,
+    tenant_id: int,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> dict[str, Any] | None:
+    db = session_factory()
+    try:
+        job = db.query(ExportJob).filter(ExportJob.id == job_id, ExportJob.tenant_id == tenant_id).first()
+        return export_job_payload(job) if job is not None else None
+    finally:
+        db.close()
+
+
+def notify_export_worker() -> None:
+    loop, wakeup = _worker_loop, _worker_wakeup
+    if loop is None or wakeup is None:
+        return
+    try:
+        loop.call_soon_threadsafe(wakeup.set)
+    except RuntimeError:
+        pass
+
+
+def _next_pending_job_id(session_factory: Callable[[], Session]) -> str | None:
+    db = session_factory()
+    try:
+        row = (
+            db.query(ExportJob.id)
+            .filter(ExportJob.status == "pending")
+            .order_by(ExportJob.created_at, ExportJob.id)
+            .first()
+        )
+        return row.id if row is not None else None
+    finally:
+        db.close()
+
+
+def _requeue_with_new_session(session_factory: Callable[[], Session]) -> int:
+    db = session_factory()
+    try:
+        return requeue_stale_export_jobs(db)
+    finally:
+        db.close()
+
+
+def local_export_hosts(db: Session) -> set[str]:
+    """Instâncias com arquivos locais ainda disponíveis; mais de uma quer dizer downloads quebrados."""
+    rows = (
+        db.query(ExportJob.host)
+        .filter(ExportJob.status == "done", ExportJob.storage == "local", ExportJob.host.isnot(None))
+        .distinct()
+        .all()
+    )
+    return {row.host for row in rows}
+
+
+def _expire_with_new_session(session_factory: Callable[[], Session]) -> int:
+    db = session_factory()
+    try:
+        return expire_export_artifacts(db)
+    finally:
+        db.close()
+
+
+def _local_hosts_with_new_session(session_factory: Callable[[], Session]) -> set[str]:
+    db = session_factory()
+    try:
+        return local_export_hosts(db)
+    finally:
+        db.close()
+
+
+async def run_export_worker(
+    stop_event: asyncio.Event,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> None:
+    """Processa export_jobs um por vez em thread, fora dos workers da API."""
+    global _worker_loop, _worker_wakeup
+    _worker_loop = asyncio.get_running_loop()
+    _worker_wakeup = asyncio.Event()
+    logger.info("Export worker started storage=%s", EXPORT_JOBS_STORAGE)
+    try:
+        try:
+            requeued = await asyncio.to_thread(_requeue_with_new_session, session_factory)
+            if requeued:
+                logger.warning("Export jobs requeued after stale run count=%s", requeued)
+        except Exception:
+            logger.exception("Failed to requeue stale export jobs")
+
+        next_cleanup = monotonic()
+        while not stop_event.is_set():
+            if monotonic() >= next_cleanup:
+                next_cleanup = monotonic() + EXPORT_JOBS_CLEANUP_INTERVAL_SECONDS
+                try:
+                    expired = await asyncio.to_thread(_expire_with_new_session, session_factory)
+                    if expired:
+                        logger.info("Export artifacts expired count=%s", expired)
+                except Exception:
+                    logger.exception("Failed to expire export artifacts")
+                if EXPORT_JOBS_STORAGE == "local":
+                    try:
+                        hosts = await asyncio.to_thread(_local_hosts_with_new_session, session_factory)
+                        if len(hosts) > 1:
+                            logger.error(
+                                "EXPORT_JOBS_STORAGE=local com várias instâncias hosts=%s: o download só "
+                                "funciona na instância que gerou o arquivo; configure EXPORT_JOBS_STORAGE=r2",
+                                sorted(hosts),
+                            )
+                    except Exception:
+                        logger.exception("Failed to check export storage hosts")
+            try:
+                job_id = await asyncio.to_thread(_next_pending_job_id, session_factory)
+                if job_id is not None:
+                    await asyncio.to_thread(run_export_job, job_id, session_factory)
+                    continue
+            except Exception:
+                logger.exception("Export worker iteration failed")
+
+            waiters = {
+                asyncio.create_task(_worker_wakeup.wait()),
+                asyncio.create_task(stop_event.wait()),
+            }
+            try:
+                await asyncio.wait(waiters, timeout=EXPORT_JOBS_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+            _worker_wakeup.clear()
+    finally:
+        _worker_loop = None
+        _worker_wakeup = None
+        logger.info("Export worker stopped")
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import zlib
+from typing import Any, Iterable, Iterator, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "500"))
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+
+def stream_query(query: Query, yield_per: int = EXPORT_YIELD_PER) -> Iterator[Any]:
+    """Itera o resultado por cursor do servidor, em lotes de `yield_per` linhas."""
+    return iter(query.execution_options(stream_results=True).yield_per(yield_per))
+
+
+def iter_csv(
+    header: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Iterator[bytes]:
+    """Serializa as linhas em blocos de até `chunk_rows`, sem montar o arquivo inteiro."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(
+    fields: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Iterator[bytes]:
+    """Uma linha JSON por registro, com as mesmas colunas do CSV como chaves."""
+    lines: list[str] = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str))
+        if len(lines) >= chunk_rows:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = EXPORT_GZIP_LEVEL) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def csv_streaming_response(
+    header: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    filename: str,
+    *,
+    gzip: bool = False,
+) -> StreamingResponse:
+    chunks = iter_csv(header, rows)
+    media_type = "text/csv; charset=utf-8"
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        media_type = "application/gzip"
+        filename = f"{filename}.gz"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
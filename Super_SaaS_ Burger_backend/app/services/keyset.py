@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values: Any) -> str:
+    """Cursor opaco para paginação por chave (keyset) a partir dos valores da última linha."""
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> list[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("cursor size")
+        return [
+            None if value is None else datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for value, kind in zip(values, types)
+        ]
+    except (ValueError, TypeError, UnicodeError) as exc:
+        raise HTTPException(status_code=400, detail="Cursor inválido") from exc
@@ -0,0 +1,524 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Callable, Iterable
+
+from redis import Redis
+from sqlalchemy import JSON, DateTime, Float, Integer, bindparam, cast, column, inspect, update, values
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.integrations.redis_client import get_redis_client
+from app.models.delivery_log import DeliveryLog
+from app.models.delivery_tracking import DeliveryTracking
+from app.models.order import Order
+from app.services.driver_locations import LOCATION_EVENT_TYPE, upsert_driver_latest_locations
+
+logger = logging.getLogger(__name__)
+
+LOCATION_FLUSH_BATCH_SIZE = int(os.getenv("LOCATION_FLUSH_BATCH_SIZE", "500"))
+LOCATION_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOCATION_FLUSH_INTERVAL_SECONDS", "2.0"))
+LOCATION_MAX_PENDING = int(os.getenv("LOCATION_MAX_PENDING", "50000"))
+# lotes por posse do lock; o que sobrar sai no flush seguinte (de qualquer worker), logo em seguida
+LOCATION_FLUSH_MAX_BATCHES = int(os.getenv("LOCATION_FLUSH_MAX_BATCHES", "20"))
+LOCATION_REPLAY_MAX_ATTEMPTS = int(os.getenv("LOCATION_REPLAY_MAX_ATTEMPTS", "5"))
+
+PENDING_KEY = "locations:write_buffer"
+PROCESSING_KEY = "locations:write_buffer:processing"
+REPLAY_ATTEMPTS_KEY = "locations:write_buffer:processing:attempts"
+DEAD_LETTER_KEY = "locations:write_buffer:dead"
+FLUSH_LOCK_KEY = "locations:write_buffer:lock"
+FLUSH_LOCK_TTL_SECONDS = 30
+
+# colunas que um ping pode alterar; qualquer outra mudança (geocode, destino, tracking novo) grava na hora
+_ORDER_LOCATION_ATTRS = {"driver_lat", "driver_lng"}
+_TRACKING_LOCATION_ATTRS = {
+    "current_lat",
+    "current_lng",
+    "delivery_user_id",
+    "route_distance_meters",
+    "route_duration_seconds",
+    "initial_distance_meters",
+    "expected_delivery_at",
+    "route_geometry",
+}
+
+
+def _parse_datetime(value: Any) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _only_changed(instance: Any, allowed: set[str]) -> bool:
+    state = inspect(instance)
+    return all(attr.key in allowed or not attr.history.has_changes() for attr in state.attrs)
+
+
+def _latest_by(fixes: Iterable[dict[str, Any]], *keys: str) -> list[dict[str, Any]]:
+    latest: dict[tuple, dict[str, Any]] = {}
+    for fix in fixes:
+        key = tuple(fix[name] for name in keys)
+        current = latest.get(key)
+        if current is None or current["recorded_at"] <= fix["recorded_at"]:
+            latest[key] = fix
+    return list(latest.values())
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _unlogged(connection: Connection, fixes: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    # replay após queda entre commit e limpeza do buffer, ou lote reenviado pelo app: não duplica linhas
+    if not fixes:
+        return fixes
+    table = DeliveryLog.__table__
+    recorded = [fix["recorded_at"] for fix in fixes]
+    existing = {
+        (int(row.order_id), int(row.delivery_user_id), _naive_utc(row.created_at))
+        for row in connection.execute(
+            table.select()
+            .with_only_columns(table.c.order_id, table.c.delivery_user_id, table.c.created_at)
+            .where(
+                table.c.event_type == LOCATION_EVENT_TYPE,
+                table.c.order_id.in_({fix["order_id"] for fix in fixes}),
+                table.c.created_at >= min(recorded),
+                table.c.created_at <= max(recorded),
+            )
+        )
+    }
+    return [
+        fix
+        for fix in fixes
+        if (fix["order_id"], fix["delivery_user_id"], _naive_utc(fix["recorded_at"])) not in existing
+    ]
+
+
+def _update_orders(connection: Connection, fixes: list[dict[str, Any]]) -> None:
+    orders = Order.__table__
+    if connection.dialect.name == "postgresql":
+        rows = values(
+            column("order_id", Integer), column("lat", Float), column("lng", Float), name="v"
+        ).data([(fix["order_id"], fix["lat"], fix["lng"]) for fix in fixes])
+        connection.execute(
+            update(orders)
+            .where(orders.c.id == rows.c.order_id)
+            .values(driver_lat=rows.c.lat, driver_lng=rows.c.lng)
+        )
+        return
+    connection.execute(
+        update(orders)
+        .where(orders.c.id == bindparam("b_order_id"))
+        .values(driver_lat=bindparam("b_lat"), driver_lng=bindparam("b_lng")),
+        [{"b_order_id": fix["order_id"], "b_lat": fix["lat"], "b_lng": fix["lng"]} for fix in fixes],
+    )
+
+
+def _update_trackings(connection: Connection, fixes: list[dict[str, Any]]) -> None:
+    tracking = DeliveryTracking.__table__
+    if connection.dialect.name == "postgresql":
+        rows = values(
+            column("order_id", Integer),
+            column("delivery_user_id", Integer),
+            column("lat", Float),
+            column("lng", Float),
+            column("distance", Integer),
+            column("initial_distance", Integer),
+            column("duration", Integer),
+            column("expected_at", DateTime(timezone=True)),
+            column("geometry", JSON(none_as_null=True)),
+            name="v",
+        ).data(
+            [
+                (
+                    fix["order_id"],
+                    fix["delivery_user_id"],
+                    fix["lat"],
+                    fix["lng"],
+                    fix.get("route_distance_meters"),
+                    fix.get("initial_distance_meters"),
+                    fix.get("route_duration_seconds"),
+                    _parse_datetime(fix.get("expected_delivery_at")),
+                    fix.get("route_geometry"),
+                )
+                for fix in fixes
+            ]
+        )
+        # lotes só com NULL chegariam como text no VALUES; o cast fixa o tipo de cada coluna
+        connection.execute(
+            update(tracking)
+            .where(tracking.c.order_id == rows.c.order_id)
+            .values(
+                delivery_user_id=rows.c.delivery_user_id,
+                current_lat=rows.c.lat,
+                current_lng=rows.c.lng,
+                route_distance_meters=cast(rows.c.distance, Integer),
+                route_duration_seconds=cast(rows.c.duration, Integer),
+                initial_distance_meters=cast(rows.c.initial_distance, Integer),
+                expected_delivery_at=cast(rows.c.expected_at, DateTime(timezone=True)),
+                route_geometry=cast(rows.c.geometry, JSON(none_as_null=True)),
+            )
+        )
+        return
+    connection.execute(
+        update(tracking)
+        .where(tracking.c.order_id == bindparam("b_order_id"))
+        .values(
+            delivery_user_id=bindparam("b_delivery_user_id"),
+            current_lat=bindparam("b_lat"),
+            current_lng=bindparam("b_lng"),
+            route_distance_meters=bindparam("b_distance", type_=Integer),
+            route_duration_seconds=bindparam("b_duration", type_=Integer),
+            initial_distance_meters=bindparam("b_initial_distance", type_=Integer),
+            expected_delivery_at=bindparam("b_expected_at", type_=DateTime(timezone=True)),
+            route_geometry=bindparam("b_geometry", type_=JSON(none_as_null=True)),
+        ),
+        [
+            {
+                "b_order_id": fix["order_id"],
+                "b_delivery_user_id": fix["delivery_user_id"],
+                "b_lat": fix["lat"],
+                "b_lng": fix["lng"],
+                "b_distance": fix.get("route_distance_meters"),
+                "b_initial_distance": fix.get("initial_distance_meters"),
+                "b_duration": fix.get("route_duration_seconds"),
+                "b_expected_at": _parse_datetime(fix.get("expected_delivery_at")),
+                "b_geometry": fix.get("route_geometry"),
+            }
+            for fix in fixes
+        ],
+    )
+
+
+def insert_location_track(
+    connection: Connection,
+    fixes: list[dict[str, Any]],
+    *,
+    skip_existing: bool = True,
+) -> int:
+    """Insere os pings como location_update num único INSERT em lote (created_at = recorded_at do ping)."""
+    fixes = [{**fix, "recorded_at": _parse_datetime(fix["recorded_at"])} for fix in fixes]
+    if skip_existing:
+        fixes = _unlogged(connection, fixes)
+    if not fixes:
+        return 0
+    connection.execute(
+        DeliveryLog.__table__.insert(),
+        [
+            {
+                "tenant_id": fix["tenant_id"],
+                "order_id": fix["order_id"],
+                "delivery_user_id": fix["delivery_user_id"],
+                "event_type": LOCATION_EVENT_TYPE,
+                "latitude": fix["lat"],
+                "longitude": fix["lng"],
+                "created_at": fix["recorded_at"],
+            }
+            for fix in fixes
+        ],
+    )
+    return len(fixes)
+
+
+def persist_location_fixes(connection: Connection, fixes: list[dict[str, Any]], *, replay: bool = False) -> int:
+    """Grava um lote de pings: insert em lote dos logs e um UPDATE por tabela com a última posição de cada pedido."""
+    fixes = [{**fix, "recorded_at": _parse_datetime(fix["recorded_at"])} for fix in fixes]
+    if not fixes:
+        return 0
+
+    insert_location_track(connection, [fix for fix in fixes if fix.get("log")], skip_existing=replay)
+
+    latest_per_order = _latest_by(fixes, "order_id")
+    order_fixes = [fix for fix in latest_per_order if fix.get("update_order")]
+    if order_fixes:
+        _update_orders(connection, order_fixes)
+    _update_trackings(connection, latest_per_order)
+
+    upsert_driver_latest_locations(
+        connection,
+        [
+            {
+                "tenant_id": fix["tenant_id"],
+                "delivery_user_id": fix["delivery_user_id"],
+                "order_id": fix["order_id"],
+                "latitude": fix["lat"],
+                "longitude": fix["lng"],
+                "recorded_at": fix["recorded_at"],
+            }
+            for fix in _latest_by(fixes, "tenant_id", "delivery_user_id")
+        ],
+    )
+    return len(fixes)
+
+
+class LocationWriteBuffer:
+    """Write-behind dos pings de localização: enfileira em memória e grava no banco em lote.
+
+    `enqueue` roda no event loop e não faz I/O; o flush (numa thread) passa os pings para o Redis
+    e só então grava, para que outro worker possa retomá-los. Se o processo cair antes disso, perde
+    os pings ainda em memória (até `flush_interval` segundos ou `batch_size` pings): a posição volta
+    no ping seguinte do entregador, só o histórico (location_update) fica sem esses pontos.
+    O lote reivindicado fica em PROCESSING_KEY até o commit; se o processo cair no meio, o próximo
+    flush (de qualquer worker) reprocessa esse lote antes de pegar novos pings. Um lote que falha
+    `max_replay_attempts` vezes vai para DEAD_LETTER_KEY, para não travar a fila.
+    Sem Redis o buffer é só em memória; sem o writer rodando (scripts, testes) o chamador grava na hora.
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_size: int = LOCATION_FLUSH_BATCH_SIZE,
+        flush_interval: float = LOCATION_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = LOCATION_MAX_PENDING,
+        max_batches: int = LOCATION_FLUSH_MAX_BATCHES,
+        max_replay_attempts: int = LOCATION_REPLAY_MAX_ATTEMPTS,
+        redis_factory: Callable[[], Redis | None] = get_redis_client,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_batches = max_batches
+        self.max_replay_attempts = max_replay_attempts
+        self._redis_factory = redis_factory
+        self._redis: Redis | None = None
+        self._pending: deque[str] = deque(maxlen=max_pending)
+        self._lock = Lock()
+        self._since_flush = 0
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._wakeup is not None
+
+    def enqueue(self, fix: dict[str, Any]) -> bool:
+        if not self.running:
+            return False
+        fix.setdefault("event_id", uuid.uuid4().hex)
+        recorded_at = fix.get("recorded_at") or datetime.now(timezone.utc)
+        fix["recorded_at"] = recorded_at.isoformat() if isinstance(recorded_at, datetime) else str(recorded_at)
+        raw = json.dumps(fix, default=str)
+
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(raw)
+            self._since_flush += 1
+            should_wake = self._since_flush >= self.batch_size
+        if should_wake:
+            self._wake()
+        return True
+
+    def _wake(self) -> None:
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass
+
+    def defer(
+        self,
+        db: Session,
+        *,
+        order: Order,
+        tracking: DeliveryTracking,
+        delivery_user_id: int,
+        latitude: float,
+        longitude: float,
+        recorded_at: datetime | None = None,
+        log: bool = False,
+        update_order: bool = False,
+    ) -> bool:
+        """Tira o ping da transação do request quando só colunas de localização mudaram.
+
+        Retorna False quando o chamador deve gravar e fazer commit normalmente.
+        """
+        if not self.running or tracking in db.new:
+            return False
+        if not _only_changed(order, _ORDER_LOCATION_ATTRS) or not _only_changed(tracking, _TRACKING_LOCATION_ATTRS):
+            return False
+        expected_at = tracking.expected_delivery_at
+        queued = self.enqueue(
+            {
+                "tenant_id": int(order.tenant_id),
+                "order_id": int(order.id),
+                "delivery_user_id": int(delivery_user_id),
+                "lat": float(latitude),
+                "lng": float(longitude),
+                "recorded_at": recorded_at,
+                "log": log,
+                "update_order": update_order,
+                "route_distance_meters": tracking.route_distance_meters,
+                "initial_distance_meters": tracking.initial_distance_meters,
+                "route_duration_seconds": tracking.route_duration_seconds,
+                "expected_delivery_at": expected_at.isoformat() if expected_at is not None else None,
+                "route_geometry": tracking.route_geometry,
+            }
+        )
+        if queued:
+            # os objetos seguem legíveis no request, mas o commit do chamador não grava mais nada deles
+            db.expunge(order)
+            db.expunge(tracking)
+        return queued
+
+    def _drain_memory(self) -> list[str]:
+        with self._lock:
+            rows = list(self._pending)
+            self._pending.clear()
+            self._since_flush = 0
+        return rows
+
+    def _claim(self, redis: Redis) -> list[bytes]:
+        pipeline = redis.pipeline(transaction=True)
+        for _ in range(self.batch_size):
+            pipeline.lmove(PENDING_KEY, PROCESSING_KEY, "LEFT", "RIGHT")
+        return [raw for raw in pipeline.execute() if raw is not None]
+
+    def _write(self, raws: list[Any], session_factory: Callable[[], Session], *, replay: bool = False) -> int:
+        fixes = [json.loads(raw) for raw in raws]
+        db = session_factory()
+        try:
+            written = persist_location_fixes(db.connection(), fixes, replay=replay)
+            db.commit()
+            return written
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _replay(self, redis: Redis, leftover: list[bytes], session_factory: Callable[[], Session]) -> int:
+        attempts = int(redis.incr(REPLAY_ATTEMPTS_KEY))
+        if attempts > self.max_replay_attempts:
+            pipeline = redis.pipeline(transaction=True)
+            pipeline.rpush(DEAD_LETTER_KEY, *leftover)
+            pipeline.delete(PROCESSING_KEY, REPLAY_ATTEMPTS_KEY)
+            pipeline.execute()
+            logger.error(
+                "Lote de localizações falhou %s vezes; movido para %s size=%s",
+                attempts - 1,
+                DEAD_LETTER_KEY,
+                len(leftover),
+            )
+            return 0
+        logger.warning("Reprocessando lote de localizações pendente size=%s attempt=%s", len(leftover), attempts)
+        written = self._write(leftover, session_factory, replay=True)
+        redis.delete(PROCESSING_KEY, REPLAY_ATTEMPTS_KEY)
+        return written
+
+    def _extend_lock(self, redis: Redis, token: str) -> bool:
+        # renova o TTL a cada lote: um flush longo não perde o lock para outro worker no meio
+        if redis.get(FLUSH_LOCK_KEY) not in (token, token.encode()):
+            return False
+        redis.expire(FLUSH_LOCK_KEY, FLUSH_LOCK_TTL_SECONDS)
+        return True
+
+    def flush(self, session_factory: Callable[[], Session] = SessionLocal) -> int:
+        written = 0
+        memory = self._drain_memory()
+        redis = self._redis
+        if memory and redis is not None:
+            try:
+                redis.rpush(PENDING_KEY, *memory)
+                memory = []
+            except Exception:
+                logger.exception("Falha ao enfileirar pings no Redis; gravando direto size=%s", len(memory))
+        if memory:
+            try:
+                written += self._write(memory, session_factory)
+            except Exception:
+                logger.exception("Falha ao gravar lote de localizações em memória size=%s", len(memory))
+
+        if redis is None:
+            return written
+        token = uuid.uuid4().hex
+        try:
+            if not redis.set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TTL_SECONDS):
+                return written
+        except Exception:
+            logger.exception("Falha ao obter lock do flush de localizações")
+            return written
+        backlog = False
+        try:
+            leftover = redis.lrange(PROCESSING_KEY, 0, -1)
+            if leftover:
+                written += self._replay(redis, leftover, session_factory)
+            for _ in range(self.max_batches):
+                if not self._extend_lock(redis, token):
+                    break
+                batch = self._claim(redis)
+                if not batch:
+                    break
+                written += self._write(batch, session_factory)
+                redis.delete(PROCESSING_KEY)
+            else:
+                backlog = True
+        except Exception:
+            logger.exception("Falha ao gravar lote de localizações; lote fica em %s para replay", PROCESSING_KEY)
+        finally:
+            try:
+                if redis.get(FLUSH_LOCK_KEY) in (token, token.encode()):
+                    redis.delete(FLUSH_LOCK_KEY)
+            except Exception:
+                logger.exception("Falha ao liberar lock do flush de localizações")
+        if backlog:
+            self._wake()
+        return written
+
+    async def run(
+        self,
+        stop_event: asyncio.Event,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self._redis = self._redis_factory()
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        logger.info(
+            "Location writer started batch_size=%s interval=%s redis=%s",
+            self.batch_size,
+            self.flush_interval,
+            self._redis is not None,
+        )
+        try:
+            # replay de lotes deixados por um processo que caiu
+            await asyncio.to_thread(self.flush, session_factory)
+            while not stop_event.is_set():
+                waiters = {
+                    asyncio.create_task(self._wakeup.wait()),
+                    asyncio.create_task(stop_event.wait()),
+                }
+                try:
+                    await asyncio.wait(waiters, timeout=self.flush_interval, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for waiter in waiters:
+                        waiter.cancel()
+                self._wakeup.clear()
+                await asyncio.to_thread(self.flush, session_factory)
+        finally:
+            self._wakeup = None
+            self._loop = None
+            self.flush(session_factory)
+            if self._redis is not None:
+                self._redis.close()
+                self._redis = None
+            logger.info("Location writer stopped")
+
+
+location_write_buffer = LocationWriteBuffer()
+
+
+async def run_location_writer(stop_event: asyncio.Event) -> None:
+    await location_write_buffer.run(stop_event)
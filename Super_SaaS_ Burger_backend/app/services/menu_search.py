@@ -1,8 +1,8 @@
 import difflib
 import re
 import unicodedata
-
-from app.models.menu_item import MenuItem
+from functools import lru_cache
+from typing import Any, Sequence
 
 
 _ALIAS_PATTERNS = (
@@ -13,6 +13,16 @@ _ALIAS_PATTERNS = (
     (r"\b2\s*l\b", "2 litros"),
     (r"\b2\s*litros?\b", "2 litros"),
 )
+# Uma única alternância compilada aplica todos os aliases em uma passada.
+_ALIAS_REGEX = re.compile(
+    "|".join(f"(?P<alias{index}>{pattern})" for index, (pattern, _replacement) in enumerate(_ALIAS_PATTERNS))
+)
+_ALIAS_REPLACEMENTS = {
+    f"alias{index}": replacement for index, (_pattern, replacement) in enumerate(_ALIAS_PATTERNS)
+}
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s]|_")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+NORMALIZE_CACHE_SIZE = 4096
 
 _GENERIC_TOKENS = {"coca", "refrigerante"}
 _STRONG_TOKEN_PHRASES = {"lata", "zero", "2 litros"}
@@ -21,25 +31,25 @@ _MODIFIER_TRIGGER_PATTERN = re.compile(
     re.IGNORECASE,
 )
 _NEGATIVE_TRIGGER_WORDS = {"sem", "tirar", "remover", "remova", "retirar"}
+# Fração mínima dos trigramas da busca que um item precisa compartilhar para virar candidato.
+_MIN_TRIGRAM_OVERLAP = 0.3
 
 
 def _apply_aliases(text: str) -> str:
-    for pattern, replacement in _ALIAS_PATTERNS:
-        text = re.sub(pattern, replacement, text)
-    return text
+    return _ALIAS_REGEX.sub(lambda match: _ALIAS_REPLACEMENTS[match.lastgroup], text)
 
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize(text: str) -> str:
     text = text.lower()
     text = unicodedata.normalize("NFKD", text)
     text = "".join(char for char in text if not unicodedata.combining(char))
-    text = re.sub(r"[-_]", " ", text)
-    text = re.sub(r"[^\w\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _PUNCTUATION_PATTERN.sub(" ", text)
+    text = _WHITESPACE_PATTERN.sub(" ", text).strip()
     if not text:
         return ""
     text = _apply_aliases(text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _WHITESPACE_PATTERN.sub(" ", text).strip()
     return text
 
 
@@ -116,17 +126,35 @@ def _score_match(normalized_query: str, normalized_name: str) -> float:
     if normalized_query == normalized_name:
         return 1.0
 
-    query_tokens = set(normalized_query.split())
-    name_tokens = set(normalized_name.split())
+    query_tokens = frozenset(normalized_query.split())
+    name_tokens = frozenset(normalized_name.split())
     if not query_tokens or not name_tokens:
         return 0.0
 
+    return _score_tokens(
+        normalized_query,
+        query_tokens,
+        _extract_strong_tokens(set(query_tokens), normalized_query),
+        normalized_name,
+        name_tokens,
+    )
+
+
+def _score_tokens(
+    normalized_query: str,
+    query_tokens: frozenset[str],
+    strong_tokens: set[str],
+    normalized_name: str,
+    name_tokens: frozenset[str],
+) -> float:
+    if normalized_query == normalized_name:
+        return 1.0
+
     shared_tokens = query_tokens & name_tokens
     token_match_ratio = len(shared_tokens) / max(len(query_tokens), 1)
     name_match_ratio = len(shared_tokens) / max(len(name_tokens), 1)
     score = (token_match_ratio * 0.75) + (name_match_ratio * 0.25)
 
-    strong_tokens = _extract_strong_tokens(query_tokens, normalized_query)
     if strong_tokens:
         strong_hits = 0
         for token in strong_tokens:
@@ -143,25 +171,109 @@ def _score_match(normalized_query: str, normalized_name: str) -> float:
     if len(query_tokens) == 1 and next(iter(query_tokens)) in _GENERIC_TOKENS:
         score *= 0.6
 
-    similarity = difflib.SequenceMatcher(None, normalized_query, normalized_name).ratio()
-    score = max(score, similarity * 0.6)
-
     if normalized_query in normalized_name:
-        score = max(score, 0.78)
+        return min(max(score, 0.78), 1.0)
+
+    # ratio() <= quick_ratio() <= real_quick_ratio(): só calcula a similaridade
+    # completa quando ela ainda pode superar o score por tokens.
+    matcher = difflib.SequenceMatcher(None, normalized_query, normalized_name)
+    if matcher.real_quick_ratio() * 0.6 > score and matcher.quick_ratio() * 0.6 > score:
+        score = max(score, matcher.ratio() * 0.6)
 
     return min(score, 1.0)
 
 
+def _trigrams(text: str) -> set[str]:
+    padded = f" {text} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+class MenuSearchIndex:
+    """Índice de busca de um cardápio, construído uma vez por versão do menu.
+
+    Guarda nomes normalizados, tokens, índice invertido token -> itens e
+    postings de trigramas; só os candidatos vindos do índice são pontuados.
+    """
+
+    def __init__(self, items: Sequence[Any], min_trigram_overlap: float = _MIN_TRIGRAM_OVERLAP) -> None:
+        self.min_trigram_overlap = min_trigram_overlap
+        entries: list[tuple[Any, str, frozenset[str]]] = []
+        for item in items:
+            normalized_name = getattr(item, "normalized_name", None)
+            if normalized_name is None:
+                normalized_name = normalize(item.name or "")
+            if not normalized_name:
+                continue
+            entries.append((item, normalized_name, frozenset(normalized_name.split())))
+
+        self.items = tuple(entry[0] for entry in entries)
+        self.normalized_names = tuple(entry[1] for entry in entries)
+        self.token_sets = tuple(entry[2] for entry in entries)
+
+        token_postings: dict[str, list[int]] = {}
+        trigram_postings: dict[str, list[int]] = {}
+        for position, (_item, normalized_name, tokens) in enumerate(entries):
+            for token in tokens:
+                token_postings.setdefault(token, []).append(position)
+            for trigram in _trigrams(normalized_name):
+                trigram_postings.setdefault(trigram, []).append(position)
+        self.token_postings = {token: tuple(positions) for token, positions in token_postings.items()}
+        self.trigram_postings = {
+            trigram: tuple(positions) for trigram, positions in trigram_postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def candidates(self, normalized_query: str) -> list[int]:
+        positions: set[int] = set()
+        for token in normalized_query.split():
+            positions.update(self.token_postings.get(token, ()))
+
+        query_trigrams = _trigrams(normalized_query)
+        required = max(1, int(len(query_trigrams) * self.min_trigram_overlap))
+        overlap: dict[int, int] = {}
+        for trigram in query_trigrams:
+            for position in self.trigram_postings.get(trigram, ()):
+                overlap[position] = overlap.get(position, 0) + 1
+        positions.update(position for position, hits in overlap.items() if hits >= required)
+        return sorted(positions)
+
+    def search(self, query: str, limit: int = 3) -> list[tuple[Any, float]]:
+        normalized_query = normalize(query)
+        if not normalized_query:
+            return []
+
+        query_tokens = frozenset(normalized_query.split())
+        strong_tokens = _extract_strong_tokens(set(query_tokens), normalized_query)
+        results: list[tuple[Any, float]] = []
+        for position in self.candidates(normalized_query):
+            score = _score_tokens(
+                normalized_query,
+                query_tokens,
+                strong_tokens,
+                self.normalized_names[position],
+                self.token_sets[position],
+            )
+            if score > 0:
+                results.append((self.items[position], score))
+
+        results.sort(key=lambda entry: entry[1], reverse=True)
+        return results[:limit]
+
+
 def _search_menu_items_in_list(
-    items: list[MenuItem], query: str, limit: int = 3
-) -> list[tuple[MenuItem, float]]:
+    items: Sequence[Any], query: str, limit: int = 3
+) -> list[tuple[Any, float]]:
     normalized_query = normalize(query)
     if not normalized_query:
         return []
 
-    results: list[tuple[MenuItem, float]] = []
+    results: list[tuple[Any, float]] = []
     for item in items:
-        normalized_name = normalize(item.name)
+        normalized_name = getattr(item, "normalized_name", None)
+        if normalized_name is None:
+            normalized_name = normalize(item.name)
         if not normalized_name:
             continue
 
@@ -173,18 +285,16 @@ def _search_menu_items_in_list(
     return results[:limit]
 
 
-def search_menu_items(db, tenant_id: int, query: str, limit: int = 3) -> list[tuple[MenuItem, float]]:
-    items = (
-        db.query(MenuItem)
-        .filter(MenuItem.tenant_id == tenant_id, MenuItem.active.is_(True))
-        .all()
-    )
-    return _search_menu_items_in_list(items, query, limit=limit)
+def search_menu_items(db, tenant_id: int, query: str, limit: int = 3) -> list[tuple[Any, float]]:
+    from app.services.menu_snapshot import get_menu_snapshot
+
+    snapshot = get_menu_snapshot(db, tenant_id)
+    return snapshot.search_index.search(query, limit=limit)
 
 
 def search_menu_items_in_candidates(
-    items: list[MenuItem], query: str, limit: int = 3
-) -> list[tuple[MenuItem, float]]:
+    items: Sequence[Any], query: str, limit: int = 3
+) -> list[tuple[Any, float]]:
     return _search_menu_items_in_list(items, query, limit=limit)
 
 
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from threading import Lock
+from types import MappingProxyType
+from typing import Mapping
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.menu_item import MenuItem
+from app.models.menu_item_modifier_group import MenuItemModifierGroup
+from app.models.modifier import Modifier
+from app.models.modifier_group import ModifierGroup
+from app.realtime.cache_invalidation import broadcast_cache_invalidation, register_cache_invalidation
+from app.services.menu_search import MenuSearchIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+# rede de segurança: edições chegam aos outros workers pelo aviso de invalidação (Redis Pub/Sub);
+# só sem Redis, ou com o aviso perdido, um worker serve o cardápio antigo por até este tempo
+MENU_SNAPSHOT_TTL_SECONDS = float(os.getenv("MENU_SNAPSHOT_TTL_SECONDS", "300"))
+_CACHE_NAME = "menu_snapshot"
+
+_MENU_MODELS = (MenuItem, Modifier, ModifierGroup, MenuItemModifierGroup)
+_DIRTY_TENANTS_KEY = "menu_snapshot_dirty_tenants"
+_ALL_TENANTS = "*"
+
+
+@dataclass(frozen=True)
+class SnapshotMenuItem:
+    id: int
+    name: str
+    price_cents: int
+    category_id: int | None
+    normalized_name: str
+
+
+@dataclass(frozen=True)
+class SnapshotModifier:
+    id: int
+    group_id: int
+    name: str
+    price_cents: int
+    normalized_name: str
+
+
+@dataclass(frozen=True)
+class SnapshotModifierGroup:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class TenantMenuSnapshot:
+    tenant_id: int
+    version: int
+    items: tuple[SnapshotMenuItem, ...]
+    modifiers: tuple[SnapshotModifier, ...]
+    modifier_groups: tuple[SnapshotModifierGroup, ...]
+    item_group_links: tuple[tuple[int, int], ...]
+    built_at: float = field(default_factory=time.monotonic)
+    items_by_id: Mapping[int, SnapshotMenuItem] = field(init=False, repr=False, compare=False)
+    group_ids_by_item: Mapping[int, tuple[int, ...]] = field(init=False, repr=False, compare=False)
+    modifiers_by_group: Mapping[int, tuple[SnapshotModifier, ...]] = field(
+        init=False, repr=False, compare=False
+    )
+    tenant_modifiers: tuple[SnapshotModifier, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        active_group_ids = {group.id for group in self.modifier_groups}
+        group_ids_by_item: dict[int, list[int]] = {}
+        for item_id, group_id in self.item_group_links:
+            if group_id in active_group_ids:
+                group_ids_by_item.setdefault(item_id, []).append(group_id)
+        modifiers_by_group: dict[int, list[SnapshotModifier]] = {}
+        for modifier in self.modifiers:
+            modifiers_by_group.setdefault(modifier.group_id, []).append(modifier)
+
+        object.__setattr__(self, "items_by_id", MappingProxyType({item.id: item for item in self.items}))
+        object.__setattr__(
+            self,
+            "group_ids_by_item",
+            MappingProxyType({key: tuple(value) for key, value in group_ids_by_item.items()}),
+        )
+        object.__setattr__(
+            self,
+            "modifiers_by_group",
+            MappingProxyType({key: tuple(value) for key, value in modifiers_by_group.items()}),
+        )
+        object.__setattr__(
+            self,
+            "tenant_modifiers",
+            tuple(modifier for modifier in self.modifiers if modifier.group_id in active_group_ids),
+        )
+
+    @cached_property
+    def search_index(self) -> MenuSearchIndex:
+        return MenuSearchIndex(self.items)
+
+    def get_item(self, item_id: int | None) -> SnapshotMenuItem | None:
+        if item_id is None:
+            return None
+        return self.items_by_id.get(item_id)
+
+    def modifier_group_ids_for_item(self, item_id: int) -> list[int]:
+        return list(self.group_ids_by_item.get(item_id, ()))
+
+    def modifiers_for_item(self, item_id: int) -> list[SnapshotModifier]:
+        modifiers: list[SnapshotModifier] = []
+        for group_id in self.group_ids_by_item.get(item_id, ()):
+            modifiers.extend(self.modifiers_by_group.get(group_id, ()))
+        return modifiers
+
+
+_snapshots: dict[int, TenantMenuSnapshot] = {}
+_versions: dict[int, int] = {}
+_generation = 0
+_lock = Lock()
+
+
+def _current_version(tenant_id: int) -> int:
+    return _generation + _versions.get(tenant_id, 0)
+
+
+def build_menu_snapshot(db: Session, tenant_id: int, version: int = 0) -> TenantMenuSnapshot:
+    menu_items = (
+        db.query(MenuItem)
+        .filter(MenuItem.tenant_id == tenant_id, MenuItem.active.is_(True))
+        .order_by(MenuItem.name.asc(), MenuItem.id.asc())
+        .all()
+    )
+    modifiers = (
+        db.query(Modifier)
+        .filter(Modifier.tenant_id == tenant_id, Modifier.active.is_(True))
+        .order_by(Modifier.id.asc())
+        .all()
+    )
+    modifier_groups = (
+        db.query(ModifierGroup)
+        .filter(ModifierGroup.tenant_id == tenant_id, ModifierGroup.active.is_(True))
+        .order_by(ModifierGroup.id.asc())
+        .all()
+    )
+    item_groups = (
+        db.query(MenuItemModifierGroup.menu_item_id, MenuItemModifierGroup.modifier_group_id)
+        .filter(MenuItemModifierGroup.tenant_id == tenant_id)
+        .order_by(MenuItemModifierGroup.id.asc())
+        .all()
+    )
+
+    return TenantMenuSnapshot(
+        tenant_id=tenant_id,
+        version=version,
+        items=tuple(
+            SnapshotMenuItem(
+                id=item.id,
+                name=item.name,
+                price_cents=int(item.price_cents or 0),
+                category_id=item.category_id,
+                normalized_name=normalize(item.name or ""),
+            )
+            for item in menu_items
+        ),
+        modifiers=tuple(
+            SnapshotModifier(
+                id=modifier.id,
+                group_id=modifier.group_id,
+                name=modifier.name,
+                price_cents=int(modifier.price_cents or 0),
+                normalized_name=normalize(modifier.name or ""),
+            )
+            for modifier in modifiers
+        ),
+        modifier_groups=tuple(
+            SnapshotModifierGroup(id=group.id, name=group.name) for group in modifier_groups
+        ),
+        item_group_links=tuple((int(item_id), int(group_id)) for item_id, group_id in item_groups),
+    )
+
+
+def get_menu_snapshot(db: Session, tenant_id: int) -> TenantMenuSnapshot:
+    with _lock:
+        snapshot = _snapshots.get(tenant_id)
+        version = _current_version(tenant_id)
+    if snapshot is not None and snapshot.version == version:
+        if time.monotonic() - snapshot.built_at < MENU_SNAPSHOT_TTL_SECONDS:
+            return snapshot
+
+    snapshot = build_menu_snapshot(db, tenant_id, version=version)
+    with _lock:
+        # Uma edição concorrente durante o build invalida o resultado; não guarda no cache.
+        if _current_version(tenant_id) == version:
+            _snapshots[tenant_id] = snapshot
+    logger.debug(
+        "Menu snapshot built: tenant_id=%s version=%s items=%s modifiers=%s",
+        tenant_id,
+        version,
+        len(snapshot.items),
+        len(snapshot.modifiers),
+    )
+    return snapshot
+
+
+def invalidate_menu_snapshot(tenant_id: int | None = None) -> None:
+    global _generation
+    with _lock:
+        if tenant_id is None:
+            _generation += 1
+            _snapshots.clear()
+            return
+        _versions[tenant_id] = _versions.get(tenant_id, 0) + 1
+        _snapshots.pop(tenant_id, None)
+
+
+register_cache_invalidation(_CACHE_NAME, invalidate_menu_snapshot)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_menu_changes(session: Session, _flush_context) -> None:
+    dirty = session.info.setdefault(_DIRTY_TENANTS_KEY, set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, _MENU_MODELS):
+            dirty.add(getattr(instance, "tenant_id", None) or _ALL_TENANTS)
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _track_menu_bulk_changes(context) -> None:
+    mapper = getattr(context, "mapper", None)
+    if mapper is not None and issubclass(mapper.class_, _MENU_MODELS):
+        context.session.info.setdefault(_DIRTY_TENANTS_KEY, set()).add(_ALL_TENANTS)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    dirty = session.info.pop(_DIRTY_TENANTS_KEY, None)
+    if not dirty:
+        return
+    if _ALL_TENANTS in dirty:
+        invalidate_menu_snapshot()
+        broadcast_cache_invalidation(_CACHE_NAME, None)
+        return
+    for tenant_id in dirty:
+        invalidate_menu_snapshot(int(tenant_id))
+        broadcast_cache_invalidation(_CACHE_NAME, int(tenant_id))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_TENANTS_KEY, None)
@@ -58,3 +58,34 @@ def upload_file(
     _get_r2_client().upload_fileobj(file.file, r2_bucket_name, object_key)
 
     return f"{r2_public_url}/{object_key}"
+
+
+def upload_export_file(path: str | Path, tenant_id: int, filename: str, content_type: str) -> str:
+    """Envia um arquivo de exportação e retorna a chave do objeto (bucket privado, baixar via URL assinada)."""
+    r2_bucket_name = _get_required_env("R2_BUCKET_NAME")
+    object_key = "/".join(["tenants", _sanitize_key_part(str(tenant_id)), "exports", _sanitize_key_part(filename)])
+    _get_r2_client().upload_file(
+        str(path),
+        r2_bucket_name,
+        object_key,
+        ExtraArgs={"ContentType": content_type},
+    )
+    return object_key
+
+
+def presigned_download_url(object_key: str, filename: str, expires_in: int = 3600) -> str:
+    r2_bucket_name = _get_required_env("R2_BUCKET_NAME")
+    return _get_r2_client().generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": r2_bucket_name,
+            "Key": object_key,
+            "ResponseContentDisposition": f'attachment; filename="{filename}"',
+        },
+        ExpiresIn=expires_in,
+    )
+
+
+def delete_export_file(object_key: str) -> None:
+    r2_bucket_name = _get_required_env("R2_BUCKET_NAME")
+    _get_r2_client().delete_object(Bucket=r2_bucket_name, Key=object_key)
@@ -0,0 +1,1333 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from threading import Lock
+from typing import Any, Callable, Iterable
+
+from sqlalchemy import case, event, exists, func, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.finance import CashMovement, OrderPayment
+from app.models.inventory import InventoryItem, InventoryMovement
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.models.sales_rollup import DailyItemSales, DailyPaidItemSales, DailySalesRollup
+from app.models.tenant import Tenant
+
+logger = logging.getLogger(__name__)
+
+SALES_ROLLUP_RECONCILE_DAYS = int(os.getenv("SALES_ROLLUP_RECONCILE_DAYS", "3"))
+SALES_ROLLUP_RECONCILE_HOUR_UTC = int(os.getenv("SALES_ROLLUP_RECONCILE_HOUR_UTC", "6"))
+SALES_ROLLUP_REFRESH_DELAY_SECONDS = float(os.getenv("SALES_ROLLUP_REFRESH_DELAY_SECONDS", "5"))
+
+DELIVERED_ORDER_STATUS = "ENTREGUE"
+FEE_CATEGORIES = ("fee", "taxa", "taxas")
+
+_DIRTY_DAYS_KEY = "sales_rollup_dirty_days"
+_DIRTY_ITEM_DAYS_KEY = "item_sales_dirty_days"
+_DIRTY_PAID_ITEM_DAYS_KEY = "paid_item_sales_dirty_days"
+_ITEM_SALES_KEY = ("tenant_id", "day", "menu_item_id", "production_area", "item_name")
+_ITEM_SALES_COUNTERS = ("quantity", "gross_revenue_cents", "modifier_revenue_cents")
+_ITEM_SALES_COLUMNS = (
+    "tenant_id", "created_at", "menu_item_id", "production_area", "name", "quantity", "subtotal_cents",
+    "modifiers", "modifiers_json",
+)
+_PAID_ITEM_SALES_COLUMNS = ("tenant_id", "order_id", "menu_item_id", "name", "quantity", "subtotal_cents")
+# colunas de dia de cada model; mudar uma delas marca o dia antigo e o novo
+_TRACKED_COLUMNS: dict[type, tuple[str, ...]] = {
+    Order: ("created_at",),
+    OrderPayment: ("created_at", "paid_at"),
+    CashMovement: ("occurred_at",),
+    InventoryMovement: ("created_at",),
+}
+# colunas que entram nos rollups; edições em outras (GPS, endereço, observação) não marcam nada
+_ROLLUP_VALUE_COLUMNS: dict[type, tuple[str, ...]] = {
+    Order: ("tenant_id", "total_cents", "valor_total", "status"),
+    OrderPayment: ("tenant_id", "order_id", "method", "amount_cents", "fee_cents", "status"),
+    CashMovement: ("tenant_id", "type", "category", "amount_cents"),
+    InventoryMovement: ("tenant_id", "inventory_item_id", "type", "reason", "quantity"),
+}
+
+
+@dataclass
+class DailySales:
+    """Totais de um dia (ou de um intervalo, quando somados com merge)."""
+
+    orders_count: int = 0
+    gross_sales_cents: int = 0
+    open_orders_count: int = 0
+    paid_orders_count: int = 0
+    payment_gross_cents: int = 0
+    payment_fees_cents: int = 0
+    payment_orders_count: int = 0
+    payment_methods: dict[str, list[int]] = field(default_factory=dict)
+    cash_in_cents: int = 0
+    cash_out_cents: int = 0
+    cash_fees_cents: int = 0
+    cash_fee_movements_count: int = 0
+    cogs_cents: int = 0
+    cogs_movements_count: int = 0
+
+    @property
+    def avg_ticket_cents(self) -> int:
+        return int(self.gross_sales_cents / self.orders_count) if self.orders_count else 0
+
+    @property
+    def net_cash_cents(self) -> int:
+        return self.cash_in_cents - self.cash_out_cents
+
+    @property
+    def fees_cents(self) -> int:
+        # taxas lançadas no caixa têm prioridade sobre fee_cents dos pagamentos
+        return self.cash_fees_cents if self.cash_fee_movements_count else self.payment_fees_cents
+
+    @property
+    def has_payments_or_cogs(self) -> bool:
+        return bool(self.payment_orders_count or self.payment_gross_cents or self.cogs_movements_count)
+
+    def add_payment_method(self, method: str, total_cents: int, count: int) -> None:
+        entry = self.payment_methods.setdefault(method, [0, 0])
+        entry[0] += int(total_cents)
+        entry[1] += int(count)
+
+    def merge(self, other: "DailySales") -> "DailySales":
+        self.orders_count += other.orders_count
+        self.gross_sales_cents += other.gross_sales_cents
+        self.open_orders_count += other.open_orders_count
+        self.paid_orders_count += other.paid_orders_count
+        self.payment_gross_cents += other.payment_gross_cents
+        self.payment_fees_cents += other.payment_fees_cents
+        self.payment_orders_count += other.payment_orders_count
+        for method, (total_cents, count) in other.payment_methods.items():
+            self.add_payment_method(method, total_cents, count)
+        self.cash_in_cents += other.cash_in_cents
+        self.cash_out_cents += other.cash_out_cents
+        self.cash_fees_cents += other.cash_fees_cents
+        self.cash_fee_movements_count += other.cash_fee_movements_count
+        self.cogs_cents += other.cogs_cents
+        self.cogs_movements_count += other.cogs_movements_count
+        return self
+
+    def payment_method_breakdown(self) -> list[dict[str, Any]]:
+        rows = [
+            {"method": method, "total_cents": int(total_cents), "count": int(count)}
+            for method, (total_cents, count) in self.payment_methods.items()
+        ]
+        rows.sort(key=lambda row: row["total_cents"], reverse=True)
+        return rows
+
+    @classmethod
+    def from_rollup(cls, row: DailySalesRollup) -> "DailySales":
+        try:
+            methods = json.loads(row.payment_methods_json or "{}")
+        except ValueError:
+            methods = {}
+        return cls(
+            orders_count=int(row.orders_count or 0),
+            gross_sales_cents=int(row.gross_sales_cents or 0),
+            open_orders_count=int(row.open_orders_count or 0),
+            paid_orders_count=int(row.paid_orders_count or 0),
+            payment_gross_cents=int(row.payment_gross_cents or 0),
+            payment_fees_cents=int(row.payment_fees_cents or 0),
+            payment_orders_count=int(row.payment_orders_count or 0),
+            payment_methods={str(key): [int(value[0]), int(value[1])] for key, value in methods.items()},
+            cash_in_cents=int(row.cash_in_cents or 0),
+            cash_out_cents=int(row.cash_out_cents or 0),
+            cash_fees_cents=int(row.cash_fees_cents or 0),
+            cash_fee_movements_count=int(row.cash_fee_movements_count or 0),
+            cogs_cents=int(row.cogs_cents or 0),
+            cogs_movements_count=int(row.cogs_movements_count or 0),
+        )
+
+    def apply_to(self, row: DailySalesRollup) -> None:
+        row.orders_count = self.orders_count
+        row.gross_sales_cents = self.gross_sales_cents
+        row.open_orders_count = self.open_orders_count
+        row.paid_orders_count = self.paid_orders_count
+        row.avg_ticket_cents = self.avg_ticket_cents
+        row.payment_gross_cents = self.payment_gross_cents
+        row.payment_fees_cents = self.payment_fees_cents
+        row.payment_orders_count = self.payment_orders_count
+        row.payment_methods_json = json.dumps(self.payment_methods, sort_keys=True, separators=(",", ":"))
+        row.cash_in_cents = self.cash_in_cents
+        row.cash_out_cents = self.cash_out_cents
+        row.cash_fees_cents = self.cash_fees_cents
+        row.cash_fee_movements_count = self.cash_fee_movements_count
+        row.cogs_cents = self.cogs_cents
+        row.cogs_movements_count = self.cogs_movements_count
+        row.refreshed_at = datetime.now(timezone.utc)
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _as_date(value: Any) -> date | None:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return _naive_utc(value).date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def _days(first_day: date, last_day: date) -> Iterable[date]:
+    current = first_day
+    while current <= last_day:
+        yield current
+        current += timedelta(days=1)
+
+
+def aggregate_sales_by_day(
+    db: Session,
+    tenant_id: int,
+    start: datetime,
+    end: datetime,
+) -> dict[date, DailySales]:
+    """Agrega as linhas brutas de [start, end) por dia UTC."""
+    start, end = _naive_utc(start), _naive_utc(end)
+    totals: dict[date, DailySales] = {}
+
+    def _bucket(value: Any) -> DailySales | None:
+        day = _as_date(value)
+        if day is None:
+            return None
+        return totals.setdefault(day, DailySales())
+
+    order_day = func.date(Order.created_at)
+    order_total = func.coalesce(Order.total_cents, Order.valor_total, 0)
+    order_rows = (
+        db.query(
+            order_day.label("day"),
+            func.count(Order.id).label("orders_count"),
+            func.coalesce(func.sum(order_total), 0).label("gross_sales_cents"),
+            func.coalesce(
+                func.sum(case((Order.status != DELIVERED_ORDER_STATUS, 1), else_=0)),
+                0,
+            ).label("open_orders_count"),
+        )
+        .filter(Order.tenant_id == tenant_id, Order.created_at >= start, Order.created_at < end)
+        .group_by(order_day)
+        .all()
+    )
+    for row in order_rows:
+        bucket = _bucket(row.day)
+        if bucket is not None:
+            bucket.orders_count += int(row.orders_count or 0)
+            bucket.gross_sales_cents += int(row.gross_sales_cents or 0)
+            bucket.open_orders_count += int(row.open_orders_count or 0)
+
+    paid_rows = (
+        db.query(
+            order_day.label("day"),
+            func.count(func.distinct(OrderPayment.order_id)).label("paid_orders_count"),
+        )
+        .join(Order, Order.id == OrderPayment.order_id)
+        .filter(
+            Order.tenant_id == tenant_id,
+            Order.created_at >= start,
+            Order.created_at < end,
+            OrderPayment.status == "paid",
+        )
+        .group_by(order_day)
+        .all()
+    )
+    for row in paid_rows:
+        bucket = _bucket(row.day)
+        if bucket is not None:
+            bucket.paid_orders_count += int(row.paid_orders_count or 0)
+
+    payment_time = func.coalesce(OrderPayment.paid_at, OrderPayment.created_at)
+    payment_day = func.date(payment_time)
+    payment_filters = (
+        OrderPayment.tenant_id == tenant_id,
+        OrderPayment.status == "paid",
+        payment_time >= start,
+        payment_time < end,
+    )
+    method_rows = (
+        db.query(
+            payment_day.label("day"),
+            OrderPayment.method.label("method"),
+            func.coalesce(func.sum(OrderPayment.amount_cents), 0).label("total_cents"),
+            func.coalesce(func.sum(OrderPayment.fee_cents), 0).label("fees_cents"),
+            func.count(OrderPayment.id).label("count"),
+        )
+        .filter(*payment_filters)
+        .group_by(payment_day, OrderPayment.method)
+        .all()
+    )
+    for row in method_rows:
+        bucket = _bucket(row.day)
+        if bucket is not None:
+            bucket.payment_gross_cents += int(row.total_cents or 0)
+            bucket.payment_fees_cents += int(row.fees_cents or 0)
+            bucket.add_payment_method(str(row.method or ""), int(row.total_cents or 0), int(row.count or 0))
+
+    payment_order_rows = (
+        db.query(
+            payment_day.label("day"),
+            func.count(func.distinct(OrderPayment.order_id)).label("orders_count"),
+        )
+        .filter(*payment_filters)
+        .group_by(payment_day)
+        .all()
+    )
+    for row in payment_order_rows:
+        bucket = _bucket(row.day)
+        if bucket is not None:
+            bucket.payment_orders_count += int(row.orders_count or 0)
+
+    cash_day = func.date(CashMovement.occurred_at)
+    is_fee = func.lower(CashMovement.category).in_(FEE_CATEGORIES)
+    cash_rows = (
+        db.query(
+            cash_day.label("day"),
+            func.coalesce(
+                func.sum(case((CashMovement.type == "in", CashMovement.amount_cents), else_=0)), 0
+            ).label("cash_in_cents"),
+            func.coalesce(
+                func.sum(case((CashMovement.type != "in", CashMovement.amount_cents), else_=0)), 0
+            ).label("cash_out_cents"),
+            func.coalesce(func.sum(case((is_fee, CashMovement.amount_cents), else_=0)), 0).label("fees_cents"),
+            func.coalesce(func.sum(case((is_fee, 1), else_=0)), 0).label("fee_count"),
+        )
+        .filter(
+            CashMovement.tenant_id == tenant_id,
+            CashMovement.occurred_at >= start,
+            CashMovement.occurred_at < end,
+        )
+        .group_by(cash_day)
+        .all()
+    )
+    for row in cash_rows:
+        bucket = _bucket(row.day)
+        if bucket is not None:
+            bucket.cash_in_cents += int(row.cash_in_cents or 0)
+            bucket.cash_out_cents += int(row.cash_out_cents or 0)
+            bucket.cash_fees_cents += int(row.fees_cents or 0)
+            bucket.cash_fee_movements_count += int(row.fee_count or 0)
+
+    cogs_rows = (
+        db.query(
+            func.date(InventoryMovement.created_at).label("day"),
+            InventoryMovement.quantity,
+            InventoryItem.cost_cents,
+        )
+        .join(InventoryItem, InventoryItem.id == InventoryMovement.inventory_item_id)
+        .filter(
+            InventoryMovement.tenant_id == tenant_id,
+            InventoryMovement.type == "OUT",
+            InventoryMovement.reason == "sale",
+            InventoryMovement.created_at >= start,
+            InventoryMovement.created_at < end,
+        )
+        .all()
+    )
+    for row in cogs_rows:
+        bucket = _bucket(row.day)
+        if bucket is not None:
+            bucket.cogs_cents += int(round(float(row.quantity or 0) * int(row.cost_cents or 0)))
+            bucket.cogs_movements_count += 1
+
+    return totals
+
+
+def _write_rollups(
+    db: Session,
+    tenant_id: int,
+    days: Iterable[date],
+    totals: dict[date, DailySales],
+    existing: dict[date, DailySalesRollup],
+) -> None:
+    for day in days:
+        row = existing.get(day)
+        if row is None:
+            row = DailySalesRollup(tenant_id=tenant_id, day=day)
+            db.add(row)
+        totals.get(day, DailySales()).apply_to(row)
+
+
+def refresh_daily_rollups(db: Session, tenant_id: int, first_day: date, last_day: date) -> int:
+    """Recalcula (e grava) os rollups de first_day..last_day a partir das linhas brutas."""
+    if first_day > last_day:
+        return 0
+    totals = aggregate_sales_by_day(db, tenant_id, _day_start(first_day), _day_start(last_day + timedelta(days=1)))
+    existing = {
+        row.day: row
+        for row in db.query(DailySalesRollup)
+        .filter(
+            DailySalesRollup.tenant_id == tenant_id,
+            DailySalesRollup.day >= first_day,
+            DailySalesRollup.day <= last_day,
+        )
+        .all()
+    }
+    days = list(_days(first_day, last_day))
+    _write_rollups(db, tenant_id, days, totals, existing)
+    db.commit()
+    return len(days)
+
+
+def _day_runs(days: Iterable[date]) -> Iterable[tuple[date, date]]:
+    """Agrupa dias em intervalos contíguos: 3 e 4 viram (3, 4); 3 e 30 ficam separados."""
+    first = last = None
+    for day in sorted(set(days)):
+        if last is not None and day == last + timedelta(days=1):
+            last = day
+            continue
+        if first is not None:
+            yield first, last
+        first = last = day
+    if first is not None:
+        yield first, last
+
+
+def _rebuild_days(
+    db: Session,
+    tenant_days: Iterable[tuple[int, date]],
+    rebuild: Callable[[Session, int, date, date], int],
+    table: str,
+) -> set[tuple[int, date]]:
+    """Recalcula só os dias informados (sem o intervalo entre eles); devolve os que falharam."""
+    days_by_tenant: dict[int, list[date]] = {}
+    for tenant_id, day in tenant_days:
+        days_by_tenant.setdefault(int(tenant_id), []).append(day)
+    failed: set[tuple[int, date]] = set()
+    for tenant_id, days in days_by_tenant.items():
+        for first_day, last_day in _day_runs(days):
+            try:
+                rebuild(db, tenant_id, first_day, last_day)
+            except Exception:
+                db.rollback()
+                failed.update((tenant_id, day) for day in _days(first_day, last_day))
+                logger.exception(
+                    "Falha ao regravar %s tenant_id=%s days=%s..%s", table, tenant_id, first_day, last_day
+                )
+    return failed
+
+
+def refresh_rollup_days(db: Session, tenant_days: Iterable[tuple[int, date]]) -> set[tuple[int, date]]:
+    return _rebuild_days(db, tenant_days, refresh_daily_rollups, "daily_sales_rollups")
+
+
+class SalesRollupRefreshQueue:
+    """Dias (tenant, dia) a recalcular por tabela (rollup, itens, itens pagos), drenados por uma task de fundo.
+
+    `enqueue` é thread-safe (after_commit roda no loop ou no threadpool) e não toca no banco.
+    Sem a task rodando, devolve False e o chamador decide o que fazer.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session] = SessionLocal,
+        delay_seconds: float = SALES_ROLLUP_REFRESH_DELAY_SECONDS,
+    ) -> None:
+        self.delay_seconds = delay_seconds
+        self._session_factory = session_factory
+        self._pending: dict[str, set[tuple[int, date]]] = {}
+        self._lock = Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._wakeup is not None
+
+    def enqueue(self, tenant_days: Iterable[tuple[int, date]], *, target: str = "sales") -> bool:
+        """`target`: "sales" (daily_sales_rollups), "items" (daily_item_sales) ou "paid_items"."""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None:
+            return False
+        with self._lock:
+            was_empty = not self._pending
+            self._pending.setdefault(target, set()).update(tenant_days)
+        if was_empty:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass
+        return True
+
+    def _drain(self) -> dict[str, set[tuple[int, date]]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _refresh(self, pending: dict[str, set[tuple[int, date]]]) -> None:
+        rebuilders = {
+            "sales": refresh_rollup_days,
+            "items": rebuild_item_sales_days,
+            "paid_items": rebuild_paid_item_sales_days,
+        }
+        db = self._session_factory()
+        try:
+            failed = {target: rebuilders[target](db, tenant_days) for target, tenant_days in pending.items()}
+        finally:
+            db.close()
+        failed = {target: tenant_days for target, tenant_days in failed.items() if tenant_days}
+        if failed:
+            # volta para a fila; sai no próximo ciclo ou, no pior caso, no reconciliador noturno
+            with self._lock:
+                for target, tenant_days in failed.items():
+                    self._pending.setdefault(target, set()).update(tenant_days)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        logger.info("Sales rollup refresher started delay_seconds=%s", self.delay_seconds)
+        try:
+            while not stop_event.is_set():
+                waiters = {
+                    asyncio.create_task(self._wakeup.wait()),
+                    asyncio.create_task(stop_event.wait()),
+                }
+                try:
+                    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for waiter in waiters:
+                        waiter.cancel()
+                if stop_event.is_set():
+                    break
+                # junta os commits de um pico de pedidos num refresh só por dia
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.delay_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                pending = self._drain()
+                if pending:
+                    await asyncio.to_thread(self._refresh, pending)
+        finally:
+            self._wakeup = None
+            self._loop = None
+            leftover = sum(len(days) for days in self._drain().values())
+            if leftover:
+                logger.info("Sales rollup refresher stopped; %s dias ficam para o reconciliador", leftover)
+
+
+sales_rollup_refresh_queue = SalesRollupRefreshQueue()
+
+
+async def run_sales_rollup_refresher(stop_event: asyncio.Event) -> None:
+    await sales_rollup_refresh_queue.run(stop_event)
+
+
+def _load_rollups(db: Session, tenant_id: int, first_day: date, last_day: date) -> dict[date, DailySales]:
+    rows = (
+        db.query(DailySalesRollup)
+        .filter(
+            DailySalesRollup.tenant_id == tenant_id,
+            DailySalesRollup.day >= first_day,
+            DailySalesRollup.day <= last_day,
+        )
+        .all()
+    )
+    result = {row.day: DailySales.from_rollup(row) for row in rows}
+    missing = [day for day in _days(first_day, last_day) if day not in result]
+    if not missing:
+        return result
+
+    # dias ainda sem rollup (tenant novo ou backfill pendente): calcula em memória; quem grava é o
+    # refresher de fundo (ou o reconciliador/backfill), nunca o GET
+    for run_start, run_end in _day_runs(missing):
+        computed = aggregate_sales_by_day(db, tenant_id, _day_start(run_start), _day_start(run_end + timedelta(days=1)))
+        for day in _days(run_start, run_end):
+            result[day] = computed.get(day, DailySales())
+    sales_rollup_refresh_queue.enqueue((tenant_id, day) for day in missing)
+    return result
+
+
+def sales_by_day(db: Session, tenant_id: int, start: datetime, end: datetime) -> dict[date, DailySales]:
+    """Totais por dia UTC em [start, end).
+
+    Dias inteiros anteriores a hoje vêm de daily_sales_rollups; as bordas parciais e o dia
+    corrente são agregados das linhas brutas.
+    """
+    start, end = _naive_utc(start), _naive_utc(end)
+    if start >= end:
+        return {}
+
+    first_full = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last_full = min(end.date() - timedelta(days=1), utc_today() - timedelta(days=1))
+    if first_full > last_full:
+        return aggregate_sales_by_day(db, tenant_id, start, end)
+
+    result = _load_rollups(db, tenant_id, first_full, last_full)
+    raw_ranges = [
+        (start, _day_start(first_full)),
+        (_day_start(last_full + timedelta(days=1)), end),
+    ]
+    for raw_start, raw_end in raw_ranges:
+        if raw_start >= raw_end:
+            continue
+        for day, totals in aggregate_sales_by_day(db, tenant_id, raw_start, raw_end).items():
+            result.setdefault(day, DailySales()).merge(totals)
+    return result
+
+
+def sales_totals(db: Session, tenant_id: int, start: datetime, end: datetime) -> DailySales:
+    total = DailySales()
+    for totals in sales_by_day(db, tenant_id, start, end).values():
+        total.merge(totals)
+    return total
+
+
+@dataclass
+class ItemSales:
+    item_name: str
+    quantity: int = 0
+    gross_revenue_cents: int = 0
+    modifier_revenue_cents: int = 0
+    fee_cents: int = 0
+    quantity_by_menu_item: dict[int, int] = field(default_factory=dict)
+
+    def add(
+        self,
+        menu_item_id: int,
+        quantity: int,
+        gross_revenue_cents: int,
+        modifier_revenue_cents: int,
+        fee_cents: int = 0,
+    ) -> None:
+        self.quantity += int(quantity)
+        self.gross_revenue_cents += int(gross_revenue_cents)
+        self.modifier_revenue_cents += int(modifier_revenue_cents)
+        self.fee_cents += int(fee_cents)
+        if menu_item_id:
+            self.quantity_by_menu_item[menu_item_id] = self.quantity_by_menu_item.get(menu_item_id, 0) + int(quantity)
+
+
+def _modifier_revenue_cents(modifiers: Any, quantity: int) -> int:
+    if isinstance(modifiers, str):
+        try:
+            modifiers = json.loads(modifiers or "[]")
+        except ValueError:
+            modifiers = []
+    per_unit = 0
+    for modifier in modifiers if isinstance(modifiers, list) else []:
+        if not isinstance(modifier, dict):
+            continue
+        try:
+            per_unit += int(modifier.get("price_cents", 0) or 0)
+        except (TypeError, ValueError):
+            continue
+    return per_unit * quantity
+
+
+def _add_item_sale(
+    totals: dict[tuple, list[int]],
+    day: date,
+    menu_item_id: Any,
+    production_area: Any,
+    name: Any,
+    quantity: Any,
+    gross_revenue_cents: Any,
+    modifiers: Any,
+) -> None:
+    item_name = str(name or "").strip()
+    if not item_name:
+        return
+    try:
+        qty = int(quantity or 0)
+        gross = int(gross_revenue_cents or 0)
+        item_id = int(menu_item_id or 0)
+    except (TypeError, ValueError):
+        return
+    key = (day, item_id, str(production_area or "COZINHA"), item_name)
+    entry = totals.setdefault(key, [0, 0, 0])
+    entry[0] += qty
+    entry[1] += gross
+    entry[2] += _modifier_revenue_cents(modifiers, qty)
+
+
+def _aggregate_item_sales(
+    db: Session,
+    tenant_id: int,
+    start: datetime,
+    end: datetime,
+    *,
+    include_legacy_orders: bool = False,
+) -> dict[tuple, list[int]]:
+    """Agrega order_items de [start, end) em {(dia, menu_item_id, área, nome): [qtd, bruto, adicionais]}."""
+    totals: dict[tuple, list[int]] = {}
+    item_rows = (
+        db.query(
+            func.date(OrderItem.created_at).label("day"),
+            OrderItem.menu_item_id,
+            OrderItem.production_area,
+            OrderItem.name,
+            OrderItem.quantity,
+            OrderItem.subtotal_cents,
+            OrderItem.modifiers,
+        )
+        .filter(OrderItem.tenant_id == tenant_id, OrderItem.created_at >= start, OrderItem.created_at < end)
+        .yield_per(1000)
+    )
+    for row in item_rows:
+        day = _as_date(row.day)
+        if day is not None:
+            _add_item_sale(
+                totals, day, row.menu_item_id, row.production_area, row.name, row.quantity,
+                row.subtotal_cents, row.modifiers,
+            )
+
+    if not include_legacy_orders:
+        return totals
+
+    # pedidos antigos sem order_items só têm o carrinho em items_json
+    legacy_rows = (
+        db.query(func.date(Order.created_at).label("day"), Order.items_json)
+        .filter(
+            Order.tenant_id == tenant_id,
+            Order.created_at >= start,
+            Order.created_at < end,
+            ~exists().where(OrderItem.order_id == Order.id),
+        )
+        .yield_per(500)
+    )
+    for row in legacy_rows:
+        day = _as_date(row.day)
+        try:
+            entries = json.loads(row.items_json or "[]")
+        except ValueError:
+            entries = []
+        if day is None or not isinstance(entries, list):
+            continue
+        for entry in entries:
+            if isinstance(entry, dict):
+                _add_item_sale(
+                    totals, day, entry.get("menu_item_id"), entry.get("production_area"), entry.get("name"),
+                    entry.get("quantity"), entry.get("subtotal_cents"), entry.get("modifiers"),
+                )
+    return totals
+
+
+def _item_sales_params(tenant_id: int, totals: dict[tuple, list[int]]) -> list[dict[str, Any]]:
+    return [
+        {
+            "tenant_id": tenant_id,
+            "day": day,
+            "menu_item_id": menu_item_id,
+            "production_area": production_area,
+            "item_name": item_name,
+            "quantity": quantity,
+            "gross_revenue_cents": gross,
+            "modifier_revenue_cents": modifiers,
+        }
+        for (day, menu_item_id, production_area, item_name), (quantity, gross, modifiers) in totals.items()
+    ]
+
+
+def _increment_item_sales(connection: Connection, params: list[dict[str, Any]]) -> None:
+    table = DailyItemSales.__table__
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(_ITEM_SALES_KEY),
+            set_={column: table.c[column] + statement.excluded[column] for column in _ITEM_SALES_COUNTERS},
+        )
+        connection.execute(statement, params)
+        return
+
+    for param in params:
+        key_filter = [table.c[column] == param[column] for column in ("tenant_id", *_ITEM_SALES_KEY[1:])]
+        updated = connection.execute(
+            table.update()
+            .where(*key_filter)
+            .values({column: table.c[column] + param[column] for column in _ITEM_SALES_COUNTERS})
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(**param))
+
+
+def _lock_item_sales_days(connection: Connection, tenant_days: Iterable[tuple[int, date]]) -> None:
+    """Trava (até o commit) os dias de daily_item_sales (ou daily_paid_item_sales) a incrementar ou regravar.
+
+    Sem a trava, um incremento commitado entre a leitura do rebuild e o DELETE some da tabela.
+    Com ela, quem chega depois espera o commit do outro e já enxerga as linhas dele. Ordem fixa
+    (tenant, dia): sem deadlock. No SQLite a escrita já segura o banco inteiro até o commit.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    for tenant_id, day in sorted(set(tenant_days)):
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(:tenant_id, :day)"),
+            {"tenant_id": int(tenant_id), "day": day.toordinal()},
+        )
+
+
+def rebuild_daily_item_sales(db: Session, tenant_id: int, first_day: date, last_day: date) -> int:
+    """Regrava daily_item_sales de first_day..last_day (reconciliação e backfill)."""
+    if first_day > last_day:
+        return 0
+    _lock_item_sales_days(db.connection(), ((tenant_id, day) for day in _days(first_day, last_day)))
+    totals = _aggregate_item_sales(
+        db,
+        tenant_id,
+        _day_start(first_day),
+        _day_start(last_day + timedelta(days=1)),
+        include_legacy_orders=True,
+    )
+    db.query(DailyItemSales).filter(
+        DailyItemSales.tenant_id == tenant_id,
+        DailyItemSales.day >= first_day,
+        DailyItemSales.day <= last_day,
+    ).delete(synchronize_session=False)
+    params = _item_sales_params(tenant_id, totals)
+    if params:
+        db.execute(DailyItemSales.__table__.insert(), params)
+    db.commit()
+    return len(params)
+
+
+def rebuild_item_sales_days(db: Session, tenant_days: Iterable[tuple[int, date]]) -> set[tuple[int, date]]:
+    return _rebuild_days(db, tenant_days, rebuild_daily_item_sales, "daily_item_sales")
+
+
+def item_sales_by_name(db: Session, tenant_id: int, start: datetime, end: datetime) -> dict[str, ItemSales]:
+    """Vendas por nome de item em [start, end): dias inteiros de daily_item_sales, bordas parciais de order_items."""
+    start, end = _naive_utc(start), _naive_utc(end)
+    result: dict[str, ItemSales] = {}
+    if start >= end:
+        return result
+
+    def _add(name: str, menu_item_id: int, quantity: int, gross: int, modifiers: int) -> None:
+        result.setdefault(name, ItemSales(item_name=name)).add(menu_item_id, quantity, gross, modifiers)
+
+    first_full = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last_full = end.date() - timedelta(days=1)
+    raw_ranges = [(start, end)]
+    if first_full <= last_full:
+        rows = (
+            db.query(
+                DailyItemSales.item_name,
+                DailyItemSales.menu_item_id,
+                func.sum(DailyItemSales.quantity).label("quantity"),
+                func.sum(DailyItemSales.gross_revenue_cents).label("gross_revenue_cents"),
+                func.sum(DailyItemSales.modifier_revenue_cents).label("modifier_revenue_cents"),
+            )
+            .filter(
+                DailyItemSales.tenant_id == tenant_id,
+                DailyItemSales.day >= first_full,
+                DailyItemSales.day <= last_full,
+            )
+            .group_by(DailyItemSales.item_name, DailyItemSales.menu_item_id)
+            .all()
+        )
+        for row in rows:
+            _add(
+                row.item_name, int(row.menu_item_id or 0), int(row.quantity or 0),
+                int(row.gross_revenue_cents or 0), int(row.modifier_revenue_cents or 0),
+            )
+        raw_ranges = [(start, _day_start(first_full)), (_day_start(last_full + timedelta(days=1)), end)]
+
+    for raw_start, raw_end in raw_ranges:
+        if raw_start >= raw_end:
+            continue
+        for (_day, menu_item_id, _area, name), (quantity, gross, modifiers) in _aggregate_item_sales(
+            db, tenant_id, raw_start, raw_end
+        ).items():
+            _add(name, menu_item_id, quantity, gross, modifiers)
+    return result
+
+
+def top_item_sales(db: Session, tenant_id: int, start: datetime, end: datetime, limit: int) -> list[ItemSales]:
+    items = sorted(
+        item_sales_by_name(db, tenant_id, start, end).values(),
+        key=lambda item: item.gross_revenue_cents,
+        reverse=True,
+    )
+    return items[:limit]
+
+
+def _payment_time():
+    return func.coalesce(OrderPayment.paid_at, OrderPayment.created_at)
+
+
+def _order_lines(db: Session, tenant_id: int, order_ids: list[int]) -> list[tuple[int, int, str, int, int]]:
+    """(pedido, menu_item_id, nome, qtd, bruto) dos itens; pedidos antigos sem order_items vêm de items_json."""
+    lines: list[tuple[int, int, str, int, int]] = []
+    for start in range(0, len(order_ids), 500):
+        chunk = order_ids[start : start + 500]
+        item_rows = (
+            db.query(
+                OrderItem.order_id,
+                OrderItem.menu_item_id,
+                OrderItem.name,
+                OrderItem.quantity,
+                OrderItem.subtotal_cents,
+            )
+            .filter(OrderItem.tenant_id == tenant_id, OrderItem.order_id.in_(chunk))
+            .all()
+        )
+        lines.extend(
+            (
+                int(row.order_id),
+                int(row.menu_item_id or 0),
+                str(row.name or ""),
+                int(row.quantity or 0),
+                int(row.subtotal_cents or 0),
+            )
+            for row in item_rows
+        )
+        legacy_rows = (
+            db.query(Order.id, Order.items_json)
+            .filter(
+                Order.tenant_id == tenant_id,
+                Order.id.in_(chunk),
+                ~exists().where(OrderItem.order_id == Order.id),
+            )
+            .all()
+        )
+        for row in legacy_rows:
+            try:
+                entries = json.loads(row.items_json or "[]")
+            except ValueError:
+                entries = []
+            for entry in entries if isinstance(entries, list) else []:
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    lines.append(
+                        (
+                            int(row.id),
+                            int(entry.get("menu_item_id") or 0),
+                            str(entry.get("name", "") or ""),
+                            int(entry.get("quantity", 0) or 0),
+                            int(entry.get("subtotal_cents", 0) or 0),
+                        )
+                    )
+                except (TypeError, ValueError):
+                    continue
+    return lines
+
+
+def _aggregate_paid_item_sales(db: Session, tenant_id: int, start: datetime, end: datetime) -> dict[tuple, list[int]]:
+    """Itens pagos em [start, end) em {(dia do pagamento, menu_item_id, nome): [qtd, bruto, taxa]}.
+
+    Os itens de um pedido entram uma vez, no dia do seu primeiro pagamento "paid"; a taxa de cada
+    pagamento entra no dia dele, rateada entre os itens do pedido pelo valor bruto.
+    """
+    payment_time = _payment_time()
+    fee_rows = (
+        db.query(
+            OrderPayment.order_id,
+            func.date(payment_time).label("day"),
+            func.coalesce(func.sum(OrderPayment.fee_cents), 0).label("fee_cents"),
+        )
+        .filter(
+            OrderPayment.tenant_id == tenant_id,
+            OrderPayment.status == "paid",
+            payment_time >= start,
+            payment_time < end,
+        )
+        .group_by(OrderPayment.order_id, func.date(payment_time))
+        .all()
+    )
+    fees: list[tuple[int, date, int]] = []
+    for row in fee_rows:
+        day = _as_date(row.day)
+        if day is not None:
+            fees.append((int(row.order_id), day, int(row.fee_cents or 0)))
+    order_ids = sorted({order_id for order_id, _day, _fee in fees})
+
+    paid_day_by_order: dict[int, date] = {}
+    for chunk_start in range(0, len(order_ids), 500):
+        first_paid = func.min(payment_time)
+        rows = (
+            db.query(OrderPayment.order_id, func.date(first_paid).label("day"))
+            .filter(
+                OrderPayment.tenant_id == tenant_id,
+                OrderPayment.status == "paid",
+                OrderPayment.order_id.in_(order_ids[chunk_start : chunk_start + 500]),
+            )
+            .group_by(OrderPayment.order_id)
+            .having(first_paid >= start, first_paid < end)
+            .all()
+        )
+        for row in rows:
+            day = _as_date(row.day)
+            if day is not None:
+                paid_day_by_order[int(row.order_id)] = day
+
+    lines_by_order: dict[int, list[tuple[int, str, int, int]]] = {}
+    for order_id, menu_item_id, name, quantity, gross in _order_lines(db, tenant_id, order_ids):
+        lines_by_order.setdefault(order_id, []).append((menu_item_id, name.strip(), quantity, gross))
+
+    totals: dict[tuple, list[int]] = {}
+    for order_id, day in paid_day_by_order.items():
+        for menu_item_id, name, quantity, gross in lines_by_order.get(order_id, []):
+            if name:
+                entry = totals.setdefault((day, menu_item_id, name), [0, 0, 0])
+                entry[0] += quantity
+                entry[1] += gross
+    for order_id, day, fee_cents in fees:
+        lines = lines_by_order.get(order_id, [])
+        items_total = sum(gross for _menu_item_id, _name, _quantity, gross in lines)
+        if not fee_cents or items_total <= 0:
+            continue
+        for menu_item_id, name, _quantity, gross in lines:
+            if name:
+                fee_share = int(round(gross * fee_cents / items_total))
+                totals.setdefault((day, menu_item_id, name), [0, 0, 0])[2] += fee_share
+    return totals
+
+
+def rebuild_daily_paid_item_sales(db: Session, tenant_id: int, first_day: date, last_day: date) -> int:
+    """Regrava daily_paid_item_sales de first_day..last_day (pagamento alterado, reconciliação e backfill)."""
+    if first_day > last_day:
+        return 0
+    _lock_item_sales_days(db.connection(), ((tenant_id, day) for day in _days(first_day, last_day)))
+    totals = _aggregate_paid_item_sales(
+        db, tenant_id, _day_start(first_day), _day_start(last_day + timedelta(days=1))
+    )
+    db.query(DailyPaidItemSales).filter(
+        DailyPaidItemSales.tenant_id == tenant_id,
+        DailyPaidItemSales.day >= first_day,
+        DailyPaidItemSales.day <= last_day,
+    ).delete(synchronize_session=False)
+    params = [
+        {
+            "tenant_id": tenant_id,
+            "day": day,
+            "menu_item_id": menu_item_id,
+            "item_name": item_name,
+            "quantity": quantity,
+            "gross_revenue_cents": gross,
+            "fee_cents": fee_cents,
+        }
+        for (day, menu_item_id, item_name), (quantity, gross, fee_cents) in totals.items()
+    ]
+    if params:
+        db.execute(DailyPaidItemSales.__table__.insert(), params)
+    db.commit()
+    return len(params)
+
+
+def rebuild_paid_item_sales_days(db: Session, tenant_days: Iterable[tuple[int, date]]) -> set[tuple[int, date]]:
+    return _rebuild_days(db, tenant_days, rebuild_daily_paid_item_sales, "daily_paid_item_sales")
+
+
+def paid_item_sales_by_name(db: Session, tenant_id: int, start: datetime, end: datetime) -> dict[str, ItemSales]:
+    """Itens pagos em [start, end) por nome, com a taxa rateada em fee_cents.
+
+    Dias inteiros anteriores a hoje vêm de daily_paid_item_sales; as bordas parciais e o dia
+    corrente são agregados de pagamentos e itens.
+    """
+    start, end = _naive_utc(start), _naive_utc(end)
+    result: dict[str, ItemSales] = {}
+    if start >= end:
+        return result
+
+    def _add(name: str, menu_item_id: int, quantity: int, gross: int, fee_cents: int) -> None:
+        result.setdefault(name, ItemSales(item_name=name)).add(menu_item_id, quantity, gross, 0, fee_cents)
+
+    first_full = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last_full = min(end.date() - timedelta(days=1), utc_today() - timedelta(days=1))
+    raw_ranges = [(start, end)]
+    if first_full <= last_full:
+        rows = (
+            db.query(
+                DailyPaidItemSales.item_name,
+                DailyPaidItemSales.menu_item_id,
+                func.sum(DailyPaidItemSales.quantity).label("quantity"),
+                func.sum(DailyPaidItemSales.gross_revenue_cents).label("gross_revenue_cents"),
+                func.sum(DailyPaidItemSales.fee_cents).label("fee_cents"),
+            )
+            .filter(
+                DailyPaidItemSales.tenant_id == tenant_id,
+                DailyPaidItemSales.day >= first_full,
+                DailyPaidItemSales.day <= last_full,
+            )
+            .group_by(DailyPaidItemSales.item_name, DailyPaidItemSales.menu_item_id)
+            .all()
+        )
+        for row in rows:
+            _add(
+                row.item_name, int(row.menu_item_id or 0), int(row.quantity or 0),
+                int(row.gross_revenue_cents or 0), int(row.fee_cents or 0),
+            )
+        raw_ranges = [(start, _day_start(first_full)), (_day_start(last_full + timedelta(days=1)), end)]
+
+    for raw_start, raw_end in raw_ranges:
+        if raw_start >= raw_end:
+            continue
+        for (_day, menu_item_id, name), (quantity, gross, fee_cents) in _aggregate_paid_item_sales(
+            db, tenant_id, raw_start, raw_end
+        ).items():
+            _add(name, menu_item_id, quantity, gross, fee_cents)
+    return result
+
+
+def reconcile_sales_rollups(
+    db: Session,
+    *,
+    days: int = SALES_ROLLUP_RECONCILE_DAYS,
+    tenant_ids: Iterable[int] | None = None,
+    today: date | None = None,
+) -> int:
+    """Recalcula os últimos `days` dias fechados de cada tenant (job noturno e backfill)."""
+    today = today or utc_today()
+    first_day = today - timedelta(days=max(days, 1))
+    last_day = today - timedelta(days=1)
+    if tenant_ids is None:
+        tenant_ids = [row[0] for row in db.query(Tenant.id).all()]
+    refreshed = 0
+    for tenant_id in tenant_ids:
+        try:
+            refreshed += refresh_daily_rollups(db, int(tenant_id), first_day, last_day)
+            rebuild_daily_item_sales(db, int(tenant_id), first_day, last_day)
+            rebuild_daily_paid_item_sales(db, int(tenant_id), first_day, last_day)
+        except Exception:
+            db.rollback()
+            logger.exception("Falha ao reconciliar rollups de vendas tenant_id=%s", tenant_id)
+    return refreshed
+
+
+def _reconcile_with_new_session() -> int:
+    db = SessionLocal()
+    try:
+        return reconcile_sales_rollups(db)
+    finally:
+        db.close()
+
+
+def _seconds_until_next_reconcile(now: datetime) -> float:
+    next_run = now.replace(hour=SALES_ROLLUP_RECONCILE_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_sales_rollup_reconciler(stop_event: asyncio.Event) -> None:
+    logger.info("Sales rollup reconciler started hour_utc=%s", SALES_ROLLUP_RECONCILE_HOUR_UTC)
+    while not stop_event.is_set():
+        delay = _seconds_until_next_reconcile(datetime.now(timezone.utc))
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            break
+        except asyncio.TimeoutError:
+            pass
+        refreshed = await asyncio.to_thread(_reconcile_with_new_session)
+        logger.info("Sales rollups reconciled days=%s", refreshed)
+
+
+def _instance_day(session: Session, instance: Any, attr: str) -> date:
+    value = instance.__dict__.get(attr)
+    if value is None and instance not in session.new and instance not in session.deleted:
+        try:
+            value = getattr(instance, attr)
+        except Exception:
+            value = None
+    return _as_date(value) or utc_today()
+
+
+def _changed_values(session: Session, instance: Any, attr: str) -> set[Any]:
+    """Valor atual da coluna e, se ela mudou neste flush, também o anterior."""
+    history = inspect(instance).attrs[attr].history
+    values = {*history.added, *history.unchanged, *history.deleted}
+    if not values and instance not in session.new and instance not in session.deleted:
+        values = {getattr(instance, attr, None)}
+    values.discard(None)
+    return values
+
+
+def _changed_days(session: Session, instance: Any, attr: str) -> set[date]:
+    """Dia atual da coluna e, se ela mudou neste flush, também o dia anterior."""
+    history = inspect(instance).attrs[attr].history
+    days = {_as_date(value) for value in (*history.added, *history.unchanged, *history.deleted)}
+    days.discard(None)
+    return days or {_instance_day(session, instance, attr)}
+
+
+def _touches_rollups(session: Session, instance: Any, model: type) -> bool:
+    if instance in session.new or instance in session.deleted:
+        return True
+    state = inspect(instance)
+    return any(
+        state.attrs[column].history.has_changes()
+        for column in (*_TRACKED_COLUMNS[model], *_ROLLUP_VALUE_COLUMNS[model])
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _track_sales_changes(session: Session, _flush_context) -> None:
+    dirty = None
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        model = type(instance)
+        if model not in _TRACKED_COLUMNS:
+            continue
+        tenant_id = instance.__dict__.get("tenant_id")
+        if tenant_id is None or not _touches_rollups(session, instance, model):
+            continue
+        if dirty is None:
+            dirty = session.info.setdefault(_DIRTY_DAYS_KEY, set())
+        for column in _TRACKED_COLUMNS[model]:
+            dirty.update((int(tenant_id), day) for day in _changed_days(session, instance, column))
+        if model is OrderPayment and instance.__dict__.get("order_id") is not None:
+            # paid_orders_count fica no dia do pedido, não no do pagamento
+            order = session.get(Order, instance.order_id)
+            if order is not None:
+                dirty.add((int(tenant_id), _instance_day(session, order, "created_at")))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_item_sales(session: Session, _flush_context) -> None:
+    increments: dict[int, dict[tuple, list[int]]] = {}
+    for instance in session.new:
+        if not isinstance(instance, OrderItem) or instance.tenant_id is None:
+            continue
+        day = _as_date(instance.__dict__.get("created_at")) or utc_today()
+        _add_item_sale(
+            increments.setdefault(int(instance.tenant_id), {}),
+            day,
+            instance.menu_item_id,
+            instance.production_area,
+            instance.name,
+            instance.quantity,
+            instance.subtotal_cents,
+            instance.modifiers if instance.modifiers is not None else instance.modifiers_json,
+        )
+
+    # edição/remoção de item já contabilizado: o dia é regravado depois do commit
+    for instance in (*session.dirty, *session.deleted):
+        if not isinstance(instance, OrderItem) or instance.__dict__.get("tenant_id") is None:
+            continue
+        if instance not in session.deleted:
+            state = inspect(instance)
+            if not any(state.attrs[column].history.has_changes() for column in _ITEM_SALES_COLUMNS):
+                continue
+        session.info.setdefault(_DIRTY_ITEM_DAYS_KEY, set()).update(
+            (int(instance.tenant_id), day) for day in _changed_days(session, instance, "created_at")
+        )
+
+    if increments:
+        connection = session.connection()
+        _lock_item_sales_days(
+            connection, ((tenant_id, key[0]) for tenant_id, totals in increments.items() for key in totals)
+        )
+        for tenant_id, totals in increments.items():
+            _increment_item_sales(connection, _item_sales_params(tenant_id, totals))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_paid_item_sales(session: Session, _flush_context) -> None:
+    tenant_days: set[tuple[int, date]] = set()
+    orders: set[int] = set()
+    today = utc_today()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, OrderPayment):
+            tenant_id = instance.__dict__.get("tenant_id")
+            if tenant_id is None or not _touches_rollups(session, instance, OrderPayment):
+                continue
+            days = _changed_days(session, instance, "created_at") | _changed_days(session, instance, "paid_at")
+            tenant_days.update((int(tenant_id), day) for day in days)
+            # pagamento novo de hoje só mexe no dia corrente, que é lido das linhas brutas
+            if instance in session.new and min(days) >= today:
+                continue
+        elif isinstance(instance, OrderItem) and instance not in session.new:
+            # itens nascem com o pedido, antes de qualquer pagamento; só edição/remoção mexe em pedido pago
+            if instance.__dict__.get("tenant_id") is None:
+                continue
+            if instance not in session.deleted:
+                state = inspect(instance)
+                if not any(state.attrs[column].history.has_changes() for column in _PAID_ITEM_SALES_COLUMNS):
+                    continue
+        else:
+            continue
+        orders.update(_changed_values(session, instance, "order_id"))
+
+    if orders:
+        # o primeiro pagamento do pedido (dia dos itens) pode ser outro que não o alterado
+        payment_time = _payment_time()
+        rows = session.connection().execute(
+            select(OrderPayment.tenant_id, func.date(payment_time).label("day"))
+            .where(OrderPayment.order_id.in_(sorted(orders)), OrderPayment.status == "paid")
+            .distinct()
+        )
+        tenant_days.update((int(row.tenant_id), day) for row in rows if (day := _as_date(row.day)) is not None)
+    if tenant_days:
+        session.info.setdefault(_DIRTY_PAID_ITEM_DAYS_KEY, set()).update(tenant_days)
+
+
+@event.listens_for(Session, "after_commit")
+def _rebuild_paid_item_sales_after_commit(session: Session) -> None:
+    dirty = session.info.pop(_DIRTY_PAID_ITEM_DAYS_KEY, None)
+    if not dirty:
+        return
+    today = utc_today()
+    closed = {(tenant_id, day) for tenant_id, day in dirty if day < today}
+    if not closed or sales_rollup_refresh_queue.enqueue(closed, target="paid_items"):
+        return
+
+    rebuild_db = Session(bind=session.get_bind())
+    try:
+        rebuild_paid_item_sales_days(rebuild_db, closed)
+    finally:
+        rebuild_db.close()
+
+
+@event.listens_for(Session, "after_commit")
+def _rebuild_item_sales_after_commit(session: Session) -> None:
+    dirty = session.info.pop(_DIRTY_ITEM_DAYS_KEY, None)
+    if not dirty or sales_rollup_refresh_queue.enqueue(dirty, target="items"):
+        return
+
+    rebuild_db = Session(bind=session.get_bind())
+    try:
+        rebuild_item_sales_days(rebuild_db, dirty)
+    finally:
+        rebuild_db.close()
+
+
+@event.listens_for(Session, "after_commit")
+def _refresh_after_commit(session: Session) -> None:
+    dirty = session.info.pop(_DIRTY_DAYS_KEY, None)
+    if not dirty:
+        return
+    # o dia corrente é sempre lido das linhas brutas; só dias fechados precisam de refresh
+    today = utc_today()
+    closed = {(tenant_id, day) for tenant_id, day in dirty if day < today}
+    if not closed or sales_rollup_refresh_queue.enqueue(closed):
+        return
+
+    # sem o refresher de fundo (scripts, testes): recalcula na hora, só os dias tocados
+    refresh_db = Session(bind=session.get_bind())
+    try:
+        refresh_rollup_days(refresh_db, closed)
+    finally:
+        refresh_db.close()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_sales_changes(session: Session) -> None:
+    session.info.pop(_DIRTY_DAYS_KEY, None)
+    session.info.pop(_DIRTY_ITEM_DAYS_KEY, None)
+    session.info.pop(_DIRTY_PAID_ITEM_DAYS_KEY, None)
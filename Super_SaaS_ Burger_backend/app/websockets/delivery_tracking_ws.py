@@ -1,7 +1,10 @@
+import json
 from collections import defaultdict
 
 from fastapi import WebSocket
 
+from app.realtime.outbound import OutboundWebSocket, is_location_frame
+
 
 class DeliveryConnectionManager:
     def __init__(self):
@@ -9,24 +12,33 @@ class DeliveryConnectionManager:
 
     async def connect(self, order_id: int, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections[order_id].append(websocket)
-
-    def disconnect(self, order_id: int, websocket: WebSocket):
-        if websocket in self.active_connections[order_id]:
-            self.active_connections[order_id].remove(websocket)
-        if not self.active_connections[order_id]:
+        connection = OutboundWebSocket(websocket)
+        connection.start(lambda closed: self._forget(order_id, closed))
+        self.active_connections[order_id].append(connection)
+
+    def _forget(self, order_id: int, connection: OutboundWebSocket):
+        connections = self.active_connections.get(order_id)
+        if connections and connection in connections:
+            connections.remove(connection)
+        if not connections:
             self.active_connections.pop(order_id, None)
 
-    async def broadcast(self, order_id: int, message: dict):
-        stale_connections = []
-        for connection in self.active_connections[order_id]:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                stale_connections.append(connection)
-
-        for connection in stale_connections:
-            self.disconnect(order_id, connection)
+    def disconnect(self, order_id: int, websocket: WebSocket):
+        for connection in list(self.active_connections.get(order_id, ())):
+            if connection.websocket is websocket:
+                connection.close()
+                self._forget(order_id, connection)
+
+    async def broadcast(self, order_id: int, message: dict, *, droppable: bool | None = None):
+        # só enfileira: cada socket tem seu writer, um cliente lento não atrasa os outros
+        connections = self.active_connections.get(order_id)
+        if not connections:
+            return
+        data = json.dumps(message)
+        if droppable is None:
+            droppable = is_location_frame(message)
+        for connection in list(connections):
+            connection.send(data, droppable=droppable)
 
 
 manager = DeliveryConnectionManager()
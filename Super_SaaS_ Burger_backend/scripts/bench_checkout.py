@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from decimal import Decimal
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.core.database import Base  # noqa: E402
+from app.models.coupon import Coupon  # noqa: E402
+from app.models.menu_category import MenuCategory  # noqa: E402
+from app.models.menu_item import MenuItem  # noqa: E402
+from app.models.modifier_group import ModifierGroup  # noqa: E402
+from app.models.modifier_option import ModifierOption  # noqa: E402
+from app.models.tenant import Tenant  # noqa: E402
+from app.routers import public_menu  # noqa: E402
+from app.routers.public_menu import (  # noqa: E402
+    PublicOrderPayload,
+    PublicOrderProductItem,
+    PublicSelectedModifier,
+    _create_order_for_tenant,
+)
+
+MENU_SIZES = (50, 200, 1000)
+TENANT_ID = 1
+COUPON_CODE = "BENCH10"
+# (nome, obrigatório, mínimo, máximo, opções) de cada item do cardápio
+_MODIFIER_GROUPS = (
+    ("Ponto da carne", True, 1, 1, ("Mal passado", "Ao ponto", "Bem passado")),
+    ("Adicionais", False, 0, 3, ("Bacon", "Cheddar", "Ovo", "Cebola caramelizada", "Picles")),
+)
+
+MenuModifiers = dict[int, list[tuple[int, list[int], int, int]]]
+
+
+def seed_menu(db, size: int) -> MenuModifiers:
+    """Tenant com `size` itens, cada um com os grupos de `_MODIFIER_GROUPS`; devolve item -> [(grupo, opções, mín, máx)]."""
+    db.add(Tenant(id=TENANT_ID, name="Bench", business_name="Bench", slug="bench", delivery_fee=Decimal("6.00")))
+    db.add(Coupon(tenant_id=TENANT_ID, code=COUPON_CODE, discount_type="percentage", discount_value=Decimal("10")))
+    categories = [MenuCategory(tenant_id=TENANT_ID, name=f"Categoria {index}", sort_order=index) for index in range(max(1, size // 25))]
+    db.add_all(categories)
+    db.flush()
+
+    items = [
+        MenuItem(
+            tenant_id=TENANT_ID,
+            category_id=categories[index % len(categories)].id,
+            name=f"Burger {index}",
+            price_cents=1500 + (index % 40) * 100,
+        )
+        for index in range(size)
+    ]
+    db.add_all(items)
+    db.flush()
+
+    groups = []
+    for item in items:
+        for order_index, (name, required, min_selection, max_selection, _options) in enumerate(_MODIFIER_GROUPS):
+            groups.append(
+                ModifierGroup(
+                    tenant_id=TENANT_ID,
+                    product_id=item.id,
+                    name=name,
+                    required=required,
+                    min_selection=min_selection,
+                    max_selection=max_selection,
+                    order_index=order_index,
+                )
+            )
+    db.add_all(groups)
+    db.flush()
+
+    options_by_group: dict[int, list[ModifierOption]] = {}
+    for group_index, group in enumerate(groups):
+        names = _MODIFIER_GROUPS[group_index % len(_MODIFIER_GROUPS)][4]
+        options_by_group[group.id] = [
+            ModifierOption(group_id=group.id, name=name, price_delta=Decimal("2.50") * (position % 2), order_index=position)
+            for position, name in enumerate(names)
+        ]
+        db.add_all(options_by_group[group.id])
+    db.commit()
+
+    menu: MenuModifiers = {item.id: [] for item in items}
+    for group in groups:
+        menu[group.product_id].append(
+            (group.id, [option.id for option in options_by_group[group.id]], group.min_selection, group.max_selection)
+        )
+    return menu
+
+
+def build_payloads(menu: MenuModifiers, count: int, *, cart_size: int = 4, seed: int = 7) -> list[PublicOrderPayload]:
+    """Carrinhos de entrega com modificadores; metade dos telefones se repete (cliente recorrente) e 1 em 3 usa cupom."""
+    rng = random.Random(seed)
+    item_ids = sorted(menu)
+    payloads = []
+    for index in range(count):
+        products = []
+        for item_id in rng.sample(item_ids, min(cart_size, len(item_ids))):
+            selected = []
+            for group_id, option_ids, min_selection, max_selection in menu[item_id]:
+                chosen = rng.sample(option_ids, rng.randint(min_selection, max_selection))
+                selected.extend(PublicSelectedModifier(group_id=group_id, option_id=option_id) for option_id in chosen)
+            products.append(PublicOrderProductItem(product_id=item_id, quantity=rng.randint(1, 3), selected_modifiers=selected))
+        payloads.append(
+            PublicOrderPayload(
+                customer_name=f"Cliente {index}",
+                customer_phone=f"+55 (11) 9{(index // 2):04d}-0000",
+                order_type="delivery",
+                payment_method="pix",
+                street="Rua das Flores",
+                number=str(100 + index),
+                neighborhood="Centro",
+                city="São Paulo",
+                state="SP",
+                delivery_address={"zip": "01001-000"},
+                coupon_code=COUPON_CODE if index % 3 == 0 else "",
+                products=products,
+            )
+        )
+    return payloads
+
+
+@contextmanager
+def stub_external_calls():
+    """Geocoding e emissão de eventos (WhatsApp, Redis) ficam de fora; os prints do checkout também."""
+
+    async def _geocode(_address: str):
+        return -23.55, -46.63
+
+    emitted = []
+    original_geocode, original_emit = public_menu.geocode_address, public_menu.emit_order_created
+    public_menu.geocode_address = _geocode
+    public_menu.emit_order_created = emitted.append
+    try:
+        with redirect_stdout(io.StringIO()):
+            yield emitted
+    finally:
+        public_menu.geocode_address = original_geocode
+        public_menu.emit_order_created = original_emit
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure_checkout(
+    size: int,
+    checkouts: int,
+    *,
+    cart_size: int = 4,
+    warmup: int = 5,
+    allocation_samples: int = 20,
+) -> dict:
+    """Checkouts sequenciais num SQLite em memória: tempo e statements por checkout.
+
+    Os `warmup` primeiros (cache de compilação do SQLAlchemy frio) não entram na medição; depois,
+    `allocation_samples` checkouts extras rodam com tracemalloc (fora do tempo, que o rastreio distorce).
+    """
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed_db = session_factory()
+    try:
+        menu = seed_menu(seed_db, size)
+    finally:
+        seed_db.close()
+    payloads = build_payloads(menu, warmup + checkouts + allocation_samples, cart_size=cart_size)
+
+    statements = 0
+
+    def _count(*_args) -> None:
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", _count)
+    durations: list[float] = []
+    statement_counts: list[int] = []
+    allocation_peaks: list[int] = []
+
+    async def _checkout(payload: PublicOrderPayload) -> tuple[float, int]:
+        db = session_factory()
+        try:
+            tenant = db.get(Tenant, TENANT_ID)
+            before = statements
+            started = time.perf_counter()
+            await _create_order_for_tenant(db, tenant, payload)
+            return time.perf_counter() - started, statements - before
+        finally:
+            db.close()
+
+    async def _run() -> None:
+        for payload in payloads[:warmup]:
+            await _checkout(payload)
+        for payload in payloads[warmup : warmup + checkouts]:
+            duration, count = await _checkout(payload)
+            durations.append(duration)
+            statement_counts.append(count)
+        if not allocation_samples:
+            return
+        tracemalloc.start()
+        try:
+            for payload in payloads[warmup + checkouts :]:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                await _checkout(payload)
+                allocation_peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+
+    with stub_external_calls() as emitted:
+        asyncio.run(_run())
+    engine.dispose()
+
+    return {
+        "menu_items": size,
+        "checkouts": len(durations),
+        "events": len(emitted),
+        "checkouts_per_second": len(durations) / sum(durations),
+        "p50_ms": _percentile(durations, 50) * 1000,
+        "p95_ms": _percentile(durations, 95) * 1000,
+        "statements_per_checkout": sum(statement_counts) / len(statement_counts),
+        "max_statements": max(statement_counts),
+        "peak_kb_per_checkout": (sum(allocation_peaks) / len(allocation_peaks) / 1024) if allocation_peaks else None,
+    }
+
+
+def _regressions(result: dict, baseline: dict, threshold: float) -> list[str]:
+    failures = []
+    label = f"menu={result['menu_items']}"
+    # mediana em vez da média: um checkout atrasado pelo SO não reprova o build
+    if result["p50_ms"] > baseline["p50_ms"] * (1 + threshold):
+        failures.append(f"{label} p50 {result['p50_ms']:.2f}ms > {baseline['p50_ms']:.2f}ms")
+    if result["max_statements"] > baseline["max_statements"]:
+        failures.append(f"{label} statements {result['max_statements']} > {baseline['max_statements']}")
+    peak, base_peak = result.get("peak_kb_per_checkout"), baseline.get("peak_kb_per_checkout")
+    if peak is not None and base_peak is not None and peak > base_peak * (1 + threshold):
+        failures.append(f"{label} peak_kb {peak:.0f} > {base_peak:.0f}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do checkout público (_create_order_for_tenant) por tamanho de cardápio.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(MENU_SIZES))
+    parser.add_argument("--checkouts", type=int, default=200)
+    parser.add_argument("--cart-size", type=int, default=4)
+    parser.add_argument("--allocation-samples", type=int, default=20, help="Checkouts extras medidos com tracemalloc (0 desliga).")
+    parser.add_argument("--baseline", type=Path, default=None, help="JSON de uma execução anterior para comparar.")
+    parser.add_argument("--write-baseline", action="store_true", help="Grava o resultado em --baseline em vez de comparar.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Piora relativa tolerada na latência p50 e na alocação; statements não têm folga.")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        result = measure_checkout(
+            size, args.checkouts, cart_size=args.cart_size, allocation_samples=args.allocation_samples
+        )
+        results[str(size)] = result
+        peak = result["peak_kb_per_checkout"]
+        print(
+            f"menu={size:<5} checkouts/s={result['checkouts_per_second']:8.1f} p50={result['p50_ms']:6.2f}ms "
+            f"p95={result['p95_ms']:6.2f}ms statements={result['statements_per_checkout']:5.1f} "
+            f"(max {result['max_statements']}) peak_kb={'-' if peak is None else f'{peak:.0f}'}"
+        )
+
+    if args.baseline is None:
+        return 0
+    if args.write_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True), encoding="utf-8")
+        print(f"baseline gravado em {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    failures = [
+        failure
+        for size, result in results.items()
+        if size in baseline
+        for failure in _regressions(result, baseline[size], args.threshold)
+    ]
+    if failures:
+        print("REGRESSÃO: " + "; ".join(failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
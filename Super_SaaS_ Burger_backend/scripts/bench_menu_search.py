@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.menu_search import (  # noqa: E402
+    MenuSearchIndex,
+    _search_menu_items_in_list,
+    normalize,
+    parse_order_text,
+    split_item_and_modifiers,
+)
+from app.services.menu_snapshot import SnapshotMenuItem  # noqa: E402
+
+
+_BASES = [
+    "X-Burger", "X-Salada", "X-Bacon", "X-Tudo", "X-Egg", "Smash Burger", "Cheeseburger",
+    "Hambúrguer Artesanal", "Pizza Calabresa", "Pizza Margherita", "Pizza Portuguesa",
+    "Pizza Frango com Catupiry", "Hot Dog", "Batata Frita", "Onion Rings", "Nuggets",
+    "Coca Cola", "Guaraná Antarctica", "Suco de Laranja", "Água com Gás", "Milk Shake",
+    "Açaí", "Pastel de Carne", "Coxinha", "Esfiha de Carne", "Wrap de Frango",
+]
+_VARIANTS = [
+    "", "Lata", "2 Litros", "Zero", "Duplo", "Triplo", "Grande", "Média", "Pequena",
+    "Especial", "da Casa", "Vegano", "Sem Glúten", "Kids", "Combo", "Premium",
+    "Picante", "Light", "Família", "600ml",
+]
+_PREFIXES = ["", "quero ", "me ve ", "manda ", "gostaria de ", "vou querer ", "pode mandar "]
+_QUANTITIES = ["", "1 ", "2 ", "uma ", "duas ", "3x "]
+_SUFFIXES = ["", " com bacon", " sem cebola", " + cheddar", " por favor", " e uma coca", ", batata frita"]
+_SLANG = {"coca cola": "coca", "refrigerante": "refri", "2 litros": "2l", "hamburguer": "hamburger"}
+
+
+def build_menu(size: int, seed: int = 7) -> list[SnapshotMenuItem]:
+    rng = random.Random(seed)
+    names: list[str] = []
+    for base in _BASES:
+        for variant in _VARIANTS:
+            names.append(f"{base} {variant}".strip())
+    rng.shuffle(names)
+    while len(names) < size:
+        names.append(f"{rng.choice(_BASES)} {rng.choice(_VARIANTS)} {len(names)}".strip())
+    return [
+        SnapshotMenuItem(
+            id=index,
+            name=name,
+            price_cents=rng.randint(500, 6000),
+            category_id=None,
+            normalized_name=normalize(name),
+        )
+        for index, name in enumerate(sorted(names[:size]), start=1)
+    ]
+
+
+def _typo(text: str, rng: random.Random) -> str:
+    if len(text) < 5 or rng.random() > 0.3:
+        return text
+    index = rng.randrange(1, len(text) - 1)
+    return text[:index] + text[index + 1 :]
+
+
+def build_phrases(menu: list[SnapshotMenuItem], count: int, seed: int = 11) -> list[str]:
+    rng = random.Random(seed)
+    phrases: list[str] = []
+    for _ in range(count):
+        name = rng.choice(menu).name.lower()
+        for formal, slang in _SLANG.items():
+            if formal in name and rng.random() < 0.5:
+                name = name.replace(formal, slang)
+        phrases.append(
+            f"{rng.choice(_PREFIXES)}{rng.choice(_QUANTITIES)}{_typo(name, rng)}{rng.choice(_SUFFIXES)}"
+        )
+    return phrases
+
+
+def load_phrases(path: Path) -> list[str]:
+    with path.open(encoding="utf-8") as handle:
+        return [line.strip() for line in handle if line.strip()]
+
+
+def extract_queries(phrases: list[str]) -> list[str]:
+    queries: list[str] = []
+    for phrase in phrases:
+        for candidate in parse_order_text(phrase):
+            item_query, _modifiers = split_item_and_modifiers(candidate["raw_name"])
+            queries.append(item_query)
+    return queries
+
+
+def _timed(label: str, search, queries: list[str]) -> list:
+    started = time.perf_counter()
+    results = [search(query) for query in queries]
+    elapsed = time.perf_counter() - started
+    per_query_us = (elapsed / max(len(queries), 1)) * 1_000_000
+    print(f"{label:<8} total={elapsed:8.3f}s per_query={per_query_us:9.1f}us")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark da busca fuzzy do cardápio (menu_search).")
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--phrases", type=int, default=10_000)
+    parser.add_argument(
+        "--phrases-file",
+        type=Path,
+        default=None,
+        help="Arquivo com frases reais de clientes (uma por linha); sem ele, gera frases sintéticas.",
+    )
+    args = parser.parse_args()
+
+    menu = build_menu(args.items)
+    phrases = load_phrases(args.phrases_file) if args.phrases_file else build_phrases(menu, args.phrases)
+    queries = extract_queries(phrases)
+    print(f"menu_items={len(menu)} phrases={len(phrases)} queries={len(queries)}")
+
+    started = time.perf_counter()
+    index = MenuSearchIndex(menu)
+    print(f"index build={((time.perf_counter() - started) * 1000):.1f}ms")
+
+    linear = _timed("linear", lambda query: _search_menu_items_in_list(menu, query, limit=3), queries)
+    indexed = _timed("indexed", lambda query: index.search(query, limit=3), queries)
+
+    same_top = sum(
+        1
+        for before, after in zip(linear, indexed)
+        if (before[0][0].id if before else None) == (after[0][0].id if after else None)
+    )
+    print(f"top1 agreement={same_top}/{len(queries)} ({same_top / max(len(queries), 1):.2%})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.services.menu_search import (  # noqa: E402
+    _ALIAS_PATTERNS,
+    _MODIFIER_TRIGGER_PATTERN,
+    normalize,
+    parse_order_text,
+    split_item_and_modifiers,
+)
+from scripts.bench_menu_search import build_menu, build_phrases, load_phrases  # noqa: E402
+
+
+_MODIFIER_NAMES = [
+    "Bacon", "Cheddar", "Catupiry", "Ovo", "Cebola Caramelizada", "Picles", "Alface", "Tomate",
+    "Maionese da Casa", "Barbecue", "Molho Especial", "Hambúrguer Extra", "Queijo Prato",
+    "Mussarela", "Calabresa", "Banana", "Milho", "Batata Palha", "Onion", "Jalapeño",
+]
+
+
+def legacy_normalize(text: str) -> str:
+    text = text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[-_]", " ", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    if not text:
+        return ""
+    for pattern, replacement in _ALIAS_PATTERNS:
+        text = re.sub(pattern, replacement, text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def message_workload(message: str) -> list[str]:
+    """Strings que um turno do chat normaliza: log do webhook, gatilhos, busca e adicionais."""
+    calls = [message]
+    for candidate in parse_order_text(message):
+        raw_name = candidate["raw_name"]
+        calls.extend(match.group(0) for match in _MODIFIER_TRIGGER_PATTERN.finditer(raw_name))
+        item_query, modifiers_text = split_item_and_modifiers(raw_name)
+        calls.append(item_query)
+        if modifiers_text:
+            calls.append(modifiers_text)
+            for _modifier in _MODIFIER_NAMES:
+                calls.extend([modifiers_text, _modifier])
+    return calls
+
+
+def _run(label: str, func, messages: list[list[str]]) -> float:
+    started = time.perf_counter()
+    for calls in messages:
+        for text in calls:
+            func(text)
+    elapsed = time.perf_counter() - started
+    per_message_us = (elapsed / max(len(messages), 1)) * 1_000_000
+    print(f"{label:<16} total={elapsed:7.3f}s per_message={per_message_us:8.1f}us")
+    return per_message_us
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmark do custo de normalização por mensagem.")
+    parser.add_argument("--phrases", type=int, default=10_000)
+    parser.add_argument("--phrases-file", type=Path, default=None)
+    args = parser.parse_args()
+
+    phrases = (
+        load_phrases(args.phrases_file)
+        if args.phrases_file
+        else build_phrases(build_menu(500), args.phrases)
+    )
+    messages = [message_workload(phrase) for phrase in phrases]
+    calls = sum(len(entry) for entry in messages)
+    print(f"messages={len(messages)} normalize_calls={calls}")
+
+    mismatches = sum(
+        1 for entry in messages for text in entry if legacy_normalize(text) != normalize.__wrapped__(text)
+    )
+    print(f"output mismatches vs legacy={mismatches}")
+
+    legacy = _run("legacy", legacy_normalize, messages)
+    _run("compiled", normalize.__wrapped__, messages)
+    normalize.cache_clear()
+    cached = _run("compiled+lru", normalize, messages)
+    info = normalize.cache_info()
+    print(f"lru hits={info.hits} misses={info.misses} size={info.currsize}/{info.maxsize}")
+    print(f"speedup vs legacy={legacy / max(cached, 1e-9):.1f}x")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,497 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+# tokens dos entregadores simulados são assinados e validados pelo próprio processo
+os.environ.setdefault("JWT_SECRET_KEY", "bench-realtime-fanout")
+
+from sqlalchemy import create_engine  # noqa: E402
+from starlette.websockets import WebSocketDisconnect  # noqa: E402
+
+from app.core.database import Base, SessionLocal  # noqa: E402
+from app.core.metrics import realtime_outbound_metrics  # noqa: E402
+from app.models.admin_user import AdminUser  # noqa: E402
+from app.models.delivery_tracking import DeliveryTracking  # noqa: E402
+from app.models.order import Order  # noqa: E402
+from app.models.tenant import Tenant  # noqa: E402
+from app.realtime import publisher  # noqa: E402
+from app.realtime.publish_queue import realtime_publisher  # noqa: E402
+from app.routers import delivery_ws, driver_api, public_tracking  # noqa: E402
+from app.services import directions_service  # noqa: E402
+from app.services.auth import create_access_token  # noqa: E402
+
+TENANT_ID = 1
+BASE_LAT, BASE_LNG = -23.55, -46.63
+
+
+class _LocalStore:
+    """Estado compartilhado do Redis em memória: strings com TTL e streams com leitura bloqueante."""
+
+    def __init__(self) -> None:
+        self.strings: dict[str, tuple[bytes, float | None]] = {}
+        self.streams: dict[str, list[tuple[bytes, dict]]] = defaultdict(list)
+        self.appended: dict[str, asyncio.Event] = {}
+        self.published = 0
+        self._last_id = (0, 0)
+
+    def next_id(self) -> bytes:
+        millis = int(time.time() * 1000)
+        last_millis, last_seq = self._last_id
+        self._last_id = (millis, 0) if millis > last_millis else (last_millis, last_seq + 1)
+        return f"{self._last_id[0]}-{self._last_id[1]}".encode()
+
+    def xadd(self, key: str, fields: dict, maxlen: int | None = None) -> bytes:
+        entry_id = self.next_id()
+        entries = self.streams[key]
+        entries.append((entry_id, {name: value.encode() if isinstance(value, str) else value for name, value in fields.items()}))
+        if maxlen is not None and len(entries) > maxlen:
+            del entries[: len(entries) - maxlen]
+        event = self.appended.pop(key, None)
+        if event is not None:
+            event.set()
+        return entry_id
+
+    def set(self, key: str, value, ex: int | None = None, nx: bool = False) -> bool | None:
+        if nx and self.get(key) is not None:
+            return None
+        raw = value.encode() if isinstance(value, str) else value
+        self.strings[key] = (raw, time.monotonic() + ex if ex else None)
+        return True
+
+    def get(self, key: str) -> bytes | None:
+        value = self.strings.get(key)
+        if value is None:
+            return None
+        raw, expires_at = value
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.strings.pop(key, None)
+            return None
+        return raw
+
+
+def _stream_id(value) -> tuple[int, int]:
+    millis, _, seq = (value.decode() if isinstance(value, bytes) else str(value)).partition("-")
+    return int(millis), int(seq or 0)
+
+
+class _LocalPipeline:
+    def __init__(self, store: _LocalStore, *, asynchronous: bool) -> None:
+        self.store = store
+        self.asynchronous = asynchronous
+        self.commands: list = []
+
+    def publish(self, channel: str, message) -> None:
+        self.commands.append(("publish", channel, message))
+
+    def xadd(self, key: str, fields: dict, maxlen: int | None = None, approximate: bool = True) -> None:
+        self.commands.append(("xadd", key, fields, maxlen))
+
+    def expire(self, key: str, seconds: int) -> None:
+        self.commands.append(("expire", key, seconds))
+
+    def zrangebyscore(self, key: str, min_score, max_score) -> None:
+        self.commands.append(("zrangebyscore", key))
+
+    def _run(self) -> list:
+        results = []
+        for command in self.commands:
+            if command[0] == "xadd":
+                results.append(self.store.xadd(command[1], command[2], command[3]))
+            elif command[0] == "publish":
+                self.store.published += 1
+                results.append(0)
+            elif command[0] == "zrangebyscore":
+                results.append([])
+            else:
+                results.append(1)
+        self.commands = []
+        return results
+
+    def execute(self):
+        if not self.asynchronous:
+            return self._run()
+
+        async def _execute():
+            return self._run()
+
+        return _execute()
+
+
+class _LocalRedis:
+    """Stand-in do redis.asyncio com o que o caminho ping -> stream -> SSE usa (rodar sem rede, como gate)."""
+
+    def __init__(self, store: _LocalStore) -> None:
+        self.store = store
+
+    def pipeline(self, transaction: bool = True) -> _LocalPipeline:
+        return _LocalPipeline(self.store, asynchronous=True)
+
+    async def set(self, key: str, value, ex: int | None = None, nx: bool = False):
+        return self.store.set(key, value, ex=ex, nx=nx)
+
+    async def get(self, key: str):
+        return self.store.get(key)
+
+    async def publish(self, channel: str, message) -> int:
+        self.store.published += 1
+        return 0
+
+    async def xrange(self, key: str, min: str = "-", max: str = "+", count: int | None = None):
+        entries = self.store.streams.get(key, [])
+        if min.startswith("("):
+            after = _stream_id(min[1:])
+            entries = [entry for entry in entries if _stream_id(entry[0]) > after]
+        elif min != "-":
+            start = _stream_id(min)
+            entries = [entry for entry in entries if _stream_id(entry[0]) >= start]
+        return list(entries[:count] if count else entries)
+
+    async def xrevrange(self, key: str, max: str = "+", min: str = "-", count: int | None = None):
+        entries = list(reversed(self.store.streams.get(key, [])))
+        return entries[:count] if count else entries
+
+    async def xread(self, streams: dict, count: int | None = None, block: int | None = None):
+        ((key, last_id),) = streams.items()
+        deadline = time.monotonic() + (block or 0) / 1000
+        while True:
+            after = _stream_id(last_id)
+            entries = [entry for entry in self.store.streams.get(key, []) if _stream_id(entry[0]) > after][:count]
+            if entries:
+                return [(key.encode(), entries)]
+            remaining = deadline - time.monotonic()
+            if block is None or remaining <= 0:
+                return []
+            event = self.store.appended.setdefault(key, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return []
+
+    async def aclose(self) -> None:
+        return None
+
+
+class _LocalSyncRedis:
+    def __init__(self, store: _LocalStore) -> None:
+        self.store = store
+
+    def pipeline(self, transaction: bool = True) -> _LocalPipeline:
+        return _LocalPipeline(self.store, asynchronous=False)
+
+    def publish(self, channel: str, message) -> int:
+        self.store.published += 1
+        return 0
+
+
+class _DriverSocket:
+    """Lado servidor de um `/ws/driver`: o entregador simulado empurra pings na fila `incoming`."""
+
+    def __init__(self, token: str) -> None:
+        self.headers = {"authorization": f"Bearer {token}"}
+        self.cookies: dict = {}
+        self.query_params: dict = {}
+        self.path_params: dict = {}
+        self.state = SimpleNamespace()
+        self.client = None
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.pending: list[float] = []
+        self.ack_latencies: list[float] = []
+        self.results: Counter = Counter()
+
+    async def accept(self) -> None:
+        return None
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        self.results[f"closed:{code}"] += 1
+
+    async def receive_json(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect(code=1000)
+        return message
+
+    async def send_json(self, message: dict) -> None:
+        if self.pending:
+            self.ack_latencies.append(time.perf_counter() - self.pending.pop(0))
+        self.results[message.get("reason") or message.get("type")] += 1
+
+
+def _seed(drivers: int) -> list[tuple[int, int, str]]:
+    """Uma entrega em rota por entregador; devolve (entregador, pedido, token de rastreio)."""
+    db = SessionLocal()
+    try:
+        db.add(Tenant(id=TENANT_ID, name="Bench", business_name="Bench", slug="bench"))
+        deliveries = []
+        for index in range(drivers):
+            driver = AdminUser(
+                tenant_id=TENANT_ID,
+                email=f"rider{index}@bench.local",
+                name=f"Rider {index}",
+                role="DELIVERY",
+                password_hash="x",
+            )
+            db.add(driver)
+            db.flush()
+            order = Order(
+                tenant_id=TENANT_ID,
+                cliente_nome=f"Cliente {index}",
+                cliente_telefone=f"55119{index:08d}",
+                itens="x-burger",
+                status="OUT_FOR_DELIVERY",
+                assigned_delivery_user_id=driver.id,
+                destination_lat=BASE_LAT - 0.02,
+                destination_lng=BASE_LNG - 0.02,
+            )
+            db.add(order)
+            db.flush()
+            db.add(
+                DeliveryTracking(
+                    order_id=order.id,
+                    delivery_user_id=driver.id,
+                    estimated_duration_seconds=900,
+                    expected_delivery_at=datetime.now(timezone.utc),
+                    current_lat=BASE_LAT,
+                    current_lng=BASE_LNG,
+                )
+            )
+            deliveries.append((int(driver.id), int(order.id), str(order.tracking_token)))
+        db.commit()
+        return deliveries
+    finally:
+        db.close()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _rss_mb() -> tuple[float, float]:
+    """(RSS atual, pico) em MB."""
+    current = float("nan")
+    try:
+        with open("/proc/self/status", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return current, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _drive(socket: _DriverSocket, order_id: int, index: int, sent: dict, args) -> None:
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(args.interval * index / max(args.drivers, 1))
+    deadline = loop.time() + args.duration
+    seq = 0
+    while loop.time() < deadline:
+        seq += 1
+        lat = BASE_LAT + index * 1e-3 + seq * 1e-5
+        lng = BASE_LNG - seq * 1e-5
+        now = time.perf_counter()
+        sent[(order_id, lat)] = now
+        socket.pending.append(now)
+        socket.incoming.put_nowait(
+            {
+                "type": "driver_location_update",
+                "delivery_id": order_id,
+                "latitude": lat,
+                "longitude": lng,
+                "recorded_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        await asyncio.sleep(args.interval)
+    socket.incoming.put_nowait(None)
+
+
+async def _watch(token: str, order_id: int, sent: dict, latencies: list[float], frames: Counter) -> None:
+    async def _connected() -> bool:
+        return False
+
+    request = SimpleNamespace(headers={}, state=SimpleNamespace(), is_disconnected=_connected)
+    response = await public_tracking.sse_public_tracking(token, request)
+    async for chunk in response.body_iterator:
+        received = time.perf_counter()
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        for line in text.splitlines():
+            if not line.startswith("data: "):
+                continue
+            frames["location"] += 1
+            sent_at = sent.get((order_id, json.loads(line[6:]).get("driver_lat")))
+            if sent_at is not None:
+                latencies.append(received - sent_at)
+
+
+async def _scenario(args, deliveries: list[tuple[int, int, str]]) -> dict:
+    stop = asyncio.Event()
+    publisher_task = asyncio.create_task(realtime_publisher.run(stop))
+    while not realtime_publisher.running and not publisher_task.done():
+        await asyncio.sleep(0.01)
+
+    sent: dict = {}
+    latencies: list[float] = []
+    frames: Counter = Counter()
+    watchers = [
+        asyncio.create_task(_watch(token, order_id, sent, latencies, frames))
+        for index in range(args.customers)
+        for _driver_id, order_id, token in [deliveries[index % len(deliveries)]]
+    ]
+    await asyncio.sleep(0.2)
+
+    sockets = []
+    handlers = []
+    drivers = []
+    started_wall = time.perf_counter()
+    started_cpu = time.process_time()
+    for index, (driver_id, order_id, _token) in enumerate(deliveries):
+        token = create_access_token(
+            str(driver_id),
+            extra={"tenant_id": TENANT_ID, "delivery_user_id": driver_id, "role": "driver"},
+        )
+        socket = _DriverSocket(token)
+        sockets.append(socket)
+        handlers.append(asyncio.create_task(delivery_ws.driver_location_updates_ws(socket)))
+        drivers.append(asyncio.create_task(_drive(socket, order_id, index, sent, args)))
+
+    await asyncio.gather(*drivers)
+    await asyncio.gather(*handlers)
+    # última janela de coalescência ainda sai para os clientes
+    await asyncio.sleep(public_tracking.public_tracking_hub.window_seconds + 0.2)
+    wall = time.perf_counter() - started_wall
+    cpu = time.process_time() - started_cpu
+
+    for watcher in watchers:
+        watcher.cancel()
+    await asyncio.gather(*watchers, return_exceptions=True)
+    stop.set()
+    await publisher_task
+
+    results: Counter = Counter()
+    ack_latencies: list[float] = []
+    for socket in sockets:
+        results.update(socket.results)
+        ack_latencies.extend(socket.ack_latencies)
+    return {
+        "wall": wall,
+        "cpu": cpu,
+        "pings": len(sent),
+        "results": results,
+        "ack_latencies": ack_latencies,
+        "frames": frames["location"],
+        "latencies": latencies,
+    }
+
+
+def _use_local_redis() -> _LocalStore:
+    store = _LocalStore()
+    factory = lambda: _LocalRedis(store)  # noqa: E731
+    sync_client = _LocalSyncRedis(store)
+    os.environ.pop("REDIS_URL", None)
+    driver_api.get_async_redis_client = factory
+    public_tracking.get_async_redis_client = factory
+    realtime_publisher._client_factory = factory
+    publisher.get_shared_redis_client = lambda: sync_client
+    return store
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Carga do fan-out em tempo real: N entregadores em /ws/driver e M clientes em /api/public/sse/{token}."
+    )
+    parser.add_argument("--drivers", type=int, default=50)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de pings por entregador.")
+    parser.add_argument(
+        "--interval", type=float, default=3.0, help="Segundos entre pings (o throttle por pedido é de 2s)."
+    )
+    parser.add_argument("--coalesce-seconds", type=float, default=public_tracking.public_tracking_hub.window_seconds)
+    parser.add_argument(
+        "--redis-url",
+        default="",
+        help="Redis local para incluir o round-trip; sem ele, usa um Redis em memória (roda offline).",
+    )
+    parser.add_argument("--database-url", default="", help="Banco vazio para o seed; padrão: SQLite temporário.")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Gate: falha se a latência p95 ping->SSE passar disso.")
+    parser.add_argument("--min-events-per-second", type=float, default=None, help="Gate: falha abaixo desse throughput.")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="Gate: falha se o pico de RSS passar disso.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = args.database_url or f"sqlite:///{tmpdir}/bench_realtime.db"
+        engine = create_engine(
+            database_url,
+            connect_args={"check_same_thread": False} if database_url.startswith("sqlite") else {},
+        )
+        Base.metadata.create_all(bind=engine)
+        SessionLocal.configure(bind=engine)
+        # Directions fica de fora: sem chave o cálculo cai no haversine local
+        directions_service.GOOGLE_MAPS_API_KEY = ""
+        if args.redis_url:
+            os.environ["REDIS_URL"] = args.redis_url
+        else:
+            _use_local_redis()
+        public_tracking.public_tracking_hub.window_seconds = args.coalesce_seconds
+
+        deliveries = _seed(args.drivers)
+        print(
+            f"drivers={args.drivers} customers={args.customers} duration={args.duration}s interval={args.interval}s "
+            f"coalesce={args.coalesce_seconds}s redis={'local' if args.redis_url else 'memória'} "
+            f"db={engine.url.get_backend_name()}"
+        )
+        result = asyncio.run(_scenario(args, deliveries))
+        engine.dispose()
+
+    wall, cpu = result["wall"], result["cpu"]
+    latencies_ms = [value * 1000 for value in result["latencies"]]
+    acks_ms = [value * 1000 for value in result["ack_latencies"]]
+    events_per_second = result["frames"] / wall
+    rss_mb, peak_rss_mb = _rss_mb()
+    accepted = result["results"]["driver_location_ack"]
+    rejected = {reason: count for reason, count in result["results"].items() if reason != "driver_location_ack"}
+
+    print(f"pings sent={result['pings']} accepted={accepted} rejected={rejected or 0} pings/s={accepted / wall:.1f}")
+    print(
+        f"ack      p50={_percentile(acks_ms, 50):7.1f}ms p95={_percentile(acks_ms, 95):7.1f}ms "
+        f"p99={_percentile(acks_ms, 99):7.1f}ms"
+    )
+    print(
+        f"sse      events={result['frames']} events/s={events_per_second:.1f} matched={len(latencies_ms)} "
+        f"p50={_percentile(latencies_ms, 50):7.1f}ms p95={_percentile(latencies_ms, 95):7.1f}ms "
+        f"p99={_percentile(latencies_ms, 99):7.1f}ms"
+    )
+    print(f"worker   cpu={cpu:.2f}s ({cpu / wall:.0%} de um core) rss={rss_mb:.1f}MB peak_rss={peak_rss_mb:.1f}MB")
+    print(f"outbound {json.dumps(realtime_outbound_metrics.snapshot(), sort_keys=True)}")
+
+    failures = []
+    p95 = _percentile(latencies_ms, 95)
+    if args.max_p95_ms is not None and not p95 <= args.max_p95_ms:
+        failures.append(f"p95={p95:.1f}ms > {args.max_p95_ms}ms")
+    if args.min_events_per_second is not None and events_per_second < args.min_events_per_second:
+        failures.append(f"events/s={events_per_second:.1f} < {args.min_events_per_second}")
+    if args.max_rss_mb is not None and peak_rss_mb > args.max_rss_mb:
+        failures.append(f"peak_rss={peak_rss_mb:.1f}MB > {args.max_rss_mb}MB")
+    if failures:
+        print("REGRESSÃO: " + "; ".join(failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
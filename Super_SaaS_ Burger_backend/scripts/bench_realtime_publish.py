@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.realtime import publisher  # noqa: E402
+
+
+class _NullPipeline:
+    def __init__(self, client: "_NullRedis") -> None:
+        self.client = client
+        self.count = 0
+
+    def publish(self, _channel: str, _message: str) -> None:
+        self.count += 1
+
+    def xadd(self, _key: str, _fields: dict, **_kwargs) -> None:
+        self.count += 1
+
+    def expire(self, _key: str, _seconds: int) -> None:
+        self.count += 1
+
+    def execute(self) -> list[int]:
+        self.client.round_trips += 1
+        self.client.messages += self.count
+        return [0] * self.count
+
+
+class _NullRedis:
+    """Cliente em memória: mede só o custo de CPU do lado da aplicação (sem rede)."""
+
+    def __init__(self) -> None:
+        self.round_trips = 0
+        self.messages = 0
+
+    def publish(self, _channel: str, _message: str) -> int:
+        self.round_trips += 1
+        self.messages += 1
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> _NullPipeline:
+        return _NullPipeline(self)
+
+
+@contextmanager
+def _no_batch():
+    yield None
+
+
+def fan_out(index: int) -> None:
+    """Mesma sequência de publicações de um ping do entregador (delivery_api + driver_api)."""
+    lat = -23.55 + (index % 1000) * 1e-5
+    lng = -46.63 - (index % 1000) * 1e-5
+    order_id = 1000 + index % 50
+    with publisher.publish_batch():
+        publisher.publish_delivery_location_event(1, 7, lat, lng, order_id=order_id)
+        publisher.publish_delivery_driver_location_event(1, 7, order_id, lat, lng)
+        publisher.publish_public_tracking_event(
+            1,
+            order_id,
+            status="OUT_FOR_DELIVERY",
+            delivery_user_name="Entregador",
+            lat=lat,
+            lng=lng,
+            distance_meters=1200,
+            duration_seconds=300,
+            initial_distance_meters=4000,
+            progress=0.7,
+            updated_at="2026-10-19T12:00:00+00:00",
+        )
+
+
+def _run(label: str, pings: int, counter) -> None:
+    before_round_trips = getattr(counter, "round_trips", 0)
+    started_wall = time.perf_counter()
+    started_cpu = time.process_time()
+    for index in range(pings):
+        fan_out(index)
+    cpu = time.process_time() - started_cpu
+    wall = time.perf_counter() - started_wall
+    round_trips = getattr(counter, "round_trips", before_round_trips) - before_round_trips
+    print(
+        f"{label:<10} pings/s={pings / wall:10.0f} pings/s/core={pings / max(cpu, 1e-9):10.0f} "
+        f"cpu_us/ping={(cpu / pings) * 1_000_000:7.1f} round_trips/ping={round_trips / pings if round_trips else float('nan'):4.1f}"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do fan-out de localização no Pub/Sub (publish_batch).")
+    parser.add_argument("--pings", type=int, default=50_000)
+    parser.add_argument(
+        "--redis-url",
+        default=os.getenv("REDIS_URL", ""),
+        help="Redis real para medir round-trips; sem ele, usa um cliente em memória (só CPU).",
+    )
+    args = parser.parse_args()
+
+    if args.redis_url:
+        import redis
+
+        client = redis.from_url(args.redis_url)
+        client.ping()
+        counter = None
+    else:
+        client = _NullRedis()
+        counter = client
+    publisher.get_shared_redis_client = lambda: client
+    print(f"pings={args.pings} backend={'redis' if args.redis_url else 'memória'}")
+
+    # antes: cada publish_* faz o próprio round-trip
+    batched = publisher.publish_batch
+    publisher.publish_batch = _no_batch
+    try:
+        _run("sequencial", args.pings, counter)
+    finally:
+        publisher.publish_batch = batched
+    _run("pipeline", args.pings, counter)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
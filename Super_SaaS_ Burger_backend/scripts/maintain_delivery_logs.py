@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import app.models  # noqa: E402,F401
+from app.services.delivery_log_partitions import maintain_delivery_logs  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Cria as partições mensais de delivery_logs e aplica a retenção (DELIVERY_LOGS_RETENTION_MONTHS).",
+    )
+    parser.add_argument("--today", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    result = maintain_delivery_logs(args.today)
+    print(f"delivery_logs partitions created={result['created_partitions']} removed={result['removed']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
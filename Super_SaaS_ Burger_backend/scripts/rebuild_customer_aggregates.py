@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import app.models  # noqa: E402,F401
+from app.core.database import SessionLocal  # noqa: E402
+from app.services.customer_aggregates import rebuild_customer_aggregates  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Recalcula customer_aggregates a partir dos pedidos (backfill ou reconciliação).",
+    )
+    parser.add_argument("--tenant-id", type=int, action="append", dest="tenant_ids")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        refreshed = 0
+        for tenant_id in args.tenant_ids or [None]:
+            refreshed += rebuild_customer_aggregates(db, tenant_id)
+    finally:
+        db.close()
+    print(f"customer aggregates refreshed={refreshed}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import app.models  # noqa: E402,F401
+from app.core.database import SessionLocal  # noqa: E402
+from app.services.sales_rollups import SALES_ROLLUP_RECONCILE_DAYS, reconcile_sales_rollups  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Recalcula daily_sales_rollups e daily_item_sales dos últimos N dias fechados (cron noturno ou backfill).",
+    )
+    parser.add_argument("--days", type=int, default=SALES_ROLLUP_RECONCILE_DAYS)
+    parser.add_argument("--tenant-id", type=int, action="append", dest="tenant_ids")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        refreshed = reconcile_sales_rollups(db, days=args.days, tenant_ids=args.tenant_ids)
+    finally:
+        db.close()
+    print(f"sales rollup days refreshed={refreshed}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,204 @@
+import asyncio
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.ai import service as ai_service
+from app.ai.message_log import AIMessageLogBuffer
+from app.core.database import Base
+from app.models.ai_config import AIConfig
+from app.models.ai_message_log import AIMessageLog
+from app.models.menu_item import MenuItem
+from app.models.menu_item_modifier_group import MenuItemModifierGroup
+from app.models.modifier import Modifier
+from app.models.modifier_group import ModifierGroup
+from app.models.tenant import Tenant
+from app.realtime import cache_invalidation
+from app.services import menu_snapshot
+
+
+def _build_session():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    testing_session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = testing_session()
+    db.add(Tenant(id=1, slug="tempero", business_name="Tempero"))
+    db.add(AIConfig(tenant_id=1, provider="mock", enabled=True, system_prompt="Seja breve."))
+    db.add(MenuItem(id=1, tenant_id=1, name="Smash Burger", price_cents=2500, active=True))
+    db.add(ModifierGroup(id=10, tenant_id=1, name="Adicionais", active=True))
+    db.add(Modifier(id=100, tenant_id=1, group_id=10, name="Bacon", price_cents=400, active=True))
+    db.add(MenuItemModifierGroup(tenant_id=1, menu_item_id=1, modifier_group_id=10))
+    db.commit()
+    menu_snapshot.invalidate_menu_snapshot()
+    ai_service.invalidate_ai_config(1)
+    return db
+
+
+class _RecordingProvider:
+    name = "recording"
+
+    def __init__(self):
+        self.prefixes = []
+
+    def generate(self, tenant_id, phone, user_message, context):
+        raise AssertionError("prefix-aware providers should receive generate_with_prefix")
+
+    def generate_with_prefix(self, tenant_id, phone, user_message, context, prefix):
+        self.prefixes.append(prefix)
+        return {"intent": "HELP", "tool_calls": [], "message_to_user": "Oi!", "confidence": 0.9}
+
+
+def test_assistant_context_is_reused_until_menu_or_config_changes():
+    db = _build_session()
+
+    first = ai_service.get_assistant_context(1, db)
+    assert ai_service.get_assistant_context(1, db) is first
+
+    item = db.query(MenuItem).filter(MenuItem.id == 1).first()
+    item.price_cents = 2700
+    db.commit()
+    after_menu_edit = ai_service.get_assistant_context(1, db)
+    assert after_menu_edit is not first
+    assert after_menu_edit.prefix.key != first.prefix.key
+
+    ai_service.invalidate_ai_config(1)
+    assert ai_service.get_assistant_context(1, db) is not after_menu_edit
+
+
+def test_config_commit_invalidates_here_and_is_broadcast(monkeypatch):
+    db = _build_session()
+    broadcasts = []
+    monkeypatch.setattr(ai_service, "broadcast_cache_invalidation", lambda cache, tenant_id: broadcasts.append((cache, tenant_id)))
+    assert ai_service.get_cached_ai_config(db, 1).enabled is True
+
+    db.query(AIConfig).filter(AIConfig.tenant_id == 1).one().enabled = False
+    db.commit()
+
+    assert broadcasts == [("ai_config", 1)]
+    assert ai_service.get_cached_ai_config(db, 1).enabled is False
+
+    # aviso vindo de outro worker descarta a config em cache sem esperar o TTL
+    db.query(AIConfig).filter(AIConfig.tenant_id == 1).update({"enabled": True})
+    db.commit()
+    assert ai_service.get_cached_ai_config(db, 1).enabled is False
+    assert cache_invalidation.apply_cache_invalidation(
+        json.dumps({"cache": "ai_config", "tenant_id": 1, "origin": "outro-worker"})
+    )
+    assert ai_service.get_cached_ai_config(db, 1).enabled is True
+
+
+def test_prompt_prefix_is_compact_and_groups_modifiers():
+    db = _build_session()
+
+    prefix = ai_service.get_assistant_context(1, db).prefix
+    payload = json.loads(prefix.text)
+
+    assert ": " not in prefix.text
+    assert payload["system_prompt"] == "Seja breve."
+    assert payload["menu_items"] == [[1, "Smash Burger", 2500, None, [10]]]
+    assert payload["modifier_groups"] == [[10, "Adicionais", [[100, "Bacon", 400]]]]
+
+
+def test_run_assistant_hands_stable_prefix_to_prefix_aware_providers(monkeypatch):
+    db = _build_session()
+    provider = _RecordingProvider()
+    monkeypatch.setitem(ai_service._PROVIDERS, "mock", provider)
+
+    ai_service.run_assistant(1, "5511999999999", "oi", db)
+    ai_service.run_assistant(1, "5511999999999", "quero um smash burger", db)
+
+    assert len(provider.prefixes) == 2
+    assert provider.prefixes[0] is provider.prefixes[1]
+
+
+class _SlowProvider:
+    name = "slow"
+
+    def __init__(self, slow_tenants):
+        self.slow_tenants = slow_tenants
+        self.cancelled = 0
+
+    def generate(self, tenant_id, phone, user_message, context):
+        raise AssertionError("async path should use agenerate")
+
+    async def agenerate(self, tenant_id, phone, user_message, context, prefix=None):
+        if tenant_id in self.slow_tenants:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return {"intent": "HELP", "tool_calls": [], "message_to_user": "Rápido!", "confidence": 0.9}
+
+
+def _add_second_tenant(db):
+    db.add(Tenant(id=2, slug="outro", business_name="Outro"))
+    db.add(AIConfig(tenant_id=2, provider="mock", enabled=True))
+    db.add(MenuItem(id=2, tenant_id=2, name="Pizza Calabresa", price_cents=4000, active=True))
+    db.commit()
+    ai_service.invalidate_ai_config(2)
+
+
+def test_arun_assistant_times_out_to_rule_parser_and_cancels_provider(monkeypatch):
+    db = _build_session()
+    provider = _SlowProvider(slow_tenants={1})
+    monkeypatch.setitem(ai_service._PROVIDERS, "mock", provider)
+    monkeypatch.setattr(ai_service, "AI_PROVIDER_TIMEOUT_SECONDS", 0.05)
+
+    payload, final_message = asyncio.run(ai_service.arun_assistant(1, "5511999999999", "ajuda", db))
+
+    assert payload["intent"] == "HELP"
+    assert final_message == "Posso mostrar o cardápio, adicionar itens ou finalizar o pedido."
+    assert provider.cancelled == 1
+    out_log = db.query(AIMessageLog).filter(AIMessageLog.direction == "out").one()
+    assert out_log.error == "provider_timeout"
+
+
+def test_slow_tenant_does_not_stall_other_tenants(monkeypatch):
+    db = _build_session()
+    _add_second_tenant(db)
+    provider = _SlowProvider(slow_tenants={1})
+    monkeypatch.setitem(ai_service._PROVIDERS, "mock", provider)
+    monkeypatch.setattr(ai_service, "AI_PROVIDER_TIMEOUT_SECONDS", 0.5)
+    finished: list[int] = []
+
+    async def _turn(tenant_id):
+        await ai_service.arun_assistant(tenant_id, "5511999999999", "oi", db)
+        finished.append(tenant_id)
+
+    async def _run():
+        await asyncio.gather(_turn(1), _turn(1), _turn(2))
+
+    asyncio.run(_run())
+
+    assert finished[0] == 2
+
+
+def test_message_log_buffer_batches_rows_while_writer_runs():
+    db = _build_session()
+    buffer = AIMessageLogBuffer(batch_size=2, flush_interval=5)
+
+    async def _run():
+        stop_event = asyncio.Event()
+        writer = asyncio.create_task(buffer.run(stop_event, session_factory=lambda: Session(bind=db.get_bind())))
+        await asyncio.sleep(0)
+        buffer.enqueue(db, tenant_id=1, phone="1", direction="in", provider="mock", prompt="a")
+        assert db.query(AIMessageLog).count() == 0
+        buffer.enqueue(db, tenant_id=1, phone="1", direction="out", provider="mock", prompt="b")
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if db.query(AIMessageLog).count() == 2:
+                break
+        stop_event.set()
+        await writer
+
+    asyncio.run(_run())
+
+    assert db.query(AIMessageLog).count() == 2
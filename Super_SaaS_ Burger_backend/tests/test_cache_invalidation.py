@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from app.realtime import cache_invalidation
+
+
+class _PubSub:
+    def __init__(self, messages, fail):
+        self.messages = list(messages)
+        self.fail = fail
+
+    async def subscribe(self, channel):
+        assert channel == "cache:invalidate"
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=1.0):
+        if self.messages:
+            return {"data": self.messages.pop(0)}
+        if self.fail:
+            raise ConnectionError("redis restarted")
+        await asyncio.sleep(0.01)
+        return None
+
+    async def aclose(self):
+        return None
+
+
+class _Client:
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+
+    def pubsub(self):
+        return self.sessions.pop(0)
+
+    async def aclose(self):
+        return None
+
+
+def test_subscriber_applies_messages_and_drops_everything_after_reconnect(monkeypatch):
+    calls = []
+    monkeypatch.setattr(cache_invalidation, "_handlers", {"menu_snapshot": calls.append})
+    message = json.dumps({"cache": "menu_snapshot", "tenant_id": 4, "origin": "outro-worker"}).encode()
+    client = _Client([_PubSub([message], fail=True), _PubSub([], fail=False)])
+    monkeypatch.setattr(cache_invalidation, "get_async_redis_client", lambda: client)
+
+    async def _scenario():
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(cache_invalidation.run_cache_invalidation_subscriber(stop_event))
+        while len(calls) < 2:
+            await asyncio.sleep(0.01)
+        stop_event.set()
+        await task
+
+    asyncio.run(asyncio.wait_for(_scenario(), timeout=5))
+
+    # o aviso do tenant 4 e, depois da queda, a invalidação geral (avisos do intervalo se perderam)
+    assert calls == [4, None]
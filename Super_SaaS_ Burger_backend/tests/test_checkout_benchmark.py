@@ -0,0 +1,16 @@
+import pytest
+
+from scripts.bench_checkout import MENU_SIZES, measure_checkout
+
+# carrinho de 4 itens com modificadores, cupom e cliente novo/recorrente; subir este número exige justificar no PR
+CHECKOUT_STATEMENT_BUDGET = 75
+
+
+@pytest.mark.parametrize("menu_size", MENU_SIZES)
+def test_checkout_statement_count_stays_within_budget(menu_size):
+    result = measure_checkout(menu_size, checkouts=6, warmup=0, allocation_samples=0)
+
+    assert result["checkouts"] == 6
+    assert result["events"] == 6
+    # o tamanho do cardápio não pode entrar na conta: só os itens do carrinho são consultados
+    assert result["max_statements"] <= CHECKOUT_STATEMENT_BUDGET, result
@@ -0,0 +1,175 @@
+import re
+from datetime import datetime, timedelta
+
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.admin_user import AdminUser
+from app.models.customer import Customer
+from app.models.customer_aggregate import CustomerAggregate
+from app.models.order import Order
+from app.models.tenant import Tenant
+from app.routers.admin_customers import list_admin_customers
+from app.services import customer_aggregates
+from app.services.customer_aggregates import rebuild_customer_aggregates, refresh_customer_aggregates
+
+
+def _build_session():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    db.add(Tenant(id=1, slug="tempero", business_name="Tempero"))
+    db.commit()
+    return db
+
+
+def _add_order(db, customer_id, total_cents, created_at):
+    order = Order(
+        tenant_id=1,
+        customer_id=customer_id,
+        cliente_nome="Cliente",
+        cliente_telefone="5511999990000",
+        itens="x-burger",
+        total_cents=total_cents,
+        created_at=created_at,
+    )
+    db.add(order)
+    return order
+
+
+def _aggregate(db, customer_id):
+    db.expire_all()
+    return (
+        db.query(CustomerAggregate)
+        .filter(CustomerAggregate.tenant_id == 1, CustomerAggregate.customer_id == customer_id)
+        .one()
+    )
+
+
+def test_aggregates_follow_order_writes():
+    db = _build_session()
+    first = Customer(id=1, tenant_id=1, name="Ana", phone="5511999990001")
+    second = Customer(id=2, tenant_id=1, name="Bruno", phone="5511999990002")
+    db.add_all([first, second])
+    db.commit()
+
+    older = _add_order(db, 1, 300, datetime(2026, 5, 1, 12, 0))
+    _add_order(db, 1, 250, datetime(2026, 6, 1, 12, 0))
+    db.commit()
+
+    aggregate = _aggregate(db, 1)
+    assert (aggregate.total_orders, aggregate.total_spent, aggregate.is_vip) == (2, 550, True)
+    assert aggregate.first_order_at.date().isoformat() == "2026-05-01"
+    assert aggregate.last_order_at.date().isoformat() == "2026-06-01"
+
+    older.total_cents = 100
+    db.commit()
+    assert _aggregate(db, 1).total_spent == 350
+
+    older.customer_id = 2
+    db.commit()
+    assert (_aggregate(db, 1).total_orders, _aggregate(db, 1).total_spent) == (1, 250)
+    assert (_aggregate(db, 2).total_orders, _aggregate(db, 2).total_spent) == (1, 100)
+
+    db.delete(older)
+    db.commit()
+    assert (_aggregate(db, 2).total_orders, _aggregate(db, 2).last_order_at) == (0, None)
+
+    db.query(CustomerAggregate).delete()
+    db.commit()
+    assert rebuild_customer_aggregates(db, 1) == 1
+    assert _aggregate(db, 1).total_spent == 250
+
+
+def test_admin_list_pages_by_keyset_without_reading_orders():
+    db = _build_session()
+    now = datetime.utcnow()
+    for customer_id in range(1, 8):
+        db.add(Customer(id=customer_id, tenant_id=1, name=f"Cliente {customer_id}", phone=f"55119999900{customer_id:02d}"))
+    db.commit()
+    # clientes 6 e 7 sem pedidos; 4 e 5 empatados no último pedido
+    for customer_id, days_ago in ((1, 100), (2, 50), (3, 20), (4, 3), (5, 3)):
+        _add_order(db, customer_id, 100 * customer_id, now - timedelta(days=days_ago))
+    _add_order(db, 5, 600, now - timedelta(days=30))
+    db.commit()
+
+    user = AdminUser(id=1, tenant_id=1, email="admin@teste.com", name="Admin", role="admin", password_hash="x")
+    defaults = {"tenant_id": None, "search": None, "vip_only": False, "inactive_days": None, "recurrence": None}
+
+    statements = []
+
+    def _capture(_conn, _cursor, statement, *_args):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", _capture)
+    try:
+        seen = []
+        totals = []
+        cursor = None
+        while True:
+            response = list_admin_customers(page=1, limit=3, cursor=cursor, user=user, db=db, **defaults)
+            seen.extend(item["id"] for item in response["items"])
+            totals.append(response["total"])
+            cursor = response["next_cursor"]
+            if cursor is None:
+                break
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", _capture)
+
+    offset_ids = [
+        item["id"]
+        for page in (1, 2, 3)
+        for item in list_admin_customers(page=page, limit=3, cursor=None, user=user, db=db, **defaults)["items"]
+    ]
+    assert seen == [5, 4, 3, 2, 1, 7, 6]
+    assert seen == offset_ids
+    assert not [statement for statement in statements if re.search(r"\b(FROM|JOIN) orders\b", statement)]
+    # o COUNT roda só na primeira página; as seguintes, por cursor, não o repetem
+    assert totals == [7, None, None]
+    assert len([statement for statement in statements if "count(" in statement.lower()]) == 1
+
+    vip = list_admin_customers(page=1, limit=10, cursor=None, user=user, db=db, **{**defaults, "vip_only": True})
+    assert [item["id"] for item in vip["items"]] == [5]
+    assert vip["items"][0]["total_spent"] == 1100
+
+    inactive = list_admin_customers(
+        page=1, limit=10, cursor=None, user=user, db=db, **{**defaults, "recurrence": "inactive"}
+    )
+    assert [item["id"] for item in inactive["items"]] == [1, 7, 6]
+    assert inactive["total"] == 3
+    assert {item["recurrence_segment"] for item in inactive["items"]} == {"inactive"}
+
+
+class _RecordingConnection:
+    dialect = postgresql.dialect()
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement.compile(dialect=self.dialect)))
+        return SimpleNamespace(all=lambda: [])
+
+
+def test_refresh_locks_aggregate_rows_before_recounting(monkeypatch):
+    connection = _RecordingConnection()
+    monkeypatch.setattr(customer_aggregates, "_aggregate_rows", lambda _connection, tenant_id, ids: [])
+    monkeypatch.setattr(customer_aggregates, "_upsert_customer_aggregates", lambda _connection, rows: None)
+
+    assert refresh_customer_aggregates(connection, 1, [3, 2, 3]) == 2
+
+    # a linha é garantida e travada antes da recontagem: transações concorrentes do mesmo cliente
+    # recontam em sequência em vez de sobrescrever uma à outra
+    insert, lock = connection.statements
+    assert "ON CONFLICT (tenant_id, customer_id) DO NOTHING" in insert
+    assert lock.endswith("FOR UPDATE")
+    assert "ORDER BY customer_aggregates.customer_id" in lock
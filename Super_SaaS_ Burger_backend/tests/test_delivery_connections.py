@@ -0,0 +1,155 @@
+import asyncio
+import json
+
+import pytest
+
+from app.realtime import publisher
+from app.realtime.delivery_connections import DeliveryConnectionRegistry
+from app.realtime.event_streams import PresenceTarget
+from app.realtime.publish_queue import RealtimePublisher
+
+
+class _Socket:
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.release = asyncio.Event()
+        if not blocked:
+            self.release.set()
+
+    async def send_text(self, data):
+        await self.release.wait()
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+class _PresencePipeline:
+    def __init__(self, commands):
+        self.commands = commands
+
+    def zadd(self, key, mapping):
+        self.commands.append(("zadd", key, list(mapping)))
+
+    def expire(self, key, seconds):
+        self.commands.append(("expire", key, seconds))
+
+    def zrem(self, key, member):
+        self.commands.append(("zrem", key, member))
+
+    async def execute(self):
+        return []
+
+
+class _PresenceRedis:
+    def __init__(self):
+        self.commands = []
+
+    def pipeline(self, transaction=True):
+        return _PresencePipeline(self.commands)
+
+    async def aclose(self):
+        return None
+
+
+def test_registry_fans_out_to_every_device_without_waiting_on_slow_sockets():
+    async def _scenario():
+        redis = _PresenceRedis()
+        registry = DeliveryConnectionRegistry(worker_id="w1", client_factory=lambda: redis)
+        slow, phone, other_driver = _Socket(blocked=True), _Socket(), _Socket()
+
+        await registry.add(8, 13, slow)
+        await registry.add(8, 13, phone)
+        await registry.add(8, 14, other_driver)
+
+        assert registry.send(8, 13, {"type": "delivery.assignment", "n": 1}) == 2
+        assert registry.send(8, 14, {"type": "delivery.assignment", "n": 2}) == 1
+        await asyncio.sleep(0)
+        assert phone.sent == [{"type": "delivery.assignment", "n": 1}]
+        assert other_driver.sent == [{"type": "delivery.assignment", "n": 2}]
+        assert slow.sent == []
+
+        assert registry.discard(8, 13, slow) is False
+        assert registry.has(8, 13)
+        assert registry.discard(8, 13, phone) is True
+        await registry.clear_presence(8, 13)
+        assert not registry.has(8, 13)
+        assert registry.send(8, 13, {"type": "x"}) == 0
+
+        assert ("zadd", "tenant:8:delivery:13:presence", ["w1"]) in redis.commands
+        assert redis.commands[-1] == ("zrem", "tenant:8:delivery:13:presence", "w1")
+
+        registry.discard(8, 14, other_driver)
+
+    asyncio.run(_scenario())
+
+
+def test_assignment_is_routed_to_the_workers_holding_the_driver(monkeypatch):
+    published = []
+    lookups = []
+
+    class _Pipeline:
+        def __init__(self):
+            self.results = []
+
+        def zrangebyscore(self, key, min_score, max_score):
+            lookups.append(key)
+            self.results.append([b"worker-a", b"worker-b"])
+
+        def publish(self, channel, message):
+            published.append((channel, json.loads(message)))
+            self.results.append(1)
+
+        def execute(self):
+            return self.results
+
+    class _SyncRedis:
+        def pipeline(self, transaction=True):
+            return _Pipeline()
+
+    monkeypatch.setattr(publisher, "get_shared_redis_client", lambda: _SyncRedis())
+
+    publisher.publish_delivery_assignment_event(8, 44, 13, {"status": "SAIU"})
+
+    assert lookups == ["tenant:8:delivery:13:presence"]
+    assert [channel for channel, _message in published] == [
+        "tenant:8:delivery:assignment",
+        "delivery:worker:worker-a",
+        "delivery:worker:worker-b",
+    ]
+    assert published[1][1]["delivery_user_id"] == 13
+
+
+def test_assignment_presence_is_resolved_by_the_background_publisher(monkeypatch):
+    queued = []
+    monkeypatch.setattr(publisher, "get_shared_redis_client", lambda: pytest.fail("request path touched Redis"))
+    monkeypatch.setattr(publisher.realtime_publisher, "enqueue_many", lambda messages: queued.extend(messages) or True)
+
+    publisher.publish_delivery_assignment_event(8, 44, 13, {"status": "SAIU"})
+
+    assert [channel for channel, _message in queued] == [
+        "tenant:8:delivery:assignment",
+        PresenceTarget("tenant:8:delivery:13:presence", "delivery:worker:"),
+    ]
+
+    sent = []
+
+    class _AsyncRedis:
+        def pipeline(self, transaction=True):
+            commands = []
+
+            class _Pipeline:
+                def zrangebyscore(self, key, min_score, max_score):
+                    commands.append(["worker-a"])
+
+                def publish(self, channel, message):
+                    sent.append(channel)
+                    commands.append(1)
+
+                async def execute(self):
+                    return commands
+
+            return _Pipeline()
+
+    asyncio.run(RealtimePublisher()._send(_AsyncRedis(), queued))
+    assert sent == ["tenant:8:delivery:assignment", "delivery:worker:worker-a"]
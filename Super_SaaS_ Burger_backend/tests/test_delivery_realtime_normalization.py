@@ -1,6 +1,11 @@
 import json
 
-from app.realtime.delivery_envelope import DELIVERY_SCHEMA_VERSION, build_delivery_envelope, parse_delivery_envelope
+from app.realtime.delivery_envelope import (
+    DELIVERY_SCHEMA_VERSION,
+    build_delivery_envelope,
+    encode_delivery_envelope,
+    parse_delivery_envelope,
+)
 from app.realtime.publisher import (
     delivery_assignment_channel,
     delivery_location_channel,
@@ -98,3 +103,47 @@ def test_publish_order_tracking_eta_event_uses_order_channel_payload(monkeypatch
         "status": "ON_TIME",
         "schema_version": 1,
     }
+
+
+def test_binary_envelope_round_trips_and_filters_by_header_before_decoding_body():
+    location = build_delivery_envelope(
+        event_type="delivery.location",
+        tenant_id=5,
+        order_id=22,
+        delivery_user_id=99,
+        payload={"lat": -23.55052, "lng": -46.633308, "status": "online"},
+    )
+    driver_location = build_delivery_envelope(
+        event_type="driver_location",
+        tenant_id=5,
+        order_id=22,
+        delivery_user_id=99,
+        payload={"lat": -23.5, "lng": -46.6},
+    )
+    driver_location.update({"driver_id": 99, "lat": -23.5, "lng": -46.6})
+    assignment = build_delivery_envelope(
+        event_type="delivery.assignment",
+        tenant_id=5,
+        order_id=None,
+        delivery_user_id=7,
+        payload={"order_id": 22, "itens": "x-burger"},
+    )
+
+    for envelope in (location, driver_location, assignment):
+        encoded = encode_delivery_envelope(envelope, binary=True)
+        assert isinstance(encoded, bytes)
+        assert len(encoded) < len(encode_delivery_envelope(envelope, binary=False))
+        assert parse_delivery_envelope(encoded, expected_tenant_id=5) == envelope
+        assert parse_delivery_envelope(encoded, expected_tenant_id=6) is None
+
+    encoded = encode_delivery_envelope(location, binary=True)
+    corrupted_body = encoded[:-20]
+    seen = []
+    assert parse_delivery_envelope(corrupted_body, accept=lambda header: seen.append(header) or False) is None
+    assert seen == [("delivery.location", 5, 22, 99)]
+    assert parse_delivery_envelope(encoded, accept=lambda header: header.delivery_user_id == 99) == location
+    assert parse_delivery_envelope(json.dumps(location), accept=lambda header: header.type == "driver_location") is None
+
+    # tipos fora do formato compacto continuam em JSON
+    custom = build_delivery_envelope(event_type="delivery.custom", tenant_id=5, payload={"a": 1})
+    assert encode_delivery_envelope(custom, binary=True) == json.dumps(custom)
@@ -0,0 +1,148 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.admin_user import AdminUser
+from app.models.delivery_log import DeliveryLog
+from app.models.delivery_tracking import DeliveryTracking
+from app.models.driver_latest_location import DriverLatestLocation
+from app.models.order import Order
+from app.routers import driver_api
+from app.routers.driver_api import DriverLocationRejected, process_driver_location_batch
+
+
+def _build_session():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    driver = AdminUser(id=7, tenant_id=1, email="rider@teste.com", name="Rider", role="DELIVERY", password_hash="x")
+    db.add(driver)
+    db.add(
+        Order(
+            id=1,
+            tenant_id=1,
+            cliente_nome="Cliente",
+            cliente_telefone="5511999990000",
+            itens="x-burger",
+            status="OUT_FOR_DELIVERY",
+            assigned_delivery_user_id=7,
+            destination_lat=-23.55,
+            destination_lng=-46.63,
+        )
+    )
+    db.add(
+        DeliveryTracking(
+            order_id=1,
+            delivery_user_id=7,
+            estimated_duration_seconds=0,
+            expected_delivery_at=datetime.now(timezone.utc),
+        )
+    )
+    db.commit()
+    return db, driver
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+
+    async def _route_metrics(*_args):
+        return 1200, 300, None, "test"
+
+    monkeypatch.setattr(driver_api, "get_route_metrics_with_fallback", _route_metrics)
+    monkeypatch.setattr(driver_api, "get_async_redis_client", lambda: None)
+    monkeypatch.setattr(driver_api, "publish_delivery_driver_location_event", lambda **kwargs: events.append(kwargs))
+    monkeypatch.setattr(driver_api, "publish_public_tracking_event", lambda **kwargs: None)
+    return events
+
+
+def test_batch_stores_full_track_once_and_publishes_only_latest_fix(published):
+    db, driver = _build_session()
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    fixes = [
+        {"latitude": -23.50, "longitude": -46.60, "recorded_at": (now - timedelta(minutes=3)).isoformat()},
+        {"lat": -23.52, "lng": -46.61, "recorded_at": (now - timedelta(minutes=1)).isoformat(), "accuracy": 5},
+        {"latitude": -23.51, "longitude": -46.60, "recorded_at": (now - timedelta(minutes=2)).isoformat()},
+        {"latitude": -23.52, "longitude": -46.61, "recorded_at": (now - timedelta(minutes=1)).isoformat()},
+        {"latitude": 123.0, "longitude": -46.6, "recorded_at": now.isoformat()},
+        {"latitude": -23.5, "longitude": -46.6, "recorded_at": (now - timedelta(days=2)).isoformat()},
+        {"latitude": "x", "longitude": -46.6, "recorded_at": now.isoformat()},
+    ]
+
+    result = asyncio.run(process_driver_location_batch(authenticated_driver=driver, db=db, delivery_id=1, fixes=fixes))
+
+    assert (result["received"], result["accepted"], result["duplicates"], result["stored"]) == (7, 3, 1, 3)
+    assert result["rejected"] == [
+        {"index": 4, "reason": "invalid_coordinates"},
+        {"index": 5, "reason": "invalid_timestamp"},
+        {"index": 6, "reason": "invalid_payload"},
+    ]
+    assert [(event["lat"], event["lng"]) for event in published] == [(-23.52, -46.61)]
+
+    track = db.query(DeliveryLog).order_by(DeliveryLog.created_at).all()
+    assert [log.latitude for log in track] == [-23.50, -23.51, -23.52]
+    db.expire_all()
+    assert db.get(Order, 1).driver_lat == -23.52
+    assert db.query(DriverLatestLocation).one().latitude == -23.52
+
+    # reenvio do mesmo lote após timeout do app não duplica a trilha
+    retry = asyncio.run(process_driver_location_batch(authenticated_driver=driver, db=db, delivery_id=1, fixes=fixes[:4]))
+    assert (retry["accepted"], retry["stored"]) == (3, 0)
+    assert db.query(DeliveryLog).count() == 3
+
+
+def test_batch_rejects_oversized_or_foreign_delivery(published, monkeypatch):
+    db, driver = _build_session()
+    monkeypatch.setattr(driver_api, "DRIVER_LOCATION_BATCH_MAX", 2)
+    fix = {"latitude": -23.5, "longitude": -46.6, "recorded_at": datetime.now(timezone.utc).isoformat()}
+
+    with pytest.raises(DriverLocationRejected) as too_large:
+        asyncio.run(process_driver_location_batch(authenticated_driver=driver, db=db, delivery_id=1, fixes=[fix] * 3))
+    assert too_large.value.status_code == 413
+
+    with pytest.raises(DriverLocationRejected) as not_found:
+        asyncio.run(process_driver_location_batch(authenticated_driver=driver, db=db, delivery_id=99, fixes=[fix]))
+    assert not_found.value.reason == "delivery_not_found"
+    assert db.query(DeliveryLog).count() == 0
+    assert published == []
+
+
+def test_batch_counts_once_against_the_location_rate_limit(published, monkeypatch):
+    db, driver = _build_session()
+    throttle = set()
+
+    class _Redis:
+        async def set(self, key, _value, ex=None, nx=False):
+            if nx and key in throttle:
+                return None
+            throttle.add(key)
+            return True
+
+        async def aclose(self):
+            return None
+
+    monkeypatch.setattr(driver_api, "get_async_redis_client", lambda: _Redis())
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    fixes = [
+        {"latitude": -23.50 - offset / 100, "longitude": -46.60, "recorded_at": (now - timedelta(seconds=30 - offset)).isoformat()}
+        for offset in range(3)
+    ]
+
+    result = asyncio.run(process_driver_location_batch(authenticated_driver=driver, db=db, delivery_id=1, fixes=fixes))
+    assert result["stored"] == 3
+    assert [event["lat"] for event in published] == [-23.52]
+    assert [key for key in throttle if "throttle" in key] == ["tracking:throttle:order:1:driver:7"]
+
+    with pytest.raises(DriverLocationRejected) as limited:
+        asyncio.run(process_driver_location_batch(authenticated_driver=driver, db=db, delivery_id=1, fixes=fixes))
+    assert limited.value.status_code == 429
+    assert len(published) == 1
@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.delivery_log import DeliveryLog
+from app.models.driver_latest_location import DriverLatestLocation
+from app.services.delivery_log_partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    apply_delivery_log_retention,
+    ensure_delivery_log_partitions,
+    partition_month,
+    partition_name,
+    retention_cutoff,
+)
+from app.services.driver_locations import list_driver_latest_locations, record_driver_location
+
+
+def _build_session():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def _location_log(delivery_user_id, lat, created_at, tenant_id=1, event_type="location_update"):
+    return DeliveryLog(
+        tenant_id=tenant_id,
+        order_id=500 + delivery_user_id,
+        delivery_user_id=delivery_user_id,
+        event_type=event_type,
+        latitude=lat,
+        longitude=-46.0,
+        created_at=created_at,
+    )
+
+
+def test_location_logs_maintain_latest_location_projection():
+    db = _build_session()
+    now = datetime.now(timezone.utc)
+
+    db.add_all(
+        [
+            _location_log(7, -23.0, now - timedelta(minutes=2)),
+            _location_log(7, -23.1, now - timedelta(minutes=1)),
+            _location_log(8, -22.0, now - timedelta(minutes=5)),
+            _location_log(8, None, now, event_type="started"),
+            _location_log(7, -10.0, now, tenant_id=2),
+        ]
+    )
+    db.commit()
+
+    rows = list_driver_latest_locations(db, 1)
+    assert [(row.delivery_user_id, row.latitude, row.order_id) for row in rows] == [(7, -23.1, 507), (8, -22.0, 508)]
+
+    # ping atrasado não sobrescreve a posição mais recente
+    db.add(_location_log(7, -99.0, now - timedelta(minutes=10)))
+    db.commit()
+    record_driver_location(db, tenant_id=1, delivery_user_id=8, latitude=-21.5, longitude=-45.5, order_id=9)
+    db.commit()
+
+    db.expire_all()
+    rows = {row.delivery_user_id: row for row in list_driver_latest_locations(db, 1)}
+    assert rows[7].latitude == -23.1
+    assert (rows[8].latitude, rows[8].longitude, rows[8].order_id) == (-21.5, -45.5, 9)
+    assert db.query(DriverLatestLocation).count() == 3
+
+
+def test_partition_helpers_and_retention_outside_postgres():
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2026, 3, 1)) == "delivery_logs_p202603"
+    assert partition_month("delivery_logs_p202603") == date(2026, 3, 1)
+    assert partition_month("delivery_logs_default") is None
+    assert retention_cutoff(date(2026, 10, 19), 6) == date(2026, 4, 1)
+
+    db = _build_session()
+    db.add_all(
+        [
+            _location_log(7, -23.0, datetime(2026, 3, 31, 23, 59, tzinfo=timezone.utc)),
+            _location_log(7, -23.1, datetime(2026, 4, 1, 0, 0, tzinfo=timezone.utc)),
+            _location_log(7, -23.2, datetime(2026, 10, 18, tzinfo=timezone.utc)),
+        ]
+    )
+    db.commit()
+
+    connection = db.connection()
+    assert ensure_delivery_log_partitions(connection, date(2026, 10, 19)) == []
+    assert apply_delivery_log_retention(connection, date(2026, 10, 19), retention_months=6) == 1
+    db.commit()
+    assert db.query(DeliveryLog).count() == 2
+
+
+class _PartitionedConnection:
+    """Postgres de mentira: delivery_logs particionada, com linhas de novembro na default e dezembro quebrado."""
+
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self):
+        self.statements = []
+
+    @contextmanager
+    def begin_nested(self):
+        yield
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if "relkind" in sql:
+            return SimpleNamespace(scalar=lambda: "p")
+        if "pg_inherits" in sql:
+            return [("delivery_logs_p202610",), (DEFAULT_PARTITION,)]
+        if sql.startswith("SELECT 1"):
+            in_november = params["lower"].startswith("2026-11-01")
+            return SimpleNamespace(first=lambda: (1,) if in_november else None)
+        if "delivery_logs_p202612" in sql:
+            raise RuntimeError("lock timeout")
+        return SimpleNamespace(rowcount=3)
+
+
+def test_new_partition_takes_rows_from_default_and_failures_do_not_stop_the_run():
+    connection = _PartitionedConnection()
+
+    created = ensure_delivery_log_partitions(connection, date(2026, 10, 19), months_ahead=2)
+
+    assert created == ["delivery_logs_p202611"]
+    ddl = [sql for sql in connection.statements if not sql.startswith("SELECT")]
+    assert [" ".join(sql.split()[:4]) for sql in ddl[:5]] == [
+        "ALTER TABLE delivery_logs DETACH",
+        "CREATE TABLE IF NOT",
+        'INSERT INTO "delivery_logs_p202611" SELECT',
+        f'DELETE FROM "{DEFAULT_PARTITION}" WHERE',
+        "ALTER TABLE delivery_logs ATTACH",
+    ]
+    assert '"delivery_logs_p202611"' in ddl[1]
+    assert "delivery_logs_p202612" in ddl[-1]
@@ -0,0 +1,250 @@
+import asyncio
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.admin_user import AdminUser
+from app.models.export_job import ExportJob
+from app.models.order import Order
+from app.models.tenant import Tenant
+from app.routers.reports import ExportJobCreate, create_export_job, download_export_job
+from app.services import export_jobs
+from app.services.export_jobs import (
+    expire_export_artifacts,
+    export_job_finished_signal,
+    request_export_job,
+    requeue_stale_export_jobs,
+    run_export_job,
+)
+
+
+def _build_session_factory():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_factory()
+    db.add(Tenant(id=1, slug="tempero", business_name="Tempero"))
+    for index in range(3):
+        db.add(
+            Order(
+                tenant_id=1,
+                cliente_nome=f"Cliente {index}",
+                cliente_telefone=f"551199999000{index}",
+                itens="x-burger",
+                total_cents=1000 + index,
+                status="ENTREGUE",
+                created_at=datetime(2026, 3, 10 + index, 12, 0),
+            )
+        )
+    db.commit()
+    db.close()
+    return session_factory
+
+
+@pytest.fixture(autouse=True)
+def _local_exports_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_JOBS_DIR", tmp_path)
+    monkeypatch.setattr(export_jobs, "EXPORT_JOBS_STORAGE", "local")
+
+
+def test_identical_concurrent_requests_share_the_active_job():
+    session_factory = _build_session_factory()
+    db = session_factory()
+    params = {"from": "2026-03-01", "to": "2026-03-31"}
+
+    first, first_created = request_export_job(db, tenant_id=1, kind="orders", params=params)
+    second, second_created = request_export_job(db, tenant_id=1, kind="orders", params=dict(params))
+    other, other_created = request_export_job(db, tenant_id=1, kind="orders", fmt="ndjson", params=params)
+
+    assert first_created is True
+    assert second_created is False
+    assert second.id == first.id
+    assert other_created is True
+    assert other.id != first.id
+
+    # o índice único parcial barra a corrida entre a leitura e o insert
+    db.add(ExportJob(tenant_id=1, kind="orders", format="csv", dedupe_key=first.dedupe_key, status="pending"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    assert run_export_job(first.id, session_factory) == "done"
+    again, again_created = request_export_job(db, tenant_id=1, kind="orders", params=params)
+    assert again_created is True
+    assert again.id != first.id
+
+
+def test_worker_writes_gzip_ndjson_artifact(tmp_path):
+    session_factory = _build_session_factory()
+    db = session_factory()
+    job, _ = request_export_job(
+        db,
+        tenant_id=1,
+        kind="orders",
+        fmt="ndjson",
+        gzip=True,
+        params={"from": "2026-03-01", "to": "2026-03-11"},
+    )
+
+    assert run_export_job(job.id, session_factory) == "done"
+    assert run_export_job(job.id, session_factory) is None
+
+    db.expire_all()
+    job = db.get(ExportJob, job.id)
+    assert job.storage == "local"
+    assert job.rows_count == 2
+    assert job.filename.endswith(".ndjson.gz")
+    lines = gzip.decompress((tmp_path / "1" / job.filename).read_bytes()).decode("utf-8").splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record["total_cents"] for record in records] == [1000, 1001]
+    assert records[0]["customer_name"] == "Cliente 0"
+    assert job.size_bytes == (tmp_path / "1" / job.filename).stat().st_size
+
+
+def test_failed_job_is_marked_and_stale_runs_are_requeued():
+    session_factory = _build_session_factory()
+    db = session_factory()
+    job, _ = request_export_job(db, tenant_id=1, kind="financial", params={"from": "bad", "to": "bad"})
+
+    assert run_export_job(job.id, session_factory) == "failed"
+    db.expire_all()
+    assert "bad" in db.get(ExportJob, job.id).error
+
+    stuck = ExportJob(
+        tenant_id=1,
+        kind="customers",
+        format="csv",
+        dedupe_key="stuck",
+        status="running",
+        started_at=datetime.now(timezone.utc) - timedelta(hours=3),
+    )
+    db.add(stuck)
+    db.commit()
+
+    assert requeue_stale_export_jobs(db) == 1
+    db.expire_all()
+    assert db.get(ExportJob, stuck.id).status == "pending"
+
+
+def test_export_endpoints_enqueue_and_download_csv():
+    session_factory = _build_session_factory()
+    db = session_factory()
+    cashier = AdminUser(id=2, tenant_id=1, email="caixa@teste.com", name="Caixa", role="cashier", password_hash="x")
+
+    with pytest.raises(HTTPException) as denied:
+        create_export_job(ExportJobCreate(kind="customers"), tenant_id=1, db=db, user=cashier)
+    assert denied.value.status_code == 403
+
+    payload = ExportJobCreate.model_validate({"kind": "orders", "from": "2026-03-01", "to": "2026-03-31"})
+    created = create_export_job(payload, tenant_id=1, db=db, user=cashier)
+    repeated = create_export_job(payload, tenant_id=1, db=db, user=cashier)
+    assert created["status"] == "pending"
+    assert repeated["job_id"] == created["job_id"]
+    assert repeated["deduplicated"] is True
+
+    with pytest.raises(HTTPException) as pending:
+        download_export_job(created["job_id"], tenant_id=1, db=db, _user=cashier)
+    assert pending.value.status_code == 409
+
+    run_export_job(created["job_id"], session_factory)
+    db.expire_all()
+    response = download_export_job(created["job_id"], tenant_id=1, db=db, _user=cashier)
+
+    assert response.media_type == "text/csv; charset=utf-8"
+    with open(response.path, encoding="utf-8") as handle:
+        lines = handle.read().splitlines()
+    assert lines[0].startswith("id,daily_order_number,created_at,status")
+    assert len(lines) == 4
+
+
+def test_finished_signal_wakes_waiters_without_polling(monkeypatch):
+    session_factory = _build_session_factory()
+    db = session_factory()
+    job, _ = request_export_job(db, tenant_id=1, kind="orders", params={"from": "2026-03-01", "to": "2026-03-31"})
+    published = []
+    monkeypatch.setattr(export_jobs, "get_async_redis_client", lambda: None)
+    monkeypatch.setattr(
+        export_jobs, "publish_export_job_event", lambda tenant_id, job_id, payload: published.append((job_id, payload))
+    )
+
+    async def _scenario():
+        async with export_job_finished_signal(job.id) as finished:
+            assert not finished.is_set()
+            assert await asyncio.to_thread(run_export_job, job.id, session_factory) == "done"
+            await asyncio.wait_for(finished.wait(), timeout=1)
+        assert export_jobs._finished_waiters == {}
+
+    asyncio.run(_scenario())
+    assert published[0][0] == job.id
+    assert published[0][1]["type"] == "export.completed"
+
+
+def test_expired_artifacts_are_deleted_and_download_is_gone(tmp_path):
+    session_factory = _build_session_factory()
+    db = session_factory()
+    cashier = AdminUser(id=2, tenant_id=1, email="caixa@teste.com", name="Caixa", role="cashier", password_hash="x")
+    old, _ = request_export_job(db, tenant_id=1, kind="orders", params={"from": "2026-03-01", "to": "2026-03-31"})
+    recent, _ = request_export_job(db, tenant_id=1, kind="orders", params={"from": "2026-03-01", "to": "2026-03-11"})
+    run_export_job(old.id, session_factory)
+    run_export_job(recent.id, session_factory)
+    db.expire_all()
+    old_path = tmp_path / "1" / db.get(ExportJob, old.id).filename
+    db.get(ExportJob, old.id).finished_at = datetime.now(timezone.utc) - timedelta(days=4)
+    db.commit()
+
+    assert expire_export_artifacts(db) == 1
+
+    db.expire_all()
+    assert not old_path.exists()
+    assert db.get(ExportJob, old.id).status == "expired"
+    assert db.get(ExportJob, recent.id).status == "done"
+    with pytest.raises(HTTPException) as gone:
+        download_export_job(old.id, tenant_id=1, db=db, _user=cashier)
+    assert gone.value.status_code == 410
+
+
+def test_failed_write_leaves_no_partial_file(tmp_path):
+    def _chunks():
+        yield b"id,total_cents\n"
+        raise RuntimeError("conexão perdida")
+
+    path = tmp_path / "1" / "orders.csv"
+    with pytest.raises(RuntimeError):
+        export_jobs._write_chunks(path, _chunks())
+
+    assert list((tmp_path / "1").iterdir()) == []
+
+
+def test_local_artifact_from_another_instance_is_reported_not_gone(tmp_path):
+    session_factory = _build_session_factory()
+    db = session_factory()
+    cashier = AdminUser(id=2, tenant_id=1, email="caixa@teste.com", name="Caixa", role="cashier", password_hash="x")
+    job, _ = request_export_job(db, tenant_id=1, kind="orders", params={"from": "2026-03-01", "to": "2026-03-31"})
+    run_export_job(job.id, session_factory)
+    db.expire_all()
+    job = db.get(ExportJob, job.id)
+    assert job.host == export_jobs.EXPORT_JOBS_HOST
+
+    # arquivo gravado no disco de outra instância: esta não tem o arquivo nem deve marcá-lo como expirado
+    job.host = "api-2"
+    job.location = str(tmp_path / "outra-instancia.csv")
+    job.finished_at = datetime.now(timezone.utc) - timedelta(days=4)
+    db.commit()
+
+    with pytest.raises(HTTPException) as unavailable:
+        download_export_job(job.id, tenant_id=1, db=db, _user=cashier)
+    assert unavailable.value.status_code == 503
+    assert expire_export_artifacts(db) == 0
+    assert export_jobs.local_export_hosts(db) == {"api-2"}
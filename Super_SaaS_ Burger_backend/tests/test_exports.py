@@ -0,0 +1,87 @@
+import asyncio
+import csv
+import gzip
+import io
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.admin_user import AdminUser
+from app.models.customer import Customer
+from app.models.tenant import Tenant
+from app.routers.admin_customers import export_admin_customers_csv
+from app.services.exports import csv_streaming_response, gzip_chunks, iter_csv, stream_query
+
+
+def _body(response) -> bytes:
+    async def _collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(_collect())
+
+
+def test_iter_csv_yields_bounded_chunks():
+    rows = ([index, f"item {index}"] for index in range(1050))
+
+    chunks = list(iter_csv(["id", "name"], rows, chunk_rows=500))
+
+    assert len(chunks) == 3
+    parsed = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    assert parsed[0] == ["id", "name"]
+    assert parsed[-1] == ["1049", "item 1049"]
+    assert len(parsed) == 1051
+
+
+def test_gzip_chunks_produce_a_valid_gzip_stream():
+    payload = [b"a,b\n", b"1,2\n" * 1000, b"3,4\n"]
+
+    compressed = b"".join(gzip_chunks(iter(payload)))
+
+    assert gzip.decompress(compressed) == b"".join(payload)
+
+
+def test_csv_streaming_response_names_gzip_download():
+    response = csv_streaming_response(["a"], iter([[1], [2]]), "report.csv", gzip=True)
+
+    assert response.media_type == "application/gzip"
+    assert response.headers["content-disposition"] == 'attachment; filename="report.csv.gz"'
+    assert gzip.decompress(_body(response)).decode("utf-8").splitlines() == ["a", "1", "2"]
+
+
+def _build_session():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    db.add(Tenant(id=1, slug="tempero", business_name="Tempero"))
+    for index in range(30):
+        db.add(Customer(tenant_id=1, name=f"Cliente {index}", phone=f"55119999900{index:02d}"))
+    db.commit()
+    return db
+
+
+def test_stream_query_iterates_in_batches():
+    db = _build_session()
+
+    rows = list(stream_query(db.query(Customer.id).order_by(Customer.id), yield_per=7))
+
+    assert len(rows) == 30
+    assert [row.id for row in rows] == sorted(row.id for row in rows)
+
+
+def test_admin_customers_export_streams_rows():
+    db = _build_session()
+    user = AdminUser(id=1, tenant_id=1, email="admin@teste.com", name="Admin", role="admin", password_hash="x")
+
+    response = export_admin_customers_csv(
+        tenant_id=None, vip_only=False, inactive_days=None, gzip=True, user=user, db=db
+    )
+
+    lines = gzip.decompress(_body(response)).decode("utf-8").splitlines()
+    assert lines[0] == "name,phone,total_spent,total_orders,last_order_date,days_since_last_order"
+    assert len(lines) == 31
@@ -0,0 +1,296 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.delivery_log import DeliveryLog
+from app.models.delivery_tracking import DeliveryTracking
+from app.models.driver_latest_location import DriverLatestLocation
+from app.models.order import Order
+from app.services.location_writer import (
+    DEAD_LETTER_KEY,
+    FLUSH_LOCK_KEY,
+    PENDING_KEY,
+    PROCESSING_KEY,
+    REPLAY_ATTEMPTS_KEY,
+    LocationWriteBuffer,
+    persist_location_fixes,
+)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.lists = {}
+        self.values = {}
+        self.pushes = 0
+        self.expired = 0
+
+    def rpush(self, key, *values):
+        self.pushes += 1
+        self.lists.setdefault(key, []).extend(value.encode() if isinstance(value, str) else value for value in values)
+
+    def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        return list(items[start:] if end == -1 else items[start : end + 1])
+
+    def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(key, None)
+            self.values.pop(key, None)
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    def expire(self, key, _seconds):
+        self.expired += 1
+        return key in self.values
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class _Pipeline:
+            def __init__(self):
+                self.ops = []
+
+            def lmove(self, source, destination, _where_from, _where_to):
+                self.ops.append((source, destination))
+
+            def rpush(self, key, *values):
+                self.ops.append((redis.rpush, key, *values))
+
+            def delete(self, *keys):
+                self.ops.append((redis.delete, *keys))
+
+            def execute(self):
+                results = []
+                for op in self.ops:
+                    if callable(op[0]):
+                        results.append(op[0](*op[1:]))
+                        continue
+                    source, destination = op
+                    items = redis.lists.get(source, [])
+                    if not items:
+                        results.append(None)
+                        continue
+                    item = items.pop(0)
+                    redis.lists.setdefault(destination, []).append(item)
+                    results.append(item)
+                return results
+
+        return _Pipeline()
+
+    def close(self):
+        return None
+
+
+def _build_session_factory():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_factory()
+    for order_id, driver_id in ((1, 7), (2, 8)):
+        db.add(
+            Order(
+                id=order_id,
+                tenant_id=1,
+                cliente_nome="Cliente",
+                cliente_telefone="5511999990000",
+                itens="x-burger",
+                status="OUT_FOR_DELIVERY",
+                assigned_delivery_user_id=driver_id,
+            )
+        )
+        db.add(
+            DeliveryTracking(
+                order_id=order_id,
+                delivery_user_id=driver_id,
+                estimated_duration_seconds=0,
+                expected_delivery_at=datetime(2026, 10, 19, 12, 0),
+            )
+        )
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def _fix(order_id, driver_id, lat, recorded_at, **extra):
+    return {
+        "tenant_id": 1,
+        "order_id": order_id,
+        "delivery_user_id": driver_id,
+        "lat": lat,
+        "lng": -46.0,
+        "recorded_at": recorded_at.isoformat(),
+        "log": True,
+        "update_order": True,
+        "expected_delivery_at": "2026-10-19T12:00:00",
+        **extra,
+    }
+
+
+def test_persist_location_fixes_writes_logs_and_latest_position_in_bulk():
+    session_factory = _build_session_factory()
+    base = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+    fixes = [
+        _fix(1, 7, -23.0, base, route_distance_meters=900),
+        _fix(1, 7, -23.2, base + timedelta(seconds=4), route_distance_meters=500, initial_distance_meters=900),
+        _fix(1, 7, -23.1, base + timedelta(seconds=2)),
+        _fix(2, 8, -22.0, base, log=False, update_order=False),
+    ]
+
+    db = session_factory()
+    assert persist_location_fixes(db.connection(), fixes) == 4
+    db.commit()
+
+    orders = {order.id: order for order in db.query(Order).all()}
+    trackings = {tracking.order_id: tracking for tracking in db.query(DeliveryTracking).all()}
+    assert (orders[1].driver_lat, orders[2].driver_lat) == (-23.2, None)
+    assert (trackings[1].current_lat, trackings[2].current_lat) == (-23.2, -22.0)
+    # o ping leva os valores do tracking no request; o lote grava como veio, sem misturar com o banco
+    assert (trackings[1].route_distance_meters, trackings[1].initial_distance_meters) == (500, 900)
+    assert trackings[1].route_geometry is None
+    assert db.query(DeliveryLog).filter(DeliveryLog.event_type == "location_update").count() == 3
+    latest = {row.delivery_user_id: row.latitude for row in db.query(DriverLatestLocation).all()}
+    assert latest == {7: -23.2, 8: -22.0}
+
+    # replay do mesmo lote (queda entre commit e limpeza do Redis) não duplica logs
+    assert persist_location_fixes(db.connection(), fixes, replay=True) == 4
+    db.commit()
+    assert db.query(DeliveryLog).count() == 3
+
+
+def test_buffer_replays_processing_batch_and_flushes_redis_queue():
+    session_factory = _build_session_factory()
+    redis = _FakeRedis()
+    base = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+    # lote de um processo que caiu depois do commit: o primeiro ping já está no banco
+    committed = _fix(1, 7, -23.0, base)
+    db = session_factory()
+    persist_location_fixes(db.connection(), [committed])
+    db.commit()
+    db.close()
+    redis.rpush(PROCESSING_KEY, json.dumps(committed), json.dumps(_fix(1, 7, -23.1, base + timedelta(seconds=2))))
+    redis.pushes = 0
+
+    buffer = LocationWriteBuffer(batch_size=2, flush_interval=60, redis_factory=lambda: redis)
+    assert buffer.enqueue(_fix(2, 8, -22.0, base)) is False
+
+    async def _scenario():
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(buffer.run(stop_event, session_factory))
+        while not buffer.running:
+            await asyncio.sleep(0)
+        for offset in range(3):
+            assert buffer.enqueue(_fix(2, 8, -22.0 - offset, base + timedelta(seconds=offset), log=True))
+        # enqueue roda no event loop: nada de I/O no Redis até o flush
+        assert redis.pushes == 0
+        stop_event.set()
+        await task
+
+    asyncio.run(_scenario())
+
+    assert redis.pushes == 1
+    assert not redis.lists.get(PENDING_KEY)
+    assert not redis.lists.get(PROCESSING_KEY)
+    db = session_factory()
+    assert db.query(DeliveryLog).filter(DeliveryLog.order_id == 1).count() == 2
+    assert db.query(DeliveryLog).filter(DeliveryLog.order_id == 2).count() == 3
+    assert db.get(Order, 2).driver_lat == -24.0
+    assert db.get(DeliveryTracking, 1).current_lat == -23.1
+
+
+def test_defer_only_takes_location_only_changes():
+    session_factory = _build_session_factory()
+    buffer = LocationWriteBuffer(redis_factory=lambda: None)
+    buffer._wakeup = asyncio.Event()
+
+    db = session_factory()
+    order = db.get(Order, 1)
+    tracking = db.query(DeliveryTracking).filter(DeliveryTracking.order_id == 1).one()
+    order.driver_lat = -23.5
+    tracking.current_lat = -23.5
+    assert buffer.defer(db, order=order, tracking=tracking, delivery_user_id=7, latitude=-23.5, longitude=-46.0)
+    assert order not in db and tracking not in db
+    assert order.driver_lat == -23.5
+
+    order = db.get(Order, 2)
+    tracking = db.query(DeliveryTracking).filter(DeliveryTracking.order_id == 2).one()
+    order.customer_lat = -22.9
+    assert not buffer.defer(db, order=order, tracking=tracking, delivery_user_id=8, latitude=-22.0, longitude=-46.0)
+    assert order in db
+    db.rollback()
+
+    # destino recalculado no ping também grava junto do request
+    order = db.get(Order, 2)
+    tracking = db.query(DeliveryTracking).filter(DeliveryTracking.order_id == 2).one()
+    order.driver_lat = -22.0
+    order.destination_lat = -22.95
+    assert not buffer.defer(db, order=order, tracking=tracking, delivery_user_id=8, latitude=-22.0, longitude=-46.0)
+    assert order in db
+
+    buffer.flush(session_factory)
+    db.close()
+    db = session_factory()
+    assert db.get(Order, 1).driver_lat is None
+    assert db.get(DeliveryTracking, 1).current_lat == -23.5
+
+
+def test_poison_batch_goes_to_dead_letter_after_max_replays():
+    session_factory = _build_session_factory()
+    redis = _FakeRedis()
+    base = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+    poison = {key: value for key, value in _fix(1, 7, -23.0, base).items() if key != "lat"}
+    redis.rpush(PROCESSING_KEY, json.dumps(poison))
+    redis.rpush(PENDING_KEY, json.dumps(_fix(2, 8, -22.0, base)))
+    buffer = LocationWriteBuffer(batch_size=10, max_replay_attempts=2, redis_factory=lambda: redis)
+    buffer._redis = redis
+
+    # o lote envenenado segura a fila só até esgotar as tentativas
+    assert buffer.flush(session_factory) == 0
+    assert buffer.flush(session_factory) == 0
+    assert redis.values[REPLAY_ATTEMPTS_KEY] == 2
+    assert buffer.flush(session_factory) == 1
+
+    assert [json.loads(raw) for raw in redis.lists[DEAD_LETTER_KEY]] == [poison]
+    assert not redis.lists.get(PROCESSING_KEY)
+    assert REPLAY_ATTEMPTS_KEY not in redis.values
+    db = session_factory()
+    assert db.get(Order, 2).driver_lat == -22.0
+
+
+def test_flush_bounds_batches_per_lock_and_renews_it():
+    session_factory = _build_session_factory()
+    redis = _FakeRedis()
+    base = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+    for offset in range(5):
+        redis.rpush(PENDING_KEY, json.dumps(_fix(1, 7, -23.0 - offset, base + timedelta(seconds=offset))))
+    buffer = LocationWriteBuffer(batch_size=2, max_batches=2, redis_factory=lambda: redis)
+    buffer._redis = redis
+
+    assert buffer.flush(session_factory) == 4
+    # TTL renovado a cada lote; o lock é liberado e o resto fica para o próximo flush
+    assert redis.expired == 2
+    assert FLUSH_LOCK_KEY not in redis.values
+    assert len(redis.lists[PENDING_KEY]) == 1
+
+    assert buffer.flush(session_factory) == 1
+    assert not redis.lists.get(PENDING_KEY)
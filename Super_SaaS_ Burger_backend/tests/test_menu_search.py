@@ -0,0 +1,61 @@
+import re
+from types import SimpleNamespace
+
+from app.services.menu_search import (
+    _ALIAS_PATTERNS,
+    MenuSearchIndex,
+    _apply_aliases,
+    normalize,
+    search_menu_items_in_candidates,
+)
+
+
+def _items():
+    names = ["X-Burger", "X-Salada", "Coca Cola Lata", "Coca Cola 2 Litros", "Suco de Laranja", "Batata Frita"]
+    return [SimpleNamespace(id=index, name=name) for index, name in enumerate(names, start=1)]
+
+
+def test_index_only_scores_items_sharing_tokens_or_trigrams():
+    index = MenuSearchIndex(_items())
+
+    candidates = {index.items[position].name for position in index.candidates("coca cola lata")}
+
+    assert candidates == {"Coca Cola Lata", "Coca Cola 2 Litros"}
+
+
+def test_index_search_keeps_linear_search_top_match_and_score():
+    items = _items()
+    index = MenuSearchIndex(items)
+
+    for query in ["coca lata", "refri 2l", "x salada", "batata fritaa", "suco laranja"]:
+        expected = search_menu_items_in_candidates(items, query, limit=1)
+        assert index.search(query, limit=1) == expected
+
+
+def test_index_search_handles_typos_through_trigrams():
+    index = MenuSearchIndex(_items())
+
+    results = index.search("bataata frita", limit=1)
+
+    assert results[0][0].name == "Batata Frita"
+
+
+def test_single_pass_aliases_match_sequential_substitutions():
+    samples = ["coca zero", "refri 2l", "coca sem acucar 2 litro", "2l de refri", "guarana 2 litros", "coca cola"]
+
+    for text in samples:
+        expected = text
+        for pattern, replacement in _ALIAS_PATTERNS:
+            expected = re.sub(pattern, replacement, expected)
+        assert _apply_aliases(text) == expected
+
+
+def test_normalize_is_memoized():
+    normalize.cache_clear()
+
+    assert normalize("Refri 2L - Sem Açúcar!") == "refrigerante 2 litros zero"
+    assert normalize("Refri 2L - Sem Açúcar!") == "refrigerante 2 litros zero"
+
+    info = normalize.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
@@ -0,0 +1,129 @@
+import json
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.fsm import states
+from app.fsm.engine import processar_mensagem
+from app.models.conversation import Conversation
+from app.models.menu_item import MenuItem
+from app.models.menu_item_modifier_group import MenuItemModifierGroup
+from app.models.modifier import Modifier
+from app.models.modifier_group import ModifierGroup
+from app.models.tenant import Tenant
+from app.realtime import cache_invalidation
+from app.services import menu_snapshot
+
+
+def _build_session():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    testing_session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = testing_session()
+    db.add(Tenant(id=1, slug="tempero", business_name="Tempero"))
+    db.add(MenuItem(id=1, tenant_id=1, name="Smash Burger", price_cents=2500, active=True))
+    db.add(MenuItem(id=2, tenant_id=1, name="Coca Cola Lata", price_cents=700, active=True))
+    db.add(MenuItem(id=3, tenant_id=1, name="X-Antigo", price_cents=1000, active=False))
+    db.add(ModifierGroup(id=10, tenant_id=1, name="Adicionais", active=True))
+    db.add(ModifierGroup(id=11, tenant_id=1, name="Inativo", active=False))
+    db.add(Modifier(id=100, tenant_id=1, group_id=10, name="Bacon", price_cents=400, active=True))
+    db.add(Modifier(id=101, tenant_id=1, group_id=11, name="Cheddar", price_cents=300, active=True))
+    db.add(MenuItemModifierGroup(tenant_id=1, menu_item_id=1, modifier_group_id=10))
+    db.add(MenuItemModifierGroup(tenant_id=1, menu_item_id=1, modifier_group_id=11))
+    db.commit()
+    menu_snapshot.invalidate_menu_snapshot()
+    return engine, db
+
+
+def _count_statements(engine):
+    statements: list[str] = []
+
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    return statements
+
+
+def test_snapshot_holds_active_items_and_item_modifiers():
+    _engine, db = _build_session()
+
+    snapshot = menu_snapshot.get_menu_snapshot(db, 1)
+
+    assert [item.name for item in snapshot.items] == ["Coca Cola Lata", "Smash Burger"]
+    assert snapshot.get_item(1).normalized_name == "smash burger"
+    assert snapshot.get_item(3) is None
+    assert snapshot.modifier_group_ids_for_item(1) == [10]
+    assert [mod.name for mod in snapshot.modifiers_for_item(1)] == ["Bacon"]
+    assert [mod.name for mod in snapshot.tenant_modifiers] == ["Bacon"]
+    assert menu_snapshot.get_menu_snapshot(db, 1) is snapshot
+
+
+def test_snapshot_is_invalidated_on_menu_commit():
+    _engine, db = _build_session()
+    snapshot = menu_snapshot.get_menu_snapshot(db, 1)
+
+    item = db.query(MenuItem).filter(MenuItem.id == 2).first()
+    item.name = "Guarana Lata"
+    db.commit()
+
+    refreshed = menu_snapshot.get_menu_snapshot(db, 1)
+    assert refreshed is not snapshot
+    assert refreshed.version > snapshot.version
+    assert refreshed.get_item(2).name == "Guarana Lata"
+
+
+def test_snapshot_is_invalidated_on_bulk_link_delete():
+    _engine, db = _build_session()
+    assert menu_snapshot.get_menu_snapshot(db, 1).modifier_group_ids_for_item(1) == [10]
+
+    db.query(MenuItemModifierGroup).filter(MenuItemModifierGroup.menu_item_id == 1).delete()
+    db.commit()
+
+    assert menu_snapshot.get_menu_snapshot(db, 1).modifier_group_ids_for_item(1) == []
+
+
+def test_menu_commit_is_broadcast_and_other_workers_drop_their_snapshot(monkeypatch):
+    _engine, db = _build_session()
+    broadcasts = []
+    monkeypatch.setattr(
+        cache_invalidation,
+        "publish_cache_invalidation",
+        lambda cache, tenant_id, origin: broadcasts.append((cache, tenant_id, origin)),
+    )
+    snapshot = menu_snapshot.get_menu_snapshot(db, 1)
+
+    db.query(MenuItem).filter(MenuItem.id == 2).one().name = "Guarana Lata"
+    db.commit()
+    assert broadcasts == [("menu_snapshot", 1, cache_invalidation.WORKER_ID)]
+
+    # o próprio aviso volta pelo Redis e é ignorado; o de outro worker descarta o snapshot
+    snapshot = menu_snapshot.get_menu_snapshot(db, 1)
+    own = json.dumps({"cache": "menu_snapshot", "tenant_id": 1, "origin": cache_invalidation.WORKER_ID})
+    assert not cache_invalidation.apply_cache_invalidation(own)
+    assert menu_snapshot.get_menu_snapshot(db, 1) is snapshot
+
+    other = json.dumps({"cache": "menu_snapshot", "tenant_id": 1, "origin": "outro-worker"})
+    assert cache_invalidation.apply_cache_invalidation(other.encode())
+    assert menu_snapshot.get_menu_snapshot(db, 1) is not snapshot
+
+
+def test_fsm_message_runs_without_menu_queries_once_snapshot_is_warm():
+    engine, db = _build_session()
+    menu_snapshot.get_menu_snapshot(db, 1)
+    conversa = Conversation(tenant_id=1, telefone="5511999999999", estado=states.COLETANDO_ITENS, dados="{}")
+    statements = _count_statements(engine)
+
+    resposta = processar_mensagem(conversa, "2 smash burger com bacon", db, 1)
+
+    assert "Adicionei 2x Smash Burger com: Bacon" in resposta
+    assert statements == []
+    cart = json.loads(conversa.dados)["cart"]
+    assert cart[0]["modifiers"] == [{"id": 100, "name": "Bacon", "price_cents": 400}]
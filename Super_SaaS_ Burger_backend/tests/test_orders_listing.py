@@ -0,0 +1,152 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
+
+from app.core.database import Base
+from app.models.order import Order
+from app.models.tenant import Tenant
+from app.routers import orders
+from app.routers.orders import list_orders
+
+
+def _build_request() -> Request:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/orders/1",
+        "query_string": b"",
+        "headers": [],
+        "path_params": {},
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+        "scheme": "http",
+    }
+    request = Request(scope)
+    request.state.tenant = SimpleNamespace(id=1)
+    return request
+
+
+def _build_session():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    db.add(Tenant(id=1, slug="tempero", business_name="Tempero"))
+    same_moment = datetime(2026, 3, 11, 19, 0)
+    rows = [
+        (1, datetime(2026, 3, 10, 12, 0), "RECEBIDO", "whatsapp", "delivery"),
+        (2, same_moment, "ENTREGUE", "storefront", "delivery"),
+        (3, same_moment, "ENTREGUE", "storefront", "pickup"),
+        (4, same_moment, "RECEBIDO", "whatsapp", "table"),
+        (5, datetime(2026, 3, 12, 9, 0), "EM_PREPARO", "storefront", "delivery"),
+    ]
+    for order_id, created_at, status, channel, order_type in rows:
+        db.add(
+            Order(
+                id=order_id,
+                tenant_id=1,
+                cliente_nome=f"Cliente {order_id}",
+                cliente_telefone="5511999990000",
+                itens="x-burger " * 50,
+                items_json="[]",
+                status=status,
+                channel=channel,
+                order_type=order_type,
+                total_cents=1000 * order_id,
+                created_at=created_at,
+            )
+        )
+    db.add(
+        Order(
+            tenant_id=2,
+            cliente_nome="Outro",
+            cliente_telefone="5511999990009",
+            itens="x",
+            created_at=datetime(2026, 3, 12, 10, 0),
+        )
+    )
+    db.commit()
+    return db
+
+
+def _list(db, **params):
+    response = Response()
+    defaults = {
+        "status": None,
+        "channel": None,
+        "order_type": None,
+        "from_date": None,
+        "to_date": None,
+        "cursor": None,
+        "limit": None,
+        "view": "full",
+    }
+    items = list_orders(
+        request=_build_request(),
+        response=response,
+        tenant_id=1,
+        db=db,
+        user=SimpleNamespace(id=1, tenant_id=1, role="admin"),
+        **{**defaults, **params},
+    )
+    return items, response.headers.get("X-Next-Cursor")
+
+
+def test_list_orders_pages_by_created_at_and_id():
+    db = _build_session()
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        items, cursor = _list(db, limit=2, cursor=cursor)
+        seen.extend(item["id"] for item in items)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert seen == [5, 4, 3, 2, 1]
+    assert pages == 3
+
+
+def test_list_orders_without_paging_params_returns_everything(monkeypatch):
+    db = _build_session()
+    monkeypatch.setattr(orders, "ORDER_LIST_DEFAULT_LIMIT", 2)
+
+    items, cursor = _list(db)
+    assert [item["id"] for item in items] == [5, 4, 3, 2, 1]
+    assert cursor is None
+
+    # só o cursor já liga a paginação, com o limite padrão
+    first_page, cursor = _list(db, limit=1)
+    items, cursor = _list(db, cursor=cursor)
+    assert [item["id"] for item in first_page + items] == [5, 4, 3]
+    assert cursor is not None
+
+
+def test_list_orders_filters_and_summary_projection():
+    db = _build_session()
+
+    items, cursor = _list(db, status="entregue", channel="storefront", view="summary")
+    assert [item["id"] for item in items] == [3, 2]
+    assert cursor is None
+    assert "itens" not in items[0]
+    assert items[0]["customer_name"] == "Cliente 3"
+    assert items[0]["total_cents"] == 3000
+
+    items, _ = _list(db, order_type="delivery", from_date="2026-03-11", to_date="2026-03-11")
+    assert [item["id"] for item in items] == [2]
+    assert items[0]["itens"].startswith("x-burger")
+
+    with pytest.raises(HTTPException) as invalid:
+        _list(db, cursor="not-a-cursor")
+    assert invalid.value.status_code == 400
@@ -166,7 +166,7 @@ def test_public_tracking_sse_skips_empty_initial_tracking_payload(monkeypatch):
         async def is_disconnected():
             return next(checks)
 
-        request = SimpleNamespace(is_disconnected=is_disconnected, state=SimpleNamespace())
+        request = SimpleNamespace(is_disconnected=is_disconnected, state=SimpleNamespace(), headers={})
 
         async def _build_snapshot(*_args, **_kwargs):
             return {
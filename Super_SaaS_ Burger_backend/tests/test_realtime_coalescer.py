@@ -0,0 +1,173 @@
+import asyncio
+import json
+
+from app.realtime.coalescer import CoalescedFeed, CoalescingHub
+
+
+def _render(payload):
+    return json.dumps(payload, sort_keys=True).encode()
+
+
+def test_feed_coalesces_window_shares_frame_bytes_and_drops_for_slow_clients():
+    async def _scenario():
+        feed = CoalescedFeed(window_seconds=0.05, render=_render)
+        fast = feed.subscribe()
+        slow = feed.subscribe()
+
+        feed.push(44, {"driver_lat": 1.0, "status": "delivering"})
+        first = await fast.get(1)
+        assert [json.loads(frame.data) for frame in first] == [{"driver_lat": 1.0, "status": "delivering"}]
+
+        for lat in (2.0, 3.0, 4.0):
+            feed.push(44, {"driver_lat": lat})
+        assert await fast.get(0.01) == []
+        second = await fast.get(1)
+        assert [json.loads(frame.data) for frame in second] == [{"driver_lat": 4.0, "status": "delivering"}]
+        assert feed.frames == 2
+
+        # o cliente lento não leu nada: fica só com o último frame, o mesmo objeto entregue ao rápido
+        pending = await slow.get(0)
+        assert len(pending) == 1 and pending[0] is second[0]
+        assert slow.dropped == 1
+
+    asyncio.run(_scenario())
+
+
+class _FakePubSub:
+    def __init__(self, client):
+        self.client = client
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=1.0):
+        try:
+            data = await asyncio.wait_for(self.client.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if isinstance(data, Exception):
+            raise data
+        return {"data": data}
+
+    async def aclose(self):
+        self.closed = True
+
+
+class _FakeAsyncRedis:
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.pubsubs = []
+
+    def pubsub(self):
+        pubsub = _FakePubSub(self)
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+    async def aclose(self):
+        return None
+
+
+def test_hub_shares_one_redis_subscription_per_channel():
+    async def _scenario():
+        redis = _FakeAsyncRedis()
+        hub = CoalescingHub(window_seconds=0.01, render=_render, client_factory=lambda: redis)
+
+        def extract(raw):
+            payload = json.loads(raw)
+            return (payload["order_id"], payload) if payload.get("lat") is not None else None
+
+        async with hub.subscribe("tenant:1:order:44:tracking", extract) as first:
+            async with hub.subscribe("tenant:1:order:44:tracking", extract) as second:
+                redis.messages.put_nowait(json.dumps({"order_id": 44, "status": "ignored"}))
+                redis.messages.put_nowait(json.dumps({"order_id": 44, "lat": -23.5}))
+                frames = await first.get(1)
+                assert [json.loads(frame.data) for frame in frames] == [{"order_id": 44, "lat": -23.5}]
+                assert (await second.get(1))[0] is frames[0]
+            assert len(redis.pubsubs) == 1
+            assert not redis.pubsubs[0].closed
+
+        assert redis.pubsubs[0].channels == ["tenant:1:order:44:tracking"]
+        assert redis.pubsubs[0].closed
+
+        async with CoalescingHub(window_seconds=1, render=_render, client_factory=lambda: None).subscribe("x", extract) as mailbox:
+            assert mailbox is None
+
+    asyncio.run(_scenario())
+
+
+def test_reader_crash_closes_subscribed_mailboxes_and_next_subscriber_reconnects():
+    async def _scenario():
+        redis = _FakeAsyncRedis()
+        hub = CoalescingHub(window_seconds=0.5, render=_render, client_factory=lambda: redis)
+
+        def extract(raw):
+            payload = json.loads(raw)
+            return payload["order_id"], payload
+
+        async with hub.subscribe("tenant:1:live", extract) as mailbox:
+            redis.messages.put_nowait(json.dumps({"order_id": 44, "lat": -23.5}))
+            assert len(await mailbox.get(1)) == 1
+            # segunda atualização ainda na janela quando o Redis cai: sai no fechamento
+            redis.messages.put_nowait(json.dumps({"order_id": 44, "lat": -23.6}))
+            redis.messages.put_nowait(ConnectionError("redis caiu"))
+            frames = await asyncio.wait_for(mailbox.get(30), 1)
+            assert [json.loads(frame.data)["lat"] for frame in frames] == [-23.6]
+            assert mailbox.closed
+            # fechada, a caixa não espera mais o timeout: o stream SSE encerra e o cliente reconecta
+            assert await asyncio.wait_for(mailbox.get(30), 1) == []
+            assert not mailbox.lagging()
+
+        async with hub.subscribe("tenant:1:live", extract) as reconnected:
+            redis.messages.put_nowait(json.dumps({"order_id": 44, "lat": -23.7}))
+            assert [json.loads(frame.data)["lat"] for frame in await reconnected.get(1)] == [-23.7]
+            assert not reconnected.closed
+            assert len(redis.pubsubs) == 2
+
+    asyncio.run(_scenario())
+
+
+class _FakeStreamRedis:
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.appended = asyncio.Queue()
+        self.closed = False
+
+    async def xrevrange(self, key, count=None):
+        return list(reversed(self.entries))[:count]
+
+    async def xread(self, streams, count=None, block=None):
+        ((key, last_id),) = streams.items()
+        newer = [entry for entry in self.entries if tuple(map(int, entry[0].split(b"-"))) > tuple(map(int, last_id.split("-")))]
+        if not newer:
+            try:
+                self.entries.append(await asyncio.wait_for(self.appended.get(), block / 1000))
+            except asyncio.TimeoutError:
+                return []
+            newer = self.entries[-1:]
+        return [(key.encode(), newer[:count])]
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_stream_hub_starts_at_stream_tail_and_tags_frames_with_entry_id():
+    async def _scenario():
+        redis = _FakeStreamRedis([(b"1-0", {b"data": json.dumps({"order_id": 44, "lat": -23.0})})])
+        hub = CoalescingHub(window_seconds=0.01, render=_render, stream=True, client_factory=lambda: redis)
+
+        def extract(raw):
+            payload = json.loads(raw)
+            return payload["order_id"], payload
+
+        async with hub.subscribe("tenant:1:order:44:tracking:stream", extract) as mailbox:
+            redis.appended.put_nowait((b"2-0", {b"data": json.dumps({"order_id": 44, "lat": -23.5})}))
+            frames = await mailbox.get(1)
+            assert [frame.event_id for frame in frames] == ["2-0"]
+            assert frames[0].data.startswith(b"id: 2-0\n")
+            assert json.loads(frames[0].data.split(b"\n", 1)[1]) == {"order_id": 44, "lat": -23.5}
+
+        assert redis.closed
+
+    asyncio.run(_scenario())
@@ -0,0 +1,203 @@
+import asyncio
+import importlib
+import json
+from types import SimpleNamespace
+
+from app.realtime import publisher
+from app.realtime.event_streams import kds_stream, latest_stream_id, order_tracking_stream, parse_stream_id, read_stream_after
+from app.services import event_handlers
+
+
+class _FakeStreamRedis:
+    def __init__(self, entries=()):
+        self.entries = [(entry_id.encode(), {b"data": data}) for entry_id, data in entries]
+        self.closed = False
+
+    async def xrange(self, key, min="-", max="+", count=None):
+        entries = self.entries
+        if min.startswith("("):
+            after = parse_stream_id(min[1:])
+            entries = [entry for entry in entries if parse_stream_id(entry[0]) > after]
+        return entries[:count]
+
+    async def xrevrange(self, key, max="+", min="-", count=None):
+        return list(reversed(self.entries))[:count]
+
+    async def aclose(self):
+        self.closed = True
+
+
+def _tracking_entry(entry_id, lat):
+    return entry_id, json.dumps(
+        {
+            "type": "delivery.public_tracking",
+            "schema_version": 1,
+            "tenant_id": 5,
+            "order_id": None,
+            "delivery_user_id": None,
+            "payload": {"status": "OUT_FOR_DELIVERY", "last_location": {"lat": lat, "lng": -46.6}},
+            "ts": "2026-10-19T12:00:00+00:00",
+        }
+    ).encode()
+
+
+def test_read_stream_after_replays_only_missed_entries_or_asks_for_snapshot():
+    async def _scenario():
+        redis = _FakeStreamRedis([_tracking_entry("10-0", -23.1), _tracking_entry("11-0", -23.2), _tracking_entry("12-0", -23.3)])
+
+        assert await latest_stream_id(redis, "key") == "12-0"
+        assert await latest_stream_id(_FakeStreamRedis(), "key") == "0-0"
+
+        missed = await read_stream_after(redis, "key", "10-0")
+        assert [entry_id for entry_id, _data in missed] == ["11-0", "12-0"]
+        assert await read_stream_after(redis, "key", "12-0") == []
+        assert [entry_id for entry_id, _data in await read_stream_after(redis, "key", "0-0")] == ["10-0", "11-0", "12-0"]
+
+        # id anterior ao início do stream (aparado), inválido ou atraso maior que o limite: precisa de snapshot
+        assert await read_stream_after(redis, "key", "9-0") is None
+        assert await read_stream_after(redis, "key", "garbage") is None
+        assert await read_stream_after(redis, "key", "10-0", count=1) is None
+
+    asyncio.run(_scenario())
+
+
+def test_public_tracking_sse_resumes_from_last_event_id_without_snapshot(monkeypatch):
+    from app.routers import public_tracking
+
+    order = SimpleNamespace(id=44, tenant_id=5, tracking_token="secure-public-token")
+    redis = _FakeStreamRedis([_tracking_entry("10-0", -23.1), _tracking_entry("11-0", -23.2), _tracking_entry("12-0", -23.3)])
+
+    async def _no_snapshot(*_args, **_kwargs):
+        raise AssertionError("reconexão com Last-Event-ID não deve montar snapshot")
+
+    async def _run_test():
+        checks = iter([True])
+
+        async def is_disconnected():
+            return next(checks)
+
+        request = SimpleNamespace(is_disconnected=is_disconnected, state=SimpleNamespace(), headers={"last-event-id": "10-0"})
+        monkeypatch.setattr(public_tracking, "SessionLocal", lambda: SimpleNamespace(close=lambda: None))
+        monkeypatch.setattr(public_tracking, "_resolve_public_tracking_order", lambda *_args, **_kwargs: order)
+        monkeypatch.setattr(public_tracking, "_build_public_tracking_snapshot_async", _no_snapshot)
+        monkeypatch.setattr(public_tracking, "get_async_redis_client", lambda: redis)
+        monkeypatch.setattr(public_tracking, "public_tracking_hub", public_tracking.CoalescingHub(
+            window_seconds=1, render=public_tracking._render_public_tracking_frame, client_factory=lambda: None,
+        ))
+
+        response = await public_tracking.sse_public_tracking("secure-public-token", request)
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(_run_test())
+
+    assert len(chunks) == 1
+    frame = chunks[0].decode()
+    assert frame.startswith("id: 12-0\nevent: tracking_update\n")
+    assert json.loads(frame.split("data: ", 1)[1].split("\n", 1)[0])["driver_lat"] == -23.3
+    assert redis.closed
+
+
+def test_order_events_are_written_to_the_tenant_kds_stream(monkeypatch):
+    sent = []
+    monkeypatch.setattr(publisher, "_send_messages", lambda messages: sent.extend(messages) or len(messages))
+
+    event_handlers.handle_order_status_changed_kds_stream(
+        {
+            "order_id": 44,
+            "order_number": 7,
+            "daily_order_number": 7,
+            "tenant_id": 5,
+            "status": "PRONTO",
+            "previous_status": "EM_PREPARO",
+            "customer_phone": "5511999999999",
+            "delivery_type": "ENTREGA",
+        }
+    )
+
+    assert [target for target, _message in sent] == [kds_stream(5)]
+    message = json.loads(sent[0][1])
+    assert message["type"] == "order.status.changed"
+    assert message["status"] == "PRONTO"
+    assert "customer_phone" not in message
+
+
+def test_order_tracking_sse_waits_on_stream_events_instead_of_polling(monkeypatch):
+    tracking_router = importlib.import_module("app.modules.tracking.router")
+
+    sessions = []
+    order = SimpleNamespace(id=44, tenant_id=5, status="OUT_FOR_DELIVERY")
+
+    class _Session:
+        def close(self):
+            return None
+
+    def _session_local():
+        sessions.append(1)
+        return _Session()
+
+    class _LocationRedis:
+        async def get(self, key):
+            return json.dumps({"lat": -23.1, "lng": -46.6, "updated_at": "2026-10-19T12:00:00+00:00"})
+
+        async def aclose(self):
+            return None
+
+    class _StreamRedis(_FakeStreamRedis):
+        def __init__(self):
+            super().__init__()
+            self.appended = asyncio.Queue()
+
+        async def xread(self, streams, count=None, block=None):
+            ((key, _last_id),) = streams.items()
+            try:
+                entry_id, data = await asyncio.wait_for(self.appended.get(), block / 1000)
+            except asyncio.TimeoutError:
+                return []
+            return [(key.encode(), [(entry_id.encode(), {b"data": data})])]
+
+    stream_redis = _StreamRedis()
+    monkeypatch.setattr(tracking_router, "SessionLocal", _session_local)
+    monkeypatch.setattr(tracking_router, "_resolve_order_by_tracking_token", lambda *_args: order)
+    monkeypatch.setattr(tracking_router, "get_async_redis_client", lambda: _LocationRedis())
+    monkeypatch.setattr(tracking_router, "tracking_hub", tracking_router.CoalescingHub(
+        window_seconds=0.01, render=tracking_router._render_tracking_frame, stream=True, client_factory=lambda: stream_redis,
+    ))
+
+    async def _run_test():
+        async def is_disconnected():
+            return False
+
+        request = SimpleNamespace(is_disconnected=is_disconnected)
+        response = await tracking_router.stream_order_tracking("token", request)
+        chunks = []
+        async for chunk in response.body_iterator:
+            chunks.append(chunk)
+            if len(chunks) == 1:
+                stream_redis.appended.put_nowait(("13-0", _tracking_entry("13-0", -23.4)[1]))
+            elif len(chunks) == 2:
+                status = json.loads(_tracking_entry("14-0", 0)[1])
+                status.update(type="delivery.status", payload={"status": "DELIVERED"})
+                stream_redis.appended.put_nowait(("14-0", json.dumps(status)))
+        return chunks
+
+    chunks = asyncio.run(_run_test())
+
+    assert json.loads(chunks[0].decode().removeprefix("data: "))["lat"] == -23.1
+    assert chunks[1].startswith(b"id: 13-0\ndata: ")
+    assert json.loads(chunks[1].decode().split("data: ", 1)[1])["lat"] == -23.4
+    assert chunks[2] == b"id: 14-0\n" + tracking_router.TRACKING_ENDED_FRAME
+    assert len(sessions) == 1
+
+
+def test_order_status_changes_are_pushed_to_the_order_tracking_stream(monkeypatch):
+    sent = []
+    monkeypatch.setattr(publisher, "_send_messages", lambda messages: sent.extend(messages) or len(messages))
+
+    event_handlers.handle_order_status_changed_tracking_stream(
+        {"order_id": 44, "tenant_id": 5, "status": "SAIU_PARA_ENTREGA", "previous_status": "PRONTO"}
+    )
+
+    assert [target for target, _message in sent] == [order_tracking_stream(5, 44), "tenant:5:order:44:tracking"]
+    envelope = json.loads(sent[0][1])
+    assert envelope["type"] == "delivery.status"
+    assert envelope["payload"] == {"status": "SAIU_PARA_ENTREGA", "previous_status": "PRONTO"}
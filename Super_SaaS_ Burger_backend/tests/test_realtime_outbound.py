@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+from app.core.metrics import RealtimeOutboundMetrics
+from app.realtime import coalescer, outbound
+from app.realtime.coalescer import Frame, FrameMailbox
+from app.realtime.outbound import SLOW_CONSUMER_CLOSE_CODE, OutboundBuffer, OutboundWebSocket
+
+
+class _Socket:
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.closed_with = None
+        self.release = asyncio.Event()
+        if not blocked:
+            self.release.set()
+
+    async def send_text(self, data):
+        await self.release.wait()
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_buffer_drops_oldest_location_frames_but_never_status(monkeypatch):
+    metrics = RealtimeOutboundMetrics()
+    monkeypatch.setattr(outbound, "realtime_outbound_metrics", metrics)
+
+    buffer = OutboundBuffer("websocket", max_frames=3)
+    assert buffer.put("status-1", droppable=False)
+    assert buffer.put("location-1", droppable=True)
+    assert buffer.put("location-2", droppable=True)
+    assert buffer.put("status-2", droppable=False)
+
+    assert [frame[0] for frame in buffer._frames] == ["status-1", "location-2", "status-2"]
+    assert buffer.dropped == 1
+    assert not buffer.lagging()
+
+    # sem posição para descartar o status não some: a fila estoura e a conexão deve ser fechada
+    assert buffer.put("location-3", droppable=True)
+    assert buffer.put("status-3", droppable=False)
+    assert not buffer.put("status-4", droppable=False)
+    assert buffer.overflowed and buffer.lagging()
+    assert [frame[0] for frame in buffer._frames] == ["status-1", "status-2", "status-3", "status-4"]
+
+    gauge = metrics.snapshot()["websocket"]
+    assert gauge["dropped_frames"] == 3
+    assert gauge["queued_frames"] == 4
+    assert gauge["queued_bytes"] == buffer.queued_bytes
+
+    buffer.clear()
+    assert metrics.snapshot()["websocket"]["queued_bytes"] == 0
+
+
+def test_slow_socket_is_closed_without_blocking_fast_ones(monkeypatch):
+    metrics = RealtimeOutboundMetrics()
+    monkeypatch.setattr(outbound, "realtime_outbound_metrics", metrics)
+
+    async def _scenario():
+        slow, fast = _Socket(blocked=True), _Socket()
+        closed = []
+        slow_connection = OutboundWebSocket(slow, max_lag_seconds=0.05)
+        fast_connection = OutboundWebSocket(fast, max_lag_seconds=0.05)
+        slow_connection.start(closed.append)
+        fast_connection.start(closed.append)
+
+        for index in range(3):
+            slow_connection.send({"type": "delivery.location", "n": index})
+            fast_connection.send({"type": "delivery.location", "n": index})
+        await asyncio.sleep(0.01)
+        assert [message["n"] for message in fast.sent] == [0, 1, 2]
+
+        await asyncio.sleep(0.1)
+        assert closed == [slow_connection]
+        assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+        assert not slow_connection.send({"type": "delivery.status"})
+
+        fast_connection.close()
+        await asyncio.sleep(0)
+
+    asyncio.run(_scenario())
+
+    gauge = metrics.snapshot()["websocket"]
+    assert gauge["connections"] == 0
+    assert gauge["queued_frames"] == 0
+    assert gauge["slow_consumer_closes"] == 1
+
+
+def test_sse_mailbox_counts_replaced_frames_and_flags_sustained_lag(monkeypatch):
+    metrics = RealtimeOutboundMetrics()
+    monkeypatch.setattr(coalescer, "realtime_outbound_metrics", metrics)
+
+    async def _scenario():
+        mailbox = FrameMailbox(max_lag_seconds=0.02)
+        mailbox.offer("order", Frame("1-0", b"a"))
+        mailbox.offer("order", Frame("2-0", b"bb"))
+        assert not mailbox.lagging()
+        assert metrics.snapshot()["sse"]["queued_bytes"] == 2
+
+        await asyncio.sleep(0.05)
+        assert mailbox.lagging()
+        assert await mailbox.get(0) == [Frame("2-0", b"bb")]
+        assert not mailbox.lagging()
+
+    asyncio.run(_scenario())
+
+    gauge = metrics.snapshot()["sse"]
+    assert gauge["dropped_frames"] == 1
+    assert gauge["queued_frames"] == 0
+    assert gauge["slow_consumer_closes"] == 1
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+
+from app.realtime import publisher
+from app.realtime.publish_queue import RealtimePublisher
+
+
+class _FakeAsyncRedis:
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class _Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            def publish(self, channel, message):
+                self.commands.append((channel, message))
+
+            async def execute(self):
+                client.batches.append(list(self.commands))
+                return [1] * len(self.commands)
+
+        return _Pipeline()
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_publisher_sends_loop_and_thread_messages_in_background_batches():
+    client = _FakeAsyncRedis()
+    queue = RealtimePublisher(batch_size=3, client_factory=lambda: client)
+    assert queue.enqueue("tenant:1:events", "{}") is False
+
+    async def _scenario():
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(queue.run(stop_event))
+        while not queue.running:
+            await asyncio.sleep(0)
+
+        for index in range(4):
+            assert queue.enqueue("tenant:1:events", json.dumps({"n": index}))
+        worker = threading.Thread(target=lambda: queue.enqueue("tenant:1:events", json.dumps({"n": "thread"})))
+        worker.start()
+        worker.join()
+
+        while sum(len(batch) for batch in client.batches) < 5:
+            await asyncio.sleep(0)
+        stop_event.set()
+        await task
+
+    asyncio.run(_scenario())
+
+    messages = [json.loads(message)["n"] for batch in client.batches for _channel, message in batch]
+    assert messages == [0, 1, 2, 3, "thread"]
+    assert max(len(batch) for batch in client.batches) <= 3
+    assert client.closed
+    assert not queue.running
+
+
+def test_publish_helpers_enqueue_when_running_and_fall_back_to_shared_client(monkeypatch):
+    queued = []
+    sent = []
+
+    class _SyncRedis:
+        def publish(self, channel, message):
+            sent.append((channel, json.loads(message)))
+            return 2
+
+    monkeypatch.setattr(publisher, "get_shared_redis_client", lambda: _SyncRedis())
+    assert publisher.publish_event(3, {"type": "order.created"}) == 2
+    assert sent == [("tenant:3:events", {"type": "order.created"})]
+
+    monkeypatch.setattr(publisher.realtime_publisher, "enqueue_many", lambda messages: queued.append(messages) or True)
+    assert publisher.publish_event(3, {"type": "order.updated"}) == 1
+    assert [[channel for channel, _message in messages] for messages in queued] == [["tenant:3:events"]]
+    assert len(sent) == 1
+
+
+def test_publish_batch_sends_location_fan_out_in_one_pipeline_and_encodes_shared_payload_once(monkeypatch):
+    pipelines = []
+
+    class _SyncRedis:
+        def pipeline(self, transaction=True):
+            commands = []
+            pipelines.append(commands)
+
+            class _Pipeline:
+                def publish(self, channel, message):
+                    commands.append((channel, json.loads(message)))
+
+                def xadd(self, key, fields, maxlen=None, approximate=True):
+                    commands.append((key, json.loads(fields[b"data"])))
+
+                def expire(self, key, seconds):
+                    commands.append(("expire", seconds))
+
+                def execute(self):
+                    return [1] * len(commands)
+
+            return _Pipeline()
+
+    encoded = []
+    real_dumps = json.dumps
+    monkeypatch.setattr(publisher, "get_shared_redis_client", lambda: _SyncRedis())
+    monkeypatch.setattr(publisher.json, "dumps", lambda payload: encoded.append(payload) or real_dumps(payload))
+
+    assert publisher.publish_delivery_location_event(5, 9, -23.5, -46.6, order_id=44) == 2
+    assert [channel for channel, _payload in pipelines[0]] == ["tenant:5:delivery:location", "delivery:44"]
+
+    shared = {"type": "order.updated", "order_id": 44}
+    with publisher.publish_batch() as batch:
+        publisher.publish_delivery_location_event(5, 9, -23.5, -46.6, order_id=44)
+        publisher.publish_public_tracking_event(5, 44, status="OUT_FOR_DELIVERY", delivery_user_name=None, lat=-23.5, lng=-46.6)
+        publisher._publish("tenant:5:events", shared)
+        publisher._publish("tenant:5:admin", shared)
+        assert len(batch) == 6
+        assert pipelines[1:] == []
+
+    assert len(pipelines) == 2
+    assert [channel for channel, _payload in pipelines[1]] == [
+        "tenant:5:delivery:location",
+        "delivery:44",
+        "tenant:5:order:44:tracking:stream",
+        "expire",
+        "tenant:5:order:44:tracking",
+        "tenant:5:events",
+        "tenant:5:admin",
+    ]
+    assert sum(1 for payload in encoded if payload is shared) == 1
@@ -0,0 +1,487 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.finance import CashMovement, OrderPayment
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.models.sales_rollup import DailyItemSales, DailyPaidItemSales, DailySalesRollup
+from app.models.tenant import Tenant
+from app.routers.dashboard import dashboard_overview
+from app.routers.reports import financial_summary, sales_timeseries, sales_top_items
+from app.services import sales_rollups
+
+
+def _build_session():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    testing_session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = testing_session()
+    db.add(Tenant(id=1, slug="tempero", business_name="Tempero"))
+    db.commit()
+    return db
+
+
+def _add_paid_order(db, created_at, total_cents, method="pix", fee_cents=0, status="RECEBIDO"):
+    order = Order(
+        tenant_id=1,
+        cliente_telefone="5511999999999",
+        itens="1x Burger",
+        total_cents=total_cents,
+        status=status,
+        created_at=created_at,
+    )
+    db.add(order)
+    db.flush()
+    db.add(
+        OrderPayment(
+            tenant_id=1,
+            order_id=order.id,
+            method=method,
+            amount_cents=total_cents,
+            fee_cents=fee_cents,
+            status="paid",
+            paid_at=created_at,
+            created_at=created_at,
+        )
+    )
+    db.add(
+        CashMovement(
+            tenant_id=1,
+            type="in",
+            category="sale",
+            amount_cents=total_cents,
+            occurred_at=created_at,
+        )
+    )
+    return order
+
+
+def _seed(db):
+    today = sales_rollups.utc_today()
+    base = datetime.combine(today, datetime.min.time())
+    _add_paid_order(db, base - timedelta(days=3, hours=-12), 3000, method="pix")
+    _add_paid_order(db, base - timedelta(days=2, hours=-15), 2000, method="card", fee_cents=100, status="ENTREGUE")
+    _add_paid_order(db, base - timedelta(days=2, hours=-18), 1000, method="pix", status="ENTREGUE")
+    _add_paid_order(db, base + timedelta(minutes=5), 500, method="cash")
+    db.commit()
+    return today
+
+
+def test_closed_days_are_read_from_rollups_and_today_from_raw_rows():
+    db = _build_session()
+    today = _seed(db)
+    start = datetime.combine(today - timedelta(days=10), datetime.min.time())
+    end = datetime.combine(today + timedelta(days=1), datetime.min.time())
+
+    totals = sales_rollups.sales_totals(db, 1, start, end)
+
+    assert totals.orders_count == 4
+    assert totals.gross_sales_cents == 6500
+    assert totals.open_orders_count == 2
+    assert totals.payment_fees_cents == 100
+    # só os dias gravados no seed têm rollup; os demais são calculados em memória, o GET não grava
+    assert {row.day for row in db.query(DailySalesRollup).all()} == {
+        today - timedelta(days=3),
+        today - timedelta(days=2),
+    }
+
+    sales_rollups.reconcile_sales_rollups(db, days=10, today=today)
+    assert db.query(DailySalesRollup).count() == 10
+    assert not db.query(DailySalesRollup).filter(DailySalesRollup.day == today).count()
+
+    # linhas brutas de dias fechados deixam de ser lidas; o dia corrente continua ao vivo
+    db.execute(text("UPDATE orders SET total_cents = 0"))
+    db.commit()
+    totals = sales_rollups.sales_totals(db, 1, start, end)
+    assert totals.gross_sales_cents == 6000
+
+
+def test_rollup_queries_do_not_scan_raw_tables_for_closed_days():
+    db = _build_session()
+    today = _seed(db)
+    start = datetime.combine(today - timedelta(days=365), datetime.min.time())
+    end = datetime.combine(today, datetime.min.time())
+    sales_rollups.reconcile_sales_rollups(db, days=365, today=today)
+
+    statements: list[str] = []
+
+    def listener(_conn, _cursor, statement, *_args):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        totals = sales_rollups.sales_totals(db, 1, start, end)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+
+    assert totals.orders_count == 3
+    assert len(statements) == 1
+    assert "daily_sales_rollups" in statements[0]
+
+
+def test_writes_to_closed_days_refresh_their_rollup_after_commit():
+    db = _build_session()
+    today = _seed(db)
+    yesterday = today - timedelta(days=1)
+    sales_rollups.refresh_daily_rollups(db, 1, yesterday, yesterday)
+    assert db.query(DailySalesRollup).filter(DailySalesRollup.day == yesterday).one().orders_count == 0
+
+    _add_paid_order(db, datetime.combine(yesterday, datetime.min.time()) + timedelta(hours=20), 4200)
+    db.commit()
+
+    row = db.query(DailySalesRollup).filter(DailySalesRollup.day == yesterday).one()
+    db.refresh(row)
+    assert row.orders_count == 1
+    assert row.gross_sales_cents == 4200
+    assert row.avg_ticket_cents == 4200
+
+
+class _RecordingQueue:
+    def __init__(self):
+        self.enqueued = []
+
+    def enqueue(self, tenant_days, target="sales"):
+        if target == "sales":
+            self.enqueued.append(set(tenant_days))
+        return True
+
+
+def test_only_rollup_columns_mark_days_and_refresh_leaves_the_request_path(monkeypatch):
+    db = _build_session()
+    today = _seed(db)
+    base = datetime.combine(today, datetime.min.time())
+    old_order = _add_paid_order(db, base - timedelta(days=30, hours=-21), 900)
+    recent_order = _add_paid_order(db, base - timedelta(days=1, hours=-23), 1100)
+    db.commit()
+    sales_rollups.reconcile_sales_rollups(db, days=31, today=today)
+    queue = _RecordingQueue()
+    monkeypatch.setattr(sales_rollups, "sales_rollup_refresh_queue", queue)
+
+    # ping de GPS e edição de endereço não entram nos rollups
+    old_order.driver_lat = -23.5
+    recent_order.street = "Rua Nova"
+    db.commit()
+    assert queue.enqueued == []
+
+    old_order.status = "ENTREGUE"
+    recent_order.total_cents = 1500
+    db.commit()
+
+    # só os dois dias tocados, sem o mês entre eles, e nada recalculado no commit
+    assert queue.enqueued == [{(1, today - timedelta(days=30)), (1, today - timedelta(days=1))}]
+    row = db.query(DailySalesRollup).filter(DailySalesRollup.day == today - timedelta(days=1)).one()
+    assert row.gross_sales_cents == 1100
+
+
+def test_refresh_queue_recomputes_enqueued_days_in_background():
+    db = _build_session()
+    today = _seed(db)
+    two_days_ago = today - timedelta(days=2)
+    sales_rollups.reconcile_sales_rollups(db, days=3, today=today)
+    db.execute(text("UPDATE daily_sales_rollups SET gross_sales_cents = 1"))
+    db.commit()
+    queue = sales_rollups.SalesRollupRefreshQueue(
+        session_factory=sessionmaker(bind=db.get_bind()), delay_seconds=0
+    )
+    assert not queue.enqueue({(1, two_days_ago)})
+
+    async def _scenario():
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(queue.run(stop_event))
+        await asyncio.sleep(0)
+        assert queue.enqueue({(1, two_days_ago)})
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            db.expire_all()
+            if db.query(DailySalesRollup).filter(DailySalesRollup.day == two_days_ago).one().gross_sales_cents != 1:
+                break
+        stop_event.set()
+        await task
+
+    asyncio.run(_scenario())
+
+    totals = {row.day: row.gross_sales_cents for row in db.query(DailySalesRollup).all()}
+    assert totals[two_days_ago] == 3000
+    assert totals[today - timedelta(days=3)] == 1
+
+
+def test_reconcile_rebuilds_drifted_rollups():
+    db = _build_session()
+    today = _seed(db)
+    sales_rollups.reconcile_sales_rollups(db, days=5, today=today)
+    db.execute(text("UPDATE daily_sales_rollups SET gross_sales_cents = 1"))
+    db.commit()
+
+    sales_rollups.reconcile_sales_rollups(db, days=5, today=today)
+
+    totals = {row.day: row.gross_sales_cents for row in db.query(DailySalesRollup).all()}
+    assert totals[today - timedelta(days=3)] == 3000
+    assert totals[today - timedelta(days=2)] == 3000
+
+
+def test_dashboard_and_reports_match_raw_aggregation():
+    db = _build_session()
+    today = _seed(db)
+    first = (today - timedelta(days=6)).isoformat()
+    last = today.isoformat()
+
+    overview = dashboard_overview(
+        tenant_id=1, start_date=first, end_date=last, de=None, para=None, db=db, _user=None
+    )
+    summary = financial_summary(tenant_id=1, from_date=first, to_date=last, db=db, _user=None)
+    monthly = sales_timeseries(tenant_id=1, from_date=first, to_date=last, granularity="month", db=db, _user=None)
+
+    assert summary["gross_revenue_cents"] == 6500
+    assert summary["fees_cents"] == 100
+    assert summary["orders_count"] == 4
+    assert summary["cash_in_cents"] == 6500
+    assert sum(point["gross_revenue_cents"] for point in monthly["points"]) == 6500
+    assert overview["orders_count"] == 4
+    assert overview["gross_sales_cents"] == 6500
+    assert overview["open_orders_count"] == 2
+    assert overview["net_cash_cents"] == 6500
+    breakdown = {row["method"]: row["total_cents"] for row in overview["payment_method_breakdown"]}
+    assert breakdown == {"pix": 4000, "card": 2000, "cash": 500}
+
+
+def _add_order_with_items(db, created_at, items, items_json="[]"):
+    order = Order(
+        tenant_id=1,
+        cliente_telefone="5511999999999",
+        itens="pedido",
+        items_json=items_json,
+        total_cents=sum(item["subtotal_cents"] for item in items),
+        created_at=created_at,
+    )
+    db.add(order)
+    db.flush()
+    for item in items:
+        db.add(OrderItem(tenant_id=1, order_id=order.id, created_at=created_at, **item))
+    return order
+
+
+def test_order_items_increment_daily_item_sales_on_flush():
+    db = _build_session()
+    now = datetime.combine(sales_rollups.utc_today(), datetime.min.time()) + timedelta(hours=1)
+    burger = {
+        "menu_item_id": 7,
+        "name": "Smash Burger",
+        "quantity": 2,
+        "subtotal_cents": 6000,
+        "modifiers": [{"name": "Bacon", "price_cents": 500}],
+    }
+    _add_order_with_items(db, now, [burger])
+    _add_order_with_items(db, now, [dict(burger, quantity=1, subtotal_cents=3000)])
+    db.commit()
+
+    row = db.query(DailyItemSales).one()
+    assert (row.menu_item_id, row.production_area, row.item_name) == (7, "COZINHA", "Smash Burger")
+    assert row.quantity == 3
+    assert row.gross_revenue_cents == 9000
+    assert row.modifier_revenue_cents == 1500
+
+
+def test_item_sales_rebuild_covers_legacy_orders():
+    db = _build_session()
+    today = sales_rollups.utc_today()
+    two_days_ago = datetime.combine(today - timedelta(days=2), datetime.min.time()) + timedelta(hours=12)
+    _add_order_with_items(
+        db,
+        two_days_ago,
+        [{"menu_item_id": 7, "name": "Smash Burger", "quantity": 1, "subtotal_cents": 3000}],
+    )
+    legacy = Order(
+        tenant_id=1,
+        cliente_telefone="5511988887777",
+        itens="2x Coca",
+        items_json='[{"name": "Coca Lata", "quantity": 2, "subtotal_cents": 1200}]',
+        total_cents=1200,
+        created_at=two_days_ago,
+    )
+    db.add(legacy)
+    db.commit()
+
+    sales_rollups.rebuild_daily_item_sales(db, 1, today - timedelta(days=7), today - timedelta(days=1))
+    db.execute(text("DELETE FROM order_items"))
+    db.commit()
+
+    start = datetime.combine(today - timedelta(days=6), datetime.min.time())
+    end = datetime.combine(today, datetime.min.time())
+    items = sales_rollups.top_item_sales(db, 1, start, end, 10)
+
+    assert [(item.item_name, item.quantity) for item in items] == [("Smash Burger", 1), ("Coca Lata", 2)]
+    assert items[0].gross_revenue_cents == 3000
+
+
+class _RecordingConnection:
+    dialect = postgresql.dialect()
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return SimpleNamespace(all=lambda: [])
+
+
+def test_item_sales_increments_and_rebuild_take_the_same_day_locks(monkeypatch):
+    connection = _RecordingConnection()
+    day = sales_rollups.utc_today()
+    sales_rollups._lock_item_sales_days(connection, [(2, day), (1, day), (1, day - timedelta(days=1)), (1, day)])
+    # uma trava por (tenant, dia), sempre na mesma ordem: rebuild e incremento não se intercalam nem travam em ciclo
+    assert [params for _sql, params in connection.statements] == [
+        {"tenant_id": 1, "day": (day - timedelta(days=1)).toordinal()},
+        {"tenant_id": 1, "day": day.toordinal()},
+        {"tenant_id": 2, "day": day.toordinal()},
+    ]
+    assert all("pg_advisory_xact_lock" in sql for sql, _params in connection.statements)
+
+    locked = []
+    monkeypatch.setattr(
+        sales_rollups, "_lock_item_sales_days", lambda _connection, tenant_days: locked.append(set(tenant_days))
+    )
+    db = _build_session()
+    created_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=1)
+    _add_order_with_items(
+        db, created_at, [{"menu_item_id": 7, "name": "Smash Burger", "quantity": 1, "subtotal_cents": 3000}]
+    )
+    db.commit()
+    sales_rollups.rebuild_daily_item_sales(db, 1, day, day)
+
+    assert locked == [{(1, day)}, {(1, day)}]
+    assert db.query(DailyItemSales).one().quantity == 1
+
+
+def test_financial_top_items_only_count_paid_orders_with_their_own_fees():
+    db = _build_session()
+    today = sales_rollups.utc_today()
+    yesterday = datetime.combine(today - timedelta(days=1), datetime.min.time()) + timedelta(hours=12)
+    burger = {"menu_item_id": 7, "name": "Smash Burger", "quantity": 1, "subtotal_cents": 3000}
+    paid = _add_order_with_items(db, yesterday, [burger, {"name": "Coca Lata", "quantity": 1, "subtotal_cents": 1000}])
+    db.add(
+        OrderPayment(
+            tenant_id=1, order_id=paid.id, method="card", amount_cents=4000, fee_cents=400,
+            status="paid", paid_at=yesterday, created_at=yesterday,
+        )
+    )
+    legacy = Order(
+        tenant_id=1,
+        cliente_telefone="5511988887777",
+        itens="1x Burger",
+        items_json='[{"name": "Smash Burger", "quantity": 1, "subtotal_cents": 3000}]',
+        total_cents=3000,
+        created_at=yesterday,
+    )
+    db.add(legacy)
+    db.flush()
+    db.add(OrderPayment(tenant_id=1, order_id=legacy.id, method="pix", amount_cents=3000, status="paid", paid_at=yesterday))
+    # pedido não pago e pedido cancelado (pagamento estornado) ficam fora do relatório financeiro
+    _add_order_with_items(db, yesterday, [dict(burger, quantity=5, subtotal_cents=15000)])
+    cancelled = _add_order_with_items(db, yesterday, [dict(burger, quantity=2, subtotal_cents=6000)])
+    cancelled.status = "CANCELADO"
+    db.add(
+        OrderPayment(
+            tenant_id=1, order_id=cancelled.id, method="pix", amount_cents=6000,
+            status="refunded", paid_at=yesterday,
+        )
+    )
+    db.commit()
+
+    report = sales_top_items(
+        tenant_id=1, from_date=(today - timedelta(days=1)).isoformat(), to_date=today.isoformat(), limit=10,
+        db=db, _user=None,
+    )
+
+    assert report["items"] == [
+        {
+            "item_name": "Smash Burger",
+            "qty": 2,
+            "gross_revenue_cents": 6000,
+            "net_revenue_cents": 5700,
+            "cogs_cents": 0,
+            "gross_profit_cents": 5700,
+        },
+        {
+            "item_name": "Coca Lata",
+            "qty": 1,
+            "gross_revenue_cents": 1000,
+            "net_revenue_cents": 900,
+            "cogs_cents": 0,
+            "gross_profit_cents": 900,
+        },
+    ]
+
+
+def test_paid_top_items_read_closed_days_from_the_paid_rollup():
+    db = _build_session()
+    today = sales_rollups.utc_today()
+    three_days_ago = datetime.combine(today - timedelta(days=3), datetime.min.time()) + timedelta(hours=12)
+    two_days_ago = three_days_ago + timedelta(days=1)
+    order = _add_order_with_items(
+        db,
+        three_days_ago,
+        [
+            {"menu_item_id": 7, "name": "Smash Burger", "quantity": 1, "subtotal_cents": 3000},
+            {"name": "Coca Lata", "quantity": 1, "subtotal_cents": 1000},
+        ],
+    )
+    # pagamento dividido em dois dias: os itens entram uma vez, no primeiro; a taxa, no dia de cada pagamento
+    first = OrderPayment(
+        tenant_id=1, order_id=order.id, method="card", amount_cents=2000, fee_cents=200,
+        status="paid", paid_at=three_days_ago, created_at=three_days_ago,
+    )
+    second = OrderPayment(
+        tenant_id=1, order_id=order.id, method="pix", amount_cents=2000, fee_cents=40,
+        status="paid", paid_at=two_days_ago, created_at=two_days_ago,
+    )
+    db.add_all([first, second])
+    db.commit()
+
+    rows = {
+        (row.day, row.item_name): (row.quantity, row.gross_revenue_cents, row.fee_cents)
+        for row in db.query(DailyPaidItemSales).all()
+    }
+    assert rows == {
+        (three_days_ago.date(), "Smash Burger"): (1, 3000, 150),
+        (three_days_ago.date(), "Coca Lata"): (1, 1000, 50),
+        (two_days_ago.date(), "Smash Burger"): (0, 0, 30),
+        (two_days_ago.date(), "Coca Lata"): (0, 0, 10),
+    }
+
+    # dias fechados saem do rollup, sem tocar em pagamentos e itens
+    db.execute(text("UPDATE daily_paid_item_sales SET fee_cents = 0"))
+    db.commit()
+    items = sales_rollups.paid_item_sales_by_name(
+        db,
+        1,
+        datetime.combine(today - timedelta(days=7), datetime.min.time()),
+        datetime.combine(today, datetime.min.time()),
+    )
+    assert {name: (item.quantity, item.gross_revenue_cents, item.fee_cents) for name, item in items.items()} == {
+        "Smash Burger": (1, 3000, 0),
+        "Coca Lata": (1, 1000, 0),
+    }
+
+    # estorno do primeiro pagamento: os itens passam para o dia do segundo, e os dois dias são regravados
+    first.status = "refunded"
+    db.commit()
+
+    rows = {
+        (row.day, row.item_name): (row.quantity, row.gross_revenue_cents, row.fee_cents)
+        for row in db.query(DailyPaidItemSales).all()
+    }
+    assert rows == {
+        (two_days_ago.date(), "Smash Burger"): (1, 3000, 30),
+        (two_days_ago.date(), "Coca Lata"): (1, 1000, 10),
+    }
@@ -26,7 +26,7 @@ import {
   X,
   XCircle,
 } from "lucide-react";
-import { useMutation, useQuery, useQueryClient, type UseMutationResult } from "@tanstack/react-query";
+import { keepPreviousData, useInfiniteQuery, useMutation, useQuery, useQueryClient, type UseMutationResult } from "@tanstack/react-query";
 
 import { Badge } from "@/components/ui/badge";
 import { Button } from "@/components/ui/button";
@@ -35,7 +35,7 @@ import { Input } from "@/components/ui/input";
 import { Select } from "@/components/ui/select";
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table";
 import { useSession } from "@/hooks/use-session";
-import { api } from "@/lib/api";
+import { api, ApiError, apiFetch } from "@/lib/api";
 import { buildOrderWhatsAppUrl, normalizeWhatsAppPhone, openOrderWhatsApp } from "@/lib/orderWhatsApp";
 import { cn } from "@/lib/utils";
 
@@ -131,6 +131,7 @@ const statusPresentations: Record<string, StatusPresentation> = {
   FAILED: { label: "Falha na entrega", color: "red", tone: "danger", icon: AlertCircle },
 };
 
+const ORDERS_PAGE_SIZE = 100;
 const statusFilterOptions = ["PENDING", "CONFIRMADO", "EM_PREPARO", "PRONTO", "DRIVER_ASSIGNED", "SAIU_PARA_ENTREGA", "ENTREGUE", "CANCELADO", "FAILED"];
 const statusOptions = ["RECEBIDO", "CONFIRMADO", "EM_PREPARO", "PRONTO", "SAIU_PARA_ENTREGA", "ENTREGUE", "CANCELADO"];
 
@@ -139,6 +140,23 @@ function getOrderStatusPresentation(status?: string | null): StatusPresentation
   return statusPresentations[key] ?? { label: status || "Sem status", color: "gray", tone: "neutral", icon: Clock3 };
 }
 
+// O filtro de status vai para a API com todos os códigos que compartilham o mesmo rótulo (ex.: ENTREGUE e DELIVERED).
+function getStatusAliases(status: string) {
+  const label = getOrderStatusPresentation(status).label;
+  return Array.from(new Set([status, ...Object.keys(statusPresentations).filter((key) => statusPresentations[key].label === label)]));
+}
+
+async function fetchOrdersPage(tenantId: number, filters: Pick<Filters, "status" | "date">, cursor?: string) {
+  const params = new URLSearchParams({ limit: String(ORDERS_PAGE_SIZE) });
+  if (cursor) params.set("cursor", cursor);
+  if (filters.status) params.set("status", getStatusAliases(filters.status).join(","));
+  if (filters.date) { params.set("from", filters.date); params.set("to", filters.date); }
+  const response = await apiFetch(`/api/orders/${tenantId}?${params.toString()}`);
+  const data = await response.json().catch(() => null);
+  if (!response.ok) throw new ApiError((data as { detail?: string } | null)?.detail || "Erro inesperado", response.status, data);
+  return { orders: data as Order[], nextCursor: response.headers.get("X-Next-Cursor") ?? undefined };
+}
+
 function getOrderNumber(order: Order) {
   return order.daily_order_number ?? order.id;
 }
@@ -347,7 +365,9 @@ export default function OrdersPage() {
   const { data: session, isLoading: isSessionLoading } = useSession();
   const tenantId = session?.tenant_id;
 
-  const { data: orders, isLoading, isError, isFetching, refetch } = useQuery({ queryKey: ["orders", tenantId], queryFn: () => api.get<Order[]>(`/api/orders/${tenantId}`), enabled: Boolean(tenantId) });
+  const ordersQuery = useInfiniteQuery({ queryKey: ["orders", tenantId, filters.status, filters.date], queryFn: ({ pageParam }) => fetchOrdersPage(tenantId as number, filters, pageParam), initialPageParam: undefined as string | undefined, getNextPageParam: (lastPage) => lastPage.nextCursor, placeholderData: keepPreviousData, enabled: Boolean(tenantId) });
+  const { isLoading, isError, isFetching, refetch, hasNextPage, fetchNextPage, isFetchingNextPage } = ordersQuery;
+  const orders = useMemo(() => ordersQuery.data?.pages.flatMap((page) => page.orders), [ordersQuery.data]);
   const orderItemsQuery = useQuery({ queryKey: ["order-items", selectedOrderId], queryFn: () => api.get<OrderItem[]>(`/api/orders/${selectedOrderId}/items`), enabled: Boolean(selectedOrderId) });
   const updateStatus = useMutation({ mutationFn: ({ orderId, status }: { orderId: number; status: string }) => api.patch(`/api/orders/${orderId}/status`, { status }), onSuccess: () => { queryClient.invalidateQueries({ queryKey: ["orders"] }); if (selectedOrderId) queryClient.invalidateQueries({ queryKey: ["order-items", selectedOrderId] }); } });
 
@@ -366,5 +386,5 @@ export default function OrdersPage() {
   if (isSessionLoading || isLoading) return <div className="space-y-4"><div className="h-20 animate-pulse rounded-2xl bg-slate-100" /><div className="grid gap-3 sm:grid-cols-2 xl:grid-cols-5">{[0,1,2,3,4].map((i) => <div key={i} className="h-24 animate-pulse rounded-2xl bg-slate-100" />)}</div><div className="h-96 animate-pulse rounded-2xl bg-slate-100" /></div>;
   if (!tenantId || isError || !orders) return <div className="rounded-2xl border border-red-200 bg-red-50 p-6 text-sm text-red-700"><p className="font-semibold">Não foi possível carregar pedidos.</p><p className="mt-1">Verifique sua sessão e tente novamente.</p><Button type="button" variant="outline" className="mt-4" onClick={() => refetch()}>Tentar novamente</Button></div>;
 
-  return <div className="space-y-5"><OrdersPageHeader onRefresh={() => refetch()} isRefreshing={isFetching} /><OrdersSummaryCards orders={orders} />{whatsAppError && <div className="rounded-xl border border-amber-200 bg-amber-50 p-3 text-sm text-amber-700">{whatsAppError}</div>}<OrdersFilters filters={filters} setFilters={setFilters} orders={orders} /><div className="grid gap-5 xl:grid-cols-[minmax(0,72fr)_minmax(320px,28fr)]"><main className="min-w-0 space-y-3">{orders.length === 0 ? <OrdersEmptyState /> : filteredOrders.length === 0 ? <OrdersEmptyState filtered /> : <><OrdersTable orders={filteredOrders} selectedOrderId={selectedOrderId} onSelect={handleSelect} onWhatsApp={handleWhatsAppClick} /><OrdersMobileCards orders={filteredOrders} onSelect={handleSelect} onWhatsApp={handleWhatsAppClick} /></>}</main><OrderDetailsPanel order={selectedOrder} items={orderItemsQuery.data} isItemsLoading={orderItemsQuery.isLoading} onClose={() => setSelectedOrderId(null)} onWhatsApp={handleWhatsAppClick} updateStatus={updateStatus} />{selectedOrder && <OrderDetailsPanel order={selectedOrder} items={orderItemsQuery.data} isItemsLoading={orderItemsQuery.isLoading} onClose={() => setSelectedOrderId(null)} onWhatsApp={handleWhatsAppClick} updateStatus={updateStatus} isMobile />}</div></div>;
+  return <div className="space-y-5"><OrdersPageHeader onRefresh={() => refetch()} isRefreshing={isFetching} /><OrdersSummaryCards orders={orders} />{whatsAppError && <div className="rounded-xl border border-amber-200 bg-amber-50 p-3 text-sm text-amber-700">{whatsAppError}</div>}<OrdersFilters filters={filters} setFilters={setFilters} orders={orders} /><div className="grid gap-5 xl:grid-cols-[minmax(0,72fr)_minmax(320px,28fr)]"><main className="min-w-0 space-y-3">{orders.length === 0 ? <OrdersEmptyState /> : filteredOrders.length === 0 ? <OrdersEmptyState filtered /> : <><OrdersTable orders={filteredOrders} selectedOrderId={selectedOrderId} onSelect={handleSelect} onWhatsApp={handleWhatsAppClick} /><OrdersMobileCards orders={filteredOrders} onSelect={handleSelect} onWhatsApp={handleWhatsAppClick} /></>}{hasNextPage && <div className="flex justify-center"><Button type="button" variant="outline" onClick={() => fetchNextPage()} disabled={isFetchingNextPage} className="gap-2"><RefreshCw className={cn("h-4 w-4", isFetchingNextPage && "animate-spin")} /> Carregar mais pedidos</Button></div>}</main><OrderDetailsPanel order={selectedOrder} items={orderItemsQuery.data} isItemsLoading={orderItemsQuery.isLoading} onClose={() => setSelectedOrderId(null)} onWhatsApp={handleWhatsAppClick} updateStatus={updateStatus} />{selectedOrder && <OrderDetailsPanel order={selectedOrder} items={orderItemsQuery.data} isItemsLoading={orderItemsQuery.isLoading} onClose={() => setSelectedOrderId(null)} onWhatsApp={handleWhatsAppClick} updateStatus={updateStatus} isMobile />}</div></div>;
 }